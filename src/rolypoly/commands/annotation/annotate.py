@@ -149,6 +149,18 @@ class AnnotationConfig(BaseConfig):
     help="Log level",
     hidden=True,
 )
+@click.option(
+    "--conflict-policy",
+    default="keep_all",
+    type=click.Choice(["keep_all", "prefer_protein", "prefer_rna"]),
+    help="How overlapping protein and RNA features are resolved in the merged annotation: keep both (flagged with conflict=true), or drop the RNA (prefer_protein) or protein (prefer_rna) feature",
+)
+@click.option(
+    "--conflict-min-overlap",
+    default=0.5,
+    type=click.FloatRange(0, 1),
+    help="Overlap (fraction of the shorter feature) at which a protein and an RNA feature conflict",
+)
 @click.option(
     "--search-tool",
     default="hmmsearch",
@@ -175,12 +187,23 @@ def annotate(
     custom_domain_db,
     min_orf_length,
     log_level,
+    conflict_policy,
+    conflict_min_overlap,
     search_tool,
 ):
-    """Functionally and structurally annotate RNA viral sequence(s) (Wrapper for annotate_prot, annotate_RNA)"""
+    """Functionally and structurally annotate RNA viral sequence(s) (Wrapper for annotate_prot, annotate_RNA)
+
+    The protein and RNA branches run concurrently, each with an equal share
+    of --threads and --memory; their results are merged into
+    combined_annotations.gff3 and combined_annotations.parquet.
+    """
     import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    from rolypoly.utils.bio.annotation_merge import merge_annotations
 
     from rolypoly.utils.logging.loggit import log_start_info
+    from rolypoly.utils.various import parse_memory
 
     override_parameters = (
         json.loads(override_parameters) if override_parameters else {}
@@ -199,16 +222,28 @@ def annotate(
         skip_steps=skip_steps_list,
     )
 
+    branches = [
+        branch
+        for branch in ("protein_annotation", "RNA_annotation")
+        if branch not in config.skip_steps
+    ]
+    # both branches lease from the same scheduler; split the per-step
+    # thread and memory budgets so concurrent steps do not each claim the
+    # whole budget
+    branch_threads = max(threads // max(len(branches), 1), 1)
+    total_mb = parse_memory(config.memory["bytes"]) // 1024**2
+    branch_memory = f"{total_mb // max(len(branches), 1)}mb"
+
     # Create RNA config
     rna_config = RNAAnnotationConfig(
         input=Path(config.input).absolute().resolve(),  # type: ignore
         output_dir=config.output_dir / "rna_annotation",
-        threads=threads,
+        threads=branch_threads,
         log_level=log_level,
         log_file=config.logger,  # Pass the logger directly
-        memory=memory,
+        memory=branch_memory,
         override_parameters=override_parameters,
-        skip_steps=skip_steps_list,
+        skip_steps=list(skip_steps_list),
         secondary_structure_tool=secondary_structure_tool,
         ires_tool=ires_tool,
         trna_tool=trna_tool,
@@ -220,11 +255,11 @@ def annotate(
     protein_config = ProteinAnnotationConfig(
         input=input,
         output_dir=config.output_dir / "protein_annotation",
-        threads=threads,
+        threads=branch_threads,
         log_file=config.logger,  # Pass the logger directly
-        memory=memory,
+        memory=branch_memory,
         override_parameters=override_parameters,
-        skip_steps=skip_steps_list,
+        skip_steps=list(skip_steps_list),
         gene_prediction_tool=gene_prediction_tool,
         search_tool=search_tool,
         domain_db=domain_db,
@@ -241,15 +276,26 @@ def annotate(
     log_start_info(config.logger, config.__dict__)
     config.logger.info("Starting annotation process    ")
 
-    if "protein_annotation" not in config.skip_steps:
-        process_protein_annotations(config.protein_config)
+    runners = {
+        "protein_annotation": (process_protein_annotations, protein_config),
+        "RNA_annotation": (process_RNA_annotations, rna_config),
+    }
+    for branch in runners:
+        if branch not in branches:
+            config.logger.info(f"Skipping {branch.replace('_', ' ')}")
+    with ThreadPoolExecutor(max_workers=max(len(branches), 1)) as executor:
+        futures = {
+            branch: executor.submit(*runners[branch]) for branch in branches
+        }
+        # re-raise the first failure (the other branch still runs to completion)
+        for future in futures.values():
+            future.result()
+
+    if "protein_annotation" in branches:
         tools.append(config.protein_config.search_tool)
         tools.append(str(config.protein_config.min_orf_length))
         tools.append(config.protein_config.domain_db)
-    else:
-        config.logger.info("Skipping protein annotation")
-    if "RNA_annotation" not in config.skip_steps:
-        process_RNA_annotations(config.rna_config)
+    if "RNA_annotation" in branches:
         tools.append(config.rna_config.secondary_structure_tool)
         tools.append(config.rna_config.ires_tool)
         tools.append(config.rna_config.trna_tool)
@@ -257,10 +303,21 @@ def annotate(
         tools.append(
             "rfam"
         )  # TODO: add other needed domain_db to the citation reminder
-    else:
-        config.logger.info("Skipping RNA annotation")
 
-    # TODO: logic to combine RNA and protein annotation results - either stack the tables or combine the gff3s (both?)
+    if branches:
+        merge_annotations(
+            protein_table=protein_config.output_dir / "combined_annotations.tsv"
+            if "protein_annotation" in branches
+            else None,
+            rna_table=rna_config.output_dir / "combined_annotations.tsv"
+            if "RNA_annotation" in branches
+            else None,
+            output_prefix=config.output_dir / "combined_annotations",
+            orf_fasta=protein_config.output_dir / "predicted_orfs.faa",
+            policy=conflict_policy,
+            min_overlap=conflict_min_overlap,
+            logger=config.logger,
+        )
 
     config.logger.info("Annotation process completed.")
 
@@ -66,9 +66,20 @@ class RNAAnnotationConfig(BaseConfig):
 
         self.step_params = {
             "RNAfold": {
-                "temperature": 25
-            },  # 37 is unreasonably hot for most enviroments
-            "LinearFold": {},  # Fixed parameter name
+                "temperature": 25,  # 37 is unreasonably hot for most enviroments
+                # windowed (RNALfold) folding: True, False or "auto" (longer than window_threshold)
+                "window": "auto",
+                "window_threshold": 3000,
+                "max_bp_span": 150,
+                "partition_function": False,  # also write secondary_structure_ensemble.tsv
+                "plot": False,  # SVG plot per structure
+            },
+            "LinearFold": {
+                "beamsize": 100,
+                "batch_size": 256,  # sequences per linearfold process
+                "batch_nucleotides": 500_000,
+                "timeout": 300,  # seconds per sequence
+            },
             "RNAstructure": {"temperature": 25},
             "cmsearch": {
                 "cut_ga": True,
@@ -77,7 +88,14 @@ class RNAAnnotationConfig(BaseConfig):
             "IRESfinder": {"min_score": 0.5},
             "IRESpy": {"min_score": 0.6},
             "tRNAscan-SE": {"forceow": True, "G": True},  #
-            "lightmotif": {},
+            "lightmotif": {
+                "pvalue": 1e-4,
+                "min_score": None,  # absolute score floor on top of the p-value
+                "thresholds": {},  # per motif: {"name": {"pvalue": .., "min_score": ..}}
+                "both_strands": True,
+                "pseudocount": 0.25,
+                "batch_nucleotides": 10_000_000,
+            },
             "aragorn": {"l": True},
         }
         if override_parameters:
@@ -231,8 +249,8 @@ def annotate_RNA(
     min_overlap_positions,
 ):
     """Predict viral sequence RNA secondary structure, search for ribozymes, IRES, tRNAs, and other RNA structural elements.
-    By default, the following steps are run in the following order: predict_secondary_structure (LinearFold), search_ribozymes (Rfam via cmscan), predict_trnas (tRNAscan-SE).
-    Additional steps (detect_ires, search_rna_motifs, search_rna_elements) are currently disabled as they are under development.
+    By default, the following steps are run in the following order: predict_secondary_structure (LinearFold), search_ribozymes (Rfam via cmscan), predict_trnas (tRNAscan-SE), search_rna_motifs (lightmotif, when a motif collection is available).
+    Additional steps (detect_ires, search_rna_elements) are currently disabled as they are under development.
     Use --skip-steps to skip specific steps."""
     import json
 
@@ -283,7 +301,7 @@ def process_RNA_annotations(config):
         search_ribozymes,  # Rfam via cmscan
         # detect_ires,  # Not yet tested/finalized
         predict_trnas,  # tRNAscan-SE
-        # search_rna_motifs,  # Not yet tested/finalized
+        search_rna_motifs,  # lightmotif PSSM scan (skipped without a motif collection)
         # search_rna_elements,  # RNAsselem - not yet tested
         resolve_rna_element_overlaps,  # Resolve overlapping RNA element hits
     ]
@@ -337,44 +355,23 @@ def predict_secondary_structure(config):
 
 
 def predict_secondary_structure_rnafold(config, input_fasta, output_file):
-    """Predict RNA secondary structure using RNAfold."""
-    import RNA
-    from needletail import parse_fastx_file
-
-    # from needletail import Record as record
-
-    with open(output_file, "w") as out_f:
-        for record in parse_fastx_file(str(input_fasta)):
-            sequence = str(record.seq)  # pyright: ignore
-
-            # convert to RNA
-            sequence = sequence.replace("T", "U")
-            # Set folding parameters
-            md = RNA.md()
-            md.temperature = config.step_params["RNAfold"]["temperature"]
-            # print(sequence)
-
-            # Predict MFE structure
-            (ss, mfe) = RNA.fold(sequence, str(md))
+    """Predict RNA secondary structure using RNAfold (ViennaRNA).
 
-            # Calculate partition function and base pair probabilities
-            (ss_pf, fe) = RNA.pf_fold(sequence, md)
-
-            # Generate dot-plot
-            RNA.plot_structure_svg(
-                data=sequence,
-                filename=config.output_dir / f"{record.id}_plot.svg",  # pyright: ignore
-                sequence=sequence,
-                structure=ss,
-            )  # pyright: ignore
-
-            # Write results
-            out_f.write(f">{record.id}\n")  # pyright: ignore
-            out_f.write(f"Sequence: {sequence}\n")
-            out_f.write(f"MFE structure: {ss}\n")
-            out_f.write(f"MFE: {mfe:.2f} kcal/mol\n")
-            out_f.write(f"Ensemble structure: {ss_pf}\n")
-            out_f.write(f"Ensemble free energy: {fe:.2f} kcal/mol\n\n")
+    Records are folded in parallel; sequences longer than the window
+    threshold are folded locally (RNALfold). The partition function and
+    plots are opt-in through step_params["RNAfold"].
+    """
+    from rolypoly.utils.bio.rna_folding import fold_fasta
+
+    fold_fasta(
+        input_fasta,
+        output_file,
+        params=config.step_params["RNAfold"],
+        threads=config.threads,
+        plot_dir=config.output_dir / "structure_plots",
+        ensemble_file=config.output_dir / "secondary_structure_ensemble.tsv",
+        logger=config.logger,
+    )
 
     config.logger.info(
         f"Secondary structure prediction completed. Output written to {output_file}"
@@ -440,91 +437,20 @@ def predict_secondary_structure_rnastructure(config, input_fasta, output_file):
 
 
 def predict_secondary_structure_linearfold(config, input_fasta, output_file):
-    """Predict RNA secondary structure using LinearFold."""
-    import subprocess
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
-    from needletail import parse_fastx_file
+    """Predict RNA secondary structure using LinearFold.
 
-    def process_sequence(record):
-        """Process a single sequence with LinearFold."""
-        sequence = str(record.seq).replace("T", "U")
-
-        try:
-            # Prepare LinearFold command
-            params = config.step_params["LinearFold"]
-            beamsize = params.get("beamsize", 100)
-
-            # LinearFold expects input via stdin
-            cmd = ["linearfold", "--beamsize", str(beamsize)]
-
-            # Run LinearFold with sequence input via stdin
-            process = subprocess.run(
-                cmd,
-                input=sequence,
-                text=True,
-                capture_output=True,
-                timeout=300,  # 5 minute timeout per sequence
-            )
-
-            if process.returncode == 0:
-                # Parse LinearFold output
-                output_lines = process.stdout.strip().split("\n")
-                if len(output_lines) >= 2:
-                    # LinearFold outputs: sequence, then structure with energy
-                    structure_line = output_lines[1]
-                    # Extract structure and MFE from output like: "(((...))) (-2.34)"
-                    if "(" in structure_line and ")" in structure_line:
-                        parts = structure_line.split()
-                        if len(parts) >= 2:
-                            structure = parts[0]
-                            # Extract MFE from parentheses
-                            mfe_str = parts[1].strip("()")
-                            try:
-                                mfe = float(mfe_str)
-                            except ValueError:
-                                mfe = 0.0
-                            return (record.id, sequence, structure, mfe)
-
-                config.logger.warning(
-                    f"Unexpected LinearFold output format for {record.id}: {process.stdout}"
-                )
-                return (record.id, sequence, "Error", 0.0)
-            else:
-                config.logger.error(
-                    f"LinearFold failed for sequence {record.id}: {process.stderr}"
-                )
-                return (record.id, sequence, "Error", 0.0)
-
-        except subprocess.TimeoutExpired:
-            config.logger.error(
-                f"LinearFold timed out for sequence {record.id}"
-            )
-            return (record.id, sequence, "Error", 0.0)
-        except Exception as e:
-            config.logger.error(
-                f"Error processing sequence {record.id}: {str(e)}"
-            )
-            return (record.id, sequence, "Error", 0.0)
+    Sequences are sent in batches over stdin to up to config.threads
+    concurrent linearfold processes (see linearfold_fasta).
+    """
+    from rolypoly.utils.bio.rna_folding import linearfold_fasta
 
-    # Process sequences in parallel
-    with (
-        open(output_file, "w") as out_f,
-        ThreadPoolExecutor(max_workers=config.threads) as executor,
-    ):
-        futures = []
-        for record in parse_fastx_file(str(input_fasta)):
-            futures.append(executor.submit(process_sequence, record))
-
-        for future in as_completed(futures):
-            seq_id, sequence, structure, mfe = future.result()
-            out_f.write(f">{seq_id}\n")
-            out_f.write(f"{sequence}\n")
-            if structure != "Error":
-                out_f.write(f"{structure}\n")
-                out_f.write(f"({mfe:.2f})\n")
-            else:
-                out_f.write("Error in structure prediction\n")
+    linearfold_fasta(
+        input_fasta,
+        output_file,
+        params=config.step_params["LinearFold"],
+        threads=config.threads,
+        logger=config.logger,
+    )
 
     config.logger.info(
         f"LinearFold prediction completed. DBN file with MFE predictions written to {output_file}"
@@ -537,7 +463,7 @@ def search_ribozymes(config):
     import os
     from pathlib import Path
 
-    from rolypoly.utils.various import run_command_comp
+    from rolypoly.utils.bio.cm_search import cm_search_sharded
 
     config.logger.info(f"Searching for ribozymes using {config.cm_db}")
     input_fasta = config.input
@@ -553,37 +479,26 @@ def search_ribozymes(config):
     else:
         raise ValueError(f"Invalid cm database: {config.cm_db}")
 
-    # Prepare parameters
-    params = config.step_params["cmsearch"].copy()
-
-    # Filter out False boolean values and only keep True boolean flags
-    filtered_params = {}
-    for param, value in params.items():
-        if isinstance(value, bool):
-            if value:  # Only add True boolean values as flags
-                filtered_params[param] = True
-        else:
-            filtered_params[param] = value
-
-    # Set up positional arguments in correct order
-    positional_args = [str(cm_db_path), str(input_fasta)]
-
-    # Add required parameters
-    filtered_params.update(
-        {"cpu": config.threads, "tblout": str(output_file), "o": "/dev/null"}
-    )
-
-    success = run_command_comp(
-        base_cmd="cmscan",
-        positional_args=positional_args,
-        params=filtered_params,
+    if output_file.exists() and output_file.stat().st_size > 28:
+        config.logger.info(f"{output_file} exists and isn't empty, skipping")
+        tools.append("cmsearch")
+        return True
+
+    # Sequences are searched in residue-balanced shards, concurrently
+    cm_search_sharded(
+        cm_db_path,
+        input_fasta,
+        output_file,
+        program="cmscan",
+        params=config.step_params["cmsearch"],
+        threads=config.threads,
+        memory=config.memory["bytes"],
+        work_dir=config.output_dir / "cmscan_shards",
+        scheduler=config.scheduler,
         logger=config.logger,
-        output_file=output_file,
-        skip_existing=True,
     )
-    if success:
-        tools.append("cmsearch")
-    return success
+    tools.append("cmsearch")
+    return True
 
 
 def search_rna_elements(config):
@@ -795,139 +710,57 @@ def predict_trnas_with_tRNAscan(config):
 
 
 def search_rna_motifs(config):  # py
-    """PSSM search using lightmotif."""
-
-    config.logger.warning("RNA motif search is still in development.")
-    # from pathlib import Path
-
-    # import lightmotif
-    # from needletail import parse_fastx_file
-
-    # config.logger.info(
-    #     f"Searching for RNA structural elements using {config.motif_db} database"
-    # )
-
-    # # Check ROLYPOLY_DATA environment variable
-    # if "ROLYPOLY_DATA" not in os.environ:
-    #     config.logger.error("ROLYPOLY_DATA environment variable is not set")
-    #     return False
-
-    # datadir = Path(os.environ.get("ROLYPOLY_DATA", ""))
-    # if not datadir.exists():
-    #     config.logger.error(f"ROLYPOLY_DATA directory {datadir} does not exist")
-    #     return False
-
-    # if config.motif_db == "RolyPoly":
-    #     motifs_dir = datadir / "RNA_motifs" / "rolypoly"
-    #     if not motifs_dir.exists():
-    #         config.logger.warning(f"RolyPoly RNA motifs search is still in development. You can {motifs_dir} with your own motifs, but no guarantees that it will work.")
-    #         config.logger.warning("Skipping RNA motif search.")
-    #         # config.logger.warning(f"RolyPoly RNA motifs directory {motifs_dir} does not exist. Skipping RNA motif search.")
-    #         return False
-    # elif config.motif_db == "jaspar_core":
-    #     motifs_dir = datadir / "RNA_motifs" / "jaspar_core"
-    #     if not motifs_dir.exists():
-    #         config.logger.warning(f"RolyPoly RNA motifs search is still in development. You can {motifs_dir} with your own motifs, but no guarantees that it will work.")
-    #         # config.logger.warning(f"JASPAR core RNA motifs directory {motifs_dir} does not exist. Skipping RNA motif search.")
-    #         return False
-    # else:
-    #     motifs_dir = Path(config.motif_db)
-    #     # check if motifs_dir exists
-    #     if not motifs_dir.exists():
-    #         config.logger.error(f"Motifs directory {motifs_dir} does not exist")
-    #         return False
-    #     config.logger.info(f"Loading motifs from {motifs_dir}")
-
-    # config.logger.info(f"Loading motifs from {config.motif_db} database")
+    """PSSM search using lightmotif.
+
+    Motifs are loaded once from config.motif_db: a collection under
+    ROLYPOLY_DATA/RNA_motifs (RolyPoly, jaspar_core, jaspar_rna) or a
+    user file/directory of JASPAR/MEME/TRANSFAC motifs. All contigs are
+    scanned in striped batches on both strands; hits passing the p-value
+    (and score) thresholds of step_params["lightmotif"] are written to
+    rna_motifs.out.
+    """
+    from rolypoly.utils.bio.motif_scan import load_motifs, scan_fasta
+
+    named_dbs = {
+        "RolyPoly": "rolypoly",
+        "jaspar_core": "jaspar_core",
+        "jaspar_rna": "jaspar_rna",
+    }
+    if config.motif_db in named_dbs:
+        datadir = Path(os.environ.get("ROLYPOLY_DATA", ""))
+        motifs_dir = datadir / "RNA_motifs" / named_dbs[config.motif_db]
+        if not os.environ.get("ROLYPOLY_DATA") or not motifs_dir.exists():
+            config.logger.warning(
+                f"RNA motif collection {motifs_dir} not found (is ROLYPOLY_DATA set?). Skipping RNA motif search."
+            )
+            return False
+    else:
+        motifs_dir = Path(config.motif_db)
+        if not motifs_dir.exists():
+            config.logger.error(f"Motifs directory {motifs_dir} does not exist")
+            return False
+
+    params = dict(config.step_params["lightmotif"])
+    motifs = load_motifs(
+        motifs_dir,
+        pseudocount=params.pop("pseudocount", 0.25),
+        logger=config.logger,
+    )
+    if not motifs:
+        config.logger.warning(
+            f"No motifs found in {motifs_dir}. Skipping RNA motif search."
+        )
+        return False
+    tools.append("lightmotif")
 
-    # input_fasta = config.input
-    # output_file = config.output_dir / "rna_motifs.out"
-
-    # # Load motifs from the database
-    # motifs = []
-    # try:
-    #     # For built-in databases, try to load from lightmotif
-    #     if config.motif_db in ["RolyPoly", "jaspar_core"]:
-    #         # Try loading the database name directly first
-    #         try:
-    #             loader = lightmotif.lib.Loader(config.motif_db) # pyright: ignore
-    #             motifs.extend(list(loader))
-    #         except Exception:
-    #             # If that fails, skip motif search
-    #             config.logger.warning(f"Could not load {config.motif_db} database. This may not be available in your lightmotif installation. Skipping RNA motif search.")
-    #             return False
-    #     else:
-    #         # For custom paths, load from directory
-    #         loader = lightmotif.lib.Loader(str(motifs_dir)) # pyright: ignore
-    #         motifs.extend(list(loader))
-
-    #     if motifs:
-    #         config.logger.info(
-    #             f"Successfully loaded {len(motifs)} motifs from {config.motif_db}"
-    #         )
-    #         tools.append(f"lightmotif_{config.motif_db}")
-    #     else:
-    #         config.logger.warning(f"No motifs found in {config.motif_db} database")
-    #         return False
-    # except ValueError as e:
-    #     config.logger.warning(f"Invalid motif database '{config.motif_db}': {e}. Skipping RNA motif search.")
-    #     return False
-    # except Exception as e:
-    #     config.logger.warning(f"Error loading motifs from {config.motif_db}: {e}. Skipping RNA motif search.")
-    #     return False
-
-    # with open(output_file, "w") as out:
-    #     out.write("Sequence\tMotif\tStart\tEnd\tScore\tStrand\n")
-
-    #     # Process each sequence
-    #     for record in parse_fastx_file(str(input_fasta)):
-    #         sequence = str(record.seq) # pyright: ignore
-
-    #         try:
-    #             # Create an encoded sequence for scanning
-    #             encoded = lightmotif.lib.create(sequence)
-    #             if encoded is None:
-    #                 config.logger.warning(
-    #                     f"Could not encode sequence {record.id} - skipping" # pyright: ignore
-    #                 )
-    #                 continue
-
-    #             # Create striped sequence for scanning
-    #             striped = lightmotif.lib.stripe(encoded)
-
-    #             # Scan for each motif
-    #             for motif in motifs:
-    #                 try:
-    #                     # Configure striped sequence for this motif
-    #                     striped(motif.matrix)
-
-    #                     # Score all positions
-    #                     scores = motif.matrix.score(striped)
-
-    #                     # Find positions above threshold
-    #                     params = config.step_params["lightmotif"]
-    #                     min_score = params.get("min_score", 0.5)
-
-    #                     # Get scores as a list
-    #                     score_list = scores.unstripe()
-
-    #                     # Find positions above threshold
-    #                     for pos, score in enumerate(score_list):
-    #                         if score >= min_score:
-    #                             out.write(
-    #                                 f"{record.id}\t{motif.name}\t{pos + 1}\t{pos + motif.matrix.width}\t{score:.3f}\t+\n"
-    #                             )
-    #                 except Exception as e:
-    #                     config.logger.warning(
-    #                         f"Error scanning sequence {record.id} with motif {motif.name}: {e}"
-    #                     )
-    #                     continue
-    #         except Exception as e:
-    #             config.logger.warning(f"Error processing sequence {record.id}: {e}")
-    #             continue
-
-    # config.logger.info(f"RNA motif scanning completed. Output written to {output_file}")
-    # return True
+    output_file = config.output_dir / "rna_motifs.out"
+    scan_fasta(
+        config.input, output_file, motifs, params=params, logger=config.logger
+    )
+    config.logger.info(
+        f"RNA motif scanning completed. Output written to {output_file}"
+    )
+    return True
 
 
 def process_ribozymes_data(config, ribozymes_file):
@@ -1236,8 +1069,8 @@ def process_rna_motifs_data(config, rna_motifs_file):
                 pl.col("start").cast(pl.Int64).alias("start"),
                 pl.col("end").cast(pl.Int64).alias("end"),
                 pl.col("score").alias("score"),
-                pl.lit("RNAMotif").alias("source"),
-                pl.lit("+").alias("strand"),
+                pl.lit("lightmotif").alias("source"),
+                pl.col("strand").alias("strand"),
                 pl.lit(".").alias("phase"),
                 pl.col("motif_type").alias("motif_type"),
             ]
@@ -1246,6 +1079,13 @@ def process_rna_motifs_data(config, rna_motifs_file):
 
 
 def read_multiDBN_to_dataframe(MultiDBN_file):
+    """Read a multi-record dot-bracket file into the annotation schema.
+
+    Headers may carry start=, end= and source= fields (written by the
+    RNAfold step for windowed structures); otherwise the structure spans
+    the whole sequence. The energy follows the structure, on the same line
+    or the next one.
+    """
     import polars as pl
 
     if not MultiDBN_file.is_file():
@@ -1258,9 +1098,15 @@ def read_multiDBN_to_dataframe(MultiDBN_file):
                 continue
 
             lines = record.strip().split("\n")
-            sequence_id = lines[0]
+            header = lines[0].split()
+            sequence_id = header[0]
+            fields = dict(
+                field.split("=", 1) for field in header[1:] if "=" in field
+            )
             sequence = lines[1]
             structure_line = lines[2].split()
+            if len(structure_line) == 1 and len(lines) > 3:
+                structure_line.append(lines[3].strip())
             structure = structure_line[0]
 
             # Try to parse energy value, handle LinearFold errors
@@ -1274,14 +1120,15 @@ def read_multiDBN_to_dataframe(MultiDBN_file):
                     # LinearFold error message like "Error in structure prediction"
                     mfe = -0.1
 
+            start = int(fields.get("start", 1))
             records.append(
                 {
                     "sequence_id": sequence_id,
                     "type": "RNA_secondary_structure",
-                    "start": 1,
-                    "end": len(sequence),
+                    "start": start,
+                    "end": int(fields.get("end", start + len(sequence) - 1)),
                     "score": mfe,
-                    "source": "LinearFold",
+                    "source": fields.get("source", "LinearFold"),
                     "strand": "+",
                     "phase": ".",
                     "sequence": sequence,
@@ -1488,7 +1335,6 @@ def combine_results(config):
                 combined_data = pl.concat(unified_dataframes, how="vertical")
                 config.logger.debug(f"Combined data:\n{combined_data.head()}")
                 if config.output_format == "gff3":
-                    combined_data = add_missing_gff_columns(combined_data)
                     write_combined_results_to_gff(config, combined_data)
                 elif config.output_format == "csv":
                     output_file = config.output_dir / "combined_annotations.csv"
@@ -1517,144 +1363,17 @@ def combine_results(config):
 
 
 def write_combined_results_to_gff(config, combined_data):
+    from rolypoly.utils.bio.polars_fastx import frame_to_gff3
     from rolypoly.utils.bio.sequences import add_fasta_to_gff
 
     output_file = config.output_dir / "combined_annotations.gff3"
-    with open(output_file, "w") as f:
-        f.write("##gff-version 3\n")
-        for row in combined_data.iter_rows(named=True):
-            record = convert_record_to_gff3_record(row)
-            config.logger.debug(f"Writing record:\n{row}")
-            f.write(f"{record}\n")
+    frame_to_gff3(combined_data, output_file, default_type="feature")
 
     # Optionally add FASTA section
     add_fasta_to_gff(config, output_file)
     config.logger.info(f"Combined annotation results written to {output_file}")
 
 
-def convert_record_to_gff3_record(
-    row,
-):  # for dict objects expected to be coherced into a gff3
-    # try to identify a sequence_id columns (query, qseqid, contig_id, contig, id, name)
-    sequence_id_columns = [
-        "sequence_id",
-        "query",
-        "qseqid",
-        "contig_id",
-        "contig",
-        "id",
-        "name",
-        "query_full_name",
-    ]
-    sequence_id_col = next(
-        (col for col in sequence_id_columns if col in row.keys()), None
-    )
-    if sequence_id_col is None:
-        raise ValueError(
-            f"No sequence ID column found in row. Available columns: {list(row.keys())}"
-        )
-
-    # try to identify a score column (score, Score, bitscore, qscore, bit)
-    score_columns = ["score", "Score", "bitscore", "qscore", "bit", "bits"]
-    score_col = next(
-        (col for col in score_columns if col in row.keys()), "score"
-    )
-
-    # try to identify a source column (source, Source, db, DB)
-    source_columns = ["source", "Source", "db", "DB"]
-    source_col = next(
-        (col for col in source_columns if col in row.keys()), "source"
-    )
-
-    # try to identify a type column (type, Type, feature, Feature)
-    type_columns = ["type", "Type", "feature", "Feature"]
-    type_col = next((col for col in type_columns if col in row.keys()), "type")
-
-    # try to identify a strand column (strand, Strand, sense, Sense)
-    strand_columns = ["strand", "Strand", "sense", "Sense"]
-    strand_col = next(
-        (col for col in strand_columns if col in row.keys()), "strand"
-    )
-
-    # try to identify a phase column (phase, Phase)
-    phase_columns = ["phase", "Phase"]
-    phase_col = next(
-        (col for col in phase_columns if col in row.keys()), "phase"
-    )
-
-    # Build GFF3 attributes string
-    attrs = []
-    # Define columns that should not be included in attributes
-    excluded_cols = [
-        sequence_id_col,
-        source_col,
-        score_col,
-        type_col,
-        strand_col,
-        phase_col,
-        "start",
-        "end",  # Also exclude start/end since they're separate GFF3 fields
-    ]
-
-    for key, value in row.items():
-        if key not in excluded_cols:
-            # Skip empty values (empty strings, None, ".", etc.)
-            if (
-                value
-                and str(value).strip()
-                and str(value) != "."
-                and str(value) != ""
-            ):
-                attrs.append(f"{key}={value}")
-
-    # Get values, using defaults for missing columns
-    sequence_id = row[sequence_id_col]
-    source = row.get(source_col, "rp")
-    score = row.get(score_col, "0")
-    feature_type = row.get(type_col, "feature")
-    strand = row.get(strand_col, "+")
-    phase = row.get(phase_col, ".")
-
-    # Format GFF3 record
-    gff3_fields = [
-        sequence_id,
-        source,
-        feature_type,
-        str(row.get("start", "1")),
-        str(row.get("end", "1")),
-        str(score),
-        strand,
-        phase,
-        ";".join(attrs) if attrs else ".",
-    ]
-
-    return "\t".join(gff3_fields)
-
-
-def add_missing_gff_columns(dataframe):
-    import polars as pl
-
-    # check if the dataframe has the columns 'attributes',"source", "type", "score", "strand", "phase", if not add them
-    # cols_to_check = ['attributes', 'source', 'type', 'score', 'strand', 'phase']
-    if "source" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit("rp").alias("source"))
-    if "type" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit("feature").alias("type"))
-    if "score" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit("0").alias("score"))
-    if "strand" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit("+").alias("strand"))
-    if "phase" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit(".").alias("phase"))
-    if "attributes" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit(".").alias("attributes"))
-    if "start" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit(0).alias("start"))
-    if "end" not in dataframe.columns:
-        dataframe = dataframe.with_columns(pl.lit(1).alias("end"))
-    return dataframe
-
-
 if __name__ == "__main__":
     annotate_RNA()
     # TODO: prediction of ribosomal shunt
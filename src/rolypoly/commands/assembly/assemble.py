@@ -39,6 +39,11 @@ class AssemblyConfig(BaseConfig):
         # initialize the command specific stuff parameters
         self.assembler = kwargs.get("assembler", ["spades", "megahit"])
         self.post_processing = kwargs.get("post_processing")
+        self.raw_fasta = list(kwargs.get("raw_fasta") or [])
+        self.contig_ids = kwargs.get("contig_ids", "hash")
+        self.min_contig_length = kwargs.get("min_contig_length", 0)
+        self.alignment_output = kwargs.get("alignment_output", "none")
+        self.coverage_window = kwargs.get("coverage_window", 1000)
 
         self.step_params = {
             "spades": {
@@ -238,16 +243,17 @@ def handle_input_files(
     return libraries, len(libraries)
 
 
-def run_spades(config, libraries):
-    import subprocess
-
-    from rolypoly.utils.various import ensure_memory
+def run_spades(config, libraries, lease=None):
+    """Run SPAdes assembly (under ``lease`` if given, else the full budget)."""
+    from rolypoly.utils.resources import tool_params
+    from rolypoly.utils.various import parse_memory
 
+    threads, memory = _lease_budget(config, lease)
     spades_output = (
         config.output_dir
         / f"spades_{config.step_params['spades']['mode']}_output"
     )
-    spades_cmd = f"spades.py --{config.step_params['spades']['mode']} -o {spades_output} --threads {config.threads} --only-assembler -k {config.step_params['spades']['k']} --phred-offset 33 -m {ensure_memory(config.memory)['bytes'][:-1]}"
+    spades_cmd = f"spades.py --{config.step_params['spades']['mode']} -o {spades_output} --threads {threads} --only-assembler -k {config.step_params['spades']['k']} --phred-offset 33 -m {tool_params('spades', threads, parse_memory(memory))['m']}"
 
     if len(libraries) > 9:
         config.logger.info("Running SPAdes on concatenated reads")
@@ -294,19 +300,21 @@ def run_spades(config, libraries):
 
     config.logger.info(f"Running SPAdes with command: {spades_cmd}")
 
-    subprocess.run(spades_cmd, shell=True, check=True)
+    _run_tracked(config, spades_cmd, lease)
     config.logger.info("Finished SPAdes assembly")
 
     return spades_output / "scaffolds.fasta"
 
 
-def run_megahit(config, libraries):
-    """Run MEGAHIT assembly."""
+def run_megahit(config, libraries, lease=None):
+    """Run MEGAHIT assembly (under ``lease`` if given, else the full budget)."""
     import glob
     import subprocess
 
-    from rolypoly.utils.various import ensure_memory
+    from rolypoly.utils.resources import tool_params
+    from rolypoly.utils.various import parse_memory
 
+    threads, memory = _lease_budget(config, lease)
     config.logger.info("Started Megahit assembly")
     megahit_output = config.output_dir / "megahit_custom_out"
 
@@ -333,13 +341,13 @@ def run_megahit(config, libraries):
     megahit_cmd.extend(
         [
             f"--out-dir {megahit_output}",
-            f"--num-cpu-threads {config.threads} --memory {ensure_memory(config.memory)['bytes'][:-1]}",
+            f"--num-cpu-threads {threads} --memory {tool_params('megahit', threads, parse_memory(memory))['memory']}",
         ]
     )
     config.logger.info(
         f"Running Megahit assembly with command: {' '.join(megahit_cmd)}"
     )
-    subprocess.run(" ".join(megahit_cmd), shell=True, check=True)
+    _run_tracked(config, " ".join(megahit_cmd), lease)
 
     final_k = max(
         int(os.path.basename(file).split("k")[1].split(".")[0])
@@ -358,10 +366,9 @@ def run_megahit(config, libraries):
     return megahit_output / "final.contigs.fa"
 
 
-def run_penguin(config, libraries):
-    """Run Penguin assembler."""
-    import subprocess
-
+def run_penguin(config, libraries, lease=None):
+    """Run Penguin assembler (under ``lease`` if given, else the full budget)."""
+    threads, _ = _lease_budget(config, lease)
     config.logger.info("Started Penguin assembly")
     penguin_output = (
         config.output_dir / "penguin_Fguided_1_nuclassemble_c0.fasta"
@@ -377,15 +384,354 @@ def run_penguin(config, libraries):
 
     penguin_cmd = (
         f"penguin guided_nuclassemble {interleaved} {merged} "
-        f"{penguin_output} ./tmp/ --min-contig-len {config.step_params['penguin']['min-contig-len']} "
+        f"{penguin_output} {config.temp_dir / 'penguin_tmp'} --min-contig-len {config.step_params['penguin']['min-contig-len']} "
         f"--contig-output-mode 0 --num-iterations {config.step_params['penguin']['num-iterations']} "
         f"--min-seq-id nucl:0.9,aa:0.99 --min-aln-len nucl:31,aa:150 "
-        f"--clust-min-seq-id 0.99 --clust-min-cov 0.99 --threads {config.threads}"
+        f"--clust-min-seq-id 0.99 --clust-min-cov 0.99 --threads {threads}"
     )
-    subprocess.run(penguin_cmd, shell=True, check=True)
+    _run_tracked(config, penguin_cmd, lease)
     return penguin_output
 
 
+ASSEMBLER_RUNNERS = {
+    "spades": run_spades,
+    "megahit": run_megahit,
+    "penguin": run_penguin,
+}
+
+# default share of the thread/memory budget when assemblers run concurrently
+ASSEMBLER_WEIGHTS = {"spades": 3.0, "megahit": 1.0, "penguin": 1.0}
+
+# exit codes of SIGKILLed processes (directly or reported by the shell)
+OOM_RETURNCODES = (-9, 137)
+OOM_MESSAGES = (
+    "std::bad_alloc",
+    "cannot allocate memory",
+    "out of memory",
+    "not enough memory",
+    "memory limit",
+)
+
+
+def _lease_budget(config, lease) -> Tuple[int, str]:
+    """Threads and memory (bytes string) of a lease, or the whole config."""
+    if lease is None:
+        return config.threads, config.memory["bytes"]
+    return lease.threads, f"{lease.memory}b"
+
+
+def _run_tracked(config, cmd: str, lease=None, kill_factor: float = 1.25):
+    """Run a shell command, tracking its memory against ``lease``.
+
+    The process tree is killed when it grows past ``kill_factor`` times the
+    lease, before the kernel OOM killer picks a victim on a shared node.
+
+    Raises:
+        subprocess.CalledProcessError: if the command fails or is killed
+    """
+    import subprocess
+    import time
+
+    import psutil
+
+    if lease is None:
+        subprocess.run(cmd, shell=True, check=True)
+        return
+    process = subprocess.Popen(cmd, shell=True)
+    config.scheduler.track(lease, process.pid)
+    while process.poll() is None:
+        if lease.current_rss > lease.memory * kill_factor:
+            config.logger.warning(
+                f"{lease.name} exceeded its memory lease ({lease.current_rss} > {lease.memory} bytes), killing it"
+            )
+            try:
+                parent = psutil.Process(process.pid)
+                for proc in parent.children(recursive=True) + [parent]:
+                    proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+            process.wait()
+            raise subprocess.CalledProcessError(-9, cmd)
+        time.sleep(config.scheduler.monitor_interval)
+    config.scheduler.sample()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def parse_partition(partition: Optional[str]) -> Dict[str, float]:
+    """Parse --partition weights ("spades:3,megahit:1") into {assembler: weight}.
+
+    Raises:
+        click.BadParameter: A weight is not a positive number
+    """
+    import math
+
+    weights = {}
+    for item in (partition or "").split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition(":")
+        try:
+            value = float(weight)
+        except ValueError:
+            value = math.nan
+        # a zero share would be a 0-byte lease, killed on its first byte
+        if not (math.isfinite(value) and value > 0):
+            raise click.BadParameter(
+                f"weight of '{name.strip()}' must be a positive number, got '{weight}'",
+                param_hint="--partition",
+            )
+        weights[name.strip()] = value
+    return weights
+
+
+def _check_partition(ctx, param, value):
+    """Click callback: reject malformed --partition weights up front."""
+    parse_partition(value)
+    return value
+
+
+def partition_resources(
+    assemblers, threads: int, memory: int, partition: Optional[str] = None
+) -> Dict[str, Tuple[int, int]]:
+    """Split threads and memory (bytes) between concurrently run assemblers.
+
+    Args:
+        assemblers: Assembler names
+        threads: Total threads
+        memory: Total memory in bytes
+        partition: Optional weights, e.g. "spades:2,megahit:1" (default:
+            ASSEMBLER_WEIGHTS). Weights are normalised over ``assemblers``.
+
+    Returns:
+        dict: {assembler: (threads, memory_bytes)}
+
+    Raises:
+        click.BadParameter: A weight is not a positive number
+    """
+    weights = {a: ASSEMBLER_WEIGHTS.get(a, 1.0) for a in assemblers}
+    for name, weight in parse_partition(partition).items():
+        if name in weights:
+            weights[name] = weight
+    total_weight = sum(weights.values()) or 1.0
+    shares = {}
+    for name in assemblers:
+        fraction = weights[name] / total_weight
+        shares[name] = (max(int(threads * fraction), 1), int(memory * fraction))
+    # hand rounding leftovers to the assembler with the largest share
+    leftover = threads - sum(t for t, _ in shares.values())
+    if leftover > 0 and shares:
+        largest = max(weights, key=lambda a: weights[a])
+        shares[largest] = (shares[largest][0] + leftover, shares[largest][1])
+    return shares
+
+
+def _is_oom(returncode: int, log_files) -> bool:
+    """Guess whether an assembler failed for lack of memory."""
+    if returncode in OOM_RETURNCODES:
+        return True
+    for log_file in log_files:
+        log_file = Path(log_file)
+        if not log_file.is_file():
+            continue
+        with open(log_file, "rb") as f:
+            f.seek(max(log_file.stat().st_size - 65536, 0))
+            tail = f.read().decode(errors="replace").lower()
+        if any(message in tail for message in OOM_MESSAGES):
+            return True
+    return False
+
+
+def _reduce_kmers(config, assembler: str) -> bool:
+    """Shrink the k-mer set of an assembler for an OOM retry.
+
+    SPAdes keeps the lower half of its k list, MEGAHIT lowers --k-max to the
+    middle of its range. Returns False if there is nothing left to drop.
+    """
+    params = config.step_params[assembler]
+    if assembler == "spades":
+        ks = [k for k in str(params["k"]).split(",") if k]
+        if len(ks) <= 2:
+            return False
+        params["k"] = ",".join(ks[: max(len(ks) // 2, 2)])
+        return True
+    if assembler == "megahit":
+        k_min, k_max = int(params["k-min"]), int(params["k-max"])
+        new_max = k_min + (k_max - k_min) // 2
+        new_max -= (new_max - k_min) % int(params["k-step"])
+        if new_max <= k_min:
+            return False
+        params["k-max"] = new_max
+        return True
+    return False
+
+
+def _assembler_logs(config, assembler: str):
+    if assembler == "spades":
+        return [
+            config.output_dir
+            / f"spades_{config.step_params['spades']['mode']}_output"
+            / "spades.log"
+        ]
+    if assembler == "megahit":
+        return [config.output_dir / "megahit_custom_out" / "log"]
+    return []
+
+
+def _assembler_output_dir(config, assembler: str) -> Optional[Path]:
+    if assembler == "spades":
+        return (
+            config.output_dir
+            / f"spades_{config.step_params['spades']['mode']}_output"
+        )
+    if assembler == "megahit":
+        return config.output_dir / "megahit_custom_out"
+    return None
+
+
+def run_assembler(
+    config,
+    assembler: str,
+    libraries,
+    threads: int,
+    memory: int,
+    retries: int = 1,
+) -> Tuple[Optional[Path], Dict]:
+    """Run one assembler under its own lease, retrying on OOM.
+
+    Returns:
+        Tuple of the contig file (None if the assembler failed) and a usage
+        record (threads, memory, peak RSS, wall time, attempts, status).
+    """
+    import shutil
+    import subprocess
+
+    runner = ASSEMBLER_RUNNERS[assembler]
+    status = "failed"
+    contigs = None
+    attempts = 0
+    with config.scheduler.lease(
+        assembler, threads=threads, memory=memory, tool=assembler
+    ) as lease:
+        while True:
+            attempts += 1
+            try:
+                contigs = runner(config, libraries, lease)
+                status = "ok"
+                break
+            except subprocess.CalledProcessError as e:
+                oom = _is_oom(e.returncode, _assembler_logs(config, assembler))
+                if (
+                    oom
+                    and attempts <= retries
+                    and _reduce_kmers(config, assembler)
+                ):
+                    config.logger.warning(
+                        f"{assembler} ran out of memory, retrying with a smaller k-mer set: {config.step_params[assembler]}"
+                    )
+                    output_dir = _assembler_output_dir(config, assembler)
+                    if output_dir is not None:
+                        shutil.rmtree(output_dir, ignore_errors=True)
+                    continue
+                status = "oom" if oom else f"failed ({e.returncode})"
+                config.logger.error(f"{assembler} failed: {e}")
+                break
+    usage = dict(lease.to_dict(), attempts=attempts, status=status)
+    return contigs, usage
+
+
+def run_assemblers(
+    config,
+    libraries,
+    concat_file: Union[str, Path],
+    partition: Optional[str] = None,
+    concurrent: bool = True,
+    retries: int = 1,
+    keep_going: bool = False,
+) -> Tuple[list, list]:
+    """Run the selected assemblers and append their contigs to concat_file.
+
+    Assemblers run concurrently on their share of the budget (see
+    partition_resources) unless ``concurrent`` is False, in which case each
+    gets the full budget in turn. Once all have finished, their contigs are
+    concatenated into ``concat_file`` in selection order (spades, megahit,
+    penguin) rather than completion order, so the running numbers and copy
+    suffixes of the renamed contigs are the same across runs.
+
+    A failed assembler fails the run once the others have finished, unless
+    ``keep_going`` is set, in which case the contigs of the successful ones
+    are used. If every assembler failed, the run fails either way.
+
+    Returns:
+        Tuple of (contig files, per-assembler usage records)
+
+    Raises:
+        RuntimeError: An assembler failed (every assembler, with keep_going)
+    """
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from rolypoly.utils.various import parse_memory
+
+    selected = [
+        a
+        for a in ("spades", "megahit", "penguin")
+        if a in config.assembler and a not in config.skip_steps
+    ]
+    total_memory = parse_memory(config.memory["bytes"])
+    if concurrent and len(selected) > 1:
+        shares = partition_resources(
+            selected, config.threads, total_memory, partition
+        )
+    else:
+        shares = {a: (config.threads, total_memory) for a in selected}
+    for name, (threads, memory) in shares.items():
+        config.logger.info(
+            f"{name}: {threads} threads, {memory / 1024**3:.1f} GB"
+        )
+
+    results = {}
+    workers = max(len(selected), 1) if concurrent else 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                run_assembler, config, name, libraries, *shares[name], retries
+            ): name
+            for name in selected
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            results[name] = future.result()
+            usage = results[name][1]
+            config.logger.info(
+                f"{name} finished ({usage['status']}) in {usage['wall_time']:.0f}s, peak RSS {usage['peak_rss'] / 1024**3:.2f} GB"
+            )
+
+    contig_files, usages = [], []
+    with open(concat_file, "wb") as outfile:
+        for name in selected:
+            contigs, usage = results[name]
+            usages.append(usage)
+            if contigs is None or not Path(contigs).exists():
+                continue
+            tools.append(name)
+            contig_files.append(contigs)
+            with open(contigs, "rb") as infile:
+                shutil.copyfileobj(infile, outfile)
+    failed = [u for u in usages if u["status"] != "ok"]
+    if failed and (not keep_going or len(failed) == len(usages)):
+        raise RuntimeError(
+            "Assembler(s) failed: "
+            + ", ".join(f"{u['name']} ({u['status']})" for u in failed)
+            + (
+                ""
+                if keep_going
+                else "; use --keep-going to continue without them"
+            )
+        )
+    return contig_files, usages
+
+
 @click.command()
 @click.option("-t", "--threads", default=1, help="Threads ", type=int)
 @click.option(
@@ -511,6 +857,54 @@ def run_penguin(config, libraries):
     - rmdup: use seqkit rmdup to remove identical sequences (same sequence, same length, or its' reverse complement)
     - none: do not perform any post assembly processing""",
 )
+@click.option(
+    "--partition",
+    default=None,
+    callback=_check_partition,
+    help="Relative share of threads/memory per assembler when running several at once, e.g. 'spades:3,megahit:1,penguin:1' (the default)",
+)
+@click.option(
+    "--sequential",
+    is_flag=True,
+    default=False,
+    help="Run the assemblers one after the other, each with the full thread/memory budget, instead of concurrently",
+)
+@click.option(
+    "--keep-going",
+    is_flag=True,
+    default=False,
+    help="If an assembler fails (after its OOM retries), continue with the contigs of the others instead of stopping. The run still fails if every assembler failed",
+)
+@click.option(
+    "--contig-ids",
+    default="hash",
+    type=click.Choice(["hash", "number"]),
+    help="How to rename the merged contigs: 'hash' (CID_<md5 of the sequence>, stable whatever order the assemblers finish in; identical contigs get a _2, _3, ... suffix) or 'number' (CID_<running number>)",
+)
+@click.option(
+    "--min-contig-length",
+    default=0,
+    type=int,
+    help="Drop merged contigs shorter than this before deduplication/clustering",
+)
+@click.option(
+    "--alignment-output",
+    default="none",
+    type=click.Choice(["none", "bam", "sam.gz"]),
+    help="Keep the read-to-contig alignments as a coordinate-sorted BAM (needs samtools) or a gzipped SAM. By default only the coverage tables are written",
+)
+@click.option(
+    "--coverage-window",
+    default=1000,
+    type=int,
+    help="Window size (bp) for the per-window depth table (assembly_coverage_windows.tsv)",
+)
+@click.option(
+    "--oom-retries",
+    default=1,
+    type=int,
+    help="How many times to retry an assembler that ran out of memory, each time with a smaller k-mer set",
+)
 def assembly(
     input_dir,
     paired_end,
@@ -529,18 +923,21 @@ def assembly(
     skip_steps,
     overwrite,
     log_level,
+    partition,
+    sequential,
+    keep_going,
+    oom_retries,
+    contig_ids,
+    min_contig_length,
+    alignment_output,
+    coverage_window,
 ):
     """Assembly wrapper - takes in reads, assembles them using one or more assemblers, then performs post-assembly processing."""
     import shutil
 
     import polars as pl
-    from bbmapy import bbmap
 
-    from rolypoly.utils.bio.sequences import (
-        process_sequences,
-        read_fasta_df,
-        rename_sequences,
-    )
+    from rolypoly.utils.bio.sequences import stream_rename_fasta
     from rolypoly.utils.logging.citation_reminder import remind_citations
     from rolypoly.utils.logging.loggit import log_start_info
     from rolypoly.utils.various import run_command_comp
@@ -581,6 +978,10 @@ def assembly(
         log_level=log_level,
         post_processing=post_processing,
         overwrite=overwrite,
+        contig_ids=contig_ids,
+        min_contig_length=min_contig_length,
+        alignment_output=alignment_output,
+        coverage_window=coverage_window,
     )
 
     config.logger.info("Starting assembly process")
@@ -629,73 +1030,62 @@ def assembly(
 
     config.logger.info(f"Found {n_libraries} libraries")
     config.logger.info(f"Libraries: {libraries}")
-    contigs4eval = []
-
-    if "spades" in config.assembler and "spades" not in config.skip_steps:
-        contigs4eval.append(run_spades(config, libraries))
-        tools.append("spades")
-    if "megahit" in config.assembler and "megahit" not in config.skip_steps:
-        contigs4eval.append(run_megahit(config, libraries))
-        tools.append("megahit")
-    if "penguin" in config.assembler and "penguin" not in config.skip_steps:
-        contigs4eval.append(run_penguin(config, libraries))
-        tools.append("penguin")
+    config.raw_fasta = library_info.raw_fasta
+
+    # Run the assemblers (concurrently, each on its share of the budget) and
+    # concatenate their contigs as each one finishes
+    concat_file = str(config.output_dir / "all_contigs.fasta")
+    contigs4eval, assembler_usage = run_assemblers(
+        config,
+        libraries,
+        concat_file,
+        partition=partition,
+        concurrent=not sequential,
+        retries=oom_retries,
+        keep_going=keep_going,
+    )
+    if assembler_usage:
+        usage_file = config.output_dir / "assembler_usage.tsv"
+        pl.DataFrame(assembler_usage).write_csv(usage_file, separator="\t")
+        config.logger.info(
+            f"Per-assembler resource usage saved to {usage_file}"
+        )
 
     # First concatenate and rename all contigs
     if len(contigs4eval) > 0:
-        # Concatenate all contigs into one file
-        concat_file = str(config.output_dir / "all_contigs.fasta")
         config.logger.info(
-            f"Concatenating {len(contigs4eval)} contig files into {concat_file}"
+            f"Concatenated {len(contigs4eval)} contig files into {concat_file}"
         )
-        with open(concat_file, "w") as outfile:
-            for contig_file in contigs4eval:
-                with open(str(contig_file), "r") as infile:
-                    outfile.write(infile.read())
+
+        # downstream steps work on the merged file (or its renamed copy)
+        contigs4eval = [concat_file]
 
         if "rename" not in config.skip_steps:
             try:
-                # Rename sequences
-                config.logger.info("Reading and parsing FASTA file")
-                df = read_fasta_df(concat_file)
-                config.logger.info(f"Found {len(df)} sequences")
-
-                config.logger.info("Renaming sequences")
-                df_renamed, id_map = rename_sequences(
-                    df, prefix="CID", use_hash=False
-                )
-                config.logger.info("Calculating sequence statistics")
-                df_renamed = process_sequences(df_renamed)
-
-                # Write renamed sequences
+                # Stream the merged contigs through the renamer batch by
+                # batch instead of loading them into a DataFrame
                 renamed_file = str(
                     config.output_dir / "all_contigs_renamed.fasta"
                 )
+                mapping_file = str(config.output_dir / "contigs_id_map.tsv")
                 config.logger.info(
-                    f"Writing renamed sequences to {renamed_file}"
+                    f"Renaming contigs ({config.contig_ids} IDs) into {renamed_file}"
+                )
+                rename_stats = stream_rename_fasta(
+                    concat_file,
+                    renamed_file,
+                    mapping_file,
+                    prefix="CID",
+                    use_hash=config.contig_ids == "hash",
+                    min_length=config.min_contig_length,
+                )
+                config.logger.info(
+                    f"Wrote {rename_stats['written']} of {rename_stats['input']} contigs, ID mapping saved to {mapping_file}"
                 )
-                with open(renamed_file, "w") as f:
-                    for header, seq in zip(
-                        df_renamed["header"], df_renamed["sequence"]
-                    ):
-                        f.write(f">{header}\n{seq}\n")
 
                 # Update contigs4eval to use renamed file
                 contigs4eval = [renamed_file]
 
-                # Save mapping file
-                mapping_file = str(config.output_dir / "contigs_id_map.tsv")
-                config.logger.info(f"Saving ID mapping to {mapping_file}")
-                mapping_df = pl.DataFrame(
-                    {
-                        "old_id": list(id_map.keys()),
-                        "new_id": list(id_map.values()),
-                        "length": df_renamed["length"],
-                        "gc_content": df_renamed["gc_content"].round(2),
-                    }
-                )
-                mapping_df.write_csv(mapping_file, separator="\t")
-
             except Exception as e:
                 config.logger.error(f"Error during sequence renaming: {str(e)}")
                 config.logger.warning("Continuing with original contig files")
@@ -792,8 +1182,16 @@ def assembly(
     else:
         config.logger.warning("No contigs available for post-processing")
 
-    # Map reads back to contigs using either bbmap_skimmer (default) or bowtie (low-mem)
+    # Map reads back to contigs using either bbmap (default) or bowtie
+    # (low-mem). The SAM is streamed into a coverage aggregator, and only
+    # kept (as sorted BAM or gzipped SAM) when --alignment-output asks for it
     if post_processed_output and os.path.exists(post_processed_output):
+        from rolypoly.utils.bio.coverage import (
+            CoverageAggregator,
+            map_and_aggregate,
+        )
+        from rolypoly.utils.various import bbtools_launcher
+
         interleaved = ",".join(
             str(lib["interleaved"])
             for lib in libraries.values()
@@ -802,11 +1200,17 @@ def assembly(
         merged = ",".join(
             str(lib["merged"]) for lib in libraries.values() if lib["merged"]
         )
+        aggregator = CoverageAggregator()
+
+        def _alignment_output(name: str):
+            if config.alignment_output == "none":
+                return None
+            return config.output_dir / f"{name}.{config.alignment_output}"
 
-        # Use bbmap_skimmer by default
+        # Use bbmap by default
         if "bbmap" not in config.skip_steps:
             tools.append("bbmap")
-            config.logger.info("Running bbmap_skimmer for read mapping")
+            config.logger.info("Running bbmap for read mapping")
 
             # Combine all input reads
             input_reads = []
@@ -815,35 +1219,41 @@ def assembly(
             if merged:
                 input_reads.extend(merged.split(","))
 
-            bbmap(
-                ref=post_processed_output,
-                in_file=",".join(input_reads),
-                out=str(config.output_dir / "assembly_bbmap.sam"),
-                threads=str(config.threads),
-                Xmx=str(config.memory["giga"]),
-                ignorefrequentkmers="f",
-                vslow=True,
-                maxsites="1500",
-                maxsites2="1500",
-                sam="1.4",
-                minid="0.8",
-                nodisk=True,
-                ambiguous="all",
-                overwrite="t",
-                secondary=True,
-            )
-
-            # Compress SAM file
-            if os.path.exists(str(config.output_dir / "assembly_bbmap.sam")):
-                run_command_comp(
-                    "pigz",
-                    params={"p": str(config.threads)},
-                    positional_args=[
-                        str(config.output_dir / "assembly_bbmap.sam")
-                    ],
-                    logger=config.logger,
-                    prefix_style="single",
-                )
+            with config.scheduler.lease("bbmap", tool="bbtools") as lease:
+                bbmap_params = lease.tool_params()
+                # the launcher bbmapy ships, as its wrappers can't pipe stdout
+                bbmap_cmd = [
+                    bbtools_launcher("bbmap.sh"),
+                    f"-Xmx{bbmap_params['Xmx']}",
+                    f"ref={post_processed_output}",
+                    f"in={','.join(input_reads)}",
+                    "out=stdout.sam",
+                    f"threads={bbmap_params['threads']}",
+                    "ignorefrequentkmers=f",
+                    "vslow=t",
+                    "maxsites=1500",
+                    "maxsites2=1500",
+                    "sam=1.4",
+                    "minid=0.8",
+                    "nodisk=t",
+                    "ambiguous=all",
+                    "overwrite=t",
+                    "secondary=t",
+                ]
+                try:
+                    map_and_aggregate(
+                        bbmap_cmd,
+                        aggregator,
+                        alignment_output=_alignment_output("assembly_bbmap"),
+                        alignment_format=config.alignment_output,
+                        threads=lease.threads,
+                        logger=config.logger,
+                    )
+                except Exception as e:
+                    config.logger.error(
+                        f"Failed to align reads to contigs: {e}"
+                    )
+                    raise
 
         # Use bowtie as low-memory alternative
         elif "bowtie" not in config.skip_steps:
@@ -868,96 +1278,47 @@ def assembly(
             )
 
             if index_success:
+                runs = []
+                if len(interleaved) > 0:
+                    runs.append(
+                        ("assembly_bowtie_interleaved", f"--12 {interleaved}")
+                    )
+                if len(merged) > 0:
+                    runs.append(("assembly_bowtie_merged_reads", merged))
                 try:
-                    if len(interleaved) > 0:
-                        # Align paired-end interleaved reads
-                        align_success = run_command_comp(
-                            "bowtie",
-                            params={
-                                "p": str(config.threads),
-                                "S": True,
-                                "x": str(
-                                    config.output_dir / "bowtie_index/contigs"
-                                ),
-                            },
-                            positional_args=[
-                                "--12",
-                                interleaved,
-                                str(
-                                    config.output_dir
-                                    / "assembly_bowtie_interleaved.sam"
-                                ),
-                            ],
-                            logger=config.logger,
-                            prefix_style="single",
-                        )
-                        if align_success and os.path.exists(
-                            str(
-                                config.output_dir
-                                / "assembly_bowtie_interleaved.sam"
-                            )
-                        ):
-                            run_command_comp(
-                                "pigz",
-                                params={"p": str(config.threads)},
-                                positional_args=[
-                                    str(
-                                        config.output_dir
-                                        / "assembly_bowtie_interleaved.sam"
-                                    )
-                                ],
-                                logger=config.logger,
-                                prefix_style="single",
-                            )
-
-                    if len(merged) > 0:
-                        # Align single-end/merged reads
-                        align_success = run_command_comp(
-                            "bowtie",
-                            params={
-                                "p": str(config.threads),
-                                "S": True,
-                                "x": str(
-                                    config.output_dir / "bowtie_index/contigs"
-                                ),
-                            },
-                            positional_args=[
-                                merged,
-                                str(
-                                    config.output_dir
-                                    / "assembly_bowtie_merged_reads.sam"
-                                ),
-                            ],
-                            logger=config.logger,
-                            prefix_style="single",
-                        )
-                        if align_success and os.path.exists(
-                            str(
-                                config.output_dir
-                                / "assembly_bowtie_merged_reads.sam"
-                            )
-                        ):
-                            run_command_comp(
-                                "pigz",
-                                params={"p": str(config.threads)},
-                                positional_args=[
-                                    str(
-                                        config.output_dir
-                                        / "assembly_bowtie_merged_reads.sam"
-                                    )
-                                ],
+                    with config.scheduler.lease(
+                        "bowtie", tool="bowtie"
+                    ) as lease:
+                        for name, reads in runs:
+                            map_and_aggregate(
+                                f"bowtie -p {lease.threads} -S -x {config.output_dir / 'bowtie_index/contigs'} {reads}",
+                                aggregator,
+                                alignment_output=_alignment_output(name),
+                                alignment_format=config.alignment_output,
+                                threads=lease.threads,
                                 logger=config.logger,
-                                prefix_style="single",
                             )
                 except Exception as e:
-                    config.logger.warning(
+                    config.logger.error(
                         f"Failed to align reads to contigs: {e}"
                     )
+                    raise
             else:
                 config.logger.error(
                     "Failed to build bowtie index, skipping alignment steps"
                 )
 
+        if aggregator.records_used > 0:
+            coverage_file = config.output_dir / "assembly_coverage.tsv"
+            windows_file = config.output_dir / "assembly_coverage_windows.tsv"
+            aggregator.summary().write_csv(coverage_file, separator="\t")
+            aggregator.windows(config.coverage_window).write_csv(
+                windows_file, separator="\t"
+            )
+            config.logger.info(
+                f"Contig coverage summary saved to {coverage_file} (per {config.coverage_window} bp windows in {windows_file})"
+            )
+
     config.logger.info(f"Finished assembly evaluation on: {contigs4eval}")
 
     if not config.keep_tmp:
@@ -1014,9 +1375,10 @@ def assembly(
     config.logger.info(
         f"Reads unassembled from the assembly are in {config.output_dir}/assembly_bbw_unassembled.fq.gz"
     )
-    config.logger.info(
-        f"Reads aligned to the assembly (interleaved and merged) are in {config.output_dir}/assembly_bowtie_interleaved.sam.gz and {config.output_dir}/assembly_bowtie_merged_reads.sam.gz"
-    )
+    if config.alignment_output != "none":
+        config.logger.info(
+            f"Reads aligned to the assembly are in {config.output_dir}/assembly_*.{config.alignment_output}"
+        )
     if config.log_level != "DEBUG":
         with open(f"{config.log_file}", "a") as f_out:
             f_out.write(remind_citations(tools, return_bibtex=True) or "")
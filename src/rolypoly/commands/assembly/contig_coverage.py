@@ -0,0 +1,146 @@
+import rich_click as click
+from rich.console import Console
+
+console = Console()
+
+
+@click.command(name="contig-coverage")
+@click.option(
+    "-i",
+    "--input",
+    "alignments",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Alignment file(s) of reads against the contigs (SAM, SAM.gz or BAM). Repeat for several files",
+)
+@click.option(
+    "-c",
+    "--contigs",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Contigs (FASTA). Required with --reads; with --input it adds the reference base to the allele table",
+)
+@click.option(
+    "-r",
+    "--reads",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Reads (FASTA/FASTQ) to map onto --contigs with minimap2 (mappy) instead of giving --input",
+)
+@click.option(
+    "--preset",
+    default="sr",
+    help="minimap2 preset used with --reads (sr, map-ont, map-pb ...)",
+)
+@click.option(
+    "-o",
+    "--output",
+    default="contig_coverage",
+    help="Output directory for the Parquet tables",
+)
+@click.option(
+    "-w",
+    "--window",
+    default=1000,
+    type=int,
+    help="Window size (bp) of the per-window depth table",
+)
+@click.option(
+    "--alleles/--no-alleles",
+    default=False,
+    help="Also build a pileup and write per-position allele frequencies",
+)
+@click.option(
+    "--min-depth",
+    default=10,
+    type=int,
+    help="Minimum depth of positions in the allele table",
+)
+@click.option(
+    "--min-frequency",
+    default=0.0,
+    type=float,
+    help="Only report positions whose second most common allele reaches this frequency",
+)
+@click.option("--min-mapq", default=0, type=int, help="Minimum mapping quality")
+@click.option(
+    "--include-secondary",
+    is_flag=True,
+    default=False,
+    help="Count secondary alignments (e.g. bbmap ambiguous=all) as well",
+)
+@click.option("-t", "--threads", default=1, type=int, help="Threads")
+def contig_coverage(
+    alignments,
+    contigs,
+    reads,
+    preset,
+    output,
+    window,
+    alleles,
+    min_depth,
+    min_frequency,
+    min_mapq,
+    include_secondary,
+    threads,
+):
+    """Per-contig depth, breadth, window depth and allele frequencies from read alignments.
+
+    Reads SAM/BAM alignments (e.g. from bbmap or bowtie) or maps reads with
+    minimap2, and writes <output>/coverage_summary.parquet,
+    coverage_windows.parquet and (with --alleles) coverage_alleles.parquet.
+    """
+    from rolypoly.utils.bio.coverage import (
+        DEFAULT_EXCLUDE_FLAGS,
+        CoverageAggregator,
+        aggregate_alignments,
+        aggregate_sam_stream,
+        mappy_sam_lines,
+    )
+    from rolypoly.utils.logging.loggit import get_logger
+
+    logger = get_logger()
+    if not alignments and not reads:
+        raise click.ClickException("Give alignments (--input) or --reads")
+    if reads and not contigs:
+        raise click.ClickException("--reads needs the --contigs to map onto")
+
+    contig_lengths = None
+    references = None
+    if contigs:
+        from needletail import parse_fastx_file
+
+        references = {
+            record.name: record.seq for record in parse_fastx_file(str(contigs))
+        }
+        contig_lengths = {name: len(seq) for name, seq in references.items()}
+
+    aggregator = CoverageAggregator(
+        contig_lengths,
+        exclude_flags=DEFAULT_EXCLUDE_FLAGS & ~0x100
+        if include_secondary
+        else DEFAULT_EXCLUDE_FLAGS,
+        min_mapq=min_mapq,
+        track_alleles=alleles,
+    )
+    if alignments:
+        logger.info(f"Aggregating coverage from {len(alignments)} file(s)")
+        aggregate_alignments(list(alignments), aggregator, threads=threads)
+    if reads:
+        logger.info(f"Mapping {len(reads)} read file(s) onto {contigs}")
+        aggregate_sam_stream(
+            mappy_sam_lines(contigs, list(reads), preset, threads), aggregator
+        )
+
+    written = aggregator.write_parquet(
+        output,
+        window_size=window,
+        min_depth=min_depth,
+        min_frequency=min_frequency,
+        references=references,
+    )
+    logger.info(
+        f"Used {aggregator.records_used} of {aggregator.records_seen} alignment records"
+    )
+    for table, path in written.items():
+        console.print(f"{table}: {path}")
@@ -52,6 +52,13 @@ class FilterContigsConfig(BaseConfig):
         self.filter1_aa = kwargs.get("filter1_aa", "length >= 80 & pident>=75")
         self.filter2_aa = kwargs.get("filter2_aa", "qcovhsp >= 95 & pident>=80")
         self.diamond_args = kwargs.get("diamond_args", "--id 50 --min-orf 50")
+        # persistent caches (masked hosts, host/reference indices); with
+        # cache=False they are built in the temp dir for this run only
+        self.cache = kwargs.get("cache", True)
+        self.cache_dir = kwargs.get("cache_dir") or None
+        self.index_cache_dir = (
+            self.cache_dir if self.cache else str(self.temp_dir / "cache")
+        )
 
 
 @click.command(name="filter_contigs")
@@ -130,6 +137,16 @@ class FilterContigsConfig(BaseConfig):
     default="--id 50 --min-orf 50",
     help="Additional arguments for Diamond",
 )
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Reuse (and store) masked hosts and host/reference indices in the persistent caches. With --no-cache, they are built in the temporary directory for this run only",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Root directory of the persistent caches (default: $ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)",
+)
 @click.option(
     "-ow",
     "--overwrite",
@@ -160,6 +177,8 @@ def filter_contigs(
     dont_mask,
     mmseqs_args,
     diamond_args,
+    cache,
+    cache_dir,
     overwrite,
     log_level,
 ):
@@ -168,6 +187,20 @@ def filter_contigs(
     """
     from rolypoly.utils.logging.citation_reminder import remind_citations
     from rolypoly.utils.logging.loggit import log_start_info
+    from rolypoly.utils.various import parse_filter
+
+    # fail on a malformed filter before running any search
+    for option_name, filter_str in (
+        ("--filter1_nuc", filter1_nuc),
+        ("--filter2_nuc", filter2_nuc),
+        ("--filter1_aa", filter1_aa),
+        ("--filter2_aa", filter2_aa),
+    ):
+        if filter_str and filter_str.strip("[] "):
+            try:
+                parse_filter(filter_str)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint=option_name)
 
     output = Path(output).absolute().resolve()
     host = Path(known_dna).absolute().resolve()
@@ -195,6 +228,8 @@ def filter_contigs(
         filter1_aa=filter1_aa,
         filter2_aa=filter2_aa,
         diamond_args=diamond_args,
+        cache=cache,
+        cache_dir=cache_dir,
     )
 
     log_start_info(config.logger, config.__dict__)
@@ -238,13 +273,17 @@ def filter_contigs(
 def filter_contigs_nuc(config: FilterContigsConfig):
     import subprocess
 
-    import polars as pl
     import pyfastx
     from rich_click import Context
 
-    from rolypoly.utils.bio.interval_ops import mask_dna
-    from rolypoly.utils.bio.library_detection import ensure_faidx
-    from rolypoly.utils.various import apply_filter, ensure_memory
+    from rolypoly.commands.reads.mask_dna import mask_dna
+    from rolypoly.utils.bio.sequences import ensure_faidx
+    from rolypoly.utils.cache import CacheStore, file_digest, hash_key
+    from rolypoly.utils.various import (
+        ensure_memory,
+        matching_values,
+        scan_table,
+    )
 
     config.logger.info(f"Started nucleotide host filtering for: {config.input}")
 
@@ -280,9 +319,6 @@ def filter_contigs_nuc(config: FilterContigsConfig):
     # Process host file
     host_db = config.host
     if config.host.suffix.endswith((".faa", ".fasta", ".fas", ".fna", ".fa")):
-        host_db = config.temp_dir / "host_db" / "dnammdb"
-        host_db.parent.mkdir(parents=True, exist_ok=True)
-
         if not config.dont_mask:
             host_fasta = config.temp_dir / "masked_host.fasta"
             mask_args = {
@@ -291,48 +327,73 @@ def filter_contigs_nuc(config: FilterContigsConfig):
                 "output": host_fasta,
                 "flatten": False,
                 "input": config.host,
+                "cache": config.cache,
+                "cache_dir": config.cache_dir,
             }
             context = Context(mask_dna, ignore_unknown_options=True)
             context.invoke(mask_dna, **mask_args)
         else:
             host_fasta = config.host
 
-        subprocess.run(
-            [
-                "mmseqs",
-                "createdb",
-                str(host_fasta),
-                str(host_db),
-                "--dbtype",
-                "2",
-                "-v",
-                "1",
-            ],
-            check=True,
+        # the (masked) host DB only depends on the host content, so it is
+        # shared across runs through the persistent reference-index store
+        def _build_host_db(entry_dir: Path) -> None:
+            subprocess.run(
+                [
+                    "mmseqs",
+                    "createdb",
+                    str(host_fasta),
+                    str(entry_dir / "dnammdb"),
+                    "--dbtype",
+                    "2",
+                    "-v",
+                    "1",
+                ],
+                check=True,
+            )
+
+        index_params = {
+            "host_digest": file_digest(host_fasta),
+            "index": "mmseqs_createdb",
+            "dbtype": 2,
+        }
+        index_store = CacheStore(
+            "reference_indices",
+            cache_dir=config.index_cache_dir,
+            logger=config.logger,
+        )
+        host_db = (
+            index_store.get_or_build(
+                hash_key(index_params), _build_host_db, params=index_params
+            )
+            / "dnammdb"
         )
 
     # Perform MMseqs2 search
     # config.logger.info(f"Searching against {host_db}")
-    mmseqs_search_cmd = [
-        "mmseqs",
-        "search",
-        str(input_db),
-        str(host_db),
-        f"{resdb}/res",
-        str(config.temp_dir),
-        "--threads",
-        str(config.threads),
-        "-a",
-        "--search-type",
-        "3",
-        "-v",
-        "1",
-    ]
-    config.logger.info(
-        f"Running mmseqs2 search with command:  {' '.join(mmseqs_search_cmd)}"
+    def _mmseqs_search_cmd(lease):
+        params = lease.tool_params("mmseqs")
+        return [
+            "mmseqs",
+            "search",
+            str(input_db),
+            str(host_db),
+            f"{resdb}/res",
+            str(config.temp_dir),
+            "--threads",
+            str(params["threads"]),
+            "--split-memory-limit",
+            params["split-memory-limit"],
+            "-a",
+            "--search-type",
+            "3",
+            "-v",
+            "1",
+        ] + config.mmseqs_args.split()
+
+    config.scheduler.run(
+        _mmseqs_search_cmd, name="mmseqs search (host nuc)", tool="mmseqs"
     )
-    mmseqs_search_cmd.extend(config.mmseqs_args.split())
-    subprocess.run(mmseqs_search_cmd, check=True)
 
     # Convert results to desired format
     result_file = config.temp_dir / f"{config.input.stem}_vs_host.tab"  # type: ignore - an initalized config.input is a path
@@ -355,10 +416,11 @@ def filter_contigs_nuc(config: FilterContigsConfig):
         check=True,
     )
 
-    # Apply filters
+    # Apply filters (lazily: only the filtered columns are parsed and rows
+    # are dropped during the scan)
     config.logger.info(f"reading results from {result_file}")
-    y = pl.read_csv(result_file, separator="\t", has_header=True)
-    if y.shape[0] == 0:
+    y = scan_table(result_file)
+    if y.head(1).collect().height == 0:
         config.logger.warning(
             f"No nucleic hits found for {config.input} against {config.host}, copying input to output"
         )
@@ -367,10 +429,10 @@ def filter_contigs_nuc(config: FilterContigsConfig):
 
     config.logger.info("Applying filters:")
     config.logger.info(f"Filter 1: {config.filter1_nuc}")
-    filtered1 = apply_filter(y, config.filter1_nuc)
     config.logger.info(f"Filter 2: {config.filter2_nuc}")
-    filtered2 = apply_filter(y, config.filter2_nuc)
-    y_set = set(filtered1["qheader"]).union(set(filtered2["qheader"]))
+    y_set = matching_values(
+        y, [config.filter1_nuc, config.filter2_nuc], "qheader"
+    )
 
     # Write filtered sequences
     fa = pyfastx.Fasta(str(config.input))
@@ -397,21 +459,23 @@ def filter_contigs_nuc(config: FilterContigsConfig):
         shutil.rmtree(resdb, ignore_errors=True)
         if input_db != config.input:
             shutil.rmtree(input_db.parent, ignore_errors=True)  # type: ignore - an initalized input_db is a path
-        if host_db != config.host:
-            shutil.rmtree(host_db.parent, ignore_errors=True)  # type: ignore - an initalized host_db is a path
         result_file.unlink(missing_ok=True)
 
 
 def filter_contigs_aa(config: FilterContigsConfig):
     import subprocess
 
-    import polars as pl
     import pyfastx
     from bbmapy import callgenes
 
     from rolypoly.utils.bio.library_detection import ensure_faidx
+    from rolypoly.utils.bio.reference_search import cached_diamond_db
     from rolypoly.utils.bio.sequences import guess_fasta_alpha
-    from rolypoly.utils.various import apply_filter, ensure_memory
+    from rolypoly.utils.various import (
+        ensure_memory,
+        matching_values,
+        scan_table,
+    )
 
     config.logger.info(f"Started amino acid host filtering for: {config.input}")
 
@@ -453,6 +517,13 @@ def filter_contigs_aa(config: FilterContigsConfig):
                 Path(os.environ.get("ROLYPOLY_DATA", ""))
                 / "contam/masking/combined_deduplicated_orfs.faa"
             )
+            # the masking reference is the same for every run: reuse its .dmnd
+            rna_virus_prots = cached_diamond_db(
+                rna_virus_prots,
+                threads=config.threads,
+                cache_dir=config.index_cache_dir,
+                logger=config.logger,
+            )
             diamond_mask_cmd = [
                 "diamond",
                 "blastp",
@@ -491,53 +562,55 @@ def filter_contigs_aa(config: FilterContigsConfig):
 
     # Perform the Diamond search
     config.logger.info(f"Searching against {host_fasta}")
-    diamond_search_cmd = [
-        "diamond",
-        "blastx",
-        "--query",
-        str(config.input),
-        "--db",
-        str(host_fasta),
-        "--out",
-        str(res_tab),
-        "--tmpdir",
-        str(config.temp_dir),
-        "--threads",
-        str(config.threads),
-    ]
-    diamond_search_cmd.extend(config.diamond_args.split())
-    diamond_search_cmd.extend(
-        [
-            "--header",
-            "simple",
-            "--outfmt",
-            "6",
-            "qtitle sseqid pident length mismatch gapopen qstart qend qlen sstart send slen evalue bitscore qstrand qframe qcovhsp",
+
+    def _diamond_search_cmd(lease):
+        diamond_search_cmd = [
+            "diamond",
+            "blastx",
+            "--query",
+            str(config.input),
+            "--db",
+            str(host_fasta),
+            "--out",
+            str(res_tab),
+            "--tmpdir",
+            str(config.temp_dir),
+            "--threads",
+            str(lease.threads),
         ]
-    )
+        diamond_search_cmd.extend(config.diamond_args.split())
+        diamond_search_cmd.extend(
+            [
+                "--header",
+                "simple",
+                "--outfmt",
+                "6",
+                "qtitle sseqid pident length mismatch gapopen qstart qend qlen sstart send slen evalue bitscore qstrand qframe qcovhsp",
+            ]
+        )
+        return " ".join(diamond_search_cmd)
+
     with open(config.log_file, "a") as log_file:  # type: ignore
-        subprocess.run(
-            " ".join(diamond_search_cmd),
-            check=True,
-            shell=True,
+        config.scheduler.run(
+            _diamond_search_cmd,
+            name="diamond blastx (host aa)",
+            tool="diamond",
             stdout=log_file,
             stderr=log_file,
         )
 
     # Apply filters
     config.logger.info(f"reading results from {res_tab}")
-    y = pl.read_csv(res_tab, separator="\t", has_header=True)
-    if y.shape[0] == 0:
+    y = scan_table(res_tab)
+    if y.head(1).collect().height == 0:
         config.logger.warning(
             f"No amino acid hits found for {config.input} against {config.host}, proceeding to copy paste the input as the output."
         )
         shutil.copy(config.input, config.output)
         return
     config.logger.info(f"Filter 1: {config.filter1_aa}")
-    filtered1 = apply_filter(y, config.filter1_aa)
     config.logger.info(f"Filter 2: {config.filter2_aa}")
-    filtered2 = apply_filter(y, config.filter2_aa)
-    y_set = set(filtered1["qtitle"]).union(set(filtered2["qtitle"]))
+    y_set = matching_values(y, [config.filter1_aa, config.filter2_aa], "qtitle")
 
     # Write filtered sequences
     fa = pyfastx.Fasta(str(config.input))
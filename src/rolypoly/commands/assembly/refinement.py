@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 
 from rich.console import Console
 from rich_click import command, option
@@ -11,8 +12,14 @@ console = Console()
 @option(
     "-r",
     "--reads",
-    required=True,
-    help="Input reads file(s) (FASTQ). For paired-end, separate with comma.",
+    default=None,
+    help="Input reads file(s) (FASTA/FASTQ). For paired-end, separate with comma.",
+)
+@option(
+    "-a",
+    "--alignments",
+    default=None,
+    help="Existing alignments of the reads to the assembly (SAM, SAM.gz or BAM) to use instead of mapping --reads",
 )
 @option(
     "-o",
@@ -21,12 +28,40 @@ console = Console()
     help="Output directory",
 )
 @option("-t", "--threads", default=1, help="Number of threads to use")
-@option("-M", "--memory", default="6g", help="Maximum memory to use")
 @option(
-    "-v",
-    "--variant-caller",
-    default="freebayes",
-    help="Variant caller to use (freebayes, bcftools)",
+    "--preset",
+    default="sr",
+    help="minimap2 preset used to map --reads (sr, map-ont, map-pb ...)",
+)
+@option(
+    "--min-depth",
+    default=10,
+    type=int,
+    help="Minimum depth to call variants and to polish a position",
+)
+@option(
+    "--min-frequency",
+    default=0.1,
+    type=float,
+    help="Minimum frequency of a minor allele (overall to call a variant, within a strain to seed a new strain from it)",
+)
+@option(
+    "--min-reads",
+    default=5,
+    type=int,
+    help="Minimum reads supporting a variant and a strain",
+)
+@option(
+    "--max-strains",
+    default=8,
+    type=int,
+    help="Maximum number of strains per contig",
+)
+@option(
+    "--min-abundance",
+    default=0.0,
+    type=float,
+    help="Leave strains below this abundance out of strains.fasta",
 )
 @option(
     "-g",
@@ -34,97 +69,264 @@ console = Console()
     default=lambda: f"{os.getcwd()}/refinement_logfile.txt",
     help="Path to log file",
 )
-def refinement(input, reads, output, threads, memory, variant_caller, log_file):
+def refinement(
+    input,
+    reads,
+    alignments,
+    output,
+    threads,
+    preset,
+    min_depth,
+    min_frequency,
+    min_reads,
+    max_strains,
+    min_abundance,
+    log_file,
+):
     """
-    Refine assembly by de-entangling strains and rerunning assembly - post host removal.
+    Refine assembly by polishing contigs and de-entangling strains - post host removal.
+
+    Reads are mapped to the contigs (or existing alignments are read), the
+    pileup is built in-process, contigs are polished with the majority
+    alleles and reads are clustered into haplotypes by linked variants.
+    One consensus per supported strain is written with its abundance.
     """
     from rolypoly.utils.logging.loggit import setup_logging
 
+    if not reads and not alignments:
+        raise ValueError("Either --reads or --alignments is required")
+
     logger = setup_logging(log_file)
     logger.info("Starting assembly refinement process")
 
     # Create output directory
     os.makedirs(output, exist_ok=True)
-
-    # Align reads to assembly
-    bam_file = align_reads(input, reads, output, threads, logger)
+    references = read_references(input)
+
+    # Align reads to assembly and build the pileup
+    aggregator, alignment_file = align_reads(
+        input,
+        reads,
+        alignments,
+        output,
+        threads,
+        logger,
+        preset=preset,
+        references=references,
+    )
 
     # Call variants
-    vcf_file = call_variants(
-        input, bam_file, output, threads, memory, variant_caller, logger
+    variants = call_variants(
+        aggregator,
+        references,
+        output,
+        min_depth,
+        min_frequency,
+        min_reads,
+        logger,
     )
 
-    # Apply variants to improve assembly
-    improved_assembly = apply_variants(input, vcf_file, output, logger)
+    # Apply the majority alleles to polish the assembly
+    improved_assembly = apply_variants(
+        aggregator, references, output, min_depth, logger
+    )
 
     # De-entangle strains (if multiple strains are present)
     final_assemblies = de_entangle_strains(
-        improved_assembly, bam_file, output, threads, logger
+        aggregator,
+        alignment_file,
+        variants,
+        references,
+        output,
+        threads,
+        logger,
+        min_depth=min_depth,
+        min_frequency=min_frequency,
+        min_reads=min_reads,
+        max_strains=max_strains,
+        min_abundance=min_abundance,
     )
 
     logger.info("Assembly refinement completed")
+    console.print(f"Polished assembly: {improved_assembly}")
     console.print(f"Refined assembly(ies) saved in: {output}")
     return final_assemblies
 
 
-def align_reads(assembly, reads, output_dir, threads, logger):
-    import subprocess
+def read_references(assembly):
+    """{contig: sequence} of the assembly, in file order."""
+    from needletail import parse_fastx_file
 
-    logger.info("Aligning reads to assembly")
-    index_cmd = f"bwa index {assembly}"
-    subprocess.run(index_cmd, shell=True, check=True)
+    return {
+        record.id.split()[0]: record.seq
+        for record in parse_fastx_file(str(assembly))
+    }
+
+
+def align_reads(
+    assembly,
+    reads,
+    alignments,
+    output_dir,
+    threads,
+    logger,
+    preset="sr",
+    references=None,
+):
+    """Map the reads (or read existing alignments) into a pileup.
 
-    bam_file = os.path.join(output_dir, "aligned_reads.bam")
-    align_cmd = f"bwa mem -t {threads} {assembly} {reads} | samtools sort -@ {threads} -o {bam_file}"
-    subprocess.run(align_cmd, shell=True, check=True)
+    Reads are mapped with minimap2 (mappy); the alignments are kept as
+    aligned_reads.sam.gz since strain de-entanglement reads them again.
 
-    index_bam_cmd = f"samtools index {bam_file}"
-    subprocess.run(index_bam_cmd, shell=True, check=True)
+    Returns:
+        tuple: CoverageAggregator with allele counts, alignment file
+    """
+    from rolypoly.utils.bio.coverage import (
+        CoverageAggregator,
+        aggregate_alignments,
+        aggregate_sam_stream,
+        mappy_sam_lines,
+        open_alignment_sink,
+    )
 
-    return bam_file
+    references = references or read_references(assembly)
+    aggregator = CoverageAggregator(
+        {name: len(seq) for name, seq in references.items()}, track_alleles=True
+    )
+    if alignments:
+        logger.info(f"Reading alignments from {alignments}")
+        aggregate_alignments([alignments], aggregator, threads=threads)
+        return aggregator, Path(alignments)
+
+    logger.info("Aligning reads to assembly")
+    alignment_file = Path(output_dir) / "aligned_reads.sam.gz"
+    sink = open_alignment_sink(alignment_file, "sam.gz", threads, logger)
+    try:
+        aggregate_sam_stream(
+            mappy_sam_lines(
+                assembly, reads.split(","), preset=preset, threads=threads
+            ),
+            aggregator,
+            sink,
+        )
+    finally:
+        sink.close()
+    logger.info(
+        f"Used {aggregator.records_used} of {aggregator.records_seen} alignment records"
+    )
+    return aggregator, alignment_file
 
 
 def call_variants(
-    assembly, bam_file, output_dir, threads, memory, variant_caller, logger
+    aggregator,
+    references,
+    output_dir,
+    min_depth,
+    min_frequency,
+    min_reads,
+    logger,
 ):
-    import subprocess
-
-    logger.info(f"Calling variants using {variant_caller}")
-    vcf_file = os.path.join(output_dir, "variants.vcf")
+    """Call variant positions from the pileup.
 
-    if variant_caller == "freebayes":
-        cmd = f"freebayes -f {assembly} -p 1 {bam_file} > {vcf_file}"
-    elif variant_caller == "bcftools":
-        cmd = f"bcftools mpileup -Ou -f {assembly} {bam_file} | bcftools call -mv -Ov -o {vcf_file}"
-    else:
-        raise ValueError(f"Unsupported variant caller: {variant_caller}")
+    Writes the coverage tables and the allele frequencies of the variant
+    positions (coverage_*.parquet) to output_dir.
 
-    subprocess.run(cmd, shell=True, check=True)
-    return vcf_file
+    Returns:
+        np.ndarray: Sorted variant positions (contig offset + 0-based position)
+    """
+    from rolypoly.utils.bio.strains import variant_positions
+
+    logger.info("Calling variants from the pileup")
+    aggregator.write_parquet(
+        output_dir,
+        min_depth=min_depth,
+        min_frequency=min_frequency,
+        references=references,
+    )
+    variants = variant_positions(
+        aggregator, min_depth, min_frequency, min_reads
+    )
+    logger.info(f"Found {len(variants)} variant positions")
+    return variants
 
 
-def apply_variants(assembly, vcf_file, output_dir, logger):
-    import subprocess
+def apply_variants(aggregator, references, output_dir, min_depth, logger):
+    """Polish the contigs with the majority allele of every covered position."""
+    from rolypoly.utils.bio.strains import apply_alleles
 
     logger.info("Applying variants to improve assembly")
     improved_assembly = os.path.join(output_dir, "improved_assembly.fasta")
-    cmd = f"bcftools consensus -f {assembly} {vcf_file} > {improved_assembly}"
-    subprocess.run(cmd, shell=True, check=True)
+    with open(improved_assembly, "w") as f:
+        for name, sequence in references.items():
+            polished = apply_alleles(
+                sequence, aggregator.major_alleles(name, min_depth)
+            )
+            f.write(f">{name}\n{polished}\n")
     return improved_assembly
 
 
-def de_entangle_strains(assembly, bam_file, output_dir, threads, logger):
-    logger.info("De-entangling strains")
-    # placeholder for strain de-entanglement logic
-    # TODO: implement a more sophisticated approach here
+def de_entangle_strains(
+    aggregator,
+    alignment_file,
+    variants,
+    references,
+    output_dir,
+    threads,
+    logger,
+    min_depth=10,
+    min_frequency=0.1,
+    min_reads=5,
+    max_strains=8,
+    min_abundance=0.0,
+):
+    """Cluster reads into strains and write one consensus per strain.
+
+    Writes strains.fasta and strains.tsv (contig, strain, abundance, reads,
+    variants) to output_dir/strains.
+
+    Returns:
+        list: Paths of the written files
+    """
+    import polars as pl
 
-    strain_dir = os.path.join(output_dir, "strains")
-    os.makedirs(strain_dir, exist_ok=True)
+    from rolypoly.utils.bio.coverage import iter_alignment_file
+    from rolypoly.utils.bio.strains import collect_observations, resolve_strains
 
-    # # just copy the improved assembly as a single strain
-    # shutil.copy(assembly, os.path.join(strain_dir, "strain_1.fasta"))
+    logger.info("De-entangling strains")
+    strain_dir = Path(output_dir) / "strains"
+    strain_dir.mkdir(parents=True, exist_ok=True)
+
+    observations = collect_observations(
+        iter_alignment_file(alignment_file, threads), aggregator, variants
+    )
+    strains = resolve_strains(
+        aggregator,
+        observations,
+        variants,
+        references,
+        min_depth=min_depth,
+        min_frequency=min_frequency,
+        min_reads=min_reads,
+        max_strains=max_strains,
+        threads=threads,
+        logger=logger,
+    )
+    multi = strains.group_by("contig").len().filter(pl.col("len") > 1).height
+    logger.info(
+        f"{strains.height} strains over {strains['contig'].n_unique()} contigs ({multi} with more than one strain)"
+    )
 
-    # return [os.path.join(strain_dir, "strain_1.fasta")]
+    strains_fasta = strain_dir / "strains.fasta"
+    with open(strains_fasta, "w") as f:
+        for row in strains.filter(
+            pl.col("abundance") >= min_abundance
+        ).iter_rows(named=True):
+            f.write(
+                f">{row['strain']} contig={row['contig']} abundance={row['abundance']:.4f} reads={row['reads']}\n{row['sequence']}\n"
+            )
+    strains_table = strain_dir / "strains.tsv"
+    strains.drop("sequence").write_csv(strains_table, separator="\t")
+    return [strains_fasta, strains_table]
 
 
 if __name__ == "__main__":
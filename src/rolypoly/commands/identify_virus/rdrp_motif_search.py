@@ -1,7 +1,6 @@
 import json
 import os
 import shutil
-from collections import defaultdict
 from pathlib import Path
 from typing import Dict, List
 
@@ -485,32 +484,27 @@ def process_motif_results(
 
     config.logger.info("Processing motif search results")
 
-    # Add motif metadata to results
-    results = search_results.with_columns(
-        [
-            pl.col("target_name").alias("motif_profile"),
-            pl.lit(None).alias("motif_type"),
-            # pl.lit(None).alias("taxon"),  # DISABLED: no taxon data in profiles yet
-            pl.lit(None).alias("original_motif_name"),
-        ]
+    # Add motif metadata to results (one join over all profiles)
+    metadata = pl.DataFrame(
+        {
+            "motif_profile": list(motif_metadata),
+            "motif_type": [
+                m.get("motif_type") for m in motif_metadata.values()
+            ],
+            # "taxon": [m.get("taxon") for m in motif_metadata.values()],  # DISABLED: no taxon data in profiles yet
+            "original_motif_name": [
+                m.get("original_name") for m in motif_metadata.values()
+            ],
+        },
+        schema={
+            "motif_profile": pl.Utf8,
+            "motif_type": pl.Utf8,
+            "original_motif_name": pl.Utf8,
+        },
     )
-
-    # Map profile names to motif metadata
-    for profile_name, metadata in motif_metadata.items():
-        mask = pl.col("motif_profile") == profile_name
-        results = results.with_columns(
-            [
-                pl.when(mask)
-                .then(pl.lit(metadata["motif_type"]))
-                .otherwise(pl.col("motif_type"))
-                .alias("motif_type"),
-                # pl.when(mask).then(pl.lit(metadata["taxon"])).otherwise(pl.col("taxon")).alias("taxon"),  # DISABLED: no taxon data
-                pl.when(mask)
-                .then(pl.lit(metadata["original_name"]))
-                .otherwise(pl.col("original_motif_name"))
-                .alias("original_motif_name"),
-            ]
-        )
+    results = search_results.with_columns(
+        pl.col("target_name").cast(pl.Utf8).alias("motif_profile")
+    ).join(metadata, on="motif_profile", how="left", maintain_order="left")
 
     # Apply filters
     if config.motif_filter:
@@ -546,36 +540,8 @@ def apply_distance_filtering(
         f"Applying distance filtering (max distance: {config.max_distance} aa)"
     )
 
-    # Group by query sequence
-    grouped = results.group_by("query_name", maintain_order=True)
-
-    filtered_groups = []
-
-    for group_key, group_df in grouped:
-        query_name = (
-            group_key[0] if isinstance(group_key, tuple) else group_key
-        )  # TODO: figure out if this vaiable is really needed.
-        query_hits = group_df.sort("ali_from")
-        # print len(group_df)
-        # print len(query_hits)
-        # print len(query_name)
-
-        # Group hits by motif type
-        motif_groups = defaultdict(list)
-        for row in query_hits.to_dicts():
-            motif_type = row.get("motif_type", "unknown")
-            motif_groups[motif_type].append(row)
-
-        # Find best combination within distance constraint
-        best_combination = find_best_motif_combination(
-            motif_groups, config.max_distance
-        )
-
-        if best_combination:
-            filtered_groups.extend(best_combination)
-
-    if filtered_groups:
-        filtered_df = pl.DataFrame(filtered_groups)
+    filtered_df = best_motif_combinations(results, config.max_distance)
+    if len(filtered_df) > 0:
         config.logger.info(
             f"Distance filtering result: {len(filtered_df)} hits retained"
         )
@@ -585,13 +551,194 @@ def apply_distance_filtering(
         return pl.DataFrame()
 
 
+# Minimum scores for each motif type (based on original script)
+MIN_SCORE_THRESHOLDS = {"A": 10.0, "B": 11.0, "C": 5.9, "D": 5.0}
+
+
+def best_motif_combinations(
+    results: pl.DataFrame, max_distance: int
+) -> pl.DataFrame:
+    """Best combination of motif hits per query, computed column-wise.
+
+    Same selection as find_best_motif_combination applied to every query:
+    each hit above its type's minimum score seeds a combination, which
+    takes, for every other motif type (in order of first appearance along
+    the query), the highest scoring hit of that type that neither overlaps
+    nor lies further than max_distance from any hit already in it. The
+    seed with the highest combined score wins (the first one on ties).
+
+    Seeds are extended for all queries at once, one motif type per round,
+    with a join of seeds against that type's candidates and a group_by
+    picking the best compatible candidate.
+
+    Args:
+        results: Annotated motif hits (query_name, motif_type, ali_from,
+            ali_to, score, ...)
+        max_distance: Maximum distance between motifs in amino acids
+
+    Returns:
+        pl.DataFrame: The hits of the best combination of each query, in
+            query order, seed first, then the added hits
+    """
+    # hits in query order (first appearance), then by position
+    hits = (
+        results.with_row_index("_row")
+        .with_columns(
+            pl.col("_row").min().over("query_name").alias("_query_order")
+        )
+        .sort(["_query_order", "ali_from"], maintain_order=True)
+        .with_row_index("_pos")
+        .with_columns(
+            # motif types ranked by first appearance along the query
+            pl.col("_pos")
+            .min()
+            .over(["query_name", "motif_type"])
+            .rank("dense")
+            .over("query_name")
+            .alias("_type_rank"),
+            pl.col("motif_type")
+            .replace_strict(
+                MIN_SCORE_THRESHOLDS, default=0.0, return_dtype=pl.Float64
+            )
+            .alias("_threshold"),
+        )
+    )
+    candidates = (
+        hits.filter(pl.col("score") > pl.col("_threshold"))
+        .sort(
+            ["_query_order", "_type_rank", "score", "_pos"],
+            descending=[False, False, True, False],
+        )
+        .with_columns(
+            pl.int_range(pl.len())
+            .over(["_query_order", "_type_rank"])
+            .alias("_hit_rank")
+        )
+        .select(
+            "_pos",
+            "_query_order",
+            "_type_rank",
+            "_hit_rank",
+            pl.col("ali_from").alias("_start"),
+            pl.col("ali_to").alias("_end"),
+            pl.col("score").alias("_score"),
+        )
+    )
+    empty = results.clear()
+    if len(candidates) == 0:
+        return empty
+
+    # every candidate seeds a combination
+    seeds = candidates.select(
+        pl.col("_pos").alias("_seed"),
+        "_query_order",
+        pl.col("_type_rank").alias("_seed_type_rank"),
+        pl.col("_hit_rank").alias("_seed_hit_rank"),
+        pl.col("_score").alias("_total"),
+    )
+    members = candidates.select(
+        pl.col("_pos").alias("_seed"),
+        "_pos",
+        "_start",
+        "_end",
+        pl.lit(0, dtype=pl.UInt32).alias("_member"),
+    )
+
+    for type_rank in range(1, int(candidates["_type_rank"].max()) + 1):  # pyright: ignore
+        pairs = (
+            seeds.filter(pl.col("_seed_type_rank") != type_rank)
+            .select("_seed", "_query_order")
+            .join(
+                candidates.filter(pl.col("_type_rank") == type_rank),
+                on="_query_order",
+            )
+        )
+        if len(pairs) == 0:
+            continue
+        existing = members.select(
+            "_seed",
+            pl.col("_start").alias("_m_start"),
+            pl.col("_end").alias("_m_end"),
+        )
+        distance = pl.min_horizontal(
+            (pl.col("_start") - pl.col("_m_end")).abs(),
+            (pl.col("_m_start") - pl.col("_end")).abs(),
+        )
+        compatible = (
+            (pl.col("_end") < pl.col("_m_start"))
+            | (pl.col("_start") > pl.col("_m_end"))
+        ) & (distance <= max_distance)
+        accepted = (
+            pairs.join(existing, on="_seed")
+            .group_by(
+                ["_seed", "_pos", "_hit_rank", "_start", "_end", "_score"]
+            )
+            .agg(compatible.all().alias("_ok"))
+            .filter("_ok")
+            .sort(["_seed", "_hit_rank"])
+            .unique("_seed", keep="first", maintain_order=True)
+        )
+        if len(accepted) == 0:
+            continue
+        members = pl.concat(
+            [
+                members,
+                accepted.select(
+                    "_seed",
+                    "_pos",
+                    "_start",
+                    "_end",
+                    pl.lit(type_rank, dtype=pl.UInt32).alias("_member"),
+                ),
+            ]
+        )
+        # same summation order as adding the hits one at a time
+        seeds = (
+            seeds.join(
+                accepted.select("_seed", "_score"),
+                on="_seed",
+                how="left",
+                maintain_order="left",
+            )
+            .with_columns(
+                pl.when(pl.col("_score").is_not_null())
+                .then(pl.col("_total") + pl.col("_score"))
+                .otherwise(pl.col("_total"))
+                .alias("_total")
+            )
+            .drop("_score")
+        )
+
+    best = (
+        seeds.filter(pl.col("_total") > 0)
+        .sort(
+            ["_query_order", "_total", "_seed_type_rank", "_seed_hit_rank"],
+            descending=[False, True, False, False],
+        )
+        .unique("_query_order", keep="first", maintain_order=True)
+        .select("_seed", "_query_order")
+    )
+    chosen = (
+        members.join(best, on="_seed")
+        .sort(["_query_order", "_member"])
+        .select("_pos")
+    )
+    if len(chosen) == 0:
+        return empty
+    return chosen.join(
+        hits, on="_pos", how="left", maintain_order="left"
+    ).select(results.columns)
+
+
 def find_best_motif_combination(
     motif_groups: Dict, max_distance: int
 ) -> List[Dict]:
-    """Find the best combination of motifs within distance constraint"""
+    """Find the best combination of motifs within distance constraint.
 
-    # Define minimum scores for each motif type (based on original script)
-    min_score_thresholds = {"A": 10.0, "B": 11.0, "C": 5.9, "D": 5.0}
+    Per-query reference implementation of best_motif_combinations, over
+    {motif type: hits sorted by ali_from}.
+    """
+    min_score_thresholds = MIN_SCORE_THRESHOLDS
 
     # Filter by minimum scores
     filtered_groups = {}
@@ -33,6 +33,16 @@ console = Console()
     default="",
     help="Path to the user-supplied source (required if --db is 'other'). Either a fasta or a path to formatted MMseqs2 virus database",
 )
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Reuse (and store) the reference DBs and their search indices in the persistent cache. With --no-cache, they are built in the temporary directory for this run only",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Root directory of the persistent caches (default: $ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)",
+)
 @click.option(
     "-g",
     "--log-file",
@@ -46,7 +56,16 @@ console = Console()
     help="Input path to nucl fasta file OR preformatted mmseqs db",
 )
 def virus_mapping(
-    threads, memory, output, keep_tmp, db, db_path, log_file, input
+    threads,
+    memory,
+    output,
+    keep_tmp,
+    db,
+    db_path,
+    cache,
+    cache_dir,
+    log_file,
+    input,
 ):
     """MMseqs2 Virus mapping/search wrapper - takes in reads/contigs (i.e. nucs), and search them against precompiled virus databases OR user-supplied databases."""
     import shutil
@@ -72,6 +91,8 @@ def virus_mapping(
             "threads": threads,
             "memory": memory,
             "keep_tmp": keep_tmp,
+            "cache": cache,
+            "cache_dir": cache_dir,
             "log_file": log_file,
         },
     )
@@ -97,6 +118,17 @@ def virus_mapping(
 
     # TODO: functionalize / use wrappers for mmseqs2.
 
+    from rolypoly.utils.bio.reference_search import (
+        cached_mmseqs_target,
+        convert_results,
+        create_query_db,
+        is_fasta_path,
+        search_references,
+    )
+    from rolypoly.utils.resources import get_scheduler
+
+    scheduler = get_scheduler(threads, memory, logger=logger)
+
     # Create folders for MMseqs2 to use
     tmpdir = output_path / "tmp"
     os.makedirs(tmpdir, exist_ok=True)
@@ -104,33 +136,8 @@ def virus_mapping(
     shutil.rmtree(res_path, ignore_errors=True)
     os.makedirs(res_path, exist_ok=True)
 
-    # if the input is fasta Convert the input  into an mmseqs DB
-    if pt(input).suffix in [
-        ".faa",
-        ".fasta",
-        ".fas",
-        ".fa",
-        ".fna",
-        ".fastq",
-        ".fq",
-        ".gz",
-        ".fastq.gz",
-        ".fq.gz",
-        ".fasta.gz",
-        ".fa.gz",
-        ".fas.gz",
-        ".faa.gz",
-    ]:
-        logger.info("Converting input to mmseqs DB")
-        tmp = pt(tmpdir) / "pl_sv_contig_db"
-        os.makedirs(tmp, exist_ok=True)
-        mmseqs_createdb_cmd = (
-            f"mmseqs createdb {str(input)} {tmp}/mmdb  --dbtype 2"
-        )
-        subprocess.run(mmseqs_createdb_cmd, shell=True, check=True)
-        input = (
-            tmp / "mmdb"
-        )  # Ensure the path is updated correctly after creation
+    # the query DB is built once and searched against every reference
+    input = create_query_db(input, tmpdir, dbtype=2, logger=logger)
 
     DB_PATHS = {
         "NCBI_Ribovirus": datadir
@@ -147,53 +154,72 @@ def virus_mapping(
                 "[bold red]Error:[/bold red] Please provide a path to the user-supplied database with --db-path"
             )
             return
-        if pt(db_path).suffix in [".faa", ".fasta", ".fas", ".fa", ".fna"]:
-            logger.info("Converting target db to mmseqs DB")
-            tmp = pt(tmpdir) / "rp_sv_custom_db"
-            os.makedirs(tmp, exist_ok=True)
-            mmseqs_createdb_cmd = (
-                f"mmseqs createdb {db_path} {tmp}/cmmdb  --dbtype 2"
-            )
-            subprocess.run(mmseqs_createdb_cmd, shell=True, check=True)
-            db_path = (
-                tmp / "cmmdb"
-            )  # Ensure the path is updated correctly after creation
-        db_paths = {"Custom": db_path}
+        db_paths = {"Custom": pt(db_path)}
     else:
         db_paths = {db: DB_PATHS[db]}
 
+    # reference DBs and their indices come from the persistent cache
+    # (with --no-cache, from a throwaway one in the temporary directory)
+    if not cache:
+        cache_dir = str(tmpdir / "cache")
+    targets = {}
     for db_name, db_path in db_paths.items():
-        logger.info(f"Searching against {db_name}")
-        this_resdb = res_path / db_name
-        os.makedirs(this_resdb, exist_ok=True)
-
-        # Perform the MMseqs2 search
-        mmseqs_search_cmd = (
-            f"mmseqs search {input} {db_path} {this_resdb}/res {tmpdir} "
-            f"--min-seq-id 0.5 --threads {threads} -a --search-type 3 -s 8 --strand 2"
+        if is_fasta_path(db_path):
+            logger.info(f"Converting target db {db_name} to mmseqs DB")
+        targets[db_name] = cached_mmseqs_target(
+            db_path,
+            dbtype=2,
+            search_type=3,
+            threads=threads,
+            cache_dir=cache_dir,
+            logger=logger,
         )
-        subprocess.run(mmseqs_search_cmd, shell=True, check=True)
-
-        # Convert results to desired format
-        if output_format == ".tab":
-            mmseqs_convertalis_cmd = (
-                f"mmseqs convertalis {input} {db_path} {this_resdb}/res "
-                f"{output.with_suffix('')}_vs_{db_name}.tab --format-mode 4 "
-                f"--format-output qheader,theader,qlen,tlen,qstart,qend,tstart,tend,alnlen,mismatch,qcov,tcov,bits,evalue,gapopen,pident,nident"
-            )
-            subprocess.run(mmseqs_convertalis_cmd, shell=True, check=True)
-        elif output_format == ".sam":
-            mmseqs_convertalis_cmd = (
-                f"mmseqs convertalis {input} {db_path} {this_resdb}/res "
-                f"{output.with_suffix('')}_vs_{db_name}.sam --format-mode 1 --search-type 3"
-            )
-            subprocess.run(mmseqs_convertalis_cmd, shell=True, check=True)
-        elif output_format == ".html":
-            mmseqs_convertalis_cmd = (
-                f"mmseqs convertalis {input} {db_path} {this_resdb}/res "
-                f"{output.with_suffix('')}_vs_{db_name}.html --format-mode 3 --search-type 3"
+
+    logger.info(f"Searching against {', '.join(targets)}")
+    results = search_references(
+        input,
+        targets,
+        res_path,
+        search_args=[
+            "--min-seq-id",
+            "0.5",
+            "-a",
+            "--search-type",
+            "3",
+            "-s",
+            "8",
+            "--strand",
+            "2",
+        ],
+        scheduler=scheduler,
+        logger=logger,
+    )
+
+    # Convert results to desired format
+    if output_format == ".tab":
+        hits = convert_results(input, targets, results, res_path, logger=logger)
+        hits.write_csv(output, separator="\t")
+        logger.info(
+            f"{hits.height} hits ({', '.join(f'{name}: {n}' for name, n in hits.group_by('reference').len().iter_rows())})"
+        )
+    elif output_format in (".sam", ".html"):
+        format_mode = "1" if output_format == ".sam" else "3"
+        for db_name, result_db in results.items():
+            subprocess.run(
+                [
+                    "mmseqs",
+                    "convertalis",
+                    str(input),
+                    str(targets[db_name]),
+                    str(result_db),
+                    f"{output.with_suffix('')}_vs_{db_name}{output_format}",
+                    "--format-mode",
+                    format_mode,
+                    "--search-type",
+                    "3",
+                ],
+                check=True,
             )
-            subprocess.run(mmseqs_convertalis_cmd, shell=True, check=True)
 
     # Clean up
     # Remove intermediate files
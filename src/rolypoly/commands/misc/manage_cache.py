@@ -0,0 +1,99 @@
+import rich_click as click
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# persistent stores created by rolypoly commands (see rolypoly.utils.cache)
+KNOWN_STORES = [
+    "masked_refs",
+    "reference_indices",
+    "read_samples",
+    "genome_mapping",
+    "downloads",
+]
+
+
+@click.command(name="cache")
+@click.option(
+    "-s",
+    "--store",
+    "stores",
+    multiple=True,
+    type=click.Choice(KNOWN_STORES + ["all"], case_sensitive=False),
+    default=["all"],
+    help="Which store(s) to operate on",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Root directory of the persistent caches (default: $ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)",
+)
+@click.option(
+    "--gc/--list",
+    "collect",
+    default=False,
+    help="Garbage-collect entries (--gc) or only list them (--list)",
+)
+@click.option(
+    "--max-age-days",
+    default=None,
+    type=float,
+    help="With --gc, remove entries not used in this many days",
+)
+@click.option(
+    "--max-size",
+    default=None,
+    help="With --gc, remove least recently used entries until each store is below this size (e.g. 200gb)",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="With --gc, only report what would be removed",
+)
+def manage_cache(stores, cache_dir, collect, max_age_days, max_size, dry_run):
+    """List or garbage-collect the persistent caches (masked references, reference indices, read samples, genome mapping indices, downloaded genomes).
+
+    Entries that a running job is building or reading are never removed.
+    Entries that jobs use by path for longer (e.g. reference databases
+    during a search) are not tracked, so avoid --gc while such jobs run.
+    """
+    import time
+
+    from rolypoly.utils.cache import CacheStore
+    from rolypoly.utils.various import convert_bytes_to_units, parse_memory
+
+    if "all" in stores:
+        stores = KNOWN_STORES
+    max_size_bytes = parse_memory(max_size) if max_size else None
+
+    for name in stores:
+        store = CacheStore(name, cache_dir=cache_dir)
+        if collect:
+            removed = store.gc(
+                max_age_days=max_age_days,
+                max_size=max_size_bytes,
+                dry_run=dry_run,
+            )
+            freed = sum(e["size"] for e in removed)
+            verb = "Would remove" if dry_run else "Removed"
+            console.print(
+                f"[bold]{name}[/bold]: {verb} {len(removed)} entries ({convert_bytes_to_units(freed)['megabytes']})"
+            )
+            continue
+
+        table = Table(title=f"{name} ({store.root})")
+        for column in ("key", "size", "created", "last used"):
+            table.add_column(column)
+        for entry in store.entries():
+            table.add_row(
+                entry["key"],
+                convert_bytes_to_units(entry["size"])["megabytes"],
+                time.strftime(
+                    "%Y-%m-%d %H:%M", time.localtime(entry.get("created", 0))
+                ),
+                time.strftime(
+                    "%Y-%m-%d %H:%M", time.localtime(entry.get("last_used", 0))
+                ),
+            )
+        console.print(table)
@@ -19,22 +19,52 @@ def parse_marker_results(marker_file):
         marker_file (str): Path to marker search results
 
     Returns:
-        pl.DataFrame: DataFrame with marker results
+        pl.LazyFrame: Marker results (TSV files are scanned lazily)
     """
     import json
 
     import polars as pl
 
     if marker_file.endswith(".tsv"):
-        return pl.read_csv(marker_file, separator="\t")
+        return pl.scan_csv(marker_file, separator="\t")
     elif marker_file.endswith(".json"):
         with open(marker_file) as f:
             data = json.load(f)
-        return pl.DataFrame(data)
+        return pl.DataFrame(data).lazy()
     else:
         raise ValueError(f"Unsupported file format for {marker_file}")
 
 
+def scan_hmm_tblout(tblout_file):
+    """Scan an hmmsearch tblout file.
+
+    Args:
+        tblout_file (str): Path to the tblout file
+
+    Returns:
+        pl.LazyFrame: query (sequence), target (profile), evalue, score
+    """
+    import polars as pl
+
+    fields = r"^(?<query>\S+)\s+\S+\s+(?<target>\S+)\s+\S+\s+(?<evalue>\S+)\s+(?<score>\S+)"
+    return (
+        pl.scan_csv(
+            tblout_file,
+            has_header=False,
+            separator="\x01",
+            quote_char=None,
+            schema={"line": pl.String},
+        )
+        .filter(~pl.col("line").str.starts_with("#"))
+        .select(pl.col("line").str.extract_groups(fields).alias("hit"))
+        .unnest("hit")
+        .drop_nulls("query")
+        .with_columns(
+            pl.col("evalue").cast(pl.Float64), pl.col("score").cast(pl.Float64)
+        )
+    )
+
+
 def run_genomad_hmm_search(input_fasta, output_dir, threads, logger):
     """Run genomad RNA viral HMM search.
 
@@ -45,7 +75,7 @@ def run_genomad_hmm_search(input_fasta, output_dir, threads, logger):
         logger (Logger): Logger object
 
     Returns:
-        pl.DataFrame: DataFrame with HMM search results
+        pl.LazyFrame: HMM search results (see scan_hmm_tblout)
     """
     import os
 
@@ -71,92 +101,159 @@ def run_genomad_hmm_search(input_fasta, output_dir, threads, logger):
             output_format="tblout",
         )
 
-        # Parse results
-        results = []
-        with open(output_file) as f:
-            for line in f:
-                if line.startswith("#"):
-                    continue
-                parts = line.split()
-                if len(parts) >= 5:
-                    results.append(
-                        {
-                            "query": parts[0],
-                            "target": parts[2],
-                            "evalue": float(parts[4]),
-                            "score": float(parts[5]),
-                        }
-                    )
-
-        return pl.DataFrame(results)
+        return scan_hmm_tblout(str(output_file))
     except Exception as e:
         logger.error(f"HMM search failed: {e}")
-        return pl.DataFrame()
+        return pl.LazyFrame(
+            schema={
+                "query": pl.String,
+                "target": pl.String,
+                "evalue": pl.Float64,
+                "score": pl.Float64,
+            }
+        )
+
 
+def assign_taxonomy(sequence_ids, markers, hmm_results, min_score=50):
+    """Assign taxonomy to every sequence based on marker and HMM results.
 
-def assign_taxonomy(sequence_id, markers, hmm_results, min_score=50):
-    """Assign taxonomy based on marker and HMM results.
+    All sequences are assigned in one pass: the hit tables are aggregated
+    per query with group_by and joined to the sequence IDs.
+
+    - The best RdRP marker (by score) sets the taxonomy (its ``taxonomy``
+      column, if any, else "RNA virus") and a confidence of score/100 (at most 1).
+    - genomad HMM hits (score >= min_score) are added as evidence, best
+      first. If the confidence is below 0.8 they replace it, one hit after
+      the other, with min(0.8, score/100).
+    - Other markers are added as evidence in input order. If the confidence
+      is below 0.6 they replace it the same way, with min(0.6, score/100).
 
     Args:
-        sequence_id (str): Sequence identifier
-        markers (pl.DataFrame): Marker search results
-        hmm_results (pl.DataFrame): HMM search results
-        min_score (float): Minimum score threshold
+        sequence_ids (pl.LazyFrame): Sequence identifiers (column ``sequence_id``)
+        markers (pl.LazyFrame | None): Marker search results (query, target, score[, taxonomy])
+        hmm_results (pl.LazyFrame): HMM search results (query, target, score)
+        min_score (float): Minimum score threshold of the HMM hits
 
     Returns:
-        dict: Taxonomy assignment
+        pl.DataFrame: sequence_id, taxonomy, confidence, evidence (list), in sequence order
     """
     import polars as pl
 
-    # Filter results by score
-    seq_markers = markers.filter(pl.col("query") == sequence_id)
-    seq_hmms = hmm_results.filter(
-        (pl.col("query") == sequence_id) & (pl.col("score") >= min_score)
-    )
+    def _percent(column):
+        # score/100 rounded as in Python (polars divides by a scalar through
+        # its reciprocal, which can be off by one ulp)
+        return pl.col(column).map_batches(
+            lambda s: s.cast(pl.Float64).to_numpy() / 100,
+            return_dtype=pl.Float64,
+        )
 
-    # Initialize taxonomy assignment
-    tax = {
-        "sequence_id": sequence_id,
-        "confidence": 0.0,
-        "taxonomy": "Unknown",
-        "evidence": [],
-    }
+    def _confidence_updates(hits, cap, order_by, descending):
+        # a confidence below cap is overwritten by each hit in turn and
+        # sticks once a hit reaches cap: cap if any does, else the last hit
+        return (
+            hits.with_columns(_percent("score").alias("_percent"))
+            .group_by("query")
+            .agg(
+                pl.col("target")
+                .sort_by(order_by, descending=descending, maintain_order=True)
+                .alias("targets"),
+                pl.when((pl.col("_percent") >= cap).any())
+                .then(pl.lit(cap))
+                .otherwise(
+                    pl.col("_percent")
+                    .sort_by(
+                        order_by, descending=descending, maintain_order=True
+                    )
+                    .last()
+                )
+                .alias("confidence"),
+            )
+        )
 
-    # Look for RdRP markers first (highest confidence)
-    rdrp_markers = seq_markers.filter(
-        pl.col("target").str.contains("RdRP|RdRp|rdrp")
+    ids = sequence_ids.select("sequence_id").with_row_index("_order")
+    hmms = hmm_results.filter(pl.col("score") >= min_score)
+    hmm_hits = _confidence_updates(hmms, 0.8, "score", True)
+
+    if markers is None or not markers.collect_schema().names():
+        markers = pl.LazyFrame(
+            schema={
+                "query": pl.String,
+                "target": pl.String,
+                "score": pl.Float64,
+            }
+        )
+    has_taxonomy = "taxonomy" in markers.collect_schema().names()
+    markers = markers.with_row_index("_row").with_columns(
+        pl.col("target").str.contains("RdRP|RdRp|rdrp").alias("_rdrp"),
+        _percent("score").alias("_percent"),
     )
-    if not rdrp_markers.is_empty():
-        best_hit = rdrp_markers.sort("score", descending=True).row(0)
-        tax["taxonomy"] = (
-            best_hit["taxonomy"] if "taxonomy" in best_hit else "RNA virus"
+    best = pl.col("score").arg_max()
+    rdrp_hits = (
+        markers.filter("_rdrp")
+        .group_by("query")
+        .agg(
+            pl.col("target").get(best).alias("rdrp_target"),
+            pl.col("_percent").get(best).alias("rdrp_confidence"),
+            (
+                pl.col("taxonomy").get(best).cast(pl.String)
+                if has_taxonomy
+                else pl.lit(None, dtype=pl.String)
+            ).alias("rdrp_taxonomy"),
         )
-        tax["confidence"] = min(1.0, best_hit["score"] / 100)
-        tax["evidence"].append(f"RdRP marker: {best_hit['target']}")
-
-    # Check genomad HMM results
-    if not seq_hmms.is_empty():
-        hmm_hits = seq_hmms.sort("score", descending=True)
-        for hit in hmm_hits.iter_rows():
-            tax["evidence"].append(f"RNA viral marker: {hit['target']}")
-            if (
-                tax["confidence"] < 0.8
-            ):  # Only update if current confidence is low
-                tax["confidence"] = min(0.8, hit["score"] / 100)
-
-    # Check other viral markers
-    other_markers = seq_markers.filter(
-        ~pl.col("target").str.contains("RdRP|RdRp|rdrp")
     )
-    if not other_markers.is_empty():
-        for hit in other_markers.iter_rows():
-            tax["evidence"].append(f"Other marker: {hit['target']}")
-            if (
-                tax["confidence"] < 0.6
-            ):  # Only update if current confidence is low
-                tax["confidence"] = min(0.6, hit["score"] / 100)
+    other_hits = _confidence_updates(
+        markers.filter(~pl.col("_rdrp")), 0.6, "_row", False
+    )
 
-    return tax
+    rdrp_found = pl.col("rdrp_target").is_not_null()
+    after_rdrp = (
+        pl.when(rdrp_found)
+        .then(pl.min_horizontal(pl.lit(1.0), pl.col("rdrp_confidence")))
+        .otherwise(pl.lit(0.0))
+    )
+    after_hmm = (
+        pl.when(pl.col("targets").is_not_null() & (after_rdrp < 0.8))
+        .then(pl.col("confidence"))
+        .otherwise(after_rdrp)
+    )
+    after_other = (
+        pl.when(pl.col("targets_other").is_not_null() & (after_hmm < 0.6))
+        .then(pl.col("confidence_other"))
+        .otherwise(after_hmm)
+    )
+    evidence = pl.concat_list(
+        pl.when(rdrp_found)
+        .then(pl.concat_list(pl.lit("RdRP marker: ") + pl.col("rdrp_target")))
+        .otherwise(pl.lit([], dtype=pl.List(pl.String))),
+        pl.col("targets")
+        .fill_null(pl.lit([], dtype=pl.List(pl.String)))
+        .list.eval(pl.lit("RNA viral marker: ") + pl.element()),
+        pl.col("targets_other")
+        .fill_null(pl.lit([], dtype=pl.List(pl.String)))
+        .list.eval(pl.lit("Other marker: ") + pl.element()),
+    )
+    return (
+        ids.join(rdrp_hits, left_on="sequence_id", right_on="query", how="left")
+        .join(hmm_hits, left_on="sequence_id", right_on="query", how="left")
+        .join(
+            other_hits,
+            left_on="sequence_id",
+            right_on="query",
+            how="left",
+            suffix="_other",
+        )
+        .sort("_order")
+        .select(
+            "sequence_id",
+            pl.when(rdrp_found)
+            .then(pl.col("rdrp_taxonomy").fill_null("RNA virus"))
+            .otherwise(pl.lit("Unknown"))
+            .alias("taxonomy"),
+            after_other.alias("confidence"),
+            evidence.alias("evidence"),
+        )
+        .collect()
+    )
 
 
 def summarize_taxonomy(assignments):
@@ -225,7 +322,6 @@ def quick_taxonomy(
     import json
 
     import polars as pl
-    from needletail import parse_fastx_file
     from rich.table import Table
 
     from rolypoly.utils.logging.loggit import log_start_info, setup_logging
@@ -237,11 +333,12 @@ def quick_taxonomy(
     output_path = Path(output)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    sequences = []
-    for record in parse_fastx_file(input):
-        sequences.append({"id": record.id, "seq": record.seq})  # type: ignore
+    from rolypoly.utils.bio.polars_fastx import scan_fastx_headers
 
-    if not sequences:
+    sequence_ids = scan_fastx_headers(input).select(
+        pl.col("header").alias("sequence_id")
+    )
+    if sequence_ids.head(1).collect().is_empty():
         logger.error(f"No sequences found in {input}")
         return
 
@@ -259,15 +356,10 @@ def quick_taxonomy(
 
     # Assign taxonomy
     logger.info("Assigning taxonomy...")
-    assignments = []
-    for seq in sequences:
-        tax = assign_taxonomy(
-            seq["id"],
-            markers_df if markers_df is not None else pl.DataFrame(),
-            hmm_results,
-            min_score,
-        )
-        assignments.append(tax)
+    assignments_df = assign_taxonomy(
+        sequence_ids, markers_df, hmm_results, min_score
+    )
+    assignments = assignments_df.to_dicts()
 
     # Generate summary if requested
     if summarize:
@@ -283,20 +375,9 @@ def quick_taxonomy(
             json.dump(results, f, indent=2)
 
     elif format == "tsv":
-        # Flatten assignments for TSV
-        flat_assignments = []
-        for assign in assignments:
-            flat_assign = {
-                "sequence_id": assign["sequence_id"],
-                "taxonomy": assign["taxonomy"],
-                "confidence": assign["confidence"],
-                "evidence": ";".join(assign["evidence"]),
-            }
-            flat_assignments.append(flat_assign)
-
-        pl.DataFrame(flat_assignments).write_csv(
-            output_path / "taxonomy_assignments.tsv", separator="\t"
-        )
+        assignments_df.with_columns(
+            pl.col("evidence").list.join(";")
+        ).write_csv(output_path / "taxonomy_assignments.tsv", separator="\t")
 
         if summarize:
             with open(output_path / "taxonomy_summary.tsv", "w") as f:
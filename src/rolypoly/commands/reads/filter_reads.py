@@ -32,6 +32,7 @@ class ReadFilterConfig(BaseConfig):
             input=kwargs.get("input") or "",
             output=kwargs.get("output") or "",
             temp_dir=kwargs.get("temp_dir") or "",
+            temp_tiers=kwargs.get("temp_tiers") or None,
             keep_tmp=kwargs.get("keep_tmp") or False,
             log_file=kwargs.get("log_file") or None,
             threads=kwargs.get("threads") or 1,
@@ -114,6 +115,10 @@ class ReadFilterConfig(BaseConfig):
         self.max_genomes = (
             kwargs.get("max_genomes") or 5
         )  # maximum number of potential host genomes to fetch
+        # persistent caches (downloaded genomes, masked references); with
+        # cache=False downloads are kept in the temp dir for this run only
+        self.cache = kwargs.get("cache", True)
+        self.cache_dir = kwargs.get("cache_dir") or None
         if kwargs.get("override_parameters") is not None:
             self.logger.info(
                 f"override_parameters: {kwargs.get('override_parameters')}"
@@ -227,6 +232,12 @@ def process_reads(
                     current_input = expected_output
                     continue
 
+                # bbtools steps write roughly one more copy of their input
+                if Path(current_input).exists():
+                    config.ensure_temp_space(
+                        2 * Path(current_input).stat().st_size, step_name
+                    )
+
                 signal.signal(signal.SIGALRM, timeout_handler)
                 signal.alarm(config.step_timeout)  # Set timeout to 10min
 
@@ -412,6 +423,11 @@ If --input is a directory, all fastq files in the directory will be used - paire
     hidden=True,
     help="Directory for temporary files. If not provided, will create one inside the output directory.",
 )
+@click.option(
+    "--temp-tiers",
+    default=None,
+    help="Colon-separated candidate locations for temporary files, fastest first (e.g. /dev/shm:/local/scratch). The first with enough free space is used and later steps spill to the next one when it fills up; the output directory is always the last resort. Defaults to $ROLYPOLY_TMP_TIERS.",
+)
 @click.option(
     "-mg",
     "--max-genomes",
@@ -419,6 +435,16 @@ If --input is a directory, all fastq files in the directory will be used - paire
     hidden=True,
     help="Maximum number of genomes to keep in the output. Example: --max-genomes 10",
 )
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Reuse (and store) fetched host genomes and their masked versions in the persistent caches. With --no-cache, genomes are downloaded into the temporary directory for this run only",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Root directory of the persistent caches (default: $ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)",
+)
 def filter_reads(
     threads,
     memory,
@@ -439,6 +465,9 @@ def filter_reads(
     log_level,
     max_genomes,
     temp_dir,
+    temp_tiers,
+    cache,
+    cache_dir,
 ):
     """
     Process RNA-seq (transcriptome, RNA virome, metatranscriptomes) Illumina raw reads.
@@ -474,7 +503,10 @@ def filter_reads(
             log_level=log_level,
             max_genomes=max_genomes,
             temp_dir=temp_dir,
+            temp_tiers=temp_tiers,
             zip_reports=zip_reports,
+            cache=cache,
+            cache_dir=cache_dir,
         )
 
     if config.known_dna is None:
@@ -549,7 +581,9 @@ def process_input_fastq(config: ReadFilterConfig) -> tuple[Path, str]:
     final_interleaved = config.output_dir / "concat_interleaved.fq.gz"
 
     # file detection functions now sourced from seperate script (21.08.2025)
-    file_info = handle_input_fastq(config.input, logger=config.logger)
+    file_info = handle_input_fastq(
+        config.input, logger=config.logger, cache_dir=config.cache_dir
+    )
     file_name = file_info.get("file_name", "rolypoly_filtered_reads")
 
     # Process paired-end files
@@ -755,8 +789,8 @@ def fetch_and_mask_genomes(config: ReadFilterConfig) -> Union[str, Path]:
     abs_gbs_file = (fetched_dna_dir / "gbs_50m.fasta").absolute()
 
     if "filter_identified_dna" not in config.skip_steps:
-        stats_file = Path(
-            config.temp_dir / f"stats_decontaminate_rrna_{config.file_name}.txt"
+        stats_file = config.find_temp_file(
+            f"stats_decontaminate_rrna_{config.file_name}.txt"
         ).absolute()
         if not stats_file.exists():
             config.logger.warning(
@@ -788,6 +822,9 @@ def fetch_and_mask_genomes(config: ReadFilterConfig) -> Union[str, Path]:
             output_file=str(abs_gbs_file),
             max_genomes=config.max_genomes,
             threads=config.threads,
+            cache_dir=config.cache_dir
+            if config.cache
+            else str(config.temp_dir / "fetched_dna" / "cache"),
             logger=config.logger,
         )
         if not abs_gbs_file.exists() or abs_gbs_file.stat().st_size < 20:
@@ -815,6 +852,8 @@ def fetch_and_mask_genomes(config: ReadFilterConfig) -> Union[str, Path]:
             "mask_low_complexity": True,
             "flatten": False,
             "input": str(abs_gbs_file),
+            "cache": config.cache,
+            "cache_dir": config.cache_dir,
         }
         context = click.Context(mask_dna, ignore_unknown_options=True)
         context.invoke(mask_dna, **mask_args)
@@ -1225,9 +1264,12 @@ def cleanup_and_move_files(
     config.save(run_info_dir / "rp_filter_reads_config.json")
     output_tracker.to_csv(run_info_dir / "output_tracker.csv")
 
+    # temporary files may be spread over several tiers (see BaseConfig)
+    temp_dirs = [Path(d).resolve() for d in config.workspace.dirs] or [temp_dir]
+
     # Move fastqc/falco reports to run_info
     for pattern in ["*fastqc*", "falco*"]:
-        for qc_dir in temp_dir.glob(pattern):
+        for qc_dir in (p for d in temp_dirs for p in d.glob(pattern)):
             if qc_dir.exists():
                 # breakpoint()
                 config.logger.info(f"Moving {qc_dir} to run_info")
@@ -1241,7 +1283,7 @@ def cleanup_and_move_files(
 
     # Move all stats and adapter files to run_info
     for pattern in ["stats_*.txt", "out_adapter_*.txt"]:
-        for stat_file in temp_dir.glob(pattern):
+        for stat_file in (p for d in temp_dirs for p in d.glob(pattern)):
             if stat_file.exists():
                 try:
                     shutil.move(
@@ -1271,7 +1313,7 @@ def cleanup_and_move_files(
 
     # If keeping temporary files, move fetched_dna to run_info
     if config.keep_tmp:
-        fetched_dna_dir = temp_dir / "fetched_dna"
+        fetched_dna_dir = config.find_temp_file("fetched_dna")
         if fetched_dna_dir.exists():
             try:
                 target = run_info_dir / "fetched_dna"
@@ -1286,9 +1328,9 @@ def cleanup_and_move_files(
     # Clean up temporary directory if not keeping it
     if not config.keep_tmp and temp_dir != output_dir:
         try:
-            shutil.rmtree(temp_dir)
+            config.workspace.cleanup()
             config.logger.info(
-                f"Temporary directory {temp_dir} cleaned up and removed"
+                f"Temporary directories {', '.join(map(str, temp_dirs))} cleaned up and removed"
             )
         except Exception as e:
             config.logger.error(f"Error removing temporary directory: {str(e)}")
@@ -1,6 +1,7 @@
 import os
 import shutil
 from pathlib import Path
+from typing import Dict, Tuple, Union
 
 import rich_click as click
 
@@ -13,6 +14,11 @@ from rolypoly.utils.various import (  # TODO: Replace sp.run with run_command_co
     run_command_comp,
 )
 
+# bump when the masking pipeline changes in a way that alters its output
+MASKED_STORE_VERSION = 1
+MASKED_STORE_NAME = "masked_refs"
+MASKED_FASTA_NAME = "masked.fasta"
+
 global datadir
 datadir = Path(
     os.environ.get("ROLYPOLY_DATA_DIR", "")
@@ -54,6 +60,16 @@ datadir = Path(
     default=None,
     help="Temporary directory to use (default: output file's parent/tmp - if you have enough RAM, you can set this to /dev/shm/ or /tmp/ for faster I/O)",
 )
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    help="Reuse (and store) masked references from the persistent masked-reference store, keyed by the input/reference content and masking parameters",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Root directory of the persistent caches (default: $ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)",
+)
 def mask_dna(
     threads,
     memory,
@@ -64,6 +80,8 @@ def mask_dna(
     reference,
     mask_low_complexity,
     tmpdir,
+    cache,
+    cache_dir,
 ):
     """Mask an input fasta file for sequences that could be RNA viral (or mistaken for such).
 
@@ -76,6 +94,8 @@ def mask_dna(
       aligner: (str) Which tool to use for identifying shared sequence (minimap2, mmseqs2, diamond, bowtie1, bbmap)
       reference: (str) Provide an input fasta file to be used for masking, instead of the pre-generated collection of RNA viral sequences
       mask_low_complexity: (bool) Whether to mask low complexity regions using bbduks entropy masking
+      cache: (bool) Reuse/store the result in the persistent masked-reference store
+      cache_dir: (str) Root directory of the persistent caches
 
     Returns:
       None
@@ -90,14 +110,107 @@ def mask_dna(
         logger.error(
             f"{aligner} not recognised as one of minimap2, mmseqs2, diamond, bowtie1 or bbmap"
         )
-        exit
-    needs_bbmask_only = aligner in ["bowtie1", "bbmap", "mmseqs2"]
+        return
     memory = ensure_memory(memory)["giga"]
     reference = Path(reference).absolute().resolve()
     if tmpdir is None:
         tmpdir = output_file.parent / "tmp_mask_dna"
     tmpdir = Path(tmpdir).absolute().resolve()
-    Path.mkdir(Path(tmpdir), exist_ok=True)
+
+    if not cache:
+        Path.mkdir(Path(tmpdir), exist_ok=True)
+        last_file = run_masking(
+            input_file=input_file,
+            tmpdir=tmpdir,
+            aligner=aligner,
+            reference=reference,
+            threads=threads,
+            memory=memory,
+            mask_low_complexity=mask_low_complexity,
+            flatten=flatten,
+        )
+        os.rename(f"{last_file}", output_file)  # this is like mv i think...
+        shutil.rmtree("ref", ignore_errors=True)
+        shutil.rmtree(str(tmpdir), ignore_errors=True)
+        logger.info(f"Masking completed. Output saved to {output_file}")
+        return
+
+    from rolypoly.utils.cache import CacheStore
+
+    key, key_params = masked_reference_key(
+        input_file, reference, aligner, mask_low_complexity, flatten
+    )
+
+    def _build(entry_dir: Path) -> None:
+        Path.mkdir(Path(tmpdir), exist_ok=True)
+        last_file = run_masking(
+            input_file=input_file,
+            tmpdir=tmpdir,
+            aligner=aligner,
+            reference=reference,
+            threads=threads,
+            memory=memory,
+            mask_low_complexity=mask_low_complexity,
+            flatten=flatten,
+        )
+        shutil.move(str(last_file), entry_dir / MASKED_FASTA_NAME)
+        shutil.rmtree("ref", ignore_errors=True)
+        shutil.rmtree(str(tmpdir), ignore_errors=True)
+
+    store = CacheStore(MASKED_STORE_NAME, cache_dir=cache_dir, logger=logger)
+    # a copy, not a link: the output is the user's to modify
+    with store.use(key, _build, params=key_params) as entry:
+        Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry / MASKED_FASTA_NAME, output_file)
+    logger.info(f"Masking completed. Output saved to {output_file}")
+
+
+def masked_reference_key(
+    input_file: Union[str, Path],
+    reference: Union[str, Path],
+    aligner: str,
+    mask_low_complexity: bool,
+    flatten: bool,
+) -> Tuple[str, Dict[str, object]]:
+    """Key of a masked reference in the masked-reference store.
+
+    The key covers the content of the FASTA being masked and of the decoy
+    set it is masked against, plus every parameter that changes the output.
+
+    Returns:
+        Tuple of (key, parameters recorded in the entry metadata)
+    """
+    from rolypoly.utils.cache import file_digest, hash_key
+
+    params = {
+        "store_version": MASKED_STORE_VERSION,
+        "input": str(input_file),
+        "input_digest": file_digest(input_file),
+        "reference": str(reference),
+        "reference_digest": file_digest(reference),
+        "aligner": aligner,
+        "mask_low_complexity": bool(mask_low_complexity),
+        "flatten": bool(flatten),
+    }
+    key_fields = {
+        k: v for k, v in params.items() if k not in ("input", "reference")
+    }
+    return hash_key(key_fields), params
+
+
+def run_masking(
+    input_file: Path,
+    tmpdir: Path,
+    aligner: str,
+    reference: Path,
+    threads: int,
+    memory: str,
+    mask_low_complexity: bool,
+    flatten: bool,
+) -> Path:
+    """Run the alignment + masking steps and return the final masked file (inside tmpdir)."""
+    logger = get_logger()
+    needs_bbmask_only = aligner in ["bowtie1", "bbmap", "mmseqs2"]
 
     if aligner == "minimap2":
         logger.info("Using minimap2 (low memory mode)")
@@ -131,7 +244,6 @@ def mask_dna(
         logger.info(
             f"Masking completed. Output saved to {tmpdir}/tmp_masked.fasta"
         )
-        shutil.rmtree(f"{tmpdir}", ignore_errors=True)
     elif aligner == "bowtie1":
         import subprocess as sp
 
@@ -300,8 +412,4 @@ def mask_dna(
         )
         last_file = f"{tmpdir}/tmp_masked_mle_flat.fa"
 
-    os.rename(f"{last_file}", output_file)  # this is like mv i think...
-    shutil.rmtree("ref", ignore_errors=True)
-    shutil.rmtree(str(tmpdir), ignore_errors=True)
-
-    logger.info(f"Masking completed. Output saved to {output_file}")
+    return Path(last_file)
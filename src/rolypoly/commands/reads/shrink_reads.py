@@ -41,6 +41,31 @@ from rolypoly.utils.logging.loggit import log_start_info, setup_logging
     type=click.FLOAT,
     help="Will only return (at most) this much reads (if <1, will be interpreted as a proportion of total reads, else as the exact number of reads to get)",
 )
+@click.option(
+    "-t",
+    "--threads",
+    default=1,
+    type=int,
+    help="Number of threads. Files are processed in parallel worker processes, left-over threads go to pigz for compressed output.",
+)
+@click.option(
+    "--seed",
+    default=42,
+    type=int,
+    help="Base random seed. Each file gets its own seed derived from this and its path, so results don't depend on processing order.",
+)
+@click.option(
+    "-z",
+    "--compress",
+    is_flag=True,
+    default=False,
+    help="Write gzipped output (.fastq.gz), with pigz when available.",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Root directory of the persistent caches (read counts, library probes; default: $ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)",
+)
 @click.option(
     "-g",
     "--log-file",
@@ -60,17 +85,24 @@ def shrink_reads(
     output,
     subset_type,
     sample_size,
-    # threads, # TODO: no real threading support yet, maybe will have it if multiple input files are used (one per thread)
+    threads,
+    seed,
+    compress,
+    cache_dir,
     log_file,
     log_level,
 ):
     """
     Subsets data from an input FASTQ file(s) based on the provided options.
-    Supports random sampling (when sample_size < 1) and fixed number read sampling
-    (i.e. first n reads)
-    NOTE: UNLESS --keep-matching-pairs is used, the output may not be very useful in practice.
-    TODO: no real threading support yet, maybe will have it if multiple input files are used (one per thread)
+    Supports random sampling and first-n-reads sampling, either of a fixed
+    number of reads (sample_size >= 1) or of a proportion (sample_size < 1).
+    Mates of paired (R1/R2 or interleaved) inputs are kept together.
+    Multiple input files are processed in parallel, and a summary table of
+    input/output read and base counts (both counting every mate of a pair)
+    is written to the output directory.
     """
+    import polars as pl
+
     # Initialise logger
     logger = setup_logging(log_file=log_file, log_level=log_level)
     log_start_info(logger, locals())
@@ -78,64 +110,102 @@ def shrink_reads(
     # Ensure output directory exists
     output_dir = Path(output).resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = ".fastq.gz" if compress else ".fastq"
 
     try:
         logger.info("Starting read processing")
         # Detect and organise input FASTQ files
-        file_info = handle_input_fastq(input, logger=logger)
+        file_info = handle_input_fastq(
+            input, logger=logger, cache_dir=cache_dir
+        )
         logger.debug(f"Detected file info: {file_info}")
 
-        # Process single‑end files
+        jobs = []
         for file_path in file_info.get("single_end_files", []):
             file_path = Path(file_path)
-            logger.info(f"Processing file: {file_path}")
-            output_file = output_dir / f"{file_path.stem}_shrinked.fastq"
-            create_sample_file(
-                file_path,
-                subset_type=subset_type,
-                sample_size=sample_size,
-                logger=logger,
-                output_file=output_file,
+            jobs.append(
+                {
+                    "file_path": str(file_path),
+                    "output_file": str(
+                        output_dir / f"{file_path.stem}_shrinked{suffix}"
+                    ),
+                    "interleaved": False,
+                }
             )
-            logger.info(f"Written shrinked reads to {output_file}")
-
-        # Process paired‑end files
         for r1_path, r2_path in file_info.get("R1_R2_pairs", []):
-            # print("a")
-            logger.info(f"Processing paired-end files: {r1_path} and {r2_path}")
-            logger.debug("""Note - to ensure paired reads are sampled, this will be slow (i.e. if reads_x/1 was selected from file R1, and his pair reads_x/2 is at the bottom of the R2 file, I can't think of a method to get it without going over all of R2 (if compressed). 
-                         However, read order is usually assumed to be the same for R1 and R2...
-                         """)
-
-            logger.info(f"Sampling {sample_size} from {r1_path}")
-            output_R1_file = output_dir / f"{r1_path.stem}_shrinked_R1.fastq"
-            output_R2_file = output_dir / f"{r1_path.stem}_shrinked_R2.fastq"
-            # breakpoint()
-            output_file = str(output_R1_file) + "," + str(output_R2_file)
-            create_sample_file(
-                file_path=str(r1_path) + "," + str(r2_path),
-                subset_type=subset_type,
-                sample_size=sample_size,
-                logger=logger,
-                output_file=output_file,
+            r1_path = Path(r1_path)
+            output_R1_file = output_dir / f"{r1_path.stem}_shrinked_R1{suffix}"
+            output_R2_file = output_dir / f"{r1_path.stem}_shrinked_R2{suffix}"
+            jobs.append(
+                {
+                    "file_path": f"{r1_path},{r2_path}",
+                    "output_file": f"{output_R1_file},{output_R2_file}",
+                    "interleaved": False,
+                }
             )
-
-            logger.info(
-                f"Written shrinked reads to {output_R1_file} and {output_R2_file}"
-            )
-        # Process interleaved files
         for file_path in file_info.get("interleaved_files", []):
             file_path = Path(file_path)
-            logger.info(f"Processing file: {file_path}")
-            output_file = output_dir / f"{file_path.stem}_shrinked.fastq"
-            create_sample_file(
-                file_path,
+            jobs.append(
+                {
+                    "file_path": str(file_path),
+                    "output_file": str(
+                        output_dir / f"{file_path.stem}_shrinked{suffix}"
+                    ),
+                    "interleaved": True,
+                }
+            )
+        if not jobs:
+            logger.warning(f"No FASTQ files found in {input}")
+            return
+
+        sample_size = sample_size if sample_size < 1 else int(sample_size)
+        workers = max(1, min(threads, len(jobs)))
+        compress_threads = max(1, threads // workers)
+        for job in jobs:
+            job.update(
                 subset_type=subset_type,
                 sample_size=sample_size,
-                logger=logger,
-                output_file=output_file,
+                seed=file_seed(seed, job["file_path"], input),
+                compress_threads=compress_threads,
+                cache_dir=cache_dir,
             )
-            logger.info(f"Written shrinked reads to {output_file}")
+        logger.info(
+            f"Shrinking {len(jobs)} input(s) with {workers} worker(s), {compress_threads} compression thread(s) each"
+        )
+
+        results = []
+        if workers == 1:
+            for job in jobs:
+                results.append(_shrink_one(job))
+                logger.info(f"Written shrinked reads to {job['output_file']}")
+        else:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_shrink_one, job): job for job in jobs
+                }
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    logger.info(
+                        f"Written shrinked reads to {futures[future]['output_file']}"
+                    )
+
+        summary = pl.DataFrame(
+            results,
+            schema={
+                "input_file": pl.String,
+                "output_file": pl.String,
+                "seed": pl.Int64,
+                "input_reads": pl.Int64,
+                "input_bases": pl.Int64,
+                "sampled_reads": pl.Int64,
+                "sampled_bases": pl.Int64,
+            },
+        ).sort("input_file")
+        summary_file = output_dir / "shrink_reads_summary.tsv"
+        summary.write_csv(summary_file, separator="\t")
+        logger.info(f"Summary table: {summary_file}")
 
         logger.info("Finished read processing")
         logger.info(f"Output: {output_dir}")
@@ -143,3 +213,48 @@ def shrink_reads(
     except Exception as e:
         logger.error(f"An error occurred during read processing: {e}")
         raise
+
+
+def file_seed(base_seed: int, file_path: str, input_root=None) -> int:
+    """Per-file seed that only depends on the base seed and the file path.
+
+    Files found in an input directory are keyed by their path relative to
+    it, so same-named files in different subdirectories get different
+    seeds; a file given directly is keyed by its name.
+    """
+    import zlib
+
+    path = Path(file_path.split(",")[0])
+    key = path.name
+    if input_root and Path(input_root).is_dir():
+        try:
+            key = path.resolve().relative_to(Path(input_root).resolve())
+        except ValueError:
+            pass
+    return (
+        base_seed * 1_000_003 + zlib.crc32(Path(key).as_posix().encode())
+    ) % (2**32)
+
+
+def _shrink_one(job: dict) -> dict:
+    """Worker: sample one input (single, interleaved or an R1,R2 pair)."""
+    stats = create_sample_file(
+        job["file_path"],
+        subset_type=job["subset_type"],
+        sample_size=job["sample_size"],
+        output_file=job["output_file"],
+        interleaved=job["interleaved"],
+        seed=job["seed"],
+        compress_threads=job["compress_threads"],
+        cache_dir=job["cache_dir"],
+    )
+    # input counts stay empty for top_reads, which stops reading early
+    return {
+        "input_file": job["file_path"],
+        "output_file": job["output_file"],
+        "seed": job["seed"],
+        "input_reads": stats["input_reads"],
+        "input_bases": stats["input_bases"],
+        "sampled_reads": stats["sampled_reads"],
+        "sampled_bases": stats["sampled_bases"],
+    }
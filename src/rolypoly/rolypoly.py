@@ -43,6 +43,7 @@ CONTEXT_SETTINGS = dict(
             "commands": {
                 "get-data": "rolypoly.commands.misc.get_external_data.get_data",
                 "version": "rolypoly.rolypoly.version",
+                "cache": "rolypoly.commands.misc.manage_cache.manage_cache",
                 # "build-data": "rolypoly.commands.misc.build_data.build_data", # this is for dev work.
             },
         },
@@ -67,9 +68,10 @@ CONTEXT_SETTINGS = dict(
             "commands": {
                 "assemble": "rolypoly.commands.assembly.assemble.assembly",
                 "filter-contigs": "rolypoly.commands.assembly.filter_contigs.filter_contigs",
+                "contig-coverage": "rolypoly.commands.assembly.contig_coverage.contig_coverage",
+                "refine": "rolypoly.commands.assembly.refinement.refinement",
                 # Commenting out unimplemented commands
                 # "co-assembly": "rolypoly.commands.assembly.co_assembly.co_assembly",
-                # "refine": "rolypoly.commands.assembly.refinement.refine"
             },
         },
         "misc": {
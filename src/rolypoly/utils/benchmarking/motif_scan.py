@@ -0,0 +1,128 @@
+"""
+Throughput of the lightmotif motif scan against a naive NumPy PWM scan.
+
+Builds random motifs and synthetic genomes, scans them with both
+implementations and checks that they report the same hits.
+
+    python -m rolypoly.utils.benchmarking.motif_scan --genomes 20 --length 30000
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+
+def random_motifs(n_motifs=20, width_range=(6, 16), sites=30, seed=0):
+    """Motifs built from random sites with a conserved core."""
+    import lightmotif
+
+    from rolypoly.utils.bio.motif_scan import ScanMotif
+
+    rng = random.Random(seed)
+    motifs = []
+    for i in range(n_motifs):
+        width = rng.randint(*width_range)
+        consensus = [rng.choice("ACGT") for _ in range(width)]
+        instances = [
+            "".join(
+                base if rng.random() < 0.8 else rng.choice("ACGT")
+                for base in consensus
+            )
+            for _ in range(sites)
+        ]
+        pssm = lightmotif.create(instances).counts.normalize(0.25).log_odds()
+        motifs.append(
+            ScanMotif(
+                name=f"motif_{i}",
+                description="",
+                pssm=pssm,
+                reverse=pssm.reverse_complement(),
+                width=width,
+            )
+        )
+    return motifs
+
+
+def synthetic_genomes(n_genomes=20, length=30000, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        (f"genome_{i}", "".join(rng.choice(list("ACGU"), size=length).tolist()))
+        for i in range(n_genomes)
+    ]
+
+
+def naive_scan(records, motifs, pvalue=1e-4):
+    """The scan_sequences hits (without p-values) from naive_pwm_scores."""
+    from rolypoly.utils.bio.motif_scan import encode_sequence, naive_pwm_scores
+
+    hits = []
+    for record_id, sequence in records:
+        encoded = encode_sequence(sequence)
+        for motif in motifs:
+            cutoff = motif.threshold(pvalue)
+            for strand, pssm in (("+", motif.pssm), ("-", motif.reverse)):
+                scores = naive_pwm_scores(encoded, list(pssm))  # pyright: ignore
+                for position in np.flatnonzero(scores >= cutoff):
+                    hits.append(
+                        (record_id, motif.name, int(position) + 1, strand)
+                    )
+    return hits
+
+
+def benchmark_motif_scan(
+    n_genomes=20, length=30000, n_motifs=20, pvalue=1e-4, seed=0
+):
+    """Time both scans on the same input.
+
+    Returns:
+        dict: nucleotides, hits, seconds and nt/s of each implementation,
+            and whether the hit sets agree
+    """
+    from rolypoly.utils.bio.motif_scan import scan_sequences
+
+    records = synthetic_genomes(n_genomes, length, seed)
+    motifs = random_motifs(n_motifs, seed=seed)
+    nucleotides = n_genomes * length
+
+    started = time.perf_counter()
+    fast = list(scan_sequences(records, motifs, pvalue=pvalue))
+    fast_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    naive = naive_scan(records, motifs, pvalue=pvalue)
+    naive_seconds = time.perf_counter() - started
+
+    fast_set = {(hit[0], hit[1], hit[3], hit[5]) for hit in fast}
+    return {
+        "nucleotides": nucleotides,
+        "motifs": n_motifs,
+        "hits": len(fast),
+        "lightmotif_seconds": fast_seconds,
+        "lightmotif_nt_per_s": nucleotides * n_motifs / fast_seconds,
+        "naive_seconds": naive_seconds,
+        "naive_nt_per_s": nucleotides * n_motifs / naive_seconds,
+        "speedup": naive_seconds / fast_seconds,
+        # hits right at the threshold may differ by float rounding
+        "agreement": len(fast_set & set(naive))
+        / max(len(fast_set | set(naive)), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--genomes", type=int, default=20)
+    parser.add_argument("--length", type=int, default=30000)
+    parser.add_argument("--motifs", type=int, default=20)
+    parser.add_argument("--pvalue", type=float, default=1e-4)
+    args = parser.parse_args()
+    result = benchmark_motif_scan(
+        args.genomes, args.length, args.motifs, args.pvalue
+    )
+    for key, value in result.items():
+        print(
+            f"{key}\t{value:.4g}"
+            if isinstance(value, float)
+            else f"{key}\t{value}"
+        )
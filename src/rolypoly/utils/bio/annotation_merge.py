@@ -0,0 +1,373 @@
+"""
+Merging of the protein and RNA annotation branches into one feature set.
+
+The protein branch reports domain hits on predicted ORFs (amino acid
+coordinates of ORF proteins), the RNA branch reports features on the input
+contigs. Domain hits are lifted to contig coordinates through the ORF
+coordinates of prodigal-style headers (``>orf_id # start # end # strand #
+...``), both branches are brought to one feature schema, conflicting
+protein/RNA features are resolved by a policy and the result is written
+coordinate-sorted as GFF3 and as a Parquet feature table.
+
+Key functions:
+    - orf_coordinates: ORF contig coordinates from prodigal-style headers
+    - protein_features: Domain hits (combined protein table) as contig features
+    - rna_features: Combined RNA annotation table as features
+    - resolve_conflicts: Flag or drop overlapping protein/RNA features
+    - merge_annotations: Merge both branches and write GFF3 + Parquet
+"""
+
+from pathlib import Path
+from typing import Optional, Union
+
+import polars as pl
+
+from rolypoly.utils.logging.loggit import get_logger
+
+FEATURE_SCHEMA = {
+    "seqid": pl.Utf8,
+    "source": pl.Utf8,
+    "type": pl.Utf8,
+    "start": pl.Int64,
+    "end": pl.Int64,
+    "score": pl.Float64,
+    "strand": pl.Utf8,
+    "phase": pl.Utf8,
+    "branch": pl.Utf8,
+    "attributes": pl.Utf8,
+}
+CONFLICT_POLICIES = ("keep_all", "prefer_protein", "prefer_rna")
+
+_ORF_HEADER = r"^(?<orf_id>\S+) # (?<orf_start>\d+) # (?<orf_end>\d+) # (?<orf_strand>-?1)\b"
+# columns of the RNA table that are not worth repeating in the GFF3
+_RNA_SKIP_ATTRIBUTES = {"sequence"}
+
+
+def orf_coordinates(headers: pl.Series) -> pl.DataFrame:
+    """Contig coordinates of ORFs from prodigal-style FASTA headers.
+
+    Headers that do not carry coordinates are dropped.
+
+    Returns:
+        pl.DataFrame: orf_id, seqid, orf_start, orf_end, orf_strand (+/-)
+    """
+    return (
+        headers.str.extract_groups(_ORF_HEADER)
+        .struct.unnest()
+        .drop_nulls("orf_id")
+        .select(
+            "orf_id",
+            # pyrodigal/prodigal ORF ids are <contig>_<n>
+            pl.col("orf_id").str.replace(r"_\d+$", "").alias("seqid"),
+            pl.col("orf_start").cast(pl.Int64),
+            pl.col("orf_end").cast(pl.Int64),
+            pl.when(pl.col("orf_strand") == "-1")
+            .then(pl.lit("-"))
+            .otherwise(pl.lit("+"))
+            .alias("orf_strand"),
+        )
+        .unique("orf_id", keep="first")
+    )
+
+
+def read_orf_coordinates(faa: Union[str, Path]) -> pl.DataFrame:
+    """ORF coordinates from the headers of a predicted ORFs FASTA file."""
+    from needletail import parse_fastx_file
+
+    headers = [record.id for record in parse_fastx_file(str(faa))]  # pyright: ignore
+    return orf_coordinates(pl.Series("header", headers, dtype=pl.Utf8))
+
+
+def _attributes(columns) -> pl.Expr:
+    """Escaped key=value pairs of the set values of columns (null if none)."""
+    from rolypoly.utils.bio.polars_fastx import gff3_attributes
+
+    joined = gff3_attributes(columns)
+    return pl.when(joined != ".").then(joined).alias("attributes")
+
+
+def _empty_features() -> pl.DataFrame:
+    return pl.DataFrame(schema=FEATURE_SCHEMA)
+
+
+def protein_features(
+    table: pl.DataFrame, orfs: Optional[pl.DataFrame] = None, logger=None
+) -> pl.DataFrame:
+    """Domain hits of the combined protein table as contig features.
+
+    Handles the pyhmmer (``query_full_name``, ``env_from``/``env_to``) and
+    the diamond/mmseqs2 (``sequence_id``, ``start``/``end``) layouts. Hits
+    on ORFs without known coordinates keep the ORF id as seqid and their
+    protein coordinates.
+
+    Args:
+        table: Combined protein annotation table (annotate_prot combine_results)
+        orfs: ORF coordinates (see orf_coordinates); coordinates in the
+            query names are used when they are present
+        logger: Logger instance
+
+    Returns:
+        pl.DataFrame: Features (FEATURE_SCHEMA)
+    """
+    logger = get_logger(logger)
+    if table.is_empty():
+        return _empty_features()
+    query = next(
+        c for c in ("query_full_name", "sequence_id") if c in table.columns
+    )
+    aa_from, aa_to = (
+        ("env_from", "env_to")
+        if "env_from" in table.columns
+        else ("start", "end")
+    )
+    score = next(
+        (c for c in ("this_dom_score", "score") if c in table.columns), None
+    )
+    name = next(
+        (c for c in ("hmm_full_name", "sseqid") if c in table.columns), None
+    )
+    evalue = next(
+        (c for c in ("full_hmm_evalue", "evalue") if c in table.columns), None
+    )
+
+    located = orf_coordinates(table[query])
+    if orfs is not None:
+        located = pl.concat([located, orfs]).unique("orf_id", keep="first")
+    hits = table.with_columns(
+        pl.col(query).str.extract(r"^(\S+)").alias("orf_id"),
+        pl.col(aa_from).cast(pl.Int64).alias("aa_from"),
+        pl.col(aa_to).cast(pl.Int64).alias("aa_to"),
+    ).join(located, on="orf_id", how="left")
+
+    missing = hits.filter(pl.col("orf_start").is_null()).height
+    if missing:
+        logger.warning(
+            f"{missing} protein hits are on ORFs without contig coordinates; "
+            "they keep the ORF id and protein coordinates"
+        )
+
+    forward = pl.col("orf_strand") == "+"
+    # codon of residue i (1-based) spans orf_start + 3(i-1) .. orf_start + 3i - 1
+    start = (
+        pl.when(forward)
+        .then(pl.col("orf_start") + 3 * (pl.col("aa_from") - 1))
+        .otherwise(pl.col("orf_end") - 3 * pl.col("aa_to") + 1)
+    )
+    end = (
+        pl.when(forward)
+        .then(pl.col("orf_start") + 3 * pl.col("aa_to") - 1)
+        .otherwise(pl.col("orf_end") - 3 * (pl.col("aa_from") - 1))
+    )
+    attributes = [
+        pl.col(name).alias("Name") if name else None,
+        pl.col("orf_id"),
+        pl.col(evalue).alias("evalue") if evalue else None,
+        pl.col("dom_desc").alias("description")
+        if "dom_desc" in table.columns
+        else None,
+    ]
+    attributes = [a for a in attributes if a is not None]
+    return (
+        hits.with_columns(attributes)
+        .select(
+            pl.coalesce("seqid", "orf_id").alias("seqid"),
+            pl.col("source").cast(pl.Utf8)
+            if "source" in hits.columns
+            else pl.lit("rolypoly").alias("source"),
+            pl.lit("protein_domain").alias("type"),
+            pl.coalesce(start, "aa_from").alias("start"),
+            pl.coalesce(end, "aa_to").alias("end"),
+            (pl.col(score) if score else pl.lit(None))
+            .cast(pl.Float64)
+            .alias("score"),
+            pl.coalesce("orf_strand", pl.lit(".")).alias("strand"),
+            pl.lit(".").alias("phase"),
+            pl.lit("protein").alias("branch"),
+            _attributes([a.meta.output_name() for a in attributes]),
+        )
+        .cast(FEATURE_SCHEMA)  # pyright: ignore
+    )
+
+
+def rna_features(table: pl.DataFrame) -> pl.DataFrame:
+    """Combined RNA annotation table (annotate_RNA combine_results) as features."""
+    if table.is_empty():
+        return _empty_features()
+    core = {
+        "sequence_id",
+        "type",
+        "start",
+        "end",
+        "score",
+        "source",
+        "strand",
+        "phase",
+    }
+    extras = [
+        c
+        for c in table.columns
+        if c not in core and c not in _RNA_SKIP_ATTRIBUTES
+    ]
+
+    def _text(column, default):
+        if column not in table.columns:
+            return pl.lit(default).alias(column)
+        return pl.col(column).cast(pl.Utf8).fill_null(default)
+
+    return table.select(
+        pl.col("sequence_id").cast(pl.Utf8).alias("seqid"),
+        _text("source", "rolypoly").alias("source"),
+        _text("type", "RNA_feature").alias("type"),
+        pl.col("start").cast(pl.Int64),
+        pl.col("end").cast(pl.Int64),
+        pl.col("score").cast(pl.Float64, strict=False)
+        if "score" in table.columns
+        else pl.lit(None, dtype=pl.Float64).alias("score"),
+        _text("strand", ".").alias("strand"),
+        _text("phase", ".").alias("phase"),
+        pl.lit("rna").alias("branch"),
+        _attributes(extras),
+    ).cast(FEATURE_SCHEMA)  # pyright: ignore
+
+
+def resolve_conflicts(
+    features: pl.DataFrame, policy: str = "keep_all", min_overlap: float = 0.5
+) -> pl.DataFrame:
+    """Flag or drop protein features that overlap RNA features (and vice versa).
+
+    A protein and an RNA feature conflict when they are on the same
+    sequence, on compatible strands (equal, or either unstranded) and
+    overlap by at least min_overlap of the shorter one.
+
+    Args:
+        features: Features of both branches (FEATURE_SCHEMA)
+        policy: "keep_all" keeps every feature, "prefer_protein" drops RNA
+            features that conflict with a protein feature, "prefer_rna"
+            drops protein features that conflict with an RNA feature
+        min_overlap: Overlap fraction of the shorter feature
+
+    Returns:
+        pl.DataFrame: The kept features, with a boolean ``conflict`` column
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(
+            f"Unknown conflict policy {policy!r}: expected one of {', '.join(CONFLICT_POLICIES)}"
+        )
+    features = features.with_row_index("feature_index")
+    columns = ["feature_index", "seqid", "start", "end", "strand"]
+    protein = features.filter(pl.col("branch") == "protein").select(columns)
+    rna = features.filter(pl.col("branch") == "rna").select(columns)
+
+    pairs = protein.join_where(
+        rna,
+        pl.col("seqid") == pl.col("seqid_right"),
+        pl.col("start") <= pl.col("end_right"),
+        pl.col("end") >= pl.col("start_right"),
+    ).filter(
+        (pl.col("strand") == pl.col("strand_right"))
+        | (pl.col("strand") == ".")
+        | (pl.col("strand_right") == "."),
+        (
+            pl.min_horizontal("end", "end_right")
+            - pl.max_horizontal("start", "start_right")
+            + 1
+        )
+        >= min_overlap
+        * pl.min_horizontal(
+            pl.col("end") - pl.col("start") + 1,
+            pl.col("end_right") - pl.col("start_right") + 1,
+        ),
+    )
+    conflicting = pl.concat(
+        [pairs["feature_index"], pairs["feature_index_right"]]
+    ).to_list()
+    dropped = {
+        "keep_all": [],
+        "prefer_protein": pairs["feature_index_right"].to_list(),
+        "prefer_rna": pairs["feature_index"].to_list(),
+    }[policy]
+    return (
+        features.filter(~pl.col("feature_index").is_in(dropped))
+        .with_columns(
+            pl.col("feature_index").is_in(conflicting).alias("conflict")
+        )
+        .drop("feature_index")
+    )
+
+
+def write_features_gff3(
+    features: pl.DataFrame, output_file: Union[str, Path]
+) -> Path:
+    """Write features (FEATURE_SCHEMA) as GFF3, branch and conflict as attributes."""
+    from rolypoly.utils.bio.polars_fastx import frame_to_gff3
+
+    columns = list(FEATURE_SCHEMA)
+    if "conflict" in features.columns:
+        features = features.with_columns(
+            pl.when(pl.col("conflict")).then(pl.lit("true")).alias("conflict")
+        )
+        columns.append("conflict")
+    return frame_to_gff3(features.select(columns), output_file)
+
+
+def _read_table(path: Optional[Path]) -> pl.DataFrame:
+    if path is None or not path.is_file() or path.stat().st_size == 0:
+        return pl.DataFrame()
+    return pl.read_csv(path, separator="\t", infer_schema_length=10000)
+
+
+def merge_annotations(
+    protein_table: Union[str, Path, None],
+    rna_table: Union[str, Path, None],
+    output_prefix: Union[str, Path],
+    orf_fasta: Union[str, Path, None] = None,
+    policy: str = "keep_all",
+    min_overlap: float = 0.5,
+    logger=None,
+) -> pl.DataFrame:
+    """Merge the protein and RNA annotation tables into one sorted feature set.
+
+    Args:
+        protein_table: annotate_prot combined_annotations.tsv (missing: no protein features)
+        rna_table: annotate_RNA combined_annotations.tsv (missing: no RNA features)
+        output_prefix: Writes <prefix>.gff3 and <prefix>.parquet
+        orf_fasta: Predicted ORFs FASTA, for hits whose query names lack coordinates
+        policy: Conflict policy (see resolve_conflicts)
+        min_overlap: Overlap fraction of a conflict (see resolve_conflicts)
+        logger: Logger instance
+
+    Returns:
+        pl.DataFrame: The merged features
+    """
+    logger = get_logger(logger)
+    output_prefix = Path(output_prefix)
+    orfs = (
+        read_orf_coordinates(orf_fasta)
+        if orf_fasta is not None and Path(orf_fasta).is_file()
+        else None
+    )
+    features = pl.concat(
+        [
+            protein_features(
+                _read_table(Path(protein_table) if protein_table else None),
+                orfs,
+                logger=logger,
+            ),
+            rna_features(_read_table(Path(rna_table) if rna_table else None)),
+        ]
+    )
+    merged = resolve_conflicts(features, policy, min_overlap).sort(
+        ["seqid", "start", "end", "branch"], maintain_order=True
+    )
+    n_conflicts = merged["conflict"].sum()
+    logger.info(
+        f"Merged {features.height} features into {merged.height} "
+        f"({policy}: {features.height - merged.height} dropped, {n_conflicts} kept in conflict)"
+    )
+    merged.write_parquet(output_prefix.with_suffix(".parquet"))
+    write_features_gff3(merged, output_prefix.with_suffix(".gff3"))
+    logger.info(
+        f"Merged annotations written to {output_prefix.with_suffix('.gff3')} and "
+        f"{output_prefix.with_suffix('.parquet')}"
+    )
+    return merged
@@ -0,0 +1,241 @@
+"""
+Sharded covariance model (Infernal cmscan/cmsearch) searches.
+
+The input sequences are split into shards of balanced residue counts, the
+shards are searched concurrently under the resource scheduler and the
+per-shard tblout tables are merged back into the single-shot layout.
+
+E-values stay those of a single run: cmsearch computes them over the
+whole target database, so every shard is run with ``-Z`` set to the
+search space of the full input; cmscan computes them per query sequence,
+which sharding the queries does not change.
+
+Key functions:
+    - shard_fasta: Split a FASTA file into residue-balanced shards
+    - merge_tblout: Merge per-shard tblout files in single-run order
+    - cm_search_sharded: Run cmscan/cmsearch over shards and merge the results
+"""
+
+import heapq
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from rolypoly.utils.logging.loggit import get_logger
+
+# tblout (--fmt 1) columns
+TBLOUT_QUERY = {"cmscan": 2, "cmsearch": 0}
+TBLOUT_SCORE = 14
+TBLOUT_EVALUE = 15
+
+
+def shard_fasta(
+    input_fasta: Union[str, Path], output_dir: Union[str, Path], n_shards: int
+) -> Tuple[List[Path], Dict[str, int], int]:
+    """Split a FASTA file into shards with balanced residue counts.
+
+    Records go to the least loaded shard, longest first; within a shard
+    they keep their input order.
+
+    Returns:
+        tuple: (shard paths, {record name: input index}, total residues)
+    """
+    from needletail import parse_fastx_file
+
+    lengths = [
+        (record.id.split()[0], len(record.seq))  # pyright: ignore
+        for record in parse_fastx_file(str(input_fasta))
+    ]
+    order = {}
+    for i, (name, _) in enumerate(lengths):
+        order.setdefault(name, i)
+    n_shards = max(min(n_shards, len(lengths)), 1)
+
+    loads = [(0, shard) for shard in range(n_shards)]
+    assignment = [0] * len(lengths)
+    for i in sorted(range(len(lengths)), key=lambda i: -lengths[i][1]):
+        load, shard = heapq.heappop(loads)
+        assignment[i] = shard
+        heapq.heappush(loads, (load + lengths[i][1], shard))
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    shards = [output_dir / f"shard_{i}.fasta" for i in range(n_shards)]
+    handles = [open(path, "w") for path in shards]
+    try:
+        for i, record in enumerate(parse_fastx_file(str(input_fasta))):
+            handles[assignment[i]].write(
+                f">{record.id}\n{record.seq}\n"  # pyright: ignore
+            )
+    finally:
+        for handle in handles:
+            handle.close()
+    return shards, order, sum(length for _, length in lengths)
+
+
+def merge_tblout(
+    tblouts: List[Union[str, Path]],
+    output_file: Union[str, Path],
+    program: str,
+    order: Dict[str, int],
+    input_fasta: Union[str, Path, None] = None,
+) -> int:
+    """Merge per-shard tblout files in the order of a single run.
+
+    cmscan lists hits by query sequence (input order), each query's hits
+    by E-value; cmsearch lists all hits by E-value. The header comes from
+    the first shard, the footer too, with the shard path replaced by the
+    original input.
+
+    Returns:
+        int: Number of hits written
+    """
+    header, footer, rows = [], [], []
+    for shard, path in enumerate(tblouts):
+        in_header = True
+        for line in Path(path).read_text().splitlines():
+            if not line.startswith("#"):
+                in_header = False
+                if line.strip():
+                    rows.append(line)
+            elif shard == 0:
+                # column names and the dashed ruler, then the run summary
+                (header if in_header else footer).append(line)
+                if line.startswith("#-"):
+                    in_header = False
+
+    def _fields(line):
+        return line.split(maxsplit=TBLOUT_EVALUE + 1)
+
+    if program == "cmscan":
+        query = TBLOUT_QUERY["cmscan"]
+        rows.sort(key=lambda line: order.get(_fields(line)[query], len(order)))
+    else:
+        rows.sort(
+            key=lambda line: (
+                float(_fields(line)[TBLOUT_EVALUE]),
+                -float(_fields(line)[TBLOUT_SCORE]),
+            )
+        )
+    if input_fasta is not None and tblouts:
+        footer = [
+            line.replace(
+                str(Path(tblouts[0]).with_suffix(".fasta")), str(input_fasta)
+            )
+            for line in footer
+        ]
+
+    with open(output_file, "w") as out:
+        for line in header + rows + footer:
+            out.write(line + "\n")
+    return len(rows)
+
+
+def _flags(params: Dict) -> List[str]:
+    """Infernal options from {name: value}: True is a bare flag, False/None are dropped."""
+    flags = []
+    for name, value in params.items():
+        if value is False or value is None:
+            continue
+        flags.append(f"-{name}" if len(name) == 1 else f"--{name}")
+        if value is not True:
+            flags.append(str(value))
+    return flags
+
+
+def cm_search_sharded(
+    cm_db: Union[str, Path],
+    input_fasta: Union[str, Path],
+    output_file: Union[str, Path],
+    program: str = "cmscan",
+    params: Optional[Dict] = None,
+    threads: int = 1,
+    memory: Union[str, int, None] = None,
+    shards: Optional[int] = None,
+    work_dir: Union[str, Path, None] = None,
+    scheduler=None,
+    logger=None,
+) -> Path:
+    """Search sequences with covariance models, in concurrent shards.
+
+    Args:
+        cm_db: CM database (pressed for cmscan)
+        input_fasta: Nucleotide FASTA (the queries of cmscan, the target database of cmsearch)
+        output_file: Merged tblout
+        program: "cmscan" or "cmsearch"
+        params: Extra Infernal options, e.g. {"cut_ga": True, "noali": True}
+        threads: Total threads over all shards
+        memory: Total memory over all shards, e.g. "4gb" (defaults to the scheduler's budget)
+        shards: Number of shards (defaults to threads)
+        work_dir: Directory for the shards and their results
+        scheduler: ResourceScheduler (defaults to the process-wide one)
+        logger: Logger instance
+
+    Returns:
+        Path: output_file
+    """
+    from rolypoly.utils.resources import get_scheduler
+    from rolypoly.utils.various import parse_memory
+
+    if program not in TBLOUT_QUERY:
+        raise ValueError(f"Unsupported CM search program: {program}")
+    logger = get_logger(logger)
+    scheduler = scheduler or get_scheduler(threads, logger=logger)
+    params = dict(params or {})
+    output_file = Path(output_file)
+    work_dir = Path(
+        work_dir or output_file.parent / f"{output_file.stem}_shards"
+    )
+
+    shard_files, order, residues = shard_fasta(
+        input_fasta, work_dir, shards or threads
+    )
+    if program == "cmsearch" and "Z" not in params:
+        # search space of the whole input (both strands unless --toponly), in Mb
+        strands = 1 if params.get("toponly") else 2
+        params["Z"] = f"{residues * strands / 1e6:.6f}"
+    share = max(threads // len(shard_files), 1)
+    # without an explicit memory share every lease would take the whole
+    # budget and the shards would run one after the other
+    share_memory = (
+        parse_memory(memory) if memory else scheduler.total_memory
+    ) // len(shard_files)
+    logger.info(
+        f"Running {program} on {len(order)} sequences ({residues} nt) in {len(shard_files)} shard(s)"
+    )
+
+    def _search(shard: Path) -> Path:
+        tblout = shard.with_suffix(".tblout")
+
+        def _cmd(lease):
+            return (
+                [program]
+                + _flags(params)
+                + _flags(lease.tool_params("infernal"))
+                + [
+                    "--tblout",
+                    str(tblout),
+                    "-o",
+                    "/dev/null",
+                    str(cm_db),
+                    str(shard),
+                ]
+            )
+
+        scheduler.run(
+            _cmd,
+            name=f"{program} ({shard.stem})",
+            threads=share,
+            memory=share_memory,
+            tool="infernal",
+        )
+        return tblout
+
+    with ThreadPoolExecutor(max_workers=len(shard_files)) as executor:
+        tblouts = list(executor.map(_search, shard_files))
+
+    hits = merge_tblout(tblouts, output_file, program, order, input_fasta)
+    logger.info(f"{program}: {hits} hits written to {output_file}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return output_file
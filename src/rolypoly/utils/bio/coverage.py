@@ -0,0 +1,732 @@
+"""
+Per-contig read coverage computed in-process from SAM alignment streams.
+
+Mappers (bbmap, bowtie, minimap2 ...) write SAM to stdout; the stream is
+read in chunks, each chunk's CIGARs are expanded into aligned reference
+blocks with polars and added to a difference array with NumPy. The raw
+alignments never need to hit the disk, though they can be tee'd into a
+sorted BAM (samtools sort) or a gzipped SAM while streaming.
+
+With ``track_alleles`` the aggregator also keeps a pileup (A/C/G/T/deletion
+counts per reference base) for allele-frequency tables; summaries, window
+depths and allele frequencies can be written as Parquet. Contig filtering,
+refinement and binning are meant to share this engine rather than each
+shelling out to samtools/bcftools.
+
+Key classes/functions:
+    - sam_records: Parse a chunk of SAM lines into a polars frame
+    - CoverageAggregator: Depth/pileup accumulator with summary, window and allele tables
+    - open_alignment_sink: Compressed/sorted writer for a tee'd SAM stream
+    - aggregate_sam_stream: Feed SAM lines into an aggregator (and a sink)
+    - iter_alignment_file: SAM lines of a SAM, SAM.gz or BAM (via samtools) file
+    - mappy_sam_lines: Map reads with minimap2 (mappy) and yield SAM lines
+    - aggregate_alignments: Aggregate several alignment files
+    - map_and_aggregate: Run a mapper command and aggregate its SAM stdout
+"""
+
+import io
+import shutil
+import subprocess
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import polars as pl
+
+from rolypoly.utils.logging.loggit import get_logger
+
+# samtools depth defaults: unmapped, secondary, QC-fail and duplicates
+DEFAULT_EXCLUDE_FLAGS = 0x4 | 0x100 | 0x200 | 0x400
+_CIGAR_OP = r"\d+[MIDNSHP=XB]"
+ALLELES = ("A", "C", "G", "T", "del")
+
+# read base (ASCII) -> allele column, 5 for anything that isn't ACGT
+BASE_CODES = np.full(256, 5, dtype=np.int64)
+for _i, _base in enumerate(b"ACGT"):
+    BASE_CODES[_base] = _i
+    BASE_CODES[_base + 32] = _i
+
+
+def cigar_blocks(frame: pl.DataFrame) -> pl.DataFrame:
+    """Expand SAM records into one row per CIGAR operation.
+
+    Adds the operation code and size, the 0-based reference start of the
+    operation (``start``) and its offset in the read sequence (``qstart``).
+    """
+    return (
+        frame.select(
+            "read",
+            "contig",
+            "pos",
+            pl.col("cigar").str.extract_all(_CIGAR_OP).alias("op"),
+        )
+        .explode("op")
+        .with_columns(
+            pl.col("op").str.slice(-1).alias("code"),
+            pl.col("op").str.head(-1).cast(pl.Int64).alias("size"),
+        )
+        .with_columns(
+            pl.when(pl.col("code").is_in(["M", "D", "N", "=", "X"]))
+            .then(pl.col("size"))
+            .otherwise(0)
+            .alias("ref_size"),
+            pl.when(pl.col("code").is_in(["M", "I", "S", "=", "X"]))
+            .then(pl.col("size"))
+            .otherwise(0)
+            .alias("query_size"),
+        )
+        .with_columns(
+            (
+                pl.col("pos")
+                - 1
+                + pl.col("ref_size").cum_sum().over("read")
+                - pl.col("ref_size")
+            ).alias("start"),
+            (
+                pl.col("query_size").cum_sum().over("read")
+                - pl.col("query_size")
+            ).alias("qstart"),
+        )
+    )
+
+
+def sam_records(
+    lines: List[bytes],
+    contig_index: Dict[str, int],
+    exclude_flags: int = DEFAULT_EXCLUDE_FLAGS,
+    min_mapq: int = 0,
+    with_seq: bool = False,
+    with_name: bool = False,
+) -> pl.DataFrame:
+    """Parse SAM alignment lines into a frame of the usable records.
+
+    Records that are unmapped, carry any of ``exclude_flags``, fall below
+    ``min_mapq`` or align to a contig missing from ``contig_index`` are
+    dropped. The frame has a ``read`` row index, the integer ``contig`` and
+    the flag/pos/mapq/cigar columns, plus ``seq`` and ``qname`` on request.
+    """
+    columns = (
+        ([0] if with_name else []) + [1, 2, 3, 4, 5] + ([9] if with_seq else [])
+    )
+    names = (
+        (["qname"] if with_name else [])
+        + ["flag", "rname", "pos", "mapq", "cigar"]
+        + (["seq"] if with_seq else [])
+    )
+    frame = pl.read_csv(
+        io.BytesIO(b"".join(lines)),
+        separator="\t",
+        has_header=False,
+        columns=columns,
+        new_columns=names,
+        quote_char=None,
+        truncate_ragged_lines=True,
+        infer_schema=False,
+    )
+    return (
+        frame.with_columns(
+            pl.col("flag").cast(pl.Int64),
+            pl.col("pos").cast(pl.Int64),
+            pl.col("mapq").cast(pl.Int64),
+            pl.col("rname")
+            .replace_strict(contig_index, default=-1, return_dtype=pl.Int64)
+            .alias("contig"),
+        )
+        .filter(
+            ((pl.col("flag") & exclude_flags) == 0)
+            & (pl.col("mapq") >= min_mapq)
+            & (pl.col("contig") >= 0)
+            & (pl.col("cigar") != "*")
+        )
+        .with_row_index("read")
+    )
+
+
+class CoverageAggregator:
+    """Accumulates per-base depth over a set of contigs.
+
+    Contig names/lengths come from ``contig_lengths`` or from the ``@SQ``
+    header lines of the SAM stream (whichever is seen first).
+
+    Args:
+        contig_lengths: Optional {contig: length}, in reference order
+        exclude_flags: Alignments with any of these SAM flags are ignored
+        min_mapq: Minimum mapping quality of counted alignments
+        track_alleles: Also count A/C/G/T/deletion per position (pileup),
+            which costs 20 bytes per reference base
+    """
+
+    def __init__(
+        self,
+        contig_lengths: Optional[Dict[str, int]] = None,
+        exclude_flags: int = DEFAULT_EXCLUDE_FLAGS,
+        min_mapq: int = 0,
+        track_alleles: bool = False,
+    ):
+        self.exclude_flags = exclude_flags
+        self.min_mapq = min_mapq
+        self.track_alleles = track_alleles
+        self._alleles: Optional[np.ndarray] = None
+        self.names: List[str] = []
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self._diff: Optional[np.ndarray] = None
+        self._reads: Optional[np.ndarray] = None
+        self._header: Dict[str, int] = {}
+        self._depth: Optional[np.ndarray] = None
+        self.records_seen = 0
+        self.records_used = 0
+        if contig_lengths:
+            self.set_contigs(contig_lengths)
+
+    @property
+    def initialized(self) -> bool:
+        return self._diff is not None
+
+    def set_contigs(self, contig_lengths: Dict[str, int]) -> None:
+        """Allocate the depth arrays for the given contigs."""
+        self.names = list(contig_lengths)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self.lengths = np.fromiter(
+            contig_lengths.values(), dtype=np.int64, count=len(contig_lengths)
+        )
+        self.offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.offsets[1:])
+        self._diff = np.zeros(int(self.offsets[-1]) + 1, dtype=np.int32)
+        self._reads = np.zeros(len(self.names), dtype=np.int64)
+        if self.track_alleles:
+            self._alleles = np.zeros(
+                (int(self.offsets[-1]), len(ALLELES)), dtype=np.uint32
+            )
+
+    def add_header_line(self, line: bytes) -> None:
+        """Record an ``@SQ`` header line (SN/LN tags)."""
+        if not line.startswith(b"@SQ"):
+            return
+        tags = dict(
+            field.split(":", 1)
+            for field in line.decode().rstrip("\r\n").split("\t")[1:]
+            if ":" in field
+        )
+        if "SN" in tags and "LN" in tags:
+            self._header[tags["SN"]] = int(tags["LN"])
+
+    def _ensure_contigs(self) -> None:
+        if not self.initialized:
+            if not self._header:
+                raise ValueError(
+                    "No contig lengths given and no @SQ lines in the SAM stream"
+                )
+            self.set_contigs(self._header)
+
+    def add_sam_lines(self, lines: List[bytes]) -> None:
+        """Add a chunk of SAM alignment lines (no header lines)."""
+        if not lines:
+            return
+        self._ensure_contigs()
+        self._depth = None
+        self.records_seen += len(lines)
+        frame = sam_records(
+            lines,
+            self._index,
+            exclude_flags=self.exclude_flags,
+            min_mapq=self.min_mapq,
+            with_seq=self.track_alleles,
+        )
+        if frame.height == 0:
+            return
+        self.records_used += frame.height
+        self._reads += np.bincount(
+            frame["contig"].to_numpy(), minlength=len(self.names)
+        )
+
+        blocks = cigar_blocks(frame)
+        aligned = blocks.filter(pl.col("code").is_in(["M", "=", "X"]))
+        contig = aligned["contig"].to_numpy()
+        lengths = self.lengths[contig]
+        start = np.clip(aligned["start"].to_numpy(), 0, lengths)
+        end = np.clip(start + aligned["size"].to_numpy(), 0, lengths)
+        base = self.offsets[contig]
+        np.add.at(self._diff, base + start, 1)
+        np.add.at(self._diff, base + end, -1)
+
+        if self.track_alleles:
+            self._add_alleles(frame, blocks)
+
+    def _add_alleles(self, frame: pl.DataFrame, blocks: pl.DataFrame) -> None:
+        """Count read bases (and deletions) per reference position."""
+        seq_lengths = frame["seq"].str.len_bytes().to_numpy().astype(np.int64)
+        read_offsets = np.zeros(len(seq_lengths), dtype=np.int64)
+        np.cumsum(seq_lengths[:-1], out=read_offsets[1:])
+        buffer = np.frombuffer(
+            "".join(frame["seq"].to_list()).encode(), dtype=np.uint8
+        )
+        has_seq = frame["seq"].to_numpy() != "*"
+
+        for codes, is_deletion in ((["M", "=", "X"], False), (["D"], True)):
+            part = blocks.filter(pl.col("code").is_in(codes))
+            if part.height == 0:
+                continue
+            read = part["read"].to_numpy()
+            keep = has_seq[read] | is_deletion
+            read = read[keep]
+            sizes = part["size"].to_numpy()[keep]
+            contig = part["contig"].to_numpy()[keep]
+            total = int(sizes.sum())
+            if total == 0:
+                continue
+            within = np.arange(total) - np.repeat(
+                np.cumsum(sizes) - sizes, sizes
+            )
+            local = np.repeat(part["start"].to_numpy()[keep], sizes) + within
+            contig = np.repeat(contig, sizes)
+            inside = (local >= 0) & (local < self.lengths[contig])
+            position = self.offsets[contig] + local
+            if is_deletion:
+                allele = np.full(total, 4, dtype=np.int64)
+            else:
+                query = (
+                    np.repeat(
+                        read_offsets[read] + part["qstart"].to_numpy()[keep],
+                        sizes,
+                    )
+                    + within
+                )
+                allele = BASE_CODES[buffer[query]]
+                inside &= allele < 4
+            np.add.at(
+                self._alleles.reshape(-1),
+                position[inside] * len(ALLELES) + allele[inside],
+                1,
+            )
+
+    @property
+    def depth(self) -> np.ndarray:
+        """Per-base depth over all contigs, concatenated in contig order."""
+        self._ensure_contigs()
+        if self._depth is None:
+            self._depth = np.cumsum(self._diff[:-1], dtype=np.int32)
+        return self._depth
+
+    def contig_depth(self, contig: str) -> np.ndarray:
+        """Per-base depth of one contig."""
+        i = self._index[contig]
+        return self.depth[self.offsets[i] : self.offsets[i + 1]]
+
+    def summary(self) -> pl.DataFrame:
+        """Per-contig length, mapped reads, mean depth and breadth."""
+        self._ensure_contigs()
+        depth = self.depth
+        starts = self.offsets[:-1]
+        nonempty = self.lengths > 0
+        total = np.zeros(len(self.names), dtype=np.int64)
+        covered = np.zeros(len(self.names), dtype=np.int64)
+        if nonempty.any():
+            total[nonempty] = np.add.reduceat(
+                depth, starts[nonempty], dtype=np.int64
+            )
+            covered[nonempty] = np.add.reduceat(
+                depth > 0, starts[nonempty], dtype=np.int64
+            )
+        safe_len = np.maximum(self.lengths, 1)
+        return pl.DataFrame(
+            {
+                "contig": self.names,
+                "length": self.lengths,
+                "mapped_reads": self._reads,
+                "mean_depth": total / safe_len,
+                "breadth": covered / safe_len,
+            }
+        )
+
+    def windows(self, window_size: int = 1000) -> pl.DataFrame:
+        """Mean depth in consecutive windows of each contig."""
+        self._ensure_contigs()
+        n_windows = -(-self.lengths // window_size)
+        contig = np.repeat(np.arange(len(self.names)), n_windows)
+        first = np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+        local_start = (np.arange(len(contig)) - first) * window_size
+        local_end = np.minimum(local_start + window_size, self.lengths[contig])
+        sums = (
+            np.add.reduceat(
+                self.depth, self.offsets[contig] + local_start, dtype=np.int64
+            )
+            if len(contig)
+            else np.zeros(0, dtype=np.int64)
+        )
+        return pl.DataFrame(
+            {
+                "contig": pl.Series(self.names, dtype=pl.Utf8).gather(contig),
+                "start": local_start,
+                "end": local_end,
+                "mean_depth": sums / (local_end - local_start),
+            }
+        )
+
+    def allele_counts(self, contig: str) -> np.ndarray:
+        """(length, 5) A/C/G/T/deletion counts of one contig."""
+        if self._alleles is None:
+            raise ValueError("Allele counts need track_alleles=True")
+        i = self._index[contig]
+        return self._alleles[self.offsets[i] : self.offsets[i + 1]]
+
+    def major_alleles(
+        self, contig: str, min_depth: int = 3, min_frequency: float = 0.5
+    ) -> np.ndarray:
+        """Majority allele code (index into ALLELES) per position of a contig.
+
+        Positions with fewer than min_depth reads, or whose major allele is
+        below min_frequency, are -1 (keep the reference base).
+        """
+        counts = self.allele_counts(contig)
+        depth = counts.sum(axis=1, dtype=np.int64)
+        major = counts.argmax(axis=1).astype(np.int8)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            confident = (depth >= max(min_depth, 1)) & (
+                counts.max(axis=1) >= min_frequency * depth
+            )
+        major[~confident] = -1
+        return major
+
+    def allele_table(
+        self,
+        min_depth: int = 10,
+        min_frequency: float = 0.0,
+        references: Optional[Dict[str, str]] = None,
+    ) -> pl.DataFrame:
+        """Allele frequencies at positions with at least min_depth reads.
+
+        Args:
+            min_depth: Minimum number of bases/deletions at a position
+            min_frequency: Only report positions whose second most common
+                allele reaches this frequency (0 reports every position)
+            references: Optional {contig: sequence} to add the reference base
+
+        Returns:
+            pl.DataFrame: contig, position (1-based), depth, one count column
+            per allele, major/minor allele and their frequencies
+        """
+        if self._alleles is None:
+            raise ValueError("Allele counts need track_alleles=True")
+        counts = self._alleles
+        depth = counts.sum(axis=1, dtype=np.int64)
+        order = np.argsort(counts, axis=1, kind="stable")
+        major = order[:, -1]
+        minor = order[:, -2]
+        rows = np.arange(len(counts))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            major_freq = counts[rows, major] / depth
+            minor_freq = counts[rows, minor] / depth
+        keep = depth >= max(min_depth, 1)
+        if min_frequency > 0:
+            keep &= minor_freq >= min_frequency
+        positions = np.flatnonzero(keep)
+        contig = np.searchsorted(self.offsets, positions, side="right") - 1
+        local = positions - self.offsets[contig]
+        names = pl.Series(self.names, dtype=pl.Utf8)
+        alleles = np.array(ALLELES)
+        table = pl.DataFrame(
+            {
+                "contig": names.gather(contig),
+                "position": local + 1,
+                "depth": depth[positions],
+                **{
+                    allele: counts[positions, j]
+                    for j, allele in enumerate(ALLELES)
+                },
+                "major": alleles[major[positions]],
+                "major_freq": major_freq[positions],
+                "minor": alleles[minor[positions]],
+                "minor_freq": minor_freq[positions],
+            }
+        )
+        if references is not None:
+            ref_buffer = np.frombuffer(
+                b"".join(
+                    references.get(name, "")
+                    .upper()
+                    .encode()
+                    .ljust(int(length), b"N")[: int(length)]
+                    for name, length in zip(self.names, self.lengths)
+                ),
+                dtype="S1",
+            )
+            table = table.with_columns(
+                pl.Series("ref", ref_buffer[positions].astype(str))
+            )
+        return table
+
+    def write_parquet(
+        self,
+        output_dir: Union[str, Path],
+        prefix: str = "coverage",
+        window_size: int = 1000,
+        min_depth: int = 10,
+        min_frequency: float = 0.0,
+        references: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Path]:
+        """Write the contig summary, window depths and (if tracked) alleles.
+
+        references (contig -> sequence) adds the reference base to the
+        allele table.
+
+        Returns:
+            dict: {"summary"|"windows"|"alleles": parquet path}
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        written = {
+            "summary": output_dir / f"{prefix}_summary.parquet",
+            "windows": output_dir / f"{prefix}_windows.parquet",
+        }
+        self.summary().write_parquet(written["summary"])
+        self.windows(window_size).write_parquet(written["windows"])
+        if self.track_alleles:
+            written["alleles"] = output_dir / f"{prefix}_alleles.parquet"
+            self.allele_table(
+                min_depth, min_frequency, references=references
+            ).write_parquet(written["alleles"])
+        return written
+
+
+class _PipeSink:
+    """Byte sink feeding a subprocess' stdin (samtools sort, pigz ...)."""
+
+    def __init__(self, cmd: List[str], stdout: Optional[BinaryIO] = None):
+        self._stdout = stdout
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=stdout)
+        self.cmd = cmd
+
+    def write(self, data: bytes) -> int:
+        return self._proc.stdin.write(data)
+
+    def close(self) -> None:
+        self._proc.stdin.close()
+        returncode = self._proc.wait()
+        if self._stdout is not None:
+            self._stdout.close()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, self.cmd)
+
+
+def open_alignment_sink(
+    output_path: Union[str, Path],
+    fmt: str = "bam",
+    threads: int = 1,
+    logger=None,
+):
+    """Writer for a tee'd SAM stream.
+
+    Args:
+        output_path: Output file
+        fmt: "bam" (coordinate sorted, needs samtools) or "sam.gz"
+        threads: Threads for samtools sort / pigz
+        logger: Logger instance
+
+    Returns:
+        An object with write(bytes) and close(). "bam" falls back to
+        "sam.gz" when samtools is not on the PATH.
+    """
+    import gzip
+
+    logger = get_logger(logger)
+    output_path = Path(output_path)
+    if fmt == "bam":
+        if shutil.which("samtools"):
+            return _PipeSink(
+                [
+                    "samtools",
+                    "sort",
+                    "-@",
+                    str(max(threads - 1, 1)),
+                    "-o",
+                    str(output_path),
+                    "-",
+                ]
+            )
+        logger.warning("samtools not found, writing gzipped SAM instead of BAM")
+        output_path = output_path.with_suffix(".sam.gz")
+    if shutil.which("pigz"):
+        return _PipeSink(
+            ["pigz", "-p", str(threads), "-c"], stdout=open(output_path, "wb")
+        )
+    return gzip.open(output_path, "wb")
+
+
+def aggregate_sam_stream(
+    stream: Iterable[bytes],
+    aggregator: CoverageAggregator,
+    sink=None,
+    chunk_lines: int = 200_000,
+) -> CoverageAggregator:
+    """Read a SAM byte stream into ``aggregator`` (and copy it to ``sink``)."""
+    chunk: List[bytes] = []
+    header_done = False
+    for line in stream:
+        if sink is not None:
+            sink.write(line)
+        if not header_done and line.startswith(b"@"):
+            aggregator.add_header_line(line)
+            continue
+        header_done = True
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            aggregator.add_sam_lines(chunk)
+            chunk = []
+    aggregator.add_sam_lines(chunk)
+    return aggregator
+
+
+def iter_alignment_file(
+    alignment_file: Union[str, Path], threads: int = 1
+) -> Iterator[bytes]:
+    """Yield the SAM lines (header included) of a SAM, SAM.gz or BAM file.
+
+    BAM/CRAM files are decoded by a ``samtools view -h`` subprocess.
+    """
+    import gzip
+
+    alignment_file = Path(alignment_file)
+    if alignment_file.suffix in (".bam", ".cram"):
+        process = subprocess.Popen(
+            [
+                "samtools",
+                "view",
+                "-h",
+                "-@",
+                str(max(threads - 1, 1)),
+                str(alignment_file),
+            ],
+            stdout=subprocess.PIPE,
+            bufsize=1 << 20,
+        )
+        try:
+            yield from process.stdout
+        finally:
+            process.stdout.close()
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(
+                    process.returncode, f"samtools view {alignment_file}"
+                )
+        return
+    opener = gzip.open if alignment_file.suffix == ".gz" else open
+    with opener(alignment_file, "rb") as f:
+        yield from f
+
+
+def mappy_sam_lines(
+    reference: Union[str, Path],
+    reads: List[Union[str, Path]],
+    preset: str = "sr",
+    threads: int = 1,
+) -> Iterator[bytes]:
+    """Map reads with minimap2 (mappy) and yield SAM lines.
+
+    Only the fields the aggregator uses are filled in (no mates, tags or
+    qualities). Every hit of a read is reported; all but the first are
+    flagged secondary.
+    """
+    import mappy as mp
+    from needletail import parse_fastx_file
+
+    aligner = mp.Aligner(str(reference), preset=preset, n_threads=threads)
+    if not aligner:
+        raise RuntimeError(f"Failed to build a minimap2 index for {reference}")
+    for name in aligner.seq_names:
+        yield f"@SQ\tSN:{name}\tLN:{len(aligner.seq(name))}\n".encode()
+    for reads_file in reads:
+        for record in parse_fastx_file(str(reads_file)):
+            seq = record.seq
+            hits = list(aligner.map(seq))
+            if not hits:
+                yield f"{record.name}\t4\t*\t0\t0\t*\t*\t0\t0\t{seq}\t*\n".encode()
+                continue
+            rc = None
+            for i, hit in enumerate(hits):
+                flag = (16 if hit.strand < 0 else 0) | (256 if i else 0)
+                if hit.strand < 0 and rc is None:
+                    rc = mp.revcomp(seq)
+                oriented = rc if hit.strand < 0 else seq
+                q_st, q_en = (
+                    (len(seq) - hit.q_en, len(seq) - hit.q_st)
+                    if hit.strand < 0
+                    else (hit.q_st, hit.q_en)
+                )
+                cigar = (
+                    (f"{q_st}S" if q_st else "")
+                    + hit.cigar_str
+                    + (f"{len(seq) - q_en}S" if len(seq) - q_en else "")
+                )
+                yield (
+                    f"{record.name}\t{flag}\t{hit.ctg}\t{hit.r_st + 1}\t{hit.mapq}\t"
+                    f"{cigar}\t*\t0\t0\t{oriented}\t*\n"
+                ).encode()
+
+
+def aggregate_alignments(
+    sources: List[Union[str, Path]],
+    aggregator: CoverageAggregator,
+    threads: int = 1,
+) -> CoverageAggregator:
+    """Feed SAM/SAM.gz/BAM files into one aggregator."""
+    for source in sources:
+        aggregate_sam_stream(iter_alignment_file(source, threads), aggregator)
+    return aggregator
+
+
+def map_and_aggregate(
+    cmd: Union[str, List[str]],
+    aggregator: CoverageAggregator,
+    alignment_output: Union[str, Path, None] = None,
+    alignment_format: str = "bam",
+    threads: int = 1,
+    logger=None,
+) -> CoverageAggregator:
+    """Run a mapper writing SAM to stdout and aggregate its coverage.
+
+    Args:
+        cmd: Mapper command (shell string or argument list)
+        aggregator: Aggregator to feed
+        alignment_output: Also keep the alignments here (None: don't)
+        alignment_format: "bam" or "sam.gz" for alignment_output
+        threads: Threads for the alignment writer
+        logger: Logger instance
+
+    Raises:
+        OSError: if the mapper can't be started
+        subprocess.CalledProcessError: if the mapper fails
+    """
+    logger = get_logger(logger)
+    logger.info(f"Streaming alignments from: {cmd}")
+    sink = (
+        open_alignment_sink(
+            alignment_output, alignment_format, threads, logger=logger
+        )
+        if alignment_output
+        else None
+    )
+    try:
+        process = subprocess.Popen(
+            cmd,
+            shell=isinstance(cmd, str),
+            stdout=subprocess.PIPE,
+            bufsize=1 << 20,
+        )
+    except OSError:
+        # the mapper could not start at all
+        if sink is not None:
+            sink.close()
+        raise
+    try:
+        aggregate_sam_stream(process.stdout, aggregator, sink)
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        if sink is not None:
+            sink.close()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    logger.info(
+        f"Aggregated {aggregator.records_used} of {aggregator.records_seen} alignment records"
+    )
+    return aggregator
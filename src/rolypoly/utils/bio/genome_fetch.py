@@ -22,6 +22,11 @@ Usage:
         max_genomes=5
     )
 
+The mapping is looked up through a copy sorted by query_tax_id (kept in the
+persistent cache), and all requested taxids are resolved in one join.
+Files are downloaded through the shared, MD5-verified download cache
+(rolypoly.utils.downloads), so reruns resume or reuse earlier downloads.
+
 Test:
     python src/tests/test_genome_fetch_mapping.py
 """
@@ -31,9 +36,8 @@ import os
 import shutil
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 from urllib.parse import urlparse
-from urllib.request import urlretrieve
 
 import polars as pl
 from requests import get
@@ -47,18 +51,159 @@ from rich.progress import (
 )
 
 from rolypoly.utils.bio.sequences import remove_duplicates
+from rolypoly.utils.downloads import DownloadCache, parse_md5_checksums
 from rolypoly.utils.logging.loggit import get_logger
 
 global data_dir, taxid_lookup_path
 data_dir = Path(os.environ.get("ROLYPOLY_DATA", ""))
 taxid_lookup_path = data_dir / "contam/rrna/rrna_to_genome_mapping.parquet"
 
+MAPPING_STORE = "genome_mapping"
+# candidate preference, best first
+RELATIONSHIP_ORDER = ["self", "ancestor", "relative"]
+ACCESSION_ORDER = ["GCF", "GCA"]  # RefSeq, then GenBank
+ASSEMBLY_LEVEL_ORDER = ["Complete Genome", "Chromosome", "Scaffold", "Contig"]
+RESOLVED_COLUMNS = [
+    "query_tax_id",
+    "mapped",
+    "query_name",
+    "ftp_path",
+    "relationship",
+    "reference_name",
+]
+
+
+def taxid_index(
+    mapping_path: Union[str, Path], cache_dir=None, logger=None
+) -> Path:
+    """Copy of the mapping sorted by query_tax_id, from the persistent cache.
+
+    Row groups cover disjoint taxid ranges, so lookups only read the row
+    groups whose statistics can hold the requested taxids. The original
+    row order is kept in mapping_row (the last tie-break between candidates).
+
+    Args:
+        mapping_path: rRNA to genome mapping parquet
+        cache_dir: Override for the cache root
+        logger: Logger instance
+
+    Returns:
+        Path: The sorted parquet
+    """
+    from rolypoly.utils.cache import CacheStore, file_fingerprint, hash_key
+
+    params = {"index": "query_tax_id", "source": file_fingerprint(mapping_path)}
+
+    def _build(entry_dir: Path) -> None:
+        (
+            pl.scan_parquet(mapping_path)
+            .with_row_index("mapping_row")
+            .sort("query_tax_id", maintain_order=True)
+            .sink_parquet(entry_dir / "mapping.parquet", row_group_size=65536)
+        )
+
+    store = CacheStore(MAPPING_STORE, cache_dir=cache_dir, logger=logger)
+    return (
+        store.get_or_build(hash_key(params), _build, params=params)
+        / "mapping.parquet"
+    )
+
+
+def _order_key(column: str, order: List[str]) -> pl.Expr:
+    return pl.col(column).replace_strict(
+        order,
+        list(range(len(order))),
+        default=len(order),
+        return_dtype=pl.Int32,
+    )
+
+
+def resolve_taxids(
+    taxids: Iterable[int],
+    mapping: Union[pl.DataFrame, pl.LazyFrame, str, Path],
+    get_relative_for_missing: bool = False,
+    cache_dir=None,
+    logger=None,
+) -> pl.DataFrame:
+    """Pick the best genome of every requested taxid in one join.
+
+    Candidates are the mapping rows of a taxid with an FTP path and an
+    accepted relationship, ranked self > ancestor > relative, then RefSeq
+    (GCF_) over GenBank (GCA_), then by assembly level (when the mapping has
+    an assembly_level column), then by mapping order.
+
+    Args:
+        taxids: NCBI taxonomy IDs
+        mapping: The mapping (DataFrame/LazyFrame), or the path of its parquet
+            (looked up through taxid_index)
+        get_relative_for_missing: If False, only use 'self' data; if True, allow ancestor/relative
+        cache_dir: Cache root override for the taxid index
+        logger: Logger instance
+
+    Returns:
+        pl.DataFrame: One row per unique taxid, in request order (RESOLVED_COLUMNS);
+        mapped tells whether the taxid is in the mapping at all, ftp_path,
+        relationship and reference_name are null when no genome was picked
+    """
+    if isinstance(mapping, (str, Path)):
+        mapping = pl.scan_parquet(taxid_index(mapping, cache_dir, logger))
+    elif isinstance(mapping, pl.DataFrame):
+        mapping = mapping.lazy()
+    schema = mapping.collect_schema()
+    if "mapping_row" not in schema:
+        mapping = mapping.with_row_index("mapping_row")
+
+    requested = pl.DataFrame(
+        {"query_tax_id": list(dict.fromkeys(taxids))}
+    ).cast({"query_tax_id": schema["query_tax_id"]}, strict=False)
+    candidates = mapping.filter(
+        pl.col("query_tax_id").is_in(requested["query_tax_id"].to_list())
+    )
+    allowed = RELATIONSHIP_ORDER if get_relative_for_missing else ["self"]
+    ranking = [
+        _order_key("relationship", RELATIONSHIP_ORDER),
+        _order_key("ftp_path_accession", ACCESSION_ORDER),
+    ]
+    if "assembly_level" in schema:
+        ranking.append(_order_key("assembly_level", ASSEMBLY_LEVEL_ORDER))
+    best = (
+        candidates.filter(
+            pl.col("ftp_path").is_not_null()
+            & (pl.col("ftp_path") != "")
+            & pl.col("relationship").is_in(allowed)
+        )
+        .with_columns(
+            ftp_path_accession=pl.col("ftp_path").str.extract(
+                r"/(GC[AF])_[^/]*/?$"
+            )
+        )
+        .sort([*ranking, "mapping_row"])
+        .group_by("query_tax_id", maintain_order=True)
+        .agg(pl.col("ftp_path", "relationship", "reference_name").first())
+    )
+    names = candidates.group_by("query_tax_id").agg(
+        mapped=pl.lit(True),
+        query_name=pl.col("query_name").first()
+        if "query_name" in schema
+        else pl.lit(None, dtype=pl.String),
+    )
+    return (
+        requested.lazy()
+        .join(names, on="query_tax_id", how="left", maintain_order="left")
+        .join(best, on="query_tax_id", how="left", maintain_order="left")
+        .with_columns(pl.col("mapped").fill_null(False))
+        .select(RESOLVED_COLUMNS)
+        .collect()
+    )
+
 
 def get_ftp_path_for_taxid(
     taxid: int, mapping_df: pl.DataFrame, get_relative_for_missing: bool = False
 ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
     """Get the best FTP path for a given taxonomy ID with relationship info.
 
+    Resolving many taxids? Use resolve_taxids, which does them all in one join.
+
     Args:
         taxid: NCBI taxonomy ID
         mapping_df: The mapping DataFrame (simplified format)
@@ -68,31 +213,28 @@ def get_ftp_path_for_taxid(
         Tuple of (ftp_path, relationship, reference_name) or (None, None, None) if no mapping found
         relationship: 'self' | 'ancestor' | 'relative' | None
     """
-    # Query the mapping for this taxid
-    result = mapping_df.filter(pl.col("query_tax_id") == taxid)
-
-    if result.height == 0:
-        return None, None, None
-
-    row = result.row(0, named=True)
-    relationship = row.get("relationship")
-    ftp_path = row.get("ftp_path")
-    reference_name = row.get("reference_name")
+    row = resolve_taxids([taxid], mapping_df, get_relative_for_missing).row(
+        0, named=True
+    )
+    return row["ftp_path"], row["relationship"], row["reference_name"]
 
-    # If self data available, use it
-    if relationship == "self" and ftp_path:
-        return ftp_path, relationship, reference_name
 
-    # If allowing relatives, try ancestor/relative
-    if (
-        get_relative_for_missing
-        and relationship in ["ancestor", "relative"]
-        and ftp_path
-    ):
-        return ftp_path, relationship, reference_name
+def fetch_md5_checksums(
+    ftp_path: str, cache: DownloadCache, logger=None
+) -> Dict[str, str]:
+    """{file name: md5} of an assembly directory, from its md5checksums.txt.
 
-    # No suitable mapping found
-    return None, None, None
+    Returns an empty dict (no verification) if the file is unavailable.
+    """
+    logger = get_logger(logger)
+    url = f"{ftp_path.rstrip('/')}/md5checksums.txt"
+    try:
+        return parse_md5_checksums(cache.fetch(url).read_text())
+    except Exception as e:
+        logger.warning(
+            f"Could not get {url} ({e}), downloads will not be verified"
+        )
+        return {}
 
 
 def download_from_ftp_path(
@@ -101,14 +243,19 @@ def download_from_ftp_path(
     prefer_transcript: bool = True,
     overwrite: bool = False,
     logger=None,
+    cache: Optional[DownloadCache] = None,
 ) -> Tuple[Optional[Path], Optional[int]]:
     """Download sequence files from an NCBI FTP path.
 
+    Files come from the shared download cache (resumed, retried and checked
+    against the assembly's md5checksums.txt) and are linked into output_dir.
+
     Args:
         ftp_path: Base FTP path (e.g., https://ftp.ncbi.nlm.nih.gov/genomes/all/GCF/...)
         output_dir: Directory to save downloaded files
         prefer_transcript: If True, try to download *_cds_from_genomic.fna.gz first
-        overwrite: If True, re-download even if file exists
+        overwrite: If True, replace an existing file in output_dir (from the cache)
+        cache: DownloadCache to use (default: one in the default cache root)
 
     Returns:
         Tuple of (Path to the downloaded file, file size in bytes) or (None, None) if download failed
@@ -119,6 +266,9 @@ def download_from_ftp_path(
         return None, None
 
     output_dir.mkdir(parents=True, exist_ok=True)
+    ftp_path = ftp_path.rstrip("/")
+    cache = cache or DownloadCache(logger=logger)
+    checksums = None
 
     # Extract the assembly name from the FTP path
     # e.g., GCF_000001405.40_GRCh38.p14 from the URL
@@ -146,8 +296,14 @@ def download_from_ftp_path(
             file_size = output_file.stat().st_size
             return output_file, file_size
 
+        if checksums is None:
+            checksums = fetch_md5_checksums(ftp_path, cache, logger)
+        if checksums and filename not in checksums:
+            logger.debug(f"{filename} is not part of {assembly_name}")
+            continue
+
         try:
-            urlretrieve(url, output_file)
+            cache.fetch(url, checksums.get(filename), output_file)
 
             # Verify the download (basic check)
             if output_file.exists() and output_file.stat().st_size > 0:
@@ -177,6 +333,7 @@ def fetch_genomes_by_taxid(
     overwrite: bool = False,
     exclude_viral: bool = True,
     clean_headers=True,  # currently part of the exclude virus if else, for now no need to take it out.
+    cache_dir: Optional[str] = None,
     logger=None,
 ) -> None:
     """Fetch genome/transcript sequences for a list of taxids using pre-computed mappings.
@@ -194,6 +351,7 @@ def fetch_genomes_by_taxid(
         overwrite: If True, re-download existing files
         exclude_viral: If True, filter out viral sequences from final output
         clean_headers: always true, not yet implemented as an option
+        cache_dir: Root of the persistent caches (taxid index and downloads) shared across runs (default: ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)
         logger: Logger instance
         get_relative_for_missing: If True, attempt to use relative genome if no direct match found
     """
@@ -206,19 +364,33 @@ def fetch_genomes_by_taxid(
     temp_path = Path(temp_dir)
     temp_path.mkdir(parents=True, exist_ok=True)
 
-    # Load mapping
+    # Resolve every taxid against the mapping at once
     logger.debug(f"Loading mapping from: {taxid_lookup_path}")
-    mapping_df = pl.read_parquet(taxid_lookup_path)
-
-    subdf = mapping_df.filter(pl.col("query_tax_id").is_in(list(taxids)))
-    avail_taxids = subdf.select("query_tax_id").unique().to_series().to_list()
-    unmapped_names = list(set(taxids) - set(avail_taxids))
+    resolved = resolve_taxids(
+        taxids,
+        taxid_lookup_path,
+        get_relative_for_missing,
+        cache_dir=cache_dir,
+        logger=logger,
+    )
+    targets = {
+        row[0]: row[1:]
+        for row in resolved.select(
+            "query_tax_id", "ftp_path", "relationship", "reference_name"
+        ).iter_rows()
+    }
+    unmapped_names = resolved.filter(~pl.col("mapped"))[
+        "query_tax_id"
+    ].to_list()
     if unmapped_names:
         logger.warning(
             f"Rolypoly pre-generated mapping missing for {len(unmapped_names)} taxids"
         )
         logger.warning(f"Examples: {unmapped_names[:5]}")
 
+    # Downloads are cached (and deduplicated) across runs, at most `threads` at a time
+    cache = DownloadCache(cache_dir, workers=max(threads, 1), logger=logger)
+
     # Track downloaded files
     downloaded_files: List[Path] = []
     unmapped_taxids: List[int] = []
@@ -233,8 +405,8 @@ def fetch_genomes_by_taxid(
         int, Optional[Path], Optional[str], Optional[str], Optional[int]
     ]:
         """Process a single taxid and return (taxid, downloaded_path, relationship, reference_name, file_size)."""
-        ftp_path, relationship, reference_name = get_ftp_path_for_taxid(
-            taxid, mapping_df, get_relative_for_missing
+        ftp_path, relationship, reference_name = targets.get(
+            taxid, (None, None, None)
         )
 
         if ftp_path is None:
@@ -247,6 +419,7 @@ def fetch_genomes_by_taxid(
             prefer_transcript=prefer_transcript,
             overwrite=overwrite,
             logger=logger,
+            cache=cache,
         )
 
         return (taxid, downloaded, relationship, reference_name, file_size)
@@ -415,6 +588,7 @@ def fetch_genomes_from_stats_file(
     taxid_lookup_path: str,
     output_file: str,
     max_genomes: int = 5,
+    cache_dir: Optional[str] = None,
     logger=None,
     **kwargs,
 ) -> None:
@@ -432,6 +606,7 @@ def fetch_genomes_from_stats_file(
         taxid_lookup_path: Path to the rRNA genome mapping parquet file
         output_file: Output fasta file path
         max_genomes: Maximum number of genomes to fetch (from available ones)
+        cache_dir: Root of the persistent caches (taxid index and downloads)
         **kwargs: Additional arguments passed to fetch_genomes_by_taxid
     """
     if logger is None:
@@ -459,39 +634,35 @@ def fetch_genomes_from_stats_file(
 
     logger.info(f"Found {len(all_taxons)} taxon entries in stats file")
 
-    # Load the mapping to check availability
-    mapping_df = pl.read_parquet(taxid_lookup_path)
+    # Resolve all taxons against the mapping at once
+    resolved = resolve_taxids(
+        all_taxons,
+        taxid_lookup_path,
+        get_relative_for_missing=True,
+        cache_dir=cache_dir,
+        logger=logger,
+    )
 
-    # Filter to taxons with data available
+    # Split into taxons with data available (in stats file order) and without
     available_taxons = []
     unavailable_taxons = []  # (taxid, name, relationship)
     taxon_details = {}  # Cache mapping details for later logging
 
-    for taxon in all_taxons:
-        result = mapping_df.filter(pl.col("query_tax_id") == taxon)
-
-        if result.height > 0:
-            row = result.row(0, named=True)
-            relationship = row.get("relationship")
-            ftp_path = row.get("ftp_path")
-            reference_name = row.get("reference_name")
-            query_name = row.get("query_name")
-
-            if ftp_path and relationship:  # Has valid mapping
-                available_taxons.append(taxon)
-                taxon_details[taxon] = (
-                    query_name,
-                    relationship,
-                    reference_name,
-                )
-            else:
-                # Has entry but no FTP path
-                unavailable_taxons.append((taxon, query_name, relationship))
+    for row in resolved.iter_rows(named=True):
+        taxon = row["query_tax_id"]
+        if row["ftp_path"]:  # Has valid mapping
+            available_taxons.append(taxon)
+            taxon_details[taxon] = (
+                row["query_name"],
+                row["relationship"],
+                row["reference_name"],
+            )
+        elif row["mapped"]:
+            # Has entry but no FTP path
+            unavailable_taxons.append((taxon, row["query_name"], None))
         else:
             # No entry in mapping
             unavailable_taxons.append((taxon, "<unknown>", None))
-    unavailable_taxons = list(set(unavailable_taxons))  # Remove duplicates
-    available_taxons = list(set(available_taxons))  # Remove duplicates
     logger.info(f"Taxons with available data: {len(available_taxons)}")
     logger.info(f"Taxons without available data: {len(unavailable_taxons)}")
 
@@ -530,6 +701,7 @@ def fetch_genomes_from_stats_file(
         get_relative_for_missing=True,
         taxid_lookup_path=taxid_lookup_path,
         output_file=output_file,
+        cache_dir=cache_dir,
         logger=logger,
         **kwargs,
     )
@@ -5,7 +5,8 @@ import polars as pl
 warnings.filterwarnings(
     "ignore", category=UserWarning, module="numpy"
 )  # see https://moyix.blogspot.com/2022/09/someones-been-messing-with-my-subnormals.html
-from typing import List, Optional, Tuple, Union
+import re
+from typing import Dict, List, Optional, Tuple, Union
 
 import intervaltree as itree
 from genomicranges import GenomicRanges
@@ -750,6 +751,207 @@ def mask_sequence_mp(seq: str, start: int, end: int, is_reverse: bool) -> str:
     return str(mp.revcomp(masked_seq)) if is_reverse else masked_seq
 
 
+# CIGAR operations that consume reference positions (M, D, N, =, X)
+_CIGAR_TOKEN_RE = re.compile(rb"(\d+)([MIDNSHP=XB])")
+_REF_CONSUMING_OPS = frozenset(b"MDN=X")
+
+
+def cigar_reference_length(
+    cigar: bytes, cache: Optional[Dict[bytes, int]] = None
+) -> int:
+    """Number of reference bases spanned by a CIGAR string.
+
+    Args:
+        cigar (bytes): CIGAR string as bytes (e.g. b"10S90M2D5M")
+        cache (dict, optional): Memo of already parsed CIGARs. Aligners emit
+            a handful of distinct CIGARs for millions of reads, so reusing the
+            parsed length avoids re-tokenizing them.
+
+    Returns:
+        int: Reference-consuming length (0 for "*" or unparsable strings)
+    """
+    if cache is not None:
+        cached = cache.get(cigar)
+        if cached is not None:
+            return cached
+    ref_len = 0
+    for clen, op in _CIGAR_TOKEN_RE.findall(cigar):
+        if op[0] in _REF_CONSUMING_OPS:
+            ref_len += int(clen)
+    if cache is not None:
+        cache[cigar] = ref_len
+    return ref_len
+
+
+def merge_intervals_np(starts, ends) -> Tuple:
+    """Merge overlapping or adjacent half-open intervals.
+
+    Args:
+        starts: Interval starts (0-based, inclusive)
+        ends: Interval ends (0-based, exclusive)
+
+    Returns:
+        Tuple of numpy arrays (merged_starts, merged_ends), sorted by start.
+    """
+    import numpy as np
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if starts.size == 0:
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    ends = ends[order]
+    running_end = np.maximum.accumulate(ends)
+    block_start = np.empty(starts.size, dtype=bool)
+    block_start[0] = True
+    block_start[1:] = starts[1:] > running_end[:-1]
+    block_idx = np.flatnonzero(block_start)
+    return starts[block_idx], np.maximum.reduceat(ends, block_idx)
+
+
+def _collect_intervals_from_sam(input_sam: str) -> Dict[str, Tuple]:
+    """Collect reference intervals covered by alignments in a SAM file.
+
+    Returns a dict of reference name -> (starts, ends) as array('q')
+    buffers holding 0-based half-open coordinates.
+    """
+    from array import array
+
+    intervals: Dict[str, Tuple] = {}
+    cigar_cache: Dict[bytes, int] = {}
+    with open(input_sam, "rb") as f:
+        for line in f:
+            if line.startswith(b"@"):
+                continue
+            parts = line.split(b"\t", 6)
+            if len(parts) < 6:
+                continue
+            rname = parts[2]
+            if rname == b"*" or not rname or parts[5] == b"*":
+                continue
+            try:
+                if int(parts[1]) & 4:
+                    continue
+                pos = int(parts[3])
+            except ValueError:
+                continue
+            ref_len = cigar_reference_length(parts[5], cigar_cache)
+            if ref_len <= 0:
+                continue
+            key = rname.decode()
+            bucket = intervals.get(key)
+            if bucket is None:
+                bucket = intervals[key] = (array("q"), array("q"))
+            bucket[0].append(pos - 1)
+            bucket[1].append(pos - 1 + ref_len)
+    return intervals
+
+
+def _collect_intervals_from_table(input_table: str) -> Dict[str, Tuple]:
+    """Collect intervals from a seq_id/start/stop/strand table (1-based)."""
+    from array import array
+
+    intervals: Dict[str, Tuple] = {}
+    with open(input_table, "r") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 3:
+                continue
+            seq_id = fields[0]
+            try:
+                start, stop = int(fields[1]), int(fields[2])
+            except ValueError:
+                continue
+            if start > stop:
+                start, stop = stop, start
+            bucket = intervals.get(seq_id)
+            if bucket is None:
+                bucket = intervals[seq_id] = (array("q"), array("q"))
+            bucket[0].append(start - 1)
+            bucket[1].append(stop)
+    return intervals
+
+
+def _iter_fasta_bytes(input_fasta: str):
+    """Yield (header_line, sequence) records from a FASTA as bytes/bytearray."""
+    header = None
+    seq = bytearray()
+    with open(input_fasta, "rb") as in_f:
+        for line in in_f:
+            if line.startswith(b">"):
+                if header is not None:
+                    yield header, seq
+                header = line[1:].rstrip()
+                seq = bytearray()
+            else:
+                seq += line.rstrip()
+    if header is not None:
+        yield header, seq
+
+
+def apply_interval_masks(
+    input_fasta: str,
+    output_fasta: str,
+    intervals: Dict[str, Tuple],
+    caller: str = "apply_interval_masks",
+) -> int:
+    """Replace the given reference intervals with N's in one streaming pass.
+
+    Intervals are merged per reference, then each record is loaded into a
+    bytearray and masked in place through a numpy view, so no intermediate
+    strings are created regardless of the number of alignments.
+
+    Args:
+        input_fasta (str): Path to the input FASTA file
+        output_fasta (str): Path to the output FASTA file
+        intervals (dict): reference id -> (starts, ends), 0-based half-open
+            coordinates on the forward strand of the reference
+        caller (str): Name used as the log prefix
+
+    Returns:
+        int: Number of records that had at least one masked base
+    """
+    import numpy as np
+
+    merged = {}
+    for rname, (starts, ends) in intervals.items():
+        if len(starts):
+            merged[rname] = merge_intervals_np(
+                np.frombuffer(starts, dtype=np.int64),
+                np.frombuffer(ends, dtype=np.int64),
+            )
+    total_records = len(merged)
+    n_code = ord("N")
+    processed = 0
+    with open(output_fasta, "wb") as out_f:
+        for header, seq in _iter_fasta_bytes(input_fasta):
+            rname = header.split(None, 1)[0].decode() if header else ""
+            ranges = merged.get(rname)
+            if ranges is not None and len(seq):
+                seq_len = len(seq)
+                starts = np.clip(ranges[0], 0, seq_len)
+                ends = np.clip(ranges[1], 0, seq_len)
+                keep = ends > starts
+                starts, ends = starts[keep], ends[keep]
+                if starts.size:
+                    # merged intervals never share boundaries, so a +1/-1
+                    # difference array marks the masked positions exactly
+                    delta = np.zeros(seq_len + 1, dtype=np.int8)
+                    delta[starts] = 1
+                    delta[ends] -= 1
+                    view = np.frombuffer(seq, dtype=np.uint8)
+                    view[np.cumsum(delta[:-1], dtype=np.int8) > 0] = n_code
+                    del view
+                processed += 1
+                if processed % 1000 == 0 or processed == total_records:
+                    logger.info(
+                        f"[{caller}] Processed {processed}/{total_records} records with ranges."
+                    )
+            out_f.write(b">" + header + b"\n" + seq + b"\n")
+    return processed
+
+
 def mask_nuc_range(
     input_fasta: str, input_table: str, output_fasta: str
 ) -> None:
@@ -762,61 +964,14 @@ def mask_nuc_range(
         output_fasta (str): Path to the output FASTA file
 
     Note:
-        The ranges in the table should be 1-based coordinates.
-        Handles both forward and reverse strand masking.
+        The ranges in the table should be 1-based coordinates on the forward
+        strand (as reported by diamond/blast, where minus-strand hits have
+        start > stop), so the strand column does not change what is masked.
     """
-    from .sequences import revcomp
-
-    # Read ranges
-    ranges = {}
-    with open(input_table, "r") as f:
-        for line in f:
-            seq_id, start, stop, strand = line.strip().split("\t")
-            if seq_id not in ranges:
-                ranges[seq_id] = []
-            ranges[seq_id].append((int(start), int(stop), strand))
-
-    # Process FASTA file
-    with open(input_fasta, "r") as in_f, open(output_fasta, "w") as out_f:
-        current_id = ""
-        current_seq = ""
-        for line in in_f:
-            if line.startswith(">"):
-                if current_id:
-                    if current_id in ranges:
-                        for start, stop, strand in ranges[current_id]:
-                            if start > stop:
-                                start, stop = stop, start
-                            if strand == "-":
-                                current_seq = revcomp(current_seq)
-                            current_seq = (
-                                current_seq[: start - 1]
-                                + "N" * (stop - start + 1)
-                                + current_seq[stop:]
-                            )
-                            if strand == "-":
-                                current_seq = revcomp(current_seq)
-                    out_f.write(f">{current_id}\n{current_seq}\n")
-                current_id = line[1:].strip()
-                current_seq = ""
-            else:
-                current_seq += line.strip()
-
-        if current_id:
-            if current_id in ranges:
-                for start, stop, strand in ranges[current_id]:
-                    if start > stop:
-                        start, stop = stop, start
-                    if strand == "-":
-                        current_seq = revcomp(current_seq)
-                    current_seq = (
-                        current_seq[: start - 1]
-                        + "N" * (stop - start + 1)
-                        + current_seq[stop:]
-                    )
-                    if strand == "-":
-                        current_seq = revcomp(current_seq)
-            out_f.write(f">{current_id}\n{current_seq}\n")
+    intervals = _collect_intervals_from_table(input_table)
+    apply_interval_masks(
+        input_fasta, output_fasta, intervals, caller="mask_nuc_range"
+    )
 
 
 def mask_nuc_range_from_sam(
@@ -831,190 +986,14 @@ def mask_nuc_range_from_sam(
         output_fasta (str): Path to the output FASTA file
 
     Note:
-        Handles both forward and reverse strand masking.
+        SAM POS/CIGAR are always relative to the forward strand of the
+        reference, so minus-strand hits are masked without reverse
+        complementing. Records are matched on the first word of the header.
     """
-    import re
-
-    from intervaltree import (
-        IntervalTree as itree,
-    )  # assumed available as in other functions
-    from rich.progress import track
-
-    from rolypoly.utils.logging.loggit import get_logger
-
-    from .sequences import revcomp
-
-    logger = get_logger()
-
-    # Parse SAM and collect reference intervals (1-based inclusive, with strand)
-    ranges = {}
-    with open(input_sam, "r") as f:
-        for line in f:
-            if line.startswith("@"):
-                continue
-            parts = line.rstrip("\n").split("\t")
-            if len(parts) < 6:
-                continue
-            try:
-                flag = int(parts[1])
-            except Exception:
-                continue
-            rname = parts[2]
-            if rname == "*" or rname == "":
-                continue
-            try:
-                pos = int(parts[3])
-            except Exception:
-                continue
-            cigar = parts[5]
-            if cigar == "*":
-                continue
-
-            # Compute reference-consuming length from CIGAR
-            ref_consumed = 0
-            for m in re.finditer(r"(\d+)([MIDNSHP=XB])", cigar):
-                clen = int(m.group(1))
-                op = m.group(2)
-                if op in ("M", "D", "N", "=", "X"):
-                    ref_consumed += clen
-
-            if ref_consumed <= 0:
-                continue
-
-            start = pos
-            stop = pos + ref_consumed - 1
-            strand = "-" if (flag & 16) else "+"
-            ranges.setdefault(rname, []).append((start, stop, strand))
-
-    # Merge overlapping intervals per reference and strand using intervaltree
-    merged = {}
-    for rname, lst in ranges.items():
-        # Separate by strand
-        by_strand = {"+": [], "-": []}
-        for s, e, strand in lst:
-            by_strand[strand].append((s, e))
-        merged[rname] = {}
-        for strand, intervals in by_strand.items():
-            if not intervals:
-                continue
-            tree = itree()
-            for s, e in intervals:
-                tree.addi(s, e + 1)
-            tree.merge_overlaps()
-            merged_intervals = [(iv.begin, iv.end - 1) for iv in sorted(tree)]
-            merged[rname][strand] = merged_intervals
-
-    # Count total records with ranges for progress
-    records_with_ranges = [
-        rid for rid in merged if merged[rid].get("+") or merged[rid].get("-")
-    ]
-    total_records = len(records_with_ranges)
-
-    # Read input FASTA and write masked sequences
-    with open(input_fasta, "r") as in_f, open(output_fasta, "w") as out_f:
-        current_id = ""
-        current_seq_parts = []
-        processed = 0
-        for line in in_f:
-            if line.startswith(">"):
-                if current_id:
-                    seq_str = "".join(current_seq_parts)
-                    if current_id in merged:
-                        for strand in ("+", "-"):
-                            intervals = merged[current_id].get(strand, [])
-                            if not intervals:
-                                continue
-                            # If strand is '-', mask on revcomp, then revcomp back
-                            if strand == "+":
-                                for s, e in intervals:
-                                    if s > e:
-                                        s, e = e, s
-                                    seq_str = (
-                                        seq_str[: s - 1]
-                                        + "N" * (e - s + 1)
-                                        + seq_str[e:]
-                                    )
-                            else:
-                                # Mask on revcomp
-                                rc_seq = revcomp(seq_str)
-                                seqlen = len(seq_str)
-                                for s, e in intervals:
-                                    if s > e:
-                                        s, e = e, s
-                                    # Convert 1-based coordinates to revcomp
-                                    rc_s = seqlen - e + 1
-                                    rc_e = seqlen - s + 1
-                                    if rc_s > rc_e:
-                                        rc_s, rc_e = rc_e, rc_s
-                                    rc_seq = (
-                                        rc_seq[: rc_s - 1]
-                                        + "N" * (rc_e - rc_s + 1)
-                                        + rc_seq[rc_e:]
-                                    )
-                                seq_str = revcomp(rc_seq)
-                        processed += (
-                            1
-                            if (
-                                merged[current_id].get("+")
-                                or merged[current_id].get("-")
-                            )
-                            else 0
-                        )
-                        if processed % 10 == 0 or processed == total_records:
-                            logger.info(
-                                f"[mask_nuc_range_from_sam] Processed {processed}/{total_records} records with ranges."
-                            )
-                    out_f.write(f">{current_id}\n{seq_str}\n")
-                current_id = line[1:].strip()
-                current_seq_parts = []
-            else:
-                current_seq_parts.append(line.strip())
-
-        # last record
-        if current_id:
-            seq_str = "".join(current_seq_parts)
-            if current_id in merged:
-                for strand in ("+", "-"):
-                    intervals = merged[current_id].get(strand, [])
-                    if not intervals:
-                        continue
-                    if strand == "+":
-                        for s, e in intervals:
-                            if s > e:
-                                s, e = e, s
-                            seq_str = (
-                                seq_str[: s - 1]
-                                + "N" * (e - s + 1)
-                                + seq_str[e:]
-                            )
-                    else:
-                        rc_seq = revcomp(seq_str)
-                        seqlen = len(seq_str)
-                        for s, e in intervals:
-                            if s > e:
-                                s, e = e, s
-                            rc_s = seqlen - e + 1
-                            rc_e = seqlen - s + 1
-                            if rc_s > rc_e:
-                                rc_s, rc_e = rc_e, rc_s
-                            rc_seq = (
-                                rc_seq[: rc_s - 1]
-                                + "N" * (rc_e - rc_s + 1)
-                                + rc_seq[rc_e:]
-                            )
-                        seq_str = revcomp(rc_seq)
-                processed += (
-                    1
-                    if (
-                        merged[current_id].get("+")
-                        or merged[current_id].get("-")
-                    )
-                    else 0
-                )
-                logger.info(
-                    f"[mask_nuc_range_from_sam] Processed {processed}/{total_records} records with ranges."
-                )
-            out_f.write(f">{current_id}\n{seq_str}\n")
+    intervals = _collect_intervals_from_sam(input_sam)
+    apply_interval_masks(
+        input_fasta, output_fasta, intervals, caller="mask_nuc_range_from_sam"
+    )
 
 
 def main(**kwargs):
@@ -8,288 +8,449 @@ import gzip
 import logging
 import re
 from pathlib import Path
-from typing import Dict, Optional, Tuple, Union
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
 
 from rolypoly.utils.logging.loggit import get_logger
 from rolypoly.utils.various import find_files_by_extension, is_gzipped
 
 
+SAMPLE_STORE_NAME = "read_samples"
+_SENTINEL = object()
+
+
+class _PigzWriter:
+    """Text handle that compresses through a ``pigz -p N`` subprocess."""
+
+    def __init__(self, file_path: Union[str, Path], threads: int):
+        import subprocess as sp
+
+        self._out = open(file_path, "wb")
+        self._proc = sp.Popen(
+            ["pigz", "-p", str(threads), "-c"], stdin=sp.PIPE, stdout=self._out
+        )
+        self._stdin = self._proc.stdin
+
+    def write(self, text: str) -> int:
+        return self._stdin.write(text.encode())
+
+    def writelines(self, lines) -> None:
+        for line in lines:
+            self.write(line)
+
+    def close(self) -> None:
+        self._stdin.close()
+        returncode = self._proc.wait()
+        self._out.close()
+        if returncode != 0:
+            raise RuntimeError(f"pigz exited with code {returncode}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_fastx(
+    file_path: Union[str, Path], mode: str = "rt", compress_threads: int = 1
+):
+    """Open a (possibly gzipped) FASTX file for reading or writing.
+
+    Output files are gzipped when their name ends with .gz, through pigz
+    when compress_threads > 1 and pigz is on the PATH.
+    """
+    import shutil
+
+    file_path = Path(file_path)
+    if "r" in mode:
+        gz = is_gzipped(file_path)
+    else:
+        gz = file_path.suffix == ".gz"
+        if gz and compress_threads > 1 and shutil.which("pigz"):
+            return _PigzWriter(file_path, compress_threads)
+    if gz:
+        return gzip.open(file_path, mode, encoding="utf-8", errors="ignore")
+    return open(file_path, mode, encoding="utf-8", errors="ignore")
+
+
+def iter_fastq_records(handle) -> Iterator[str]:
+    """Yield FASTQ records (4 lines, newline terminated) as single strings."""
+    from itertools import islice
+
+    while True:
+        lines = list(islice(handle, 4))
+        if not lines:
+            return
+        if len(lines) < 4 or not lines[0].startswith("@"):
+            raise ValueError(
+                f"Truncated or malformed FASTQ record: {lines[0].strip()[:80]}"
+            )
+        if not lines[3].endswith("\n"):
+            lines[3] += "\n"
+        yield "".join(lines)
+
+
+def _iter_read_units(
+    file_path: Union[str, Path], r2_path=None, interleaved: bool = False
+) -> Iterator[str]:
+    """Yield sampling units: a read, or a mate pair kept together.
+
+    For R1/R2 files a unit is (r1_record, r2_record); for interleaved
+    files a unit is two consecutive records joined into one string.
+    """
+    if r2_path is not None:
+        with open_fastx(file_path) as f1, open_fastx(r2_path) as f2:
+            it1, it2 = iter_fastq_records(f1), iter_fastq_records(f2)
+            for rec1 in it1:
+                rec2 = next(it2, None)
+                if rec2 is None:
+                    raise ValueError(
+                        f"{r2_path} has fewer reads than {file_path}"
+                    )
+                yield (rec1, rec2)
+            if next(it2, None) is not None:
+                raise ValueError(f"{r2_path} has more reads than {file_path}")
+        return
+    with open_fastx(file_path) as f:
+        records = iter_fastq_records(f)
+        if not interleaved:
+            yield from records
+            return
+        for rec1 in records:
+            rec2 = next(records, None)
+            if rec2 is None:
+                raise ValueError(
+                    f"Odd number of reads in interleaved file {file_path}"
+                )
+            yield rec1 + rec2
+
+
+def _unit_bases(unit) -> int:
+    """Number of sequence bases in a sampling unit (all records it holds)."""
+    records = unit if isinstance(unit, tuple) else (unit,)
+    bases = 0
+    for record in records:
+        lines = record.split("\n")
+        # interleaved units hold two 4-line records
+        bases += sum(len(lines[i]) for i in range(1, len(lines), 4))
+    return bases
+
+
+def reservoir_sample(
+    iterable: Iterable, k: int, seed: Optional[int] = None
+) -> Tuple[list, int]:
+    """Uniformly sample k items from a stream in one pass (Algorithm L).
+
+    Args:
+        iterable: Items to sample from
+        k: Number of items to keep
+        seed: Seed for reproducible samples
+
+    Returns:
+        Tuple of ([(index, item), ...] sorted by input order, items seen)
+    """
+    import math
+    import random
+    from itertools import islice
+
+    rng = random.Random(seed)
+
+    def _uniform() -> float:
+        # random() is in [0, 1); log() needs it strictly positive
+        return rng.random() or 5e-324
+
+    iterator = iter(iterable)
+    reservoir = list(enumerate(islice(iterator, k)))
+    seen = len(reservoir)
+    if k <= 0 or seen < k:
+        return (reservoir if k > 0 else []), seen + sum(1 for _ in iterator)
+
+    # draw the gap to the next replacement instead of a number per item
+    w = math.exp(math.log(_uniform()) / k)
+    while True:
+        skip = int(math.log(_uniform()) / math.log(max(1 - w, 1e-300)))
+        consumed = sum(1 for _ in islice(iterator, skip))
+        seen += consumed
+        if consumed < skip:
+            break
+        item = next(iterator, _SENTINEL)
+        if item is _SENTINEL:
+            break
+        reservoir[rng.randrange(k)] = (seen, item)
+        seen += 1
+        w *= math.exp(math.log(_uniform()) / k)
+    reservoir.sort(key=lambda pair: pair[0])
+    return reservoir, seen
+
+
+_UNUSABLE_CACHE_ROOTS = set()
+
+
+def _sample_cache(cache_dir=None, logger=None):
+    """The persistent sample store, or None if the cache root is unusable.
+
+    Read-only or missing cache roots (common for HOME on clusters) only
+    turn caching off, they never fail the analysis.
+    """
+    from rolypoly.utils.cache import CacheStore
+
+    try:
+        return CacheStore(SAMPLE_STORE_NAME, cache_dir=cache_dir, logger=logger)
+    except OSError as e:
+        if str(cache_dir) not in _UNUSABLE_CACHE_ROOTS:
+            _UNUSABLE_CACHE_ROOTS.add(str(cache_dir))
+            get_logger(logger).warning(
+                f"Read sample cache unavailable ({e}), continuing without it"
+            )
+        return None
+
+
+def _sample_cache_key(file_path: Union[str, Path], **params) -> str:
+    from rolypoly.utils.cache import file_fingerprint, hash_key
+
+    return hash_key({"file": file_fingerprint(file_path), **params})
+
+
+def count_reads(
+    file_path: Union[str, Path],
+    use_cache: bool = True,
+    logger: Optional[logging.Logger] = None,
+    cache_dir: Union[str, Path, None] = None,
+) -> int:
+    """Count the reads in a FASTQ file, reusing the persistent count cache."""
+    import json
+
+    logger = get_logger(logger)
+
+    def _count() -> int:
+        with open_fastx(file_path) as f:
+            return sum(1 for _ in iter_fastq_records(f))
+
+    store = _sample_cache(cache_dir, logger) if use_cache else None
+    if store is None:
+        return _count()
+
+    def _build(entry_dir: Path) -> None:
+        (entry_dir / "count.json").write_text(json.dumps({"reads": _count()}))
+
+    try:
+        key = _sample_cache_key(file_path, kind="read_count")
+        with store.use(key, _build, params={"file": str(file_path)}) as entry:
+            return json.loads((entry / "count.json").read_text())["reads"]
+    except OSError as e:
+        logger.warning(f"Not caching the read count of {file_path}: {e}")
+        return _count()
+
+
+def _record_read_count(
+    file_path, n_reads: int, logger=None, cache_dir=None
+) -> None:
+    """Store a read count learned as a side effect of a full pass."""
+    import json
+
+    store = _sample_cache(cache_dir, logger)
+    if store is None:
+        return
+    try:
+        key = _sample_cache_key(file_path, kind="read_count")
+        if not store.has(key):
+            store.get_or_build(
+                key,
+                lambda d: (d / "count.json").write_text(
+                    json.dumps({"reads": n_reads})
+                ),
+                params={"file": str(file_path)},
+            )
+    except OSError as e:
+        get_logger(logger).debug(f"Read count of {file_path} not cached: {e}")
+
+
+def get_probe_sample(
+    file_path: Union[str, Path],
+    n_reads: int = 1000,
+    logger: Optional[logging.Logger] = None,
+    cache_dir: Union[str, Path, None] = None,
+) -> Path:
+    """Path to a cached FASTQ with the first ``n_reads`` reads of a file.
+
+    Only the head of the input is decompressed, and the probe is shared
+    through the persistent cache so later commands don't re-read it.
+    Without a usable cache the input itself is returned (readers only
+    take its first reads anyway).
+    """
+    logger = get_logger(logger)
+    store = _sample_cache(cache_dir, logger)
+    if store is None:
+        return Path(file_path)
+
+    def _build(entry_dir: Path) -> None:
+        from itertools import islice
+
+        with (
+            open_fastx(file_path) as f_in,
+            open(entry_dir / "probe.fastq", "w") as f_out,
+        ):
+            f_out.writelines(islice(iter_fastq_records(f_in), n_reads))
+
+    try:
+        key = _sample_cache_key(file_path, kind="probe", n_reads=n_reads)
+        entry = store.get_or_build(
+            key, _build, params={"file": str(file_path), "n_reads": n_reads}
+        )
+    except OSError as e:
+        logger.warning(f"Not caching the probe of {file_path}: {e}")
+        return Path(file_path)
+    return entry / "probe.fastq"
+
+
 def create_sample_file(
     file_path: Union[str, Path],
     subset_type: str = "top_reads",
     sample_size: Union[int, float] = 1000,
     output_file: str = "sample.fastq.gz",
     logger: Optional[logging.Logger] = None,
-) -> str:
-    """Create a temporary sample file from a FASTQ file for analysis.
+    interleaved: bool = False,
+    seed: Optional[int] = None,
+    use_cache: bool = True,
+    compress_threads: int = 1,
+    cache_dir: Union[str, Path, None] = None,
+) -> Dict[str, Union[str, int, None]]:
+    """Create a sample file from a FASTQ file in a single streaming pass.
 
     Args:
         file_path: Path to the input FASTQ file. If it is 2 paired end files (r1 r2) use , to separate them.
-        subset_type: Type of subsert - "top_reads" or "random".
-        sample_size: if top_reads than how many reads (from the top) to sample, if random than fracton of reads to sample randomly (0.0-1.0)
-        # keep_pairs: Keep paired-end reads - if true input file is assumed to be paired end AND interleaved. all R1 reads in the output will have matching R2. (EDIT- I'm just going to sneakily take half the sample size, get that many random items, then take 2 consecutive reads at a time lol)
+        subset_type: Type of subset - "top_reads" (first reads, stops reading early) or "random".
+        sample_size: Number of reads to keep if >= 1, else the fraction of reads to keep (0.0-1.0).
+            For interleaved input this counts reads (so sample_size/2 pairs), for R1/R2 input it counts pairs.
         output_file: path to output file - if ending in .gz then will be compressed. If input is 2 paired end files, will assume output also has 2 files in it (R1 and R2) separated by comma.
         logger: Logger instance
+        interleaved: Input is interleaved - mates are sampled together.
+        seed: Seed for the random subset, for reproducible samples.
+        use_cache: Reuse/record read counts in the persistent sample cache.
+        compress_threads: pigz threads for .gz outputs.
+        cache_dir: Root of the persistent caches (default: ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly).
 
     Returns:
-        name of output file
+        Dictionary with the output file and the number of input and written
+        reads and bases. Like the bases, reads count every mate (so an
+        R1/R2 pair counts as two reads); input counts are None when a
+        top_reads probe stopped early.
+
     Note:
-        - If sample type is random, the total number of reads in the file will have to be computed and that coudl be slow.
-        - Generally adivsory to use gzipped output file
-        - ..,, to provice an even number for sample_size, if subset_type is top_reads. Otherwise if your input file is interleaved, the last read will lose its pair.
-        -
+        - Random subsets of a fixed size use reservoir sampling, fractional
+          ones keep each read/pair with that probability, so the file is
+          only decompressed once and never needs a separate count.
+        - top_reads with a fraction needs the total read count, which is
+          taken from the cache when a previous run already counted the file.
     """
-    logger = get_logger(logger)
-    file_path = Path(file_path)
-    is_paired_files = False if "," not in str(file_path) else True
-    is_gz_output = True if Path(output_file).suffix == ".gz" else False
-
-    # Helper to get total reads in a FASTQ file
-    def _get_total_reads(fpath, gzipped):
-        import subprocess as sp
+    import random
+    from itertools import islice
 
-        if gzipped:
-            cmd = f"zgrep -c '^@' {fpath}"
+    logger = get_logger(logger)
+    is_paired_files = "," in str(file_path)
+    if is_paired_files:
+        r1_path, r2_path = (Path(p) for p in str(file_path).split(","))
+        out_paths = [Path(p) for p in str(output_file).split(",")]
+        reads_per_unit = 1
+    else:
+        r1_path, r2_path = Path(file_path), None
+        out_paths = [Path(output_file)]
+        reads_per_unit = 2 if interleaved else 1
+    # reads_per_unit is per file (sizes, cached counts); the returned
+    # counts include both mates of a pair, matching the base counts
+    mates_per_unit = 2 if is_paired_files or interleaved else 1
+
+    is_fraction = isinstance(sample_size, float) and sample_size < 1.0
+    n_units = None if is_fraction else int(sample_size) // reads_per_unit
+    logger.debug(f"Sampling {subset_type} of {sample_size} of {file_path}")
+
+    input_bases = [0]
+
+    def _counted(unit_iter):
+        # only used for full passes, where input bases come for free
+        for unit in unit_iter:
+            input_bases[0] += _unit_bases(unit)
+            yield unit
+
+    units = _iter_read_units(r1_path, r2_path, interleaved=interleaved)
+    total_units = None
+    sampled = [0, 0]  # units, bases
+
+    def _write(unit) -> None:
+        sampled[0] += 1
+        sampled[1] += _unit_bases(unit)
+        if is_paired_files:
+            handles[0].write(unit[0])
+            handles[1].write(unit[1])
         else:
-            cmd = f"grep -c '^@' {fpath}"
-        try:
-            return int(
-                sp.run(
-                    cmd, shell=True, capture_output=True, text=True
-                ).stdout.strip()
-            )
-        except Exception as e:
-            logger.error(f"Failed to count reads in {fpath}: {e}")
-            raise
+            handles[0].write(unit)
 
-    # Decide if we need to get total reads first
-    need_total_reads = False
-    if subset_type == "random":
-        need_total_reads = True
-    elif (
-        subset_type == "top_reads"
-        and isinstance(sample_size, float)
-        and sample_size < 1.0
-    ):
-        need_total_reads = True
-    logger.debug(f"need_total_reads: {need_total_reads}")
-
-    if not is_paired_files:
-        is_gz = is_gzipped(file_path)
-        total_reads = None
-        if need_total_reads:
-            total_reads = _get_total_reads(file_path, is_gz)
-            # If sample_size is float, convert to int number of reads
-            if isinstance(sample_size, float):
-                sample_size = int(sample_size * total_reads)
-        logger.debug(f"Sampling {subset_type} of {sample_size} of {file_path}")
+    try:
+        if subset_type not in ("top_reads", "random"):
+            raise ValueError(f"Unknown subset_type: {subset_type}")
+        handles = [
+            open_fastx(p, "wt", compress_threads=compress_threads)
+            for p in out_paths
+        ]
         try:
+            # kept units are written as they are drawn; only the fixed-size
+            # reservoir has to hold its sample until the input ends
             if subset_type == "top_reads":
-                sample_size_int = int(sample_size)
-                sample_size_int = sample_size_int - (
-                    sample_size_int % 2
-                )  # ensure even for pairs
-                n_lines = sample_size_int * 4  # 4 lines per read
-                # Stream first n lines without loading entire file
-                if is_gz:
-                    f_in = gzip.open(
-                        file_path, "rt", encoding="utf-8", errors="ignore"
-                    )
-                else:
-                    f_in = open(
-                        file_path, "r", encoding="utf-8", errors="ignore"
-                    )
-                if is_gz_output:
-                    f_out = gzip.open(output_file, "wt", encoding="utf-8")
-                else:
-                    f_out = open(output_file, "w", encoding="utf-8")
-                for i, line in enumerate(f_in):
-                    if i >= n_lines:
-                        break
-                    f_out.write(line)
-                f_out.close()
-                f_in.close()
-            elif subset_type == "random":
-                import itertools
-                from random import sample
-
-                import numpy as np
-
-                sample_size_int = int(sample_size)
-                sample_size_int = sample_size_int - (sample_size_int % 2)
-                if total_reads is None:
-                    total_reads = _get_total_reads(file_path, is_gz)
-                if sample_size_int > total_reads:
-                    logger.warning(
-                        f"Requested sample_size {sample_size_int} > total_reads {total_reads}, using all reads."
-                    )
-                    sample_size_int = total_reads - (total_reads % 2)
-                # Each read = 4 lines, so sample indices of reads
-                read_indices = sample(range(total_reads), sample_size_int)
-                read_indices = np.sort(read_indices)
-                # Convert to line numbers
-                lines_2_get = np.sort(
-                    list(
-                        itertools.chain.from_iterable(
-                            [
-                                [i * 4 + j for j in range(4)]
-                                for i in read_indices
-                            ]
-                        )
-                    )
-                )
-                target_set = set(lines_2_get)
-                target_iter = iter(lines_2_get)
-                try:
-                    next_target = next(target_iter)
-                except StopIteration:
-                    next_target = None
-                f_in = (
-                    gzip.open(
-                        file_path, "rt", encoding="utf-8", errors="ignore"
+                if is_fraction:
+                    total_reads = count_reads(
+                        r1_path, use_cache, logger, cache_dir
                     )
-                    if is_gz
-                    else open(file_path, "r", encoding="utf-8", errors="ignore")
-                )
-                f_out = (
-                    gzip.open(output_file, "wt", encoding="utf-8")
-                    if is_gz_output
-                    else open(output_file, "w", encoding="utf-8")
-                )
-                for i, line in enumerate(f_in):
-                    if next_target is not None and i > lines_2_get[-1]:
-                        break
-                    if i in target_set:
-                        f_out.write(line)
-                        try:
-                            next_target = next(target_iter)
-                        except StopIteration:
-                            next_target = None
-                f_in.close()
-                f_out.close()
-        except Exception as e:
-            logger.error(f"Error creating sample file from {file_path}: {e}")
-            raise
-    elif "," in str(file_path):
-        # Assume 2 paired end files. Like above but first pass on R1 file we keep the read names selected, then second pass on R2 file we keep the read headers that have 2 instead of 1 in final header char.
-        logger.debug(f"Sampling {subset_type} of {sample_size} of {file_path}")
-        try:
-            r1_path, r2_path = str(file_path).split(",")
-            r1_path = Path(r1_path)
-            r2_path = Path(r2_path)
-            is_gz = is_gzipped(r1_path)
-            r1_output_file, r2_output_file = output_file.split(",")
-            total_reads = None
-            if need_total_reads:
-                total_reads = _get_total_reads(r1_path, is_gz)
-                if isinstance(sample_size, float):
-                    sample_size = int(sample_size * total_reads)
-            if subset_type == "top_reads":
-                sample_size_int = int(sample_size)
-                sample_size_int = sample_size_int - (sample_size_int % 2)
-                lines_2_get = [i for i in range(0, sample_size_int * 2, 4)]
+                    n_units = int(sample_size * total_reads) // reads_per_unit
+                for unit in islice(units, n_units):
+                    _write(unit)
+            elif is_fraction:
+                rng = random.Random(seed)
+                total_units = 0
+                for unit in _counted(units):
+                    total_units += 1
+                    if rng.random() < sample_size:
+                        _write(unit)
             else:
-                import itertools
-                from random import sample
-
-                import numpy as np
-
-                sample_size_int = int(sample_size)
-                sample_size_int = sample_size_int - (sample_size_int % 2)
-                if total_reads is None:
-                    total_reads = _get_total_reads(r1_path, is_gz)
-                if sample_size_int > total_reads:
-                    logger.warning(
-                        f"Requested sample_size {sample_size_int} > total_reads {total_reads}, using all reads."
-                    )
-                    sample_size_int = total_reads - (total_reads % 2)
-                read_indices = sample(range(total_reads), sample_size_int)
-                read_indices = np.sort(read_indices)
-                lines_2_get = np.sort(
-                    list(
-                        itertools.chain.from_iterable(
-                            [
-                                [i * 4 + j for j in range(4)]
-                                for i in read_indices
-                            ]
-                        )
-                    )
+                reservoir, total_units = reservoir_sample(
+                    _counted(units), n_units, seed
                 )
-            target_set = set(lines_2_get)
-            target_iter = iter(lines_2_get)
-            try:
-                next_target = next(target_iter)
-            except StopIteration:
-                next_target = None
-            # first pass - R1
-            headers = []
-            f_in = (
-                gzip.open(r1_path, "rt", encoding="utf-8", errors="ignore")
-                if is_gz
-                else open(r1_path, "r", encoding="utf-8", errors="ignore")
-            )
-            f_out = (
-                gzip.open(r1_output_file, "wt", encoding="utf-8")
-                if is_gz_output
-                else open(r1_output_file, "w", encoding="utf-8")
-            )
-            for i, line in enumerate(f_in):
-                if next_target is None or i >= lines_2_get[-1] + 1:
-                    break
-                if i in target_set:
-                    f_out.write(line)
-                    if line.startswith("@"):
-                        headers.append(line.strip())
-                    try:
-                        next_target = next(target_iter)
-                    except StopIteration:
-                        next_target = None
-            f_in.close()
-            f_out.close()
-            # second pass - R2
-            headers_2 = {str(h).removesuffix("1") + "2" for h in headers}
-            f_in = (
-                gzip.open(r2_path, "rt", encoding="utf-8", errors="ignore")
-                if is_gz
-                else open(r2_path, "r", encoding="utf-8", errors="ignore")
-            )
-            f_out = (
-                gzip.open(r2_output_file, "wt", encoding="utf-8")
-                if is_gz_output
-                else open(r2_output_file, "w", encoding="utf-8")
-            )
-            while headers_2:
-                try:
-                    line = next(f_in)
-                except StopIteration:
+                if total_units < n_units:
                     logger.warning(
-                        f"Reached end of {r2_path} before finding all expected headers. "
-                        f"{len(headers_2)} read pair(s) missing."
+                        f"Requested sample_size {sample_size} > total reads {total_units * reads_per_unit}, using all reads."
                     )
-                    break
-                if line.startswith("@"):
-                    stripped = line.strip()
-                    if stripped in headers_2:
-                        f_out.write(line)
-                        f_out.write(next(f_in))
-                        f_out.write(next(f_in))
-                        f_out.write(next(f_in))
-                        headers_2.remove(stripped)
-                        continue
-            f_in.close()
-            f_out.close()
-            if headers_2.__len__() > 0:
-                logger.warning(
-                    "WHOW! not all headers were found in R2 - THIS IS NOT A GOOD SIGN"
-                )
-        except Exception as e:
-            logger.error(f"Error creating sample file from {file_path}: {e}")
+                for _, unit in reservoir:
+                    _write(unit)
+        finally:
+            for handle in handles:
+                handle.close()
+    except Exception as e:
+        logger.error(f"Error creating sample file from {file_path}: {e}")
+        raise
+
+    total_reads = None
+    total_bases = None
+    if total_units is not None:
+        total_reads = total_units * mates_per_unit
+        total_bases = input_bases[0]
+        if use_cache:
+            _record_read_count(
+                r1_path, total_units * reads_per_unit, logger, cache_dir
+            )
+    return {
+        "output_file": str(output_file),
+        "input_reads": total_reads,
+        "input_bases": total_bases,
+        "sampled_reads": sampled[0] * mates_per_unit,
+        "sampled_bases": sampled[1],
+    }
 
 
 def determine_fastq_type(
     file_path: Union[str, Path],
     sample_size: int = 1000,  # Increased from whenever. should be consisent as long as the number is even..
     logger: Optional[logging.Logger] = None,
+    use_cache: bool = True,
+    cache_dir: Union[str, Path, None] = None,
 ) -> Dict:
     """Analyze FASTQ headers to determine file characteristics.
 
@@ -297,13 +458,60 @@ def determine_fastq_type(
         file_path: Path to FASTQ file or sample file
         sample_size: Number of reads (from the top of file) to use
         logger: Logger instance
+        use_cache: Reuse the analysis (and head probe) stored in the
+            persistent sample cache by earlier commands on the same file.
+            An unusable cache falls back to the uncached analysis.
+        cache_dir: Root of the persistent caches (default: ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)
 
     Returns:
         Dictionary containing header analysis results
     """
-    import polars as pl
+    import json
 
     logger = get_logger(logger)
+    store = _sample_cache(cache_dir, logger) if use_cache else None
+    if store is None:
+        return _determine_fastq_type(file_path, file_path, sample_size, logger)
+
+    try:
+        key = _sample_cache_key(
+            file_path, kind="fastq_type", sample_size=sample_size
+        )
+    except OSError as e:
+        logger.error(f"Error analyzing  {file_path}: {e}")
+        return _determine_fastq_type(file_path, file_path, sample_size, logger)
+
+    def _build(entry_dir: Path) -> None:
+        probe = get_probe_sample(file_path, sample_size, logger, cache_dir)
+        # raise instead of returning the "unknown" defaults, so failed
+        # analyses are not persisted
+        results = _determine_fastq_type(
+            file_path, probe, sample_size, logger, raise_errors=True
+        )
+        (entry_dir / "analysis.json").write_text(
+            json.dumps(results, default=float)
+        )
+
+    try:
+        with store.use(
+            key,
+            _build,
+            params={"file": str(file_path), "sample_size": sample_size},
+        ) as entry:
+            return json.loads((entry / "analysis.json").read_text())
+    except Exception:
+        return _determine_fastq_type(file_path, file_path, sample_size, logger)
+
+
+def _determine_fastq_type(
+    file_path: Union[str, Path],
+    reads_path: Union[str, Path],
+    sample_size: int,
+    logger: logging.Logger,
+    raise_errors: bool = False,
+) -> Dict:
+    """Header analysis of the first sample_size reads in reads_path."""
+    import polars as pl
     from needletail import (
         decode_phred,  # could be cool to add a mean quality score calculation here.
     )
@@ -320,7 +528,7 @@ def determine_fastq_type(
     }
     try:
         file_path = Path(file_path)
-        fastq_df = read_fastx(file_path)
+        fastq_df = read_fastx(Path(reads_path))
         fastq_df = fastq_df.head(sample_size).collect()
         header_count = fastq_df.select(
             pl.col("header").str.tail(2).value_counts()
@@ -396,6 +604,8 @@ def determine_fastq_type(
         logger.debug(f"Header analysis for {file_path}: {results}")
 
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Error analyzing  {file_path}: {e}")
     return results
 
@@ -439,6 +649,7 @@ def identify_fastq_files(
     input_path: Union[str, Path],
     return_rolypoly: bool = True,
     logger: Optional[logging.Logger] = None,
+    cache_dir: Union[str, Path, None] = None,
 ) -> Dict:
     """Identify and categorize FASTQ files from input path.
 
@@ -446,6 +657,7 @@ def identify_fastq_files(
         input_path: Path to input directory or file
         return_rolypoly: Whether to look for and return rolypoly-formatted files first
         logger: Logger instance
+        cache_dir: Root of the persistent caches used by determine_fastq_type
 
     Returns:
         Dictionary containing categorized file information:
@@ -501,7 +713,7 @@ def identify_fastq_files(
                     for file_type, file_path in data.items():
                         if file_path:
                             analysis = determine_fastq_type(
-                                file_path, logger=logger
+                                file_path, logger=logger, cache_dir=cache_dir
                             )
                             file_info["file_details"][str(file_path)] = analysis
 
@@ -528,8 +740,12 @@ def identify_fastq_files(
                 pair_path = file.parent / pair_file
                 if pair_path.exists() and pair_path in all_fastq:
                     # Analyze both files
-                    r1_analysis = determine_fastq_type(file, logger=logger)
-                    r2_analysis = determine_fastq_type(pair_path, logger=logger)
+                    r1_analysis = determine_fastq_type(
+                        file, logger=logger, cache_dir=cache_dir
+                    )
+                    r2_analysis = determine_fastq_type(
+                        pair_path, logger=logger, cache_dir=cache_dir
+                    )
 
                     file_info["file_details"][str(file)] = r1_analysis
                     file_info["file_details"][str(pair_path)] = r2_analysis
@@ -549,7 +765,9 @@ def identify_fastq_files(
                 continue
 
             logger.debug(f"Analyzing remaining file: {file}")
-            analysis = determine_fastq_type(file, logger=logger)
+            analysis = determine_fastq_type(
+                file, logger=logger, cache_dir=cache_dir
+            )
             file_info["file_details"][str(file)] = analysis
 
             # Categorize based on analysis
@@ -572,7 +790,9 @@ def identify_fastq_files(
     else:
         # Single file input
         logger.info(f"Analyzing single file: {input_path}")
-        analysis = determine_fastq_type(input_path, logger=logger)
+        analysis = determine_fastq_type(
+            input_path, logger=logger, cache_dir=cache_dir
+        )
         file_info["file_details"][str(input_path)] = analysis
 
         if analysis["file_type"] == "interleaved":
@@ -593,7 +813,9 @@ def identify_fastq_files(
 
 
 def handle_input_fastq(
-    input_path: Union[str, Path], logger: Optional[logging.Logger] = None
+    input_path: Union[str, Path],
+    logger: Optional[logging.Logger] = None,
+    cache_dir: Union[str, Path, None] = None,
 ) -> Dict:
     """Handle input FASTQ files and prepare file information for processing.
 
@@ -604,6 +826,7 @@ def handle_input_fastq(
     Args:
         input_path: Path to input directory or file(s)
         logger: Logger instance
+        cache_dir: Root of the persistent caches used by determine_fastq_type
 
     Returns:
         Dictionary containing:
@@ -660,7 +883,7 @@ def handle_input_fastq(
 
     # Use consolidated file detection for directory or single file
     file_info = identify_fastq_files(
-        input_path, return_rolypoly=False, logger=logger
+        input_path, return_rolypoly=False, logger=logger, cache_dir=cache_dir
     )
 
     # Generate appropriate file name
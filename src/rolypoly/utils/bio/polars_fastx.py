@@ -134,6 +134,33 @@ def from_fastx_eager(file: Union[str, Path]) -> pl.DataFrame:
     return pl.LazyFrame.from_fastx(file).collect()
 
 
+def scan_fastx_headers(input_file: Union[str, Path]) -> pl.LazyFrame:
+    """Scan only the headers of a (gzipped) FASTA/FASTQ file.
+
+    The file is read as plain lines by the polars CSV reader, so sequences
+    are never materialised as records. FASTQ files are expected in the
+    4-line layout.
+
+    Returns:
+        pl.LazyFrame: Column ``header`` (without the leading > or @), in file order
+    """
+    lines = pl.scan_csv(
+        input_file,
+        has_header=False,
+        separator="\x01",
+        quote_char=None,
+        schema={"line": pl.String},
+    ).filter(pl.col("line").str.len_bytes() > 0)
+    first = lines.head(1).collect()
+    if first.is_empty():
+        return pl.LazyFrame(schema={"header": pl.String})
+    if first["line"][0].startswith("@"):
+        lines = lines.gather_every(4)
+    else:
+        lines = lines.filter(pl.col("line").str.starts_with(">"))
+    return lines.select(pl.col("line").str.slice(1).alias("header"))
+
+
 @pl.api.register_lazyframe_namespace("from_gff")
 def from_gff_lazy(input_file: Union[str, Path]) -> pl.LazyFrame:
     """Scan a gff(3) file into a lazy polars DataFrame.
@@ -684,6 +711,173 @@ def frame_to_fastx(
         )
 
 
+####################################################################################
+#### output gff3 files from polars dataframes/lazyframes
+# candidate input columns of the GFF3 fields, in order of preference
+GFF3_FIELD_COLUMNS = {
+    "seqid": [
+        "seqid",
+        "sequence_id",
+        "query",
+        "qseqid",
+        "contig_id",
+        "contig",
+        "id",
+        "name",
+        "query_full_name",
+    ],
+    "source": ["source", "Source", "db", "DB", "database"],
+    "type": ["type", "Type", "feature", "Feature"],
+    "score": ["score", "Score", "bitscore", "qscore", "bit", "bits"],
+    "strand": ["strand", "Strand", "sense", "Sense"],
+    "phase": ["phase", "Phase"],
+}
+# characters percent-encoded in every column (GFF3 spec), "%" first
+GFF3_ESCAPE = ["%", "\t", "\n", "\r"]
+# additionally reserved in seqid and in attribute tags/values
+GFF3_ESCAPE_SEQID = GFF3_ESCAPE + [" ", ";", "=", "&", ","]
+GFF3_ESCAPE_ATTRIBUTE = GFF3_ESCAPE + [";", "=", "&", ","]
+
+
+def gff3_escape(expr: pl.Expr, reserved=GFF3_ESCAPE) -> pl.Expr:
+    """Percent-encode reserved characters of a string expression."""
+    for char in reserved:
+        expr = expr.str.replace_all(char, f"%{ord(char):02X}", literal=True)
+    return expr
+
+
+def gff3_attributes(columns, preformatted=()) -> pl.Expr:
+    """GFF3 attribute field (column 9) from columns, as one string expression.
+
+    Each non-null, non-empty, non-"." value becomes an escaped tag=value
+    pair, in column order; columns in preformatted already hold attribute
+    strings and are inserted as they are. Rows without attributes get ".".
+    """
+    pairs = []
+    for column in columns:
+        value = pl.col(column).cast(pl.Utf8)
+        keep = value.is_not_null() & ~value.is_in(["", "."])
+        if column in preformatted:
+            pairs.append(pl.when(keep).then(value))
+            continue
+        tag = gff3_escape(pl.lit(column), GFF3_ESCAPE_ATTRIBUTE)
+        pairs.append(
+            pl.when(keep).then(
+                tag + pl.lit("=") + gff3_escape(value, GFF3_ESCAPE_ATTRIBUTE)
+            )
+        )
+    if not pairs:
+        return pl.lit(".").alias("attributes")
+    joined = pl.concat_str(pairs, separator=";", ignore_nulls=True)
+    return (
+        pl.when(joined != "")
+        .then(joined)
+        .otherwise(pl.lit("."))
+        .alias("attributes")
+    )
+
+
+def frame_to_gff3(
+    frame: Union[pl.LazyFrame, pl.DataFrame],
+    output_file: Union[str, Path],
+    default_type: str = "feature",
+    sort: bool = True,
+) -> Path:
+    """Write an annotation table as GFF3, with column expressions only.
+
+    The nine GFF3 columns are picked from the frame by the GFF3_FIELD_COLUMNS
+    candidates (missing ones get defaults: source "rp", type default_type,
+    strand "+", score and phase "."), ``start``/``end`` are taken as
+    1-based inclusive coordinates, and every other column becomes an
+    attribute. A column named ``attributes`` is taken as preformatted
+    attribute pairs. Values are percent-encoded per the GFF3 spec and the
+    rows are streamed to the file with sink_csv.
+
+    Args:
+        frame: Annotation table (eager or lazy)
+        output_file: Output GFF3 path
+        default_type: Feature type of tables without a type column
+        sort: Sort records by seqid, then start
+
+    Returns:
+        Path: output_file
+    """
+    frame = frame.lazy()
+    columns = frame.collect_schema().names()
+
+    def _pick(field):
+        return next(
+            (c for c in GFF3_FIELD_COLUMNS[field] if c in columns), None
+        )
+
+    picked = {field: _pick(field) for field in GFF3_FIELD_COLUMNS}
+    if picked["seqid"] is None:
+        raise ValueError(
+            f"No sequence ID column found. Available columns: {columns}"
+        )
+    defaults = {
+        "source": "rp",
+        "type": default_type,
+        "score": ".",
+        "strand": "+",
+        "phase": ".",
+    }
+
+    def _field(field, reserved=GFF3_ESCAPE):
+        if picked[field] is None:
+            return pl.lit(defaults[field]).alias(field)
+        value = pl.col(picked[field]).cast(pl.Utf8)
+        return (
+            gff3_escape(value, reserved)
+            .fill_null(defaults.get(field, "."))
+            .replace("", ".")
+            .alias(field)
+        )
+
+    attribute_columns = [
+        c
+        for c in columns
+        if c not in picked.values() and c not in ("start", "end")
+    ]
+    records = frame.select(
+        _field("seqid", GFF3_ESCAPE_SEQID),
+        _field("source"),
+        _field("type"),
+        pl.col("start").cast(pl.Int64)
+        if "start" in columns
+        else pl.lit(1, pl.Int64).alias("start"),
+        pl.col("end").cast(pl.Int64)
+        if "end" in columns
+        else pl.lit(1, pl.Int64).alias("end"),
+        _field("score"),
+        _field("strand"),
+        _field("phase"),
+        gff3_attributes(
+            attribute_columns,
+            preformatted=[c for c in attribute_columns if c == "attributes"],
+        ),
+    )
+    if sort:
+        records = records.sort(["seqid", "start"], maintain_order=True)
+    lines = pl.concat(
+        [
+            pl.LazyFrame({"line": ["##gff-version 3"]}),
+            records.select(
+                pl.concat_str(
+                    pl.all().cast(pl.Utf8).fill_null("."), separator="\t"
+                ).alias("line")
+            ),
+        ]
+    )
+    lines.sink_csv(
+        output_file,
+        include_header=False,
+        quote_style="never",
+        engine="streaming",
+    )
+    return Path(output_file)
+
+
 ####################################################################################
 #### Schema utilities for annotation data (mostly gff).
 def normalize_column_names(df):
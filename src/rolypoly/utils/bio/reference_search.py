@@ -0,0 +1,348 @@
+"""
+Searches of one query set against several reference databases.
+
+The query is turned into an mmseqs2 DB once and searched against every
+reference from it. Reference DBs and their precomputed k-mer indices
+(``mmseqs createindex``) or diamond ``.dmnd`` files live in the persistent
+``reference_indices`` cache, so they are built once per reference content
+and reused by later runs (and by concurrent jobs, which wait on the cache
+lock instead of building the same index twice). Searches against the
+different references run concurrently under the resource scheduler, and
+the converted hits are merged into one polars frame tagged by reference.
+
+Key functions:
+    - is_fasta_path: Whether a path looks like a (gzipped) FASTA/FASTQ file
+    - cached_mmseqs_target: Reference mmseqs DB with a prebuilt index, from the cache
+    - cached_diamond_db: Reference diamond DB (.dmnd), from the cache
+    - create_query_db: mmseqs DB of the query, built once per run
+    - search_references: Concurrent mmseqs searches of one query DB against references
+    - convert_results: Convert search results per reference and merge them
+"""
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import polars as pl
+
+from rolypoly.utils.logging.loggit import get_logger
+
+REFERENCE_STORE = "reference_indices"
+FASTA_SUFFIXES = (
+    ".faa",
+    ".fasta",
+    ".fas",
+    ".fa",
+    ".fna",
+    ".fastq",
+    ".fq",
+    ".gz",
+)
+DEFAULT_FORMAT_OUTPUT = "qheader,theader,qlen,tlen,qstart,qend,tstart,tend,alnlen,mismatch,qcov,tcov,bits,evalue,gapopen,pident,nident"
+
+
+def is_fasta_path(path: Union[str, Path]) -> bool:
+    """Whether a path looks like a (gzipped) FASTA/FASTQ file."""
+    return Path(path).suffix in FASTA_SUFFIXES
+
+
+def _reference_store(cache_dir=None, logger=None):
+    from rolypoly.utils.cache import CacheStore
+
+    return CacheStore(REFERENCE_STORE, cache_dir=cache_dir, logger=logger)
+
+
+def _run(cmd: List[str], logger) -> None:
+    logger.debug(f"Running: {' '.join(cmd)}")
+    subprocess.run(cmd, check=True)
+
+
+def cached_mmseqs_target(
+    target: Union[str, Path],
+    dbtype: int = 2,
+    search_type: int = 3,
+    create_index: bool = True,
+    threads: int = 1,
+    cache_dir: Union[str, Path, None] = None,
+    logger=None,
+) -> Path:
+    """mmseqs DB of a reference (with its search index) from the persistent cache.
+
+    FASTA references are converted with ``createdb`` and keyed by their
+    content. Preformatted DBs (a DB prefix such as the ones shipped in
+    ROLYPOLY_DATA) are linked into the cache entry, keyed by a fingerprint
+    of the DB files, and only get the index built next to the links.
+
+    Args:
+        target: Reference FASTA or mmseqs DB prefix
+        dbtype: mmseqs createdb --dbtype (1 amino acid, 2 nucleotide)
+        search_type: --search-type the index is built for
+        create_index: Also precompute the k-mer index (createindex)
+        threads: Threads for createdb/createindex
+        cache_dir: Override for the cache root
+        logger: Logger instance
+
+    Returns:
+        Path: DB prefix to pass to mmseqs search
+    """
+    from rolypoly.utils.cache import file_digest, file_fingerprint, hash_key
+
+    logger = get_logger(logger)
+    target = Path(target).absolute()
+    from_fasta = is_fasta_path(target)
+    params = {
+        "index": "mmseqs_createindex" if create_index else "mmseqs_createdb",
+        "dbtype": dbtype,
+        "search_type": search_type,
+        "source_digest": file_digest(target)
+        if from_fasta
+        else file_fingerprint(f"{target}.index"),
+    }
+
+    def _build(entry_dir: Path) -> None:
+        db = entry_dir / "db"
+        if from_fasta:
+            _run(
+                [
+                    "mmseqs",
+                    "createdb",
+                    str(target),
+                    str(db),
+                    "--dbtype",
+                    str(dbtype),
+                    "-v",
+                    "1",
+                ],
+                logger,
+            )
+        else:
+            # data, index, header and lookup files of the DB (plus a
+            # shipped .idx index, if any): <prefix>, <prefix>.*, <prefix>_h*
+            for source in target.parent.iterdir():
+                if source.name == target.name or source.name.startswith(
+                    (f"{target.name}.", f"{target.name}_h")
+                ):
+                    os.symlink(
+                        source,
+                        entry_dir / source.name.replace(target.name, "db", 1),
+                    )
+        if not create_index or Path(f"{db}.idx").exists():
+            return
+        tmp = entry_dir / "tmp"
+        _run(
+            [
+                "mmseqs",
+                "createindex",
+                str(db),
+                str(tmp),
+                "--search-type",
+                str(search_type),
+                "--threads",
+                str(threads),
+                "-v",
+                "1",
+            ],
+            logger,
+        )
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    store = _reference_store(cache_dir, logger)
+    return store.get_or_build(hash_key(params), _build, params=params) / "db"
+
+
+def cached_diamond_db(
+    target: Union[str, Path],
+    threads: int = 1,
+    cache_dir: Union[str, Path, None] = None,
+    logger=None,
+) -> Path:
+    """diamond DB (.dmnd) of a protein FASTA from the persistent cache.
+
+    diamond accepts a FASTA as --db but then rebuilds the DB on every run;
+    the cached .dmnd is built once per reference content. Existing .dmnd
+    files are returned as they are.
+    """
+    from rolypoly.utils.cache import file_digest, hash_key
+
+    logger = get_logger(logger)
+    target = Path(target).absolute()
+    if target.suffix == ".dmnd":
+        return target
+    params = {"index": "diamond_makedb", "source_digest": file_digest(target)}
+
+    def _build(entry_dir: Path) -> None:
+        _run(
+            [
+                "diamond",
+                "makedb",
+                "--in",
+                str(target),
+                "--db",
+                str(entry_dir / "db.dmnd"),
+                "--threads",
+                str(threads),
+                "--quiet",
+            ],
+            logger,
+        )
+
+    store = _reference_store(cache_dir, logger)
+    return (
+        store.get_or_build(hash_key(params), _build, params=params) / "db.dmnd"
+    )
+
+
+def create_query_db(
+    query: Union[str, Path],
+    output_dir: Union[str, Path],
+    dbtype: int = 2,
+    logger=None,
+) -> Path:
+    """mmseqs DB of the query (built once per run; DB prefixes pass through)."""
+    logger = get_logger(logger)
+    query = Path(query)
+    if not is_fasta_path(query):
+        return query
+    query_db = Path(output_dir) / "query_db" / "mmdb"
+    query_db.parent.mkdir(parents=True, exist_ok=True)
+    logger.info("Converting input to mmseqs DB")
+    _run(
+        [
+            "mmseqs",
+            "createdb",
+            str(query),
+            str(query_db),
+            "--dbtype",
+            str(dbtype),
+            "-v",
+            "1",
+        ],
+        logger,
+    )
+    return query_db
+
+
+def search_references(
+    query_db: Union[str, Path],
+    targets: Dict[str, Union[str, Path]],
+    output_dir: Union[str, Path],
+    search_args: Optional[List[str]] = None,
+    scheduler=None,
+    logger=None,
+) -> Dict[str, Path]:
+    """Search one query DB against several references concurrently.
+
+    Every search gets its own result and temporary directory and an equal
+    share of the scheduler's threads and memory, so the whole batch takes
+    about as long as the slowest search.
+
+    Args:
+        query_db: Query mmseqs DB (see create_query_db)
+        targets: {reference name: target DB prefix}
+        output_dir: Directory for the result DBs and temporary files
+        search_args: Extra mmseqs search arguments
+        scheduler: ResourceScheduler (defaults to the process-wide one)
+        logger: Logger instance
+
+    Returns:
+        dict: {reference name: result DB prefix}
+    """
+    from rolypoly.utils.resources import get_scheduler
+
+    logger = get_logger(logger)
+    scheduler = scheduler or get_scheduler(logger=logger)
+    output_dir = Path(output_dir)
+    share_threads = max(scheduler.total_threads // max(len(targets), 1), 1)
+    share_memory = scheduler.total_memory // max(len(targets), 1)
+
+    def _search(name: str, target_db: Path) -> Path:
+        result_dir = output_dir / f"results_{name}"
+        tmp_dir = output_dir / f"tmp_{name}"
+        shutil.rmtree(result_dir, ignore_errors=True)
+        result_dir.mkdir(parents=True)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        def _cmd(lease):
+            params = lease.tool_params("mmseqs")
+            return [
+                "mmseqs",
+                "search",
+                str(query_db),
+                str(target_db),
+                str(result_dir / "res"),
+                str(tmp_dir),
+                "--threads",
+                str(params["threads"]),
+                "--split-memory-limit",
+                params["split-memory-limit"],
+                "-v",
+                "1",
+            ] + list(search_args or [])
+
+        scheduler.run(
+            _cmd,
+            name=f"mmseqs search ({name})",
+            threads=share_threads,
+            memory=share_memory,
+            tool="mmseqs",
+        )
+        return result_dir / "res"
+
+    with ThreadPoolExecutor(max_workers=max(len(targets), 1)) as executor:
+        futures = {
+            name: executor.submit(_search, name, Path(target_db))
+            for name, target_db in targets.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def convert_results(
+    query_db: Union[str, Path],
+    targets: Dict[str, Union[str, Path]],
+    results: Dict[str, Path],
+    output_dir: Union[str, Path],
+    format_output: str = DEFAULT_FORMAT_OUTPUT,
+    logger=None,
+) -> pl.DataFrame:
+    """Convert each reference's results to a table and merge them.
+
+    Returns:
+        pl.DataFrame: The format_output columns plus ``reference``
+    """
+    logger = get_logger(logger)
+    output_dir = Path(output_dir)
+
+    def _convert(name: str) -> pl.DataFrame:
+        table = output_dir / f"results_{name}.tab"
+        _run(
+            [
+                "mmseqs",
+                "convertalis",
+                str(query_db),
+                str(targets[name]),
+                str(results[name]),
+                str(table),
+                "--format-mode",
+                "4",
+                "--format-output",
+                format_output,
+                "-v",
+                "1",
+            ],
+            logger,
+        )
+        return pl.read_csv(
+            table, separator="\t", has_header=True, infer_schema_length=10000
+        ).with_columns(pl.lit(name).alias("reference"))
+
+    with ThreadPoolExecutor(max_workers=max(len(results), 1)) as executor:
+        frames = list(executor.map(_convert, results))
+    if not frames:
+        return pl.DataFrame(
+            schema={c: pl.Utf8 for c in format_output.split(",")}
+            | {"reference": pl.Utf8}
+        )
+    return pl.concat(frames, how="diagonal_relaxed")
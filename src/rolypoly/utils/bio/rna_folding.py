@@ -0,0 +1,449 @@
+"""
+RNA secondary structure prediction with the ViennaRNA bindings.
+
+Records are folded in a process pool and the results are streamed, in
+input order, into a multi-record dot-bracket file (the format read by
+annotate_RNA's read_multiDBN_to_dataframe). Long sequences are folded in a
+local windowed mode (RNALfold: base pairs limited to a span, locally
+optimal structures reported along the sequence) instead of a global MFE
+over the whole genome. Partition function folding and structure plots are
+opt-in, as they dominate the run time on long sequences.
+
+The dot-bracket records are
+    >id start=<1-based start> end=<end> source=<RNAfold|RNALfold>
+    sequence (the folded segment)
+    structure (energy)
+
+LinearFold is run in batches: a fixed number of workers each feed a batch
+of sequences to one ``linearfold`` process over stdin and parse its
+multi-record output, so process start-up is paid once per batch instead of
+once per sequence. Sequences of a failed or timed-out batch are folded
+again one by one (with a per-sequence timeout), so one bad record does not
+cost the batch.
+
+Key functions:
+    - fold_record: Fold one sequence (global or windowed)
+    - fold_fasta: Fold every record of a FASTA file in parallel into a DBN file
+    - parse_linearfold_output: Parse multi-record LinearFold output
+    - linearfold_fasta: Fold a FASTA file with batched LinearFold workers
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from rolypoly.utils.logging.loggit import get_logger
+
+# defaults of annotate_RNA's step_params["RNAfold"]
+DEFAULT_FOLD_PARAMS = {
+    "temperature": 25,
+    # "auto": windowed for sequences longer than window_threshold
+    "window": "auto",
+    "window_threshold": 3000,
+    # RNALfold -L: maximal base pair span
+    "max_bp_span": 150,
+    "partition_function": False,
+    "plot": False,
+}
+
+# defaults of annotate_RNA's step_params["LinearFold"]
+DEFAULT_LINEARFOLD_PARAMS = {
+    "beamsize": 100,
+    # sequences (and nucleotides) sent to one linearfold process
+    "batch_size": 256,
+    "batch_nucleotides": 500_000,
+    # seconds per sequence (a batch gets the sum over its sequences)
+    "timeout": 300,
+}
+
+
+def _model_details(params: Dict):
+    import RNA
+
+    md = RNA.md()
+    md.temperature = params["temperature"]
+    return md
+
+
+def _use_window(length: int, params: Dict) -> bool:
+    window = params["window"]
+    if window == "auto":
+        return length > params["window_threshold"]
+    return bool(window)
+
+
+def _drop_contained(
+    structures: List[Tuple[int, int, str, float]],
+) -> List[Tuple[int, int, str, float]]:
+    """Local structures not contained in another reported structure, by start."""
+    kept = []
+    max_end = 0
+    for start, end, structure, energy in sorted(
+        structures, key=lambda s: (s[0], -s[1])
+    ):
+        if end > max_end:
+            kept.append((start, end, structure, energy))
+            max_end = end
+    return kept
+
+
+def fold_record(
+    task: Tuple[str, str, Dict, Optional[str]],
+) -> Tuple[str, List[Tuple[int, int, str, float]], List[Tuple]]:
+    """Fold one sequence.
+
+    Args:
+        task: (record id, sequence, fold parameters, plot directory or None)
+
+    Returns:
+        tuple: (record id,
+            [(start, end, structure, energy, source, folded segment)] with
+            1-based inclusive coordinates,
+            [(start, end, ensemble structure, ensemble energy)] when the
+            partition function is requested, else [])
+    """
+    import RNA
+
+    record_id, sequence, params, plot_dir = task
+    params = {**DEFAULT_FOLD_PARAMS, **params}
+    sequence = sequence.upper().replace("T", "U")
+    md = _model_details(params)
+
+    if _use_window(len(sequence), params):
+        md.window_size = params["max_bp_span"]
+        md.max_bp_span = params["max_bp_span"]
+        found = []
+        fc = RNA.fold_compound(sequence, md, RNA.OPTION_WINDOW)
+        fc.mfe_window_cb(
+            lambda start, end, structure, energy, data: data.append(
+                (start, end, structure, energy)
+            ),
+            found,
+        )
+        structures = _drop_contained(found)
+        source = "RNALfold"
+    else:
+        fc = RNA.fold_compound(sequence, md)
+        structure, energy = fc.mfe()
+        structures = [(1, len(sequence), structure, energy)]
+        source = "RNAfold"
+
+    ensembles = []
+    if params["partition_function"]:
+        for start, end, _, energy in structures:
+            segment_fc = RNA.fold_compound(sequence[start - 1 : end], md)
+            segment_fc.exp_params_rescale(energy)
+            ensemble_structure, ensemble_energy = segment_fc.pf()
+            ensembles.append((start, end, ensemble_structure, ensemble_energy))
+
+    if plot_dir is not None:
+        for start, end, structure, _ in structures:
+            suffix = "" if source == "RNAfold" else f"_{start}-{end}"
+            RNA.svg_rna_plot(
+                sequence[start - 1 : end],
+                structure,
+                str(Path(plot_dir) / f"{record_id}{suffix}_plot.svg"),
+            )
+    return (
+        record_id,
+        [
+            (start, end, structure, energy, source, sequence[start - 1 : end])
+            for start, end, structure, energy in structures
+        ],
+        ensembles,
+    )
+
+
+def _ordered_map(executor, func, tasks: Iterable, window: int) -> Iterator:
+    """executor.map that keeps at most `window` tasks in flight.
+
+    Keeps the output in input order without reading the whole input first.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(func, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def fold_fasta(
+    input_fasta: Union[str, Path],
+    output_file: Union[str, Path],
+    params: Optional[Dict] = None,
+    threads: int = 1,
+    plot_dir: Union[str, Path, None] = None,
+    ensemble_file: Union[str, Path, None] = None,
+    logger=None,
+) -> Dict[str, float]:
+    """Fold every record of a FASTA file into a multi-record DBN file.
+
+    Args:
+        input_fasta: Input nucleotide FASTA
+        output_file: Output dot-bracket file
+        params: Fold parameters (see DEFAULT_FOLD_PARAMS)
+        threads: Worker processes
+        plot_dir: Write an SVG plot per structure here (params["plot"] must be set)
+        ensemble_file: TSV for the partition function results (params["partition_function"])
+        logger: Logger instance
+
+    Returns:
+        dict: records, nucleotides and seconds of the run
+    """
+    import time
+
+    from needletail import parse_fastx_file
+
+    logger = get_logger(logger)
+    params = {**DEFAULT_FOLD_PARAMS, **(params or {})}
+    if params["plot"]:
+        plot_dir = Path(plot_dir or Path(output_file).parent)
+        plot_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        plot_dir = None
+    totals = {"records": 0, "nucleotides": 0}
+
+    def _tasks():
+        for record in parse_fastx_file(str(input_fasta)):
+            record_id = record.id.split()[0]  # pyright: ignore
+            totals["records"] += 1
+            totals["nucleotides"] += len(record.seq)  # pyright: ignore
+            yield (
+                record_id,
+                record.seq,  # pyright: ignore
+                params,
+                str(plot_dir) if plot_dir else None,
+            )
+
+    started = time.perf_counter()
+    ensemble_out = None
+    if params["partition_function"]:
+        ensemble_file = Path(
+            ensemble_file
+            or Path(output_file).with_name("secondary_structure_ensemble.tsv")
+        )
+        ensemble_out = open(ensemble_file, "w")
+        ensemble_out.write(
+            "sequence_id\tstart\tend\tensemble_structure\tensemble_energy\n"
+        )
+    try:
+        with open(output_file, "w") as out_f:
+            if threads > 1:
+                executor = ProcessPoolExecutor(max_workers=threads)
+                results = _ordered_map(
+                    executor, fold_record, _tasks(), window=threads * 4
+                )
+            else:
+                executor = None
+                results = map(fold_record, _tasks())
+            try:
+                for record_id, structures, ensembles in results:
+                    for (
+                        start,
+                        end,
+                        structure,
+                        energy,
+                        source,
+                        segment,
+                    ) in structures:
+                        out_f.write(
+                            f">{record_id} start={start} end={end} source={source}\n"
+                        )
+                        out_f.write(f"{segment}\n")
+                        out_f.write(f"{structure} ({energy:.2f})\n")
+                    for start, end, structure, energy in ensembles:
+                        ensemble_out.write(  # pyright: ignore
+                            f"{record_id}\t{start}\t{end}\t{structure}\t{energy:.2f}\n"
+                        )
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+    finally:
+        if ensemble_out is not None:
+            ensemble_out.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Folded {totals['records']} sequences ({totals['nucleotides']} nt) in {elapsed:.1f}s "
+        f"({totals['nucleotides'] / max(elapsed, 1e-9):.0f} nt/s)"
+    )
+    return {**totals, "seconds": elapsed}
+
+
+def parse_linearfold_output(
+    lines: Iterable[str],
+) -> Iterator[Tuple[str, str, str, float]]:
+    """Parse LinearFold MFE output of FASTA input.
+
+    LinearFold echoes each ">name" line, then prints the sequence and the
+    structure followed by its energy ("((...)) (-1.20)").
+
+    Yields:
+        tuple: (name, sequence, structure, energy)
+    """
+    name = None
+    sequence = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(">"):
+            name, sequence = line[1:].split()[0], None
+            continue
+        parts = line.rsplit(None, 1)
+        if (
+            sequence is not None
+            and len(parts) == 2
+            and parts[1].startswith("(")
+            and parts[1].endswith(")")
+            and len(parts[0]) == len(sequence)
+        ):
+            try:
+                energy = float(parts[1].strip("()"))
+            except ValueError:
+                continue
+            yield name, sequence, parts[0], energy  # pyright: ignore
+            name, sequence = None, None
+        elif name is not None:
+            sequence = line
+
+
+def _linearfold_batch(
+    batch: List[Tuple[str, str]], params: Dict, logger
+) -> List[Tuple[str, str, str, float]]:
+    """Fold a batch with one linearfold process; retry failures one by one."""
+    import subprocess
+
+    cmd = ["linearfold", "--beamsize", str(params["beamsize"])]
+    # records are named by their index in the batch, the ids may hold anything
+    text = "".join(
+        f">{i}\n{sequence}\n" for i, (_, sequence) in enumerate(batch)
+    )
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        stdout, stderr = process.communicate(
+            text, timeout=params["timeout"] * len(batch)
+        )
+        failure = (
+            f"exit code {process.returncode}: {stderr.strip()}"
+            if process.returncode
+            else None
+        )
+    except subprocess.TimeoutExpired:
+        process.kill()
+        stdout, _ = process.communicate()
+        failure = f"timed out after {params['timeout'] * len(batch)}s"
+
+    folded = {
+        int(name): (structure, energy)
+        for name, _, structure, energy in parse_linearfold_output(
+            stdout.splitlines()
+        )
+        if name.isdigit()
+    }
+    results = []
+    for i, (record_id, sequence) in enumerate(batch):
+        if i in folded:
+            results.append((record_id, sequence, *folded[i]))
+        elif len(batch) > 1:
+            results.extend(
+                _linearfold_batch([(record_id, sequence)], params, logger)
+            )
+        else:
+            logger.error(
+                f"LinearFold failed for sequence {record_id}: {failure or 'no structure in the output'}"
+            )
+            results.append((record_id, sequence, "Error", 0.0))
+    return results
+
+
+def _batches(
+    records: Iterable[Tuple[str, str]], size: int, nucleotides: int
+) -> Iterator[List[Tuple[str, str]]]:
+    batch, batch_nucleotides = [], 0
+    for record in records:
+        batch.append(record)
+        batch_nucleotides += len(record[1])
+        if len(batch) >= size or batch_nucleotides >= nucleotides:
+            yield batch
+            batch, batch_nucleotides = [], 0
+    if batch:
+        yield batch
+
+
+def linearfold_fasta(
+    input_fasta: Union[str, Path],
+    output_file: Union[str, Path],
+    params: Optional[Dict] = None,
+    threads: int = 1,
+    logger=None,
+) -> Dict[str, float]:
+    """Fold every record of a FASTA file with LinearFold into a DBN file.
+
+    Args:
+        input_fasta: Input nucleotide FASTA
+        output_file: Output dot-bracket file (records in input order)
+        params: LinearFold parameters (see DEFAULT_LINEARFOLD_PARAMS)
+        threads: Concurrent linearfold processes
+        logger: Logger instance
+
+    Returns:
+        dict: records, nucleotides, failed records and seconds of the run
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from needletail import parse_fastx_file
+
+    logger = get_logger(logger)
+    params = {**DEFAULT_LINEARFOLD_PARAMS, **(params or {})}
+    totals = {"records": 0, "nucleotides": 0, "failed": 0}
+
+    def _records():
+        for record in parse_fastx_file(str(input_fasta)):
+            yield (
+                record.id.split()[0],  # pyright: ignore
+                record.seq.upper().replace("T", "U"),  # pyright: ignore
+            )
+
+    started = time.perf_counter()
+    batches = _batches(
+        _records(), params["batch_size"], params["batch_nucleotides"]
+    )
+    with (
+        open(output_file, "w") as out_f,
+        ThreadPoolExecutor(max_workers=max(threads, 1)) as executor,
+    ):
+        for results in _ordered_map(
+            executor,
+            lambda batch: _linearfold_batch(batch, params, logger),
+            batches,
+            window=max(threads, 1) * 2,
+        ):
+            for record_id, sequence, structure, energy in results:
+                totals["records"] += 1
+                totals["nucleotides"] += len(sequence)
+                out_f.write(
+                    f">{record_id} start=1 end={len(sequence)} source=LinearFold\n{sequence}\n"
+                )
+                if structure == "Error":
+                    totals["failed"] += 1
+                    out_f.write("Error in structure prediction\n")
+                else:
+                    out_f.write(f"{structure} ({energy:.2f})\n")
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"LinearFold folded {totals['records']} sequences ({totals['nucleotides']} nt, "
+        f"{totals['failed']} failed) in {elapsed:.1f}s "
+        f"({totals['nucleotides'] / max(elapsed, 1e-9):.0f} nt/s)"
+    )
+    return {**totals, "seconds": elapsed}
@@ -9,6 +9,7 @@ Key functions: (subject to change...)
     - filter_fasta_by_headers: Filter sequences by header patterns
     - rmdup: Remove duplicate sequences (similar to seqkit rmdup)
     - revcomp: Calculate reverse complement of sequences
+    - stream_rename_fasta: Merge, rename and length-filter FASTA files in batches
 """
 
 import logging
@@ -836,6 +837,162 @@ def process_sequences(df: pl.DataFrame) -> pl.DataFrame:
     return df
 
 
+def hash_sequence_ids(
+    sequences: List[str],
+    prefix: str = "CID",
+    seen: Optional[Dict[str, int]] = None,
+) -> List[str]:
+    """Content-derived IDs (``<prefix>_<md5 hex>``) for a batch of sequences.
+
+    The IDs only depend on the sequence. Repeated sequences (e.g. the same
+    contig from two assemblers) still get unique IDs: the n-th copy, in
+    input order, is named ``<prefix>_<md5 hex>_<n>``, so these suffixes are
+    only reproducible if the input order is (see run_assemblers).
+
+    MD5 is kept over polars' own hash, which is not stable across polars
+    versions; the digests are computed in one pass over the batch and the
+    copy numbering is done with polars window expressions.
+
+    Args:
+        sequences: Sequences to name
+        prefix: Prefix for the IDs
+        seen: Copies counted so far per digest, updated in place; pass the
+            same dict to keep IDs unique across batches
+
+    Returns:
+        List[str]: One ID per sequence
+    """
+    import hashlib
+
+    md5 = hashlib.md5
+    if seen is None:
+        seen = {}
+    frame = pl.DataFrame(
+        {"digest": [md5(seq.encode()).hexdigest() for seq in sequences]},
+        schema={"digest": pl.String},
+    ).with_columns(
+        copies=pl.int_range(1, pl.len() + 1).over("digest")
+        + pl.col("digest").replace_strict(
+            seen, default=0, return_dtype=pl.Int64
+        )
+    )
+    seen.update(
+        frame.group_by("digest").agg(pl.col("copies").max()).iter_rows()
+    )
+    base_id = pl.lit(f"{prefix}_") + pl.col("digest")
+    return (
+        frame.select(
+            pl.when(pl.col("copies") == 1)
+            .then(base_id)
+            .otherwise(base_id + pl.lit("_") + pl.col("copies").cast(pl.String))
+        )
+        .to_series()
+        .to_list()
+    )
+
+
+def count_fasta_records(file_path: Union[str, Path]) -> int:
+    """Count the records of a FASTA file by scanning for header lines."""
+    count = 0
+    previous = b"\n"
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(1 << 22)
+            if not chunk:
+                break
+            count += chunk.count(b"\n>") + (
+                1 if previous == b"\n" and chunk[:1] == b">" else 0
+            )
+            previous = chunk[-1:]
+    return count
+
+
+def stream_rename_fasta(
+    input_files: Union[str, Path, List[Union[str, Path]]],
+    output_file: Union[str, Path],
+    mapping_file: Union[str, Path],
+    prefix: str = "CID",
+    use_hash: bool = False,
+    min_length: int = 0,
+    batch_size: int = 50_000,
+) -> Dict[str, int]:
+    """Merge, rename, length-filter and write FASTA records batch by batch.
+
+    The streaming counterpart of read_fasta_df + rename_sequences +
+    process_sequences: only ``batch_size`` records are held in memory.
+    The old->new ID map (with length and GC content) is appended to
+    ``mapping_file`` as each batch is written.
+
+    Args:
+        input_files: FASTA file(s), merged in the given order
+        output_file: Renamed FASTA output
+        mapping_file: TSV with old_id, new_id, length, gc_content
+        prefix: Prefix for new IDs
+        use_hash: Use content hashes (see hash_sequence_ids, repeated
+            sequences get a copy number) instead of a zero-padded running
+            number
+        min_length: Drop records shorter than this
+        batch_size: Records per batch
+
+    Returns:
+        dict: Number of records read ("input") and written ("written")
+    """
+    if isinstance(input_files, (str, Path)):
+        input_files = [input_files]
+    padding = 1
+    if not use_hash:
+        padding = len(str(sum(count_fasta_records(f) for f in input_files)))
+
+    stats = {"input": 0, "written": 0}
+    first_batch = True
+    seen_digests: Dict[str, int] = {}
+
+    def _records():
+        for fasta in input_files:
+            for record in parse_fastx_file(str(fasta)):
+                yield record.id, record.seq
+
+    records = _records()
+    with open(output_file, "w") as out, open(mapping_file, "w") as mapping:
+        while True:
+            rows = [row for _, row in zip(range(batch_size), records)]
+            if not rows:
+                break
+            stats["input"] += len(rows)
+            batch = process_sequences(
+                pl.DataFrame(rows, schema=["header", "sequence"], orient="row")
+            )
+            if min_length:
+                batch = batch.filter(pl.col("length") >= min_length)
+            if use_hash:
+                new_ids = hash_sequence_ids(
+                    batch["sequence"].to_list(), prefix, seen_digests
+                )
+            else:
+                start = stats["written"] + 1
+                new_ids = [
+                    f"{prefix}_{str(i).zfill(padding)}"
+                    for i in range(start, start + batch.height)
+                ]
+            batch = batch.with_columns(pl.Series("new_id", new_ids))
+            out.writelines(
+                f">{new_id}\n{seq}\n"
+                for new_id, seq in zip(batch["new_id"], batch["sequence"])
+            )
+            batch.select(
+                pl.col("header").alias("old_id"),
+                "new_id",
+                "length",
+                pl.col("gc_content").round(2),
+            ).write_csv(mapping, separator="\t", include_header=first_batch)
+            first_batch = False
+            stats["written"] += batch.height
+    if first_batch:
+        with open(mapping_file, "w") as mapping:
+            mapping.write("old_id\tnew_id\tlength\tgc_content\n")
+    return stats
+
+
 def rename_sequences(
     df: pl.DataFrame, prefix: str = "CID", use_hash: bool = False
 ) -> Tuple[pl.DataFrame, Dict[str, str]]:
@@ -853,18 +1010,7 @@ def rename_sequences(
     """
 
     if use_hash:
-        # Use polars expressions for hash generation directly
-        import hashlib
-
-        def _hash(seq: str) -> str:
-            return hashlib.md5(seq.encode()).hexdigest()[:32]
-
-        df_with_hashes = df.with_columns(
-            pl.col("sequence")
-            .map_elements(_hash, return_dtype=pl.String)
-            .alias("seq_hash")
-        )
-        new_headers = [f"{prefix}_{h}" for h in df_with_hashes["seq_hash"]]
+        new_headers = hash_sequence_ids(df["sequence"].to_list(), prefix)
     else:
         # Calculate padding based on total number of sequences
         padding = len(str(len(df)))
@@ -0,0 +1,583 @@
+"""
+Strain (haplotype) de-entanglement of contigs from read alignments.
+
+RNA virus populations are usually quasispecies: one contig stands for a
+cloud of closely related genomes. Positions where the pileup has a well
+supported minor allele are the variant positions; every read (mates are
+linked through their name) is reduced to its alleles at the variant
+positions it covers, giving a sparse read x variant matrix per contig.
+
+Haplotypes are added one at a time, starting from the majority one. For
+the best supported minor alleles, a candidate haplotype is phased outwards
+from the reads carrying the allele (along chains of overlapping reads that
+agree with it), and the reads are refitted to the haplotypes with
+expectation-maximization of a per-base error model (reads are shared
+between the haplotypes they fit equally well). The candidate with the
+highest likelihood is kept if every haplotype still explains at least
+``min_reads`` reads better than any other, which rejects recombinants of
+haplotypes already found. Adding stops when no candidate passes, when no
+minor allele reaches ``min_frequency``, or at ``max_strains``. Each
+haplotype is written as a polished consensus of the contig (majority
+pileup alleles everywhere, the haplotype's alleles at the variant
+positions) with its abundance, the EM mixture weight. Insertions relative
+to the contig are not resolved.
+
+Contigs are independent, so they are resolved in parallel.
+
+Key functions:
+    - variant_positions: Variant positions called from a pileup
+    - variant_observations: Alleles of reads at the variant positions of one SAM chunk
+    - collect_observations: Variant observations of a whole SAM stream
+    - cluster_haplotypes: Seed phasing + EM haplotypes of a read x variant matrix
+    - apply_alleles: Apply substitutions/deletions to a reference sequence
+    - resolve_strains: Strains of all contigs (parallel per contig)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import polars as pl
+
+from rolypoly.utils.bio.coverage import (
+    ALLELES,
+    BASE_CODES,
+    CoverageAggregator,
+    cigar_blocks,
+    sam_records,
+)
+from rolypoly.utils.logging.loggit import get_logger
+
+_DELETION = ALLELES.index("del")
+_BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+
+def variant_observations(
+    frame: pl.DataFrame, variants: np.ndarray, offsets: np.ndarray
+) -> pl.DataFrame:
+    """Alleles that aligned reads carry at the variant positions.
+
+    Args:
+        frame: Records from sam_records(..., with_seq=True, with_name=True)
+        variants: Sorted global variant positions (contig offset + 0-based position)
+        offsets: Contig start offsets in the global coordinate
+
+    Returns:
+        pl.DataFrame: qname, variant (index into variants), allele (code)
+    """
+    empty = pl.DataFrame(
+        schema={"qname": pl.Utf8, "variant": pl.Int64, "allele": pl.Int8}
+    )
+    if frame.height == 0 or len(variants) == 0:
+        return empty
+    seq_lengths = frame["seq"].str.len_bytes().to_numpy().astype(np.int64)
+    read_offsets = np.zeros(len(seq_lengths), dtype=np.int64)
+    np.cumsum(seq_lengths[:-1], out=read_offsets[1:])
+    buffer = np.frombuffer(
+        "".join(frame["seq"].to_list()).encode(), dtype=np.uint8
+    )
+    has_seq = frame["seq"].to_numpy() != "*"
+    blocks = cigar_blocks(frame)
+
+    parts = []
+    for codes, is_deletion in ((["M", "=", "X"], False), (["D"], True)):
+        part = blocks.filter(pl.col("code").is_in(codes))
+        if part.height == 0:
+            continue
+        read = part["read"].to_numpy()
+        contig = part["contig"].to_numpy()
+        start = np.maximum(part["start"].to_numpy(), 0) + offsets[contig]
+        end = np.minimum(
+            part["start"].to_numpy()
+            + part["size"].to_numpy()
+            + offsets[contig],
+            offsets[contig + 1],
+        )
+        low = np.searchsorted(variants, start)
+        counts = np.maximum(np.searchsorted(variants, end) - low, 0)
+        if not is_deletion:
+            counts[~has_seq[read]] = 0
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        variant = np.repeat(low, counts) + (
+            np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        )
+        read = np.repeat(read, counts)
+        if is_deletion:
+            allele = np.full(total, _DELETION, dtype=np.int64)
+        else:
+            query = (
+                np.repeat(
+                    read_offsets[part["read"].to_numpy()]
+                    + part["qstart"].to_numpy()
+                    - part["start"].to_numpy()
+                    - offsets[contig],
+                    counts,
+                )
+                + variants[variant]
+            )
+            allele = BASE_CODES[buffer[query]]
+        keep = allele < len(ALLELES)
+        parts.append(
+            pl.DataFrame(
+                {
+                    "qname": frame["qname"].gather(read[keep]),
+                    "variant": variant[keep],
+                    "allele": allele[keep].astype(np.int8),
+                }
+            )
+        )
+    return pl.concat(parts) if parts else empty
+
+
+def collect_observations(
+    stream: Iterable[bytes],
+    aggregator: CoverageAggregator,
+    variants: np.ndarray,
+    chunk_lines: int = 200_000,
+) -> pl.DataFrame:
+    """Variant observations of every read in a SAM stream.
+
+    Uses the contigs, flag filter and mapping quality cut-off of the
+    aggregator the variants were called from. A read (or read pair) seen
+    with conflicting alleles at a position is dropped at that position.
+
+    Returns:
+        pl.DataFrame: qname, variant, allele (one row per read and variant)
+    """
+    contig_index = {name: i for i, name in enumerate(aggregator.names)}
+    parts = []
+    chunk: List[bytes] = []
+
+    def flush():
+        if not chunk:
+            return
+        frame = sam_records(
+            chunk,
+            contig_index,
+            exclude_flags=aggregator.exclude_flags,
+            min_mapq=aggregator.min_mapq,
+            with_seq=True,
+            with_name=True,
+        )
+        parts.append(variant_observations(frame, variants, aggregator.offsets))
+        chunk.clear()
+
+    for line in stream:
+        if line.startswith(b"@"):
+            continue
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            flush()
+    flush()
+    if not parts:
+        return variant_observations(
+            pl.DataFrame(), variants, aggregator.offsets
+        )
+    return (
+        pl.concat(parts)
+        .group_by("qname", "variant")
+        .agg(pl.col("allele").first(), pl.col("allele").n_unique().alias("n"))
+        .filter(pl.col("n") == 1)
+        .drop("n")
+    )
+
+
+def _weighted_counts(matrix: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """(k, variants, alleles) allele counts with reads weighted per haplotype."""
+    counts = np.empty((weights.shape[1], matrix.shape[1], len(ALLELES)))
+    for allele in range(len(ALLELES)):
+        counts[:, :, allele] = weights.T @ (matrix == allele).astype(np.float64)
+    return counts
+
+
+def _mismatches(matrix: np.ndarray, haplotypes: np.ndarray) -> np.ndarray:
+    """(reads, k) number of covered positions disagreeing with each haplotype."""
+    observed = matrix >= 0
+    result = np.empty((len(matrix), len(haplotypes)), dtype=np.int64)
+    for k, haplotype in enumerate(haplotypes):
+        result[:, k] = (observed & (matrix != haplotype)).sum(axis=1)
+    return result
+
+
+def _expectation_maximization(
+    matrix: np.ndarray,
+    haplotypes: np.ndarray,
+    weights: np.ndarray,
+    error_rate: float,
+    max_iter: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """Fit haplotype alleles and mixture weights to the reads.
+
+    A read's likelihood under a haplotype is (1 - e)^matches * e^mismatches
+    over the positions it covers, so reads compatible with several
+    haplotypes are shared in proportion to the weights.
+
+    Returns:
+        tuple: haplotypes, weights, (reads, k) responsibilities and the log
+        likelihood of the reads
+    """
+    covered = (matrix >= 0).sum(axis=1)[:, None]
+    for _ in range(max_iter):
+        mismatches = _mismatches(matrix, haplotypes)
+        log_likelihood = (
+            mismatches * np.log(error_rate)
+            + (covered - mismatches) * np.log1p(-error_rate)
+            + np.log(np.maximum(weights, 1e-300))
+        )
+        best = log_likelihood.max(axis=1, keepdims=True)
+        responsibility = np.exp(log_likelihood - best)
+        total = responsibility.sum(axis=1, keepdims=True)
+        responsibility /= total
+        score = float((best + np.log(total)).sum())
+        updated_weights = responsibility.mean(axis=0)
+        counts = _weighted_counts(matrix, responsibility)
+        updated = np.where(
+            counts.sum(axis=2) > 0, counts.argmax(axis=2), haplotypes
+        ).astype(np.int8)
+        converged = np.array_equal(updated, haplotypes) and (
+            np.abs(updated_weights - weights).max() < 1e-4
+        )
+        haplotypes, weights = updated, updated_weights
+        if converged:
+            break
+    return haplotypes, weights, responsibility, score
+
+
+def _unique_support(matrix: np.ndarray, haplotypes: np.ndarray) -> np.ndarray:
+    """Number of reads each haplotype explains strictly better than the others."""
+    mismatches = _mismatches(matrix, haplotypes)
+    if len(haplotypes) == 1:
+        return np.array([len(matrix)])
+    ordered = np.sort(mismatches, axis=1)
+    unique = ordered[:, 0] < ordered[:, 1]
+    return np.bincount(
+        mismatches.argmin(axis=1)[unique], minlength=len(haplotypes)
+    )
+
+
+def _extend_seed(
+    matrix: np.ndarray,
+    weight: np.ndarray,
+    parent: np.ndarray,
+    variant: int,
+    allele: int,
+    min_reads: int,
+    min_frequency: float,
+) -> np.ndarray:
+    """Phase a new haplotype outwards from one minor allele.
+
+    Reads agreeing with every allele phased so far, and carrying at least
+    one allele that sets the seed apart from its parent, vote on the other
+    positions they cover. Positions with at least min_reads votes and no
+    competing allele above min_frequency are phased and the process
+    repeats, so the haplotype grows along chains of overlapping reads.
+    Unphased positions keep the parent's allele.
+    """
+    seed = parent.copy()
+    seed[variant] = allele
+    phased = np.zeros(len(seed), dtype=bool)
+    phased[variant] = True
+    observed = matrix >= 0
+    while True:
+        on_phased = observed & phased
+        # voters agree with the seed and carry at least one of its own alleles
+        consistent = ~(on_phased & (matrix != seed)).any(axis=1) & (
+            on_phased & (seed != parent)
+        ).any(axis=1)
+        counts = _weighted_counts(
+            matrix[consistent], weight[consistent][:, None]
+        )[0]
+        depth = counts.sum(axis=1)
+        grow = (
+            ~phased
+            & (depth >= min_reads)
+            & (counts.max(axis=1) >= (1 - min_frequency) * depth)
+        )
+        if not grow.any():
+            return seed
+        seed[grow] = counts.argmax(axis=1)[grow]
+        phased |= grow
+
+
+def _split_candidates(
+    counts: np.ndarray, min_frequency: float, min_reads: int
+) -> List[Tuple[int, int, int]]:
+    """(haplotype, variant, allele) minor alleles to split on, best supported first."""
+    depth = counts.sum(axis=2)
+    minor = np.argsort(counts, axis=2, kind="stable")[:, :, -2]
+    minor_count = np.take_along_axis(counts, minor[:, :, None], axis=2)[:, :, 0]
+    eligible = (minor_count >= min_reads) & (
+        minor_count >= min_frequency * depth
+    )
+    haplotype, variant = np.nonzero(eligible)
+    order = np.argsort(-minor_count[haplotype, variant], kind="stable")
+    return [
+        (int(h), int(v), int(minor[h, v]))
+        for h, v in zip(haplotype[order], variant[order])
+    ]
+
+
+def cluster_haplotypes(
+    matrix: np.ndarray,
+    min_frequency: float = 0.1,
+    min_reads: int = 5,
+    max_strains: int = 8,
+    error_rate: float = 0.01,
+    max_iter: int = 50,
+    max_candidates: int = 16,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cluster reads into haplotypes over linked variant positions.
+
+    Starts from the majority haplotype and repeatedly adds one: for each
+    of the best supported minor alleles (within a haplotype) a new
+    haplotype is phased outwards from the reads carrying it, the mixture
+    is refitted with EM, and the candidate with the highest likelihood is
+    kept if every haplotype still explains at least min_reads reads better
+    than any other (which rejects recombinants of haplotypes already found).
+
+    Args:
+        matrix: (reads, variants) allele codes, -1 where a read doesn't cover a variant
+        min_frequency: Minimum within-haplotype frequency of an allele to split on
+        min_reads: Minimum reads supporting a split (and per haplotype)
+        max_strains: Maximum number of haplotypes
+        error_rate: Per-base error rate of the read likelihood
+        max_iter: Maximum EM iterations per fit
+        max_candidates: Minor alleles tried per added haplotype
+
+    Returns:
+        tuple: haplotypes (k, variants) allele codes, read labels (most
+        likely haplotype) and abundances (mixture weights)
+    """
+    matrix = np.asarray(matrix, dtype=np.int8)
+    n_reads, n_variants = matrix.shape
+    if n_reads == 0 or n_variants == 0:
+        return (
+            np.full((1, n_variants), -1, dtype=np.int8),
+            np.zeros(n_reads, dtype=np.int64),
+            np.ones(1),
+        )
+    responsibility = np.ones((n_reads, 1))
+    haplotypes = _weighted_counts(matrix, responsibility).argmax(axis=2)
+    haplotypes = haplotypes.astype(np.int8)
+    weights = np.ones(1)
+    while len(haplotypes) < max_strains:
+        candidates = _split_candidates(
+            _weighted_counts(matrix, responsibility), min_frequency, min_reads
+        )
+        best = None
+        seeds = set()
+        for parent, variant, allele in candidates[:max_candidates]:
+            seed = _extend_seed(
+                matrix,
+                responsibility[:, parent],
+                haplotypes[parent],
+                variant,
+                allele,
+                min_reads,
+                min_frequency,
+            )
+            # linked minor alleles usually phase into the same seed
+            if (haplotypes == seed).all(axis=1).any() or (
+                seed.tobytes() in seeds
+            ):
+                continue
+            seeds.add(seed.tobytes())
+            share = (
+                responsibility[matrix[:, variant] == allele, parent].sum()
+                / n_reads
+            )
+            fitted = _expectation_maximization(
+                matrix,
+                np.vstack([haplotypes, seed]),
+                np.append(weights * (1 - share), share),
+                error_rate,
+                max_iter,
+            )
+            if (_unique_support(matrix, fitted[0]) >= min_reads).all() and (
+                best is None or fitted[3] > best[3]
+            ):
+                best = fitted
+        if best is None:
+            break
+        haplotypes, weights, responsibility, _ = best
+    return haplotypes, responsibility.argmax(axis=1), weights
+
+
+def apply_alleles(reference: str, codes: np.ndarray) -> str:
+    """Apply allele codes to a reference sequence.
+
+    Args:
+        reference: Reference sequence
+        codes: Per-position allele codes: -1 keeps the reference base, 0-3
+            substitute A/C/G/T and 4 deletes the position
+
+    Returns:
+        str: The edited sequence
+    """
+    sequence = np.frombuffer(reference.upper().encode(), dtype=np.uint8).copy()
+    codes = np.asarray(codes)
+    substitute = (codes >= 0) & (codes < _DELETION)
+    sequence[substitute] = _BASES[codes[substitute]]
+    return sequence[codes != _DELETION].tobytes().decode()
+
+
+def _resolve_contig(task: dict) -> List[dict]:
+    """Strains of one contig (module level so it can run in a worker)."""
+    positions = task["positions"]
+    matrix = task["matrix"]
+    if len(positions):
+        haplotypes, labels, abundance = cluster_haplotypes(
+            matrix,
+            min_frequency=task["min_frequency"],
+            min_reads=task["min_reads"],
+            max_strains=task["max_strains"],
+        )
+    else:
+        haplotypes = np.zeros((1, 0), dtype=np.int8)
+        labels = np.zeros(len(matrix), dtype=np.int64)
+        abundance = np.ones(1)
+    order = np.argsort(-abundance, kind="stable")
+    strains = []
+    for rank, k in enumerate(order, start=1):
+        codes = task["backbone"].copy()
+        haplotype = haplotypes[k]
+        seen = haplotype >= 0
+        codes[positions[seen]] = haplotype[seen]
+        strains.append(
+            {
+                "contig": task["contig"],
+                "strain": f"{task['contig']}_strain{rank}",
+                "abundance": float(abundance[k]),
+                "reads": int((labels == k).sum()),
+                "variants": ";".join(
+                    f"{p + 1}:{ALLELES[a]}"
+                    for p, a in zip(positions[seen], haplotype[seen])
+                ),
+                "sequence": apply_alleles(task["reference"], codes),
+            }
+        )
+    return strains
+
+
+def resolve_strains(
+    aggregator: CoverageAggregator,
+    observations: pl.DataFrame,
+    variants: np.ndarray,
+    references: Dict[str, str],
+    min_depth: int = 10,
+    min_frequency: float = 0.1,
+    min_reads: int = 5,
+    max_strains: int = 8,
+    threads: int = 1,
+    logger=None,
+) -> pl.DataFrame:
+    """Resolve the strains of every contig.
+
+    Args:
+        aggregator: Pileup (track_alleles=True) the variants were called from
+        observations: collect_observations output
+        variants: Sorted global variant positions
+        references: {contig: sequence}
+        min_depth: Minimum depth to polish a position with the majority allele
+        min_frequency: Minimum within-cluster allele frequency to split on
+        min_reads: Minimum reads supporting a haplotype
+        max_strains: Maximum haplotypes per contig
+        threads: Worker processes (contigs are resolved in parallel)
+        logger: Logger instance
+
+    Returns:
+        pl.DataFrame: contig, strain, abundance, reads, variants
+        ("position:allele;..."), sequence; strains sorted by abundance
+    """
+    logger = get_logger(logger)
+    contig_of_variant = (
+        np.searchsorted(aggregator.offsets, variants, side="right") - 1
+    )
+    by_contig = {
+        int(key[0]): part
+        for key, part in observations.with_columns(
+            pl.Series(
+                "contig", contig_of_variant[observations["variant"].to_numpy()]
+            )
+        )
+        .partition_by("contig", as_dict=True)
+        .items()
+    }
+
+    tasks = []
+    for i, name in enumerate(aggregator.names):
+        if name not in references:
+            continue
+        first, last = np.searchsorted(
+            contig_of_variant, [i, i + 1], side="left"
+        )
+        positions = variants[first:last] - aggregator.offsets[i]
+        matrix = np.zeros((0, last - first), dtype=np.int8)
+        part = by_contig.get(i)
+        if part is not None and len(positions):
+            reads, row = np.unique(
+                part["qname"].to_numpy(), return_inverse=True
+            )
+            matrix = np.full((len(reads), last - first), -1, dtype=np.int8)
+            matrix[row, part["variant"].to_numpy() - first] = part[
+                "allele"
+            ].to_numpy()
+        tasks.append(
+            {
+                "contig": name,
+                "reference": references[name],
+                "backbone": aggregator.major_alleles(name, min_depth),
+                "positions": positions,
+                "matrix": matrix,
+                "min_frequency": min_frequency,
+                "min_reads": min_reads,
+                "max_strains": max_strains,
+            }
+        )
+
+    logger.info(
+        f"Resolving strains of {len(tasks)} contigs ({len(variants)} variant positions)"
+    )
+    if threads > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            results = list(
+                executor.map(
+                    _resolve_contig,
+                    tasks,
+                    chunksize=max(1, len(tasks) // (threads * 4)),
+                )
+            )
+    else:
+        results = [_resolve_contig(task) for task in tasks]
+    return pl.DataFrame(
+        [strain for strains in results for strain in strains],
+        schema={
+            "contig": pl.Utf8,
+            "strain": pl.Utf8,
+            "abundance": pl.Float64,
+            "reads": pl.Int64,
+            "variants": pl.Utf8,
+            "sequence": pl.Utf8,
+        },
+    )
+
+
+def variant_positions(
+    aggregator: CoverageAggregator,
+    min_depth: int = 10,
+    min_frequency: float = 0.1,
+    min_reads: int = 5,
+) -> np.ndarray:
+    """Sorted global positions with a well supported minor allele."""
+    table = aggregator.allele_table(min_depth, min_frequency)
+    minor_count = table["minor_freq"] * table["depth"]
+    table = table.filter(minor_count >= min_reads - 1e-9)
+    index = pl.Series(aggregator.names).to_frame("contig").with_row_index("i")
+    table = table.join(index, on="contig", how="left")
+    return np.sort(
+        aggregator.offsets[table["i"].to_numpy().astype(np.int64)]
+        + table["position"].to_numpy()
+        - 1
+    )
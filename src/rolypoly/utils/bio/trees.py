@@ -1,9 +1,559 @@
 #  tree structures, mostly for taxonomic neighbor finding. this is mostly a place holder until i figure out if this functionality is trulyt needed, needed from scratch, or can be sourced from phylotree-rs
+"""
+Taxonomy trees for lineage, common ancestor and nearest-with-data queries.
+
+Key classes:
+    - TaxonomyArrays: Array-backed taxonomy (parent/rank/depth arrays, Euler-tour LCA),
+      saved to and loaded from a single .npz or .parquet file
+    - TaxonomyTree: Nearest taxonomic neighbor with available data, on top of TaxonomyArrays
+"""
+
 import heapq
 from collections import defaultdict, deque
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
 
+import numpy as np
 import polars as pl
 
+# ranks expanded by TaxonomyArrays.lineage_frame (those present in the taxonomy)
+LINEAGE_RANKS = (
+    "realm",
+    "superkingdom",
+    "domain",
+    "kingdom",
+    "phylum",
+    "class",
+    "order",
+    "family",
+    "genus",
+    "species",
+)
+
+
+class TaxonomyArrays:
+    """Array-backed taxonomy, one position per node.
+
+    Nodes are ordered by tax_id. ``parent`` holds the position of each
+    node's parent (-1 for roots), ``depth`` its distance to the root and
+    ``preorder`` its position in a depth-first (Euler) tour of the tree.
+    Common ancestors are range-minimum queries over the tour depths,
+    answered from a sparse table built on first use.
+
+    Attributes:
+        tax_ids: Sorted tax_ids (int64)
+        parent: Parent position per node (int32, -1 for roots)
+        depth: Distance to the root per node (int32)
+        preorder: Tour position per node (int32)
+        rank: Code into rank_names per node (int16, -1 if unknown)
+        rank_names: Rank name per rank code
+        names: Scientific name per node (pl.Series) or None
+    """
+
+    def __init__(
+        self,
+        tax_ids: np.ndarray,
+        parent: np.ndarray,
+        depth: np.ndarray,
+        preorder: np.ndarray,
+        rank: np.ndarray,
+        rank_names: Sequence[str],
+        names: Optional[pl.Series] = None,
+    ):
+        self.tax_ids = tax_ids
+        self.parent = parent
+        self.depth = depth
+        self.preorder = preorder
+        self.rank = rank
+        self.rank_names = list(rank_names)
+        self.names = names
+        self._tour = None
+        self._sparse = None
+        self._at_rank = {}
+
+    def __len__(self) -> int:
+        return len(self.tax_ids)
+
+    @classmethod
+    def from_nodes(cls, nodes_df: pl.DataFrame) -> "TaxonomyArrays":
+        """Build from a nodes table (tax_id, parent_tax_id[, rank, scientific_name]).
+
+        Nodes whose parent is themselves or missing from the table are roots.
+        Duplicated tax_ids keep their first row.
+        """
+        optional = [
+            pl.col(column).cast(pl.String)
+            for column in ("rank", "scientific_name")
+            if column in nodes_df.columns
+        ]
+        frame = (
+            nodes_df.select(
+                pl.col("tax_id").cast(pl.Int64),
+                pl.col("parent_tax_id").cast(pl.Int64),
+                *optional,
+            )
+            .unique("tax_id", keep="first", maintain_order=True)
+            .sort("tax_id")
+        )
+        tax_ids = frame["tax_id"].to_numpy()
+        parent = cls._parent_positions(
+            tax_ids, frame["parent_tax_id"].fill_null(-1).to_numpy()
+        )
+        if "rank" in frame.columns:
+            rank_names = frame["rank"].drop_nulls().unique().sort().to_list()
+            rank = (
+                frame["rank"]
+                .replace_strict(
+                    rank_names,
+                    list(range(len(rank_names))),
+                    default=-1,
+                    return_dtype=pl.Int16,
+                )
+                .to_numpy()
+            )
+        else:
+            rank_names = []
+            rank = np.full(len(tax_ids), -1, dtype=np.int16)
+        names = (
+            frame["scientific_name"]
+            if "scientific_name" in frame.columns
+            else None
+        )
+        depth = cls._depths(parent)
+        return cls(
+            tax_ids,
+            parent,
+            depth,
+            cls._preorder(parent, depth),
+            rank,
+            rank_names,
+            names,
+        )
+
+    @staticmethod
+    def _parent_positions(
+        tax_ids: np.ndarray, parent_tax_ids: np.ndarray
+    ) -> np.ndarray:
+        if len(tax_ids) == 0:
+            return np.zeros(0, dtype=np.int32)
+        positions = np.minimum(
+            np.searchsorted(tax_ids, parent_tax_ids), len(tax_ids) - 1
+        )
+        found = (tax_ids[positions] == parent_tax_ids) & (
+            parent_tax_ids != tax_ids
+        )
+        return np.where(found, positions, -1).astype(np.int32)
+
+    @staticmethod
+    def _depths(parent: np.ndarray) -> np.ndarray:
+        """Root distances by pointer jumping (log of the tree height passes)."""
+        ancestor = parent.astype(np.int64)
+        depth = (ancestor >= 0).astype(np.int32)
+        for _ in range(64):
+            jumping = ancestor >= 0
+            if not jumping.any():
+                return depth
+            target = ancestor[jumping]
+            depth[jumping] += depth[target]
+            ancestor[jumping] = ancestor[target]
+        raise ValueError("Taxonomy contains a cycle")
+
+    @staticmethod
+    def _levels(depth: np.ndarray) -> List[np.ndarray]:
+        """Node positions per depth, each in ascending order."""
+        order = np.argsort(depth, kind="stable")
+        bounds = np.searchsorted(
+            depth[order], np.arange(int(depth.max(initial=0)) + 2)
+        )
+        return [order[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    @classmethod
+    def _preorder(cls, parent: np.ndarray, depth: np.ndarray) -> np.ndarray:
+        """Depth-first tour positions, children in tax_id order.
+
+        Subtree sizes are summed bottom-up and tour positions assigned
+        top-down, one depth level at a time.
+        """
+        n = len(parent)
+        levels = cls._levels(depth)
+        size = np.ones(n, dtype=np.int64)
+        for nodes in reversed(levels[1:]):
+            np.add.at(size, parent[nodes], size[nodes])
+
+        preorder = np.zeros(n, dtype=np.int64)
+        if n == 0:
+            return preorder.astype(np.int32)
+        roots = levels[0]
+        preorder[roots] = np.cumsum(size[roots]) - size[roots]
+        for nodes in levels[1:]:
+            nodes = nodes[np.argsort(parent[nodes], kind="stable")]
+            parents = parent[nodes]
+            before = np.cumsum(size[nodes]) - size[nodes]
+            first = np.r_[True, parents[1:] != parents[:-1]]
+            # siblings before each node, within its parent's children
+            offset = before - np.maximum.accumulate(np.where(first, before, 0))
+            preorder[nodes] = preorder[parents] + 1 + offset
+        return preorder.astype(np.int32)
+
+    def index(self, tax_ids: Union[Iterable[int], np.ndarray]) -> np.ndarray:
+        """Positions of tax_ids (-1 for unknown ones)."""
+        tax_ids = np.asarray(
+            tax_ids if isinstance(tax_ids, np.ndarray) else list(tax_ids),
+            dtype=np.int64,
+        )
+        if len(self.tax_ids) == 0:
+            return np.full(tax_ids.shape, -1, dtype=np.int64)
+        positions = np.minimum(
+            np.searchsorted(self.tax_ids, tax_ids), len(self.tax_ids) - 1
+        )
+        return np.where(self.tax_ids[positions] == tax_ids, positions, -1)
+
+    def _range_min_table(self):
+        """Sparse table over the tour: level k holds the shallowest tour
+        position of every window of 2**k positions."""
+        if self._sparse is None:
+            tour = np.empty(len(self), dtype=np.int32)
+            tour[self.preorder] = np.arange(len(self), dtype=np.int32)
+            tour_depth = self.depth[tour]
+            table = [np.arange(len(self), dtype=np.int32)]
+            width = 1
+            while 2 * width <= len(self):
+                previous = table[-1]
+                left, right = previous[:-width], previous[width:]
+                table.append(
+                    np.where(tour_depth[left] <= tour_depth[right], left, right)
+                )
+                width *= 2
+            self._tour, self._tour_depth, self._sparse = tour, tour_depth, table
+        return self._tour, self._tour_depth, self._sparse
+
+    def lca(self, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        """Lowest common ancestor positions of position pairs.
+
+        The shallowest node strictly after the earlier node of a pair and
+        up to the later one in the tour is a child of their common
+        ancestor (or the root of another tree, whose parent is -1).
+
+        Args:
+            first: Node positions
+            second: Node positions, same length as first
+
+        Returns:
+            np.ndarray: Ancestor positions, -1 for unknown nodes and pairs
+            in different trees
+        """
+        first = np.asarray(first, dtype=np.int64)
+        second = np.asarray(second, dtype=np.int64)
+        result = np.full(first.shape, -1, dtype=np.int64)
+        valid = (first >= 0) & (second >= 0)
+        same = valid & (first == second)
+        result[same] = first[same]
+        pending = np.flatnonzero(valid & ~same)
+        if len(pending) == 0:
+            return result
+
+        tour, tour_depth, table = self._range_min_table()
+        a = self.preorder[first[pending]].astype(np.int64)
+        b = self.preorder[second[pending]].astype(np.int64)
+        lo = np.minimum(a, b) + 1
+        hi = np.maximum(a, b)
+        level = np.frexp((hi - lo + 1).astype(np.float64))[1] - 1
+        for k in np.unique(level):
+            selected = level == k
+            left = table[k][lo[selected]]
+            right = table[k][hi[selected] - (1 << int(k)) + 1]
+            shallowest = np.where(
+                tour_depth[left] <= tour_depth[right], left, right
+            )
+            result[pending[selected]] = self.parent[tour[shallowest]]
+        return result
+
+    def lca_tax_ids(
+        self,
+        tax_ids1: Union[Iterable[int], np.ndarray],
+        tax_ids2: Union[Iterable[int], np.ndarray],
+    ) -> np.ndarray:
+        """Lowest common ancestor tax_ids of tax_id pairs (-1 if none)."""
+        ancestors = self.lca(self.index(tax_ids1), self.index(tax_ids2))
+        return np.where(
+            ancestors >= 0, self.tax_ids[np.maximum(ancestors, 0)], -1
+        )
+
+    def is_leaf(self) -> np.ndarray:
+        """Per-node flag of having no children."""
+        is_leaf = np.ones(len(self), dtype=bool)
+        is_leaf[self.parent[self.parent >= 0]] = False
+        return is_leaf
+
+    def lineage(self, position: int) -> List[int]:
+        """Positions from the root down to a node."""
+        path = []
+        while position >= 0:
+            path.append(int(position))
+            position = self.parent[position]
+        return path[::-1]
+
+    def ancestor_at_rank(self, rank: str) -> np.ndarray:
+        """Position of the ancestor (or the node itself) at a rank, per node.
+
+        -1 where the lineage has no node of that rank.
+        """
+        if rank not in self._at_rank:
+            ancestors = np.full(len(self), -1, dtype=np.int64)
+            if rank in self.rank_names:
+                code = self.rank_names.index(rank)
+                for nodes in self._levels(self.depth):
+                    parents = self.parent[nodes]
+                    inherited = np.where(
+                        parents >= 0, ancestors[np.maximum(parents, 0)], -1
+                    )
+                    ancestors[nodes] = np.where(
+                        self.rank[nodes] == code, nodes, inherited
+                    )
+            self._at_rank[rank] = ancestors
+        return self._at_rank[rank]
+
+    def nearest_with_data(
+        self, has_data: np.ndarray, preference: Optional[np.ndarray] = None
+    ) -> pl.DataFrame:
+        """Label every node with its nearest data-bearing ancestor and descendant.
+
+        One bottom-up pass over the depth levels picks each node's nearest
+        descendant with data and counts the leaves below it; one top-down
+        pass picks its nearest ancestor with data.
+
+        Args:
+            has_data: Per-node flag of data availability
+            preference: Per-node tie-break among equally near descendants,
+                lower first (default: tax_id order)
+
+        Returns:
+            pl.DataFrame: One row per node, in position order: tax_id,
+            has_data, preference, ancestor_tax_id, ancestor_distance,
+            descendant_tax_id, descendant_distance (null without such a
+            node), leaves and leaves_with_data (leaf descendants, all and
+            with data)
+        """
+        n = len(self)
+        has_data = np.asarray(has_data, dtype=bool)
+        if preference is None:
+            preference = np.arange(n, dtype=np.int64)
+        levels = self._levels(self.depth)
+        is_leaf = self.is_leaf()
+
+        leaves = np.zeros(n, dtype=np.int64)
+        leaves_with_data = np.zeros(n, dtype=np.int64)
+        descendant = np.full(n, -1, dtype=np.int64)
+        descendant_distance = np.zeros(n, dtype=np.int64)
+        for nodes in reversed(levels[1:]):
+            parents = self.parent[nodes].astype(np.int64)
+            np.add.at(
+                leaves, parents, np.where(is_leaf[nodes], 1, leaves[nodes])
+            )
+            np.add.at(
+                leaves_with_data,
+                parents,
+                np.where(
+                    is_leaf[nodes], has_data[nodes], leaves_with_data[nodes]
+                ),
+            )
+            # each child offers itself, or its own nearest descendant one step further
+            offered = np.where(has_data[nodes], nodes, descendant[nodes])
+            keep = offered >= 0
+            if not keep.any():
+                continue
+            offered, parents = offered[keep], parents[keep]
+            distance = np.where(
+                has_data[nodes[keep]], 1, descendant_distance[nodes[keep]] + 1
+            )
+            # all children of a parent share a level: the first per parent wins
+            order = np.lexsort(
+                (offered, preference[offered], distance, parents)
+            )
+            first = order[
+                np.r_[True, parents[order][1:] != parents[order][:-1]]
+            ]
+            descendant[parents[first]] = offered[first]
+            descendant_distance[parents[first]] = distance[first]
+
+        ancestor = np.full(n, -1, dtype=np.int64)
+        ancestor_distance = np.zeros(n, dtype=np.int64)
+        for nodes in levels[1:]:
+            parents = self.parent[nodes]
+            own = has_data[parents]
+            ancestor[nodes] = np.where(own, parents, ancestor[parents])
+            ancestor_distance[nodes] = np.where(
+                own, 1, ancestor_distance[parents] + 1
+            )
+
+        def _tax_ids(positions, name):
+            return pl.Series(
+                name, self.tax_ids[np.maximum(positions, 0)]
+            ).scatter(np.flatnonzero(positions < 0), None)
+
+        def _distances(positions, distances, name):
+            return pl.Series(name, distances).scatter(
+                np.flatnonzero(positions < 0), None
+            )
+
+        return pl.DataFrame(
+            [
+                pl.Series("tax_id", self.tax_ids),
+                pl.Series("has_data", has_data),
+                pl.Series("preference", preference, dtype=pl.Int64),
+                _tax_ids(ancestor, "ancestor_tax_id"),
+                _distances(ancestor, ancestor_distance, "ancestor_distance"),
+                _tax_ids(descendant, "descendant_tax_id"),
+                _distances(
+                    descendant, descendant_distance, "descendant_distance"
+                ),
+                pl.Series("leaves", leaves),
+                pl.Series("leaves_with_data", leaves_with_data),
+            ]
+        )
+
+    def lineage_frame(
+        self,
+        tax_ids: Union[Iterable[int], np.ndarray],
+        ranks: Optional[Sequence[str]] = None,
+        names: bool = True,
+    ) -> pl.DataFrame:
+        """Expand tax_ids into one column per rank.
+
+        Args:
+            tax_ids: Query tax_ids
+            ranks: Ranks to expand (default: LINEAGE_RANKS present in the taxonomy)
+            names: Fill the columns with scientific names rather than tax_ids
+
+        Returns:
+            pl.DataFrame: tax_id plus one column per rank (null where the
+            lineage has no such rank, or the tax_id is unknown)
+        """
+        tax_ids = np.asarray(
+            tax_ids if isinstance(tax_ids, np.ndarray) else list(tax_ids),
+            dtype=np.int64,
+        )
+        if ranks is None:
+            ranks = [rank for rank in LINEAGE_RANKS if rank in self.rank_names]
+        positions = self.index(tax_ids)
+        columns = {"tax_id": pl.Series("tax_id", tax_ids)}
+        for rank in ranks:
+            ancestors = np.where(
+                positions >= 0,
+                self.ancestor_at_rank(rank)[np.maximum(positions, 0)],
+                -1,
+            )
+            if names and self.names is not None:
+                column = self.names.gather(np.maximum(ancestors, 0))
+            else:
+                column = pl.Series(self.tax_ids[np.maximum(ancestors, 0)])
+            columns[rank] = column.alias(rank).scatter(
+                np.flatnonzero(ancestors < 0), None
+            )
+        return pl.DataFrame(columns)
+
+    def to_frame(self) -> pl.DataFrame:
+        """Nodes table (tax_id, parent_tax_id, rank, scientific_name, depth, preorder)."""
+        parent_tax_ids = self.tax_ids[np.maximum(self.parent, 0)]
+        return pl.DataFrame(
+            {
+                "tax_id": self.tax_ids,
+                # roots point at themselves, as in NCBI nodes.dmp
+                "parent_tax_id": np.where(
+                    self.parent >= 0, parent_tax_ids, self.tax_ids
+                ),
+                "rank": pl.Series(self.rank).replace_strict(
+                    list(range(len(self.rank_names))),
+                    self.rank_names,
+                    default=None,
+                    return_dtype=pl.String,
+                ),
+                "scientific_name": self.names
+                if self.names is not None
+                else pl.Series([None] * len(self), dtype=pl.String),
+                "depth": self.depth,
+                "preorder": self.preorder,
+            }
+        )
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Save to a single .npz (uncompressed, loads in milliseconds) or .parquet file."""
+        path = Path(path)
+        if path.suffix == ".parquet":
+            self.to_frame().write_parquet(path)
+            return path
+        if path.suffix != ".npz":
+            path = path.with_name(path.name + ".npz")
+        names = b""
+        if self.names is not None:
+            # one newline-joined buffer, split again on load
+            names = (
+                self.names.fill_null("")
+                .str.replace_all("\n", " ", literal=True)
+                .str.join("\n")
+                .item()
+                .encode()
+            )
+        np.savez(
+            path,
+            tax_ids=self.tax_ids,
+            parent=self.parent,
+            depth=self.depth,
+            preorder=self.preorder,
+            rank=self.rank,
+            rank_names=np.array(self.rank_names, dtype=str),
+            has_names=np.array(self.names is not None),
+            names=np.frombuffer(names, dtype=np.uint8),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "TaxonomyArrays":
+        """Load a taxonomy written by save."""
+        path = Path(path)
+        if path.suffix == ".parquet":
+            frame = pl.read_parquet(path).sort("tax_id")
+            tax_ids = frame["tax_id"].to_numpy()
+            rank_names = frame["rank"].drop_nulls().unique().sort().to_list()
+            return cls(
+                tax_ids,
+                cls._parent_positions(
+                    tax_ids, frame["parent_tax_id"].to_numpy()
+                ),
+                frame["depth"].to_numpy().astype(np.int32),
+                frame["preorder"].to_numpy().astype(np.int32),
+                frame["rank"]
+                .replace_strict(
+                    rank_names,
+                    list(range(len(rank_names))),
+                    default=-1,
+                    return_dtype=pl.Int16,
+                )
+                .to_numpy(),
+                rank_names,
+                frame["scientific_name"],
+            )
+        with np.load(path, allow_pickle=False) as data:
+            names = None
+            if bool(data["has_names"]):
+                names = pl.Series(
+                    "scientific_name",
+                    data["names"].tobytes().decode().split("\n"),
+                    dtype=pl.String,
+                ).head(len(data["tax_ids"]))
+                names = names.scatter(
+                    np.flatnonzero((names == "").to_numpy()), None
+                )
+            return cls(
+                data["tax_ids"],
+                data["parent"],
+                data["depth"],
+                data["preorder"],
+                data["rank"],
+                data["rank_names"].tolist(),
+                names,
+            )
+
 
 class TaxonomyTree:
     """
@@ -25,7 +575,11 @@ class TaxonomyTree:
     """
 
     def __init__(
-        self, nodes_df, data_availability_df=None, priority_columns=None
+        self,
+        nodes_df,
+        data_availability_df=None,
+        priority_columns=None,
+        arrays=None,
     ):
         """
         Initialize taxonomy tree.
@@ -37,8 +591,10 @@ class TaxonomyTree:
             priority_columns: List of column names to use for prioritization when selecting
                             among neighbors at same distance. Higher values = higher priority.
                             Example: ['protein_coding_gene_count', 'genome_size']
+            arrays: TaxonomyArrays of nodes_df, if already built (see load)
         """
         self.nodes_df = nodes_df
+        self.arrays = arrays or TaxonomyArrays.from_nodes(nodes_df)
         self.parent_map = {}  # tax_id -> parent_tax_id
         self.children_map = defaultdict(
             list
@@ -48,6 +604,7 @@ class TaxonomyTree:
         self.data_available = set()  # tax_ids with available data
         self.metadata_map = {}  # tax_id -> dict of metadata (gene counts, genome size, etc.)
         self.cache = {}  # Cache for repeated queries
+        self._nearest_labels = {}  # priority columns -> nearest_data_labels frame
         self.priority_columns = priority_columns or []
         self.leaf_nodes = set()  # Track leaf nodes
 
@@ -55,20 +612,53 @@ class TaxonomyTree:
         if data_availability_df is not None:
             self._set_data_availability(data_availability_df)
 
+    @classmethod
+    def load(cls, path, data_availability_df=None, priority_columns=None):
+        """Build a tree from a taxonomy saved with save (.npz or .parquet)."""
+        arrays = TaxonomyArrays.load(path)
+        tree = cls(
+            arrays.to_frame(),
+            data_availability_df,
+            priority_columns,
+            arrays=arrays,
+        )
+        labels_path = cls.nearest_labels_path(path)
+        if data_availability_df is not None and labels_path.exists():
+            tree.load_nearest_labels(labels_path)
+        return tree
+
+    def save(self, path):
+        """Save the taxonomy to a .npz or .parquet file, and the nearest-with-data
+        labels next to it when data availability is set."""
+        path = self.arrays.save(path)
+        if self.data_available:
+            self.save_nearest_labels(self.nearest_labels_path(path))
+        return path
+
+    @staticmethod
+    def nearest_labels_path(path):
+        """Labels file next to a taxonomy snapshot (taxonomy.npz -> taxonomy.nearest.parquet)"""
+        path = Path(path)
+        return path.with_name(f"{path.stem}.nearest.parquet")
+
     def _build_tree(self):
         """Build internal tree structure from nodes DataFrame"""
-        for row in self.nodes_df.iter_rows(named=True):
-            tax_id = row["tax_id"]
-            parent_tax_id = row["parent_tax_id"]
-
-            self.parent_map[tax_id] = parent_tax_id
+        tax_ids = self.nodes_df["tax_id"].to_list()
+        self.parent_map = dict(
+            zip(tax_ids, self.nodes_df["parent_tax_id"].to_list())
+        )
+        for tax_id, parent_tax_id in zip(
+            tax_ids, self.nodes_df["parent_tax_id"].to_list()
+        ):
             self.children_map[parent_tax_id].append(tax_id)
 
-            # Store additional info if available
-            if "rank" in row:
-                self.rank_map[tax_id] = row["rank"]
-            if "scientific_name" in row:
-                self.name_map[tax_id] = row["scientific_name"]
+        # Store additional info if available
+        if "rank" in self.nodes_df.columns:
+            self.rank_map = dict(zip(tax_ids, self.nodes_df["rank"].to_list()))
+        if "scientific_name" in self.nodes_df.columns:
+            self.name_map = dict(
+                zip(tax_ids, self.nodes_df["scientific_name"].to_list())
+            )
 
         # Identify leaf nodes (nodes with no children)
         self.leaf_nodes = {
@@ -103,6 +693,7 @@ class TaxonomyTree:
                 available_tax_ids.append(tax_id)
 
         self.data_available = set(available_tax_ids)
+        self._nearest_labels.clear()
         print(f"Set data availability for {len(self.data_available)} tax_ids")
         print(f"Stored metadata for {len(self.metadata_map)} tax_ids")
 
@@ -126,91 +717,30 @@ class TaxonomyTree:
         )
 
         initial_count = len(self.data_available)
-        nodes_updated = 0
-
-        # Process nodes in reverse topological order (leaves first, then parents)
-        # Use BFS from leaves upward
-        processed = set()
-        to_process = deque(self.leaf_nodes)
-
-        # Track descendant counts for each node
-        descendant_counts = defaultdict(lambda: {"with_data": 0, "total": 0})
-
-        while to_process:
-            current = to_process.popleft()
-
-            if current in processed:
-                continue
-
-            processed.add(current)
 
-            # If this is a leaf, count it
-            if current in self.leaf_nodes:
-                parent = self.parent_map.get(current)
-                if parent and parent != current:
-                    descendant_counts[parent]["total"] += 1
-                    if current in self.data_available:
-                        descendant_counts[parent]["with_data"] += 1
-
-                    # Add parent to processing queue
-                    if parent not in processed:
-                        to_process.append(parent)
-            else:
-                # This is an internal node - aggregate from children
-                if current in self.children_map:
-                    total = 0
-                    with_data = 0
-
-                    for child in self.children_map[current]:
-                        if child in self.leaf_nodes:
-                            total += 1
-                            if child in self.data_available:
-                                with_data += 1
-                        else:
-                            # Get counts from this internal child
-                            total += descendant_counts[child]["total"]
-                            with_data += descendant_counts[child]["with_data"]
-
-                    descendant_counts[current]["total"] = total
-                    descendant_counts[current]["with_data"] = with_data
-
-                    # Decide if this node should be marked as having data
-                    should_have_data = False
-
-                    if aggregation_method == "any":
-                        should_have_data = with_data > 0
-                    elif aggregation_method == "count":
-                        should_have_data = (
-                            with_data >= 1
-                        )  # At least one descendant
-                    elif aggregation_method == "majority":
-                        should_have_data = (
-                            total > 0 and (with_data / total) > 0.5
-                        )
-                    elif aggregation_method == "summary":
-                        should_have_data = with_data > 0
-
-                    # Update data availability
-                    if should_have_data and current not in self.data_available:
-                        self.data_available.add(current)
-                        nodes_updated += 1
-
-                        # Create aggregated metadata
-                        if current not in self.metadata_map:
-                            self.metadata_map[current] = {}
-
-                        self.metadata_map[current][
-                            "descendant_count_with_data"
-                        ] = with_data
-                        self.metadata_map[current]["descendant_count_total"] = (
-                            total
-                        )
-                        self.metadata_map[current]["data_source"] = "propagated"
-
-                # Add parent to processing queue
-                parent = self.parent_map.get(current)
-                if parent and parent != current and parent not in processed:
-                    to_process.append(parent)
+        # leaf descendant counts of every node, from one bottom-up pass
+        labels = self.arrays.nearest_with_data(self._has_data_mask())
+        total = pl.col("leaves")
+        with_data = pl.col("leaves_with_data")
+        should_have_data = {
+            "any": with_data > 0,
+            "count": with_data >= 1,  # At least one descendant
+            "majority": with_data / total > 0.5,
+            "summary": with_data > 0,
+        }.get(aggregation_method, pl.lit(False))
+        gained = labels.filter(
+            (total > 0) & should_have_data & ~pl.col("has_data")
+        ).select("tax_id", "leaves", "leaves_with_data")
+
+        for tax_id, total, with_data in gained.iter_rows():
+            self.data_available.add(tax_id)
+
+            # Create aggregated metadata
+            metadata = self.metadata_map.setdefault(tax_id, {})
+            metadata["descendant_count_with_data"] = with_data
+            metadata["descendant_count_total"] = total
+            metadata["data_source"] = "propagated"
+        nodes_updated = gained.height
 
         print(f"Propagation complete:")
         print(f"  Initial nodes with data: {initial_count:,}")
@@ -219,127 +749,251 @@ class TaxonomyTree:
 
         # Clear cache since data availability changed
         self.cache.clear()
+        self._nearest_labels.clear()
 
         return nodes_updated
 
-    def find_nearest_leaf_with_data(
-        self, tax_id, max_distance=10, priority_override=None
-    ):
+    def _has_data_mask(self):
+        """Per-node (TaxonomyArrays position) flag of data availability"""
+        mask = np.zeros(len(self.arrays), dtype=bool)
+        positions = self.arrays.index(list(self.data_available))
+        mask[positions[positions >= 0]] = True
+        return mask
+
+    def _preference(self, priority_cols):
+        """Per-node tie-break rank: priority columns descending, then tax_id"""
+        n = len(self.arrays)
+        preference = np.arange(n, dtype=np.int64)
+        if not priority_cols or not self.metadata_map:
+            return preference
+        ranked = (
+            pl.DataFrame(
+                [
+                    pl.Series(
+                        "position", self.arrays.index(list(self.metadata_map))
+                    )
+                ]
+                + [
+                    pl.Series(
+                        column,
+                        [
+                            metadata.get(column)
+                            for metadata in self.metadata_map.values()
+                        ],
+                        strict=False,
+                    ).cast(pl.Float64, strict=False)
+                    for column in priority_cols
+                ]
+            )
+            .filter(pl.col("position") >= 0)
+            .sort(
+                [*priority_cols, "position"],
+                descending=[True] * len(priority_cols) + [False],
+                nulls_last=True,
+            )
+        )
+        preference += ranked.height
+        preference[ranked["position"].to_numpy()] = np.arange(ranked.height)
+        return preference
+
+    def nearest_data_labels(self, priority_override=None):
         """
-        Find nearest leaf nodes with data (useful for finding related species).
-        This searches both up and down the tree to find leaf relatives.
+        Label every node with its nearest ancestor, descendant and leaf descendant with data.
+
+        Computed in one pass over the tree (see TaxonomyArrays.nearest_with_data) and
+        kept until data availability changes; batch queries then only index into it.
 
         Args:
-            tax_id: Starting taxonomy ID
-            max_distance: Maximum taxonomic distance to search
             priority_override: Optional list of column names to override default priority_columns
 
         Returns:
-            dict with 'leaves' (list of leaf nodes with data) and 'distance' info
+            DataFrame with one row per node (TaxonomyArrays position order)
         """
-        if tax_id in self.data_available and tax_id in self.leaf_nodes:
-            return {
-                "leaves": [self._create_node_info(tax_id, 0)],
-                "self_is_leaf_with_data": True,
-            }
-
         priority_cols = (
             priority_override
             if priority_override is not None
             else self.priority_columns
         )
+        key = tuple(priority_cols)
+        if key not in self._nearest_labels:
+            has_data = self._has_data_mask()
+            preference = self._preference(priority_cols)
+            labels = self.arrays.nearest_with_data(has_data, preference)
+            leaves = self.arrays.nearest_with_data(
+                has_data & self.arrays.is_leaf(), preference
+            )
+            self._nearest_labels[key] = labels.with_columns(
+                leaf_tax_id=leaves["descendant_tax_id"],
+                leaf_distance=leaves["descendant_distance"],
+            )
+        return self._nearest_labels[key]
 
-        # BFS to find nearest leaves with data
-        # We'll search by going up to ancestors and down to their descendants
-        nearest_leaves = []
-        min_distance_found = float("inf")
-
-        # Strategy: Walk up the tree, and at each level, search descendants for leaves with data
-        current = tax_id
-        distance_to_ancestor = 0
-        visited_ancestors = set()
-
-        while (
-            current in self.parent_map and distance_to_ancestor <= max_distance
-        ):
-            if current in visited_ancestors:
-                break
-            visited_ancestors.add(current)
+    def save_nearest_labels(self, path):
+        """Write the nearest-with-data labels (default priority columns) to parquet"""
+        self.nearest_data_labels().write_parquet(path)
+        return Path(path)
 
-            # Search descendants of this ancestor for leaves with data
-            leaves_here = self._find_leaves_with_data_in_subtree(
-                current,
-                max_depth=max_distance - distance_to_ancestor,
-                priority_cols=priority_cols,
-            )
-
-            # Calculate total distance (up to ancestor + down to leaf)
-            for leaf_info in leaves_here:
-                total_distance = distance_to_ancestor + leaf_info["distance"]
-                if (
-                    total_distance <= max_distance
-                    and total_distance <= min_distance_found
-                ):
-                    leaf_info["distance"] = total_distance
-                    if total_distance < min_distance_found:
-                        nearest_leaves = [leaf_info]
-                        min_distance_found = total_distance
-                    elif total_distance == min_distance_found:
-                        nearest_leaves.append(leaf_info)
+    def load_nearest_labels(self, path):
+        """
+        Reuse labels written by save_nearest_labels.
 
-            # Move to parent
-            parent = self.parent_map.get(current)
-            if parent == current:  # Root
-                break
-            current = parent
-            distance_to_ancestor += 1
+        The labels are only taken if they were computed for the same taxonomy,
+        data availability and priority columns.
 
-        # Prioritize and return
-        prioritized_leaves = self._prioritize_candidates(
-            nearest_leaves, priority_cols
+        Returns:
+            True if the labels were loaded, False if they are stale
+        """
+        labels = pl.read_parquet(path)
+        current = pl.DataFrame(
+            {
+                "tax_id": self.arrays.tax_ids,
+                "has_data": self._has_data_mask(),
+                "preference": self._preference(self.priority_columns),
+            }
         )
-
-        return {"leaves": prioritized_leaves, "self_is_leaf_with_data": False}
-
-    def _find_leaves_with_data_in_subtree(
-        self, root_id, max_depth, priority_cols
+        if labels.height != current.height or not labels.select(
+            current.columns
+        ).equals(current):
+            print(f"Ignoring stale nearest-with-data labels: {path}")
+            return False
+        self._nearest_labels[tuple(self.priority_columns)] = labels
+        return True
+
+    def find_nearest_with_data_frame(
+        self, tax_ids, max_distance=10, priority_override=None
     ):
         """
-        Find all leaves with data in the subtree rooted at root_id.
+        Nearest ancestor and descendant with data for many tax_ids, by indexing the labels.
 
         Args:
-            root_id: Root of subtree to search
-            max_depth: Maximum depth to search
-            priority_cols: Priority columns for sorting
+            tax_ids: Taxonomy IDs to query
+            max_distance: Maximum taxonomic distance (matches further away are null)
+            priority_override: Optional list of column names to override default priority_columns
 
         Returns:
-            List of leaf node info dicts with distance from root_id
+            DataFrame with tax_id, self_has_data, ancestor_tax_id, ancestor_distance,
+            descendant_tax_id, descendant_distance (one row per query, in order)
         """
-        if root_id in self.leaf_nodes and root_id in self.data_available:
-            return [self._create_node_info(root_id, 0)]
+        tax_ids = np.asarray(list(tax_ids), dtype=np.int64)
+        positions = self.arrays.index(tax_ids)
+        labels = self.nearest_data_labels(priority_override)
+        rows = labels[np.maximum(positions, 0)] if labels.height else labels
+        known = pl.col("known")
+        matches = []
+        for which in ("ancestor", "descendant"):
+            within = known & (pl.col(f"{which}_distance") <= max_distance)
+            matches += [
+                pl.when(within)
+                .then(pl.col(f"{which}_tax_id"))
+                .alias(f"{which}_tax_id"),
+                pl.when(within)
+                .then(pl.col(f"{which}_distance"))
+                .alias(f"{which}_distance"),
+            ]
+        return (
+            rows.select(
+                "has_data",
+                "ancestor_tax_id",
+                "ancestor_distance",
+                "descendant_tax_id",
+                "descendant_distance",
+            )
+            .with_columns(
+                tax_id=pl.Series(tax_ids), known=pl.Series(positions >= 0)
+            )
+            .select(
+                "tax_id",
+                (known & pl.col("has_data")).alias("self_has_data"),
+                *matches,
+            )
+        )
 
-        leaves = []
-        queue = deque([(root_id, 0)])
-        visited = set()
+    def find_nearest_leaf_with_data_frame(
+        self, tax_ids, max_distance=10, priority_override=None
+    ):
+        """
+        Nearest leaf with data for many tax_ids, going up to each ancestor and down to its
+        nearest labelled leaf (max_distance vectorized steps).
 
-        while queue:
-            node_id, depth = queue.popleft()
+        Args:
+            tax_ids: Taxonomy IDs to query
+            max_distance: Maximum taxonomic distance (up plus down)
+            priority_override: Optional list of column names to override default priority_columns
 
-            if node_id in visited or depth > max_depth:
-                continue
-            visited.add(node_id)
+        Returns:
+            DataFrame with tax_id, self_is_leaf_with_data, leaf_tax_id, leaf_distance
+            (null if no leaf within max_distance)
+        """
+        tax_ids = np.asarray(list(tax_ids), dtype=np.int64)
+        positions = self.arrays.index(tax_ids)
+        labels = self.nearest_data_labels(priority_override)
+        leaf = self.arrays.index(labels["leaf_tax_id"].fill_null(-1).to_numpy())
+        leaf_distance = labels["leaf_distance"].fill_null(0).to_numpy()
+        preference = labels["preference"].to_numpy()
+
+        at = np.maximum(positions, 0)
+        self_leaf = (
+            (positions >= 0)
+            & labels["has_data"].to_numpy()[at]
+            & self.arrays.is_leaf()[at]
+        )
+        best = np.where(self_leaf, positions, -1)
+        best_distance = np.where(self_leaf, 0, max_distance + 1)
+        current = positions.copy()
+        for up in range(max_distance + 1):
+            alive = current >= 0
+            if not alive.any():
+                break
+            at = np.maximum(current, 0)
+            candidate = np.where(alive, leaf[at], -1)
+            distance = up + leaf_distance[at]
+            better = (candidate >= 0) & (
+                (distance < best_distance)
+                | (
+                    (distance == best_distance)
+                    & (best >= 0)
+                    & (
+                        preference[np.maximum(candidate, 0)]
+                        < preference[np.maximum(best, 0)]
+                    )
+                )
+            )
+            best = np.where(better, candidate, best)
+            best_distance = np.where(better, distance, best_distance)
+            current = np.where(alive, self.arrays.parent[at], -1)
+
+        found = best >= 0
+        return pl.DataFrame(
+            [
+                pl.Series("tax_id", tax_ids),
+                pl.Series("self_is_leaf_with_data", self_leaf),
+                pl.Series(
+                    "leaf_tax_id", self.arrays.tax_ids[np.maximum(best, 0)]
+                ).scatter(np.flatnonzero(~found), None),
+                pl.Series("leaf_distance", best_distance).scatter(
+                    np.flatnonzero(~found), None
+                ),
+            ]
+        )
 
-            # Check if this is a leaf with data
-            if node_id in self.leaf_nodes and node_id in self.data_available:
-                leaves.append(self._create_node_info(node_id, depth))
+    def find_nearest_leaf_with_data(
+        self, tax_id, max_distance=10, priority_override=None
+    ):
+        """
+        Find nearest leaf nodes with data (useful for finding related species).
+        This searches both up and down the tree to find leaf relatives.
 
-            # Add children to queue
-            if depth < max_depth and node_id in self.children_map:
-                for child in self.children_map[node_id]:
-                    if child not in visited:
-                        queue.append((child, depth + 1))
+        Args:
+            tax_id: Starting taxonomy ID
+            max_distance: Maximum taxonomic distance to search
+            priority_override: Optional list of column names to override default priority_columns
 
-        return leaves
+        Returns:
+            dict with 'leaves' (list of leaf nodes with data) and 'distance' info
+        """
+        return self.find_nearest_leaf_with_data_batch(
+            [tax_id], max_distance, priority_override
+        )[tax_id]
 
     def find_nearest_with_data(
         self, tax_id, max_distance=10, priority_override=None
@@ -360,42 +1014,11 @@ class TaxonomyTree:
             max_distance,
             tuple(priority_override or self.priority_columns),
         )
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
-        if tax_id in self.data_available:
-            result = {
-                "ancestor": self._create_node_info(tax_id, 0),
-                "descendants": [],
-                "self_has_data": True,
-            }
-            self.cache[cache_key] = result
-            return result
-
-        priority_cols = (
-            priority_override
-            if priority_override is not None
-            else self.priority_columns
-        )
-
-        # BFS to find nearest ancestor with data
-        nearest_ancestor = self._find_nearest_ancestor_with_data(
-            tax_id, max_distance, priority_cols
-        )
-
-        # BFS to find nearest descendants with data
-        nearest_descendants = self._find_nearest_descendants_with_data(
-            tax_id, max_distance, priority_cols
-        )
-
-        result = {
-            "ancestor": nearest_ancestor,
-            "descendants": nearest_descendants,
-            "self_has_data": False,
-        }
-
-        self.cache[cache_key] = result
-        return result
+        if cache_key not in self.cache:
+            self.cache[cache_key] = self.find_nearest_with_data_batch(
+                [tax_id], max_distance, priority_override
+            )[tax_id]
+        return self.cache[cache_key]
 
     def find_nearest_with_data_batch(
         self,
@@ -406,7 +1029,7 @@ class TaxonomyTree:
         return_stats=False,
     ):
         """
-        Find nearest neighbors with data for multiple tax_ids .
+        Find nearest neighbors with data for multiple tax_ids, from the precomputed labels.
 
         Args:
             tax_ids: List of taxonomy IDs to query
@@ -416,14 +1039,46 @@ class TaxonomyTree:
             return_stats: If True, return statistics about the batch query
 
         Returns:
-            dict mapping tax_id -> result dict (same format as find_nearest_with_data)
+            dict mapping tax_id -> result dict (same format as find_nearest_with_data;
+            'descendants' holds the nearest descendant, best by priority)
             If return_stats=True, also returns stats dict
         """
         # Filter to leaves only if requested
         if leaves_only:
             tax_ids = [tid for tid in tax_ids if tid in self.leaf_nodes]
 
+        frame = self.find_nearest_with_data_frame(
+            tax_ids, max_distance, priority_override
+        )
         results = {}
+        for row in frame.iter_rows(named=True):
+            tax_id = row["tax_id"]
+            if row["self_has_data"]:
+                results[tax_id] = {
+                    "ancestor": self._create_node_info(tax_id, 0),
+                    "descendants": [],
+                    "self_has_data": True,
+                }
+                continue
+            results[tax_id] = {
+                "ancestor": self._create_node_info(
+                    row["ancestor_tax_id"], row["ancestor_distance"]
+                )
+                if row["ancestor_tax_id"] is not None
+                else None,
+                "descendants": [
+                    self._create_node_info(
+                        row["descendant_tax_id"], row["descendant_distance"]
+                    )
+                ]
+                if row["descendant_tax_id"] is not None
+                else [],
+                "self_has_data": False,
+            }
+
+        if not return_stats:
+            return results
+
         stats = {
             "total_queried": len(tax_ids),
             "self_has_data": 0,
@@ -433,39 +1088,30 @@ class TaxonomyTree:
             "distance_distribution": defaultdict(int),
             "unmatched_tax_ids": [],
         }
-
         for tax_id in tax_ids:
-            result = self.find_nearest_with_data(
-                tax_id, max_distance, priority_override
-            )
-            results[tax_id] = result
-
-            if return_stats:
-                if result["self_has_data"]:
-                    stats["self_has_data"] += 1
-                    stats["distance_distribution"][0] += 1
-                else:
-                    has_match = False
-                    if result["ancestor"]:
-                        stats["ancestor_found"] += 1
-                        stats["distance_distribution"][
-                            result["ancestor"]["distance"]
-                        ] += 1
-                        has_match = True
-                    if result["descendants"]:
-                        stats["descendant_found"] += 1
-                        min_desc_dist = min(
-                            d["distance"] for d in result["descendants"]
-                        )
-                        stats["distance_distribution"][min_desc_dist] += 1
-                        has_match = True
-                    if not has_match:
-                        stats["no_match_found"] += 1
-                        stats["unmatched_tax_ids"].append(tax_id)
-
-        if return_stats:
-            return results, stats
-        return results
+            result = results[tax_id]
+            if result["self_has_data"]:
+                stats["self_has_data"] += 1
+                stats["distance_distribution"][0] += 1
+            else:
+                has_match = False
+                if result["ancestor"]:
+                    stats["ancestor_found"] += 1
+                    stats["distance_distribution"][
+                        result["ancestor"]["distance"]
+                    ] += 1
+                    has_match = True
+                if result["descendants"]:
+                    stats["descendant_found"] += 1
+                    min_desc_dist = min(
+                        d["distance"] for d in result["descendants"]
+                    )
+                    stats["distance_distribution"][min_desc_dist] += 1
+                    has_match = True
+                if not has_match:
+                    stats["no_match_found"] += 1
+                    stats["unmatched_tax_ids"].append(tax_id)
+        return results, stats
 
     def find_nearest_leaf_with_data_batch(
         self,
@@ -476,7 +1122,7 @@ class TaxonomyTree:
         return_stats=False,
     ):
         """
-        Find nearest leaf nodes with data for multiple tax_ids .
+        Find nearest leaf nodes with data for multiple tax_ids, from the precomputed labels.
 
         Args:
             tax_ids: List of taxonomy IDs to query
@@ -486,14 +1132,34 @@ class TaxonomyTree:
             return_stats: If True, return statistics about the batch query
 
         Returns:
-            dict mapping tax_id -> result dict (same format as find_nearest_leaf_with_data)
+            dict mapping tax_id -> result dict (same format as find_nearest_leaf_with_data;
+            'leaves' holds the nearest leaf, best by priority)
             If return_stats=True, also returns stats dict
         """
         # Filter to leaves only if requested
         if leaves_only:
             tax_ids = [tid for tid in tax_ids if tid in self.leaf_nodes]
 
-        results = {}
+        frame = self.find_nearest_leaf_with_data_frame(
+            tax_ids, max_distance, priority_override
+        )
+        results = {
+            row["tax_id"]: {
+                "leaves": [
+                    self._create_node_info(
+                        row["leaf_tax_id"], row["leaf_distance"]
+                    )
+                ]
+                if row["leaf_tax_id"] is not None
+                else [],
+                "self_is_leaf_with_data": row["self_is_leaf_with_data"],
+            }
+            for row in frame.iter_rows(named=True)
+        }
+
+        if not return_stats:
+            return results
+
         stats = {
             "total_queried": len(tax_ids),
             "self_is_leaf_with_data": 0,
@@ -503,32 +1169,23 @@ class TaxonomyTree:
             "unmatched_tax_ids": [],
             "total_leaves_returned": 0,
         }
-
         for tax_id in tax_ids:
-            result = self.find_nearest_leaf_with_data(
-                tax_id, max_distance, priority_override
-            )
-            results[tax_id] = result
-
-            if return_stats:
-                if result["self_is_leaf_with_data"]:
-                    stats["self_is_leaf_with_data"] += 1
-                    stats["distance_distribution"][0] += 1
-                    stats["total_leaves_returned"] += 1
-                elif result["leaves"]:
-                    stats["leaves_found"] += 1
-                    min_distance = min(
-                        leaf["distance"] for leaf in result["leaves"]
-                    )
-                    stats["distance_distribution"][min_distance] += 1
-                    stats["total_leaves_returned"] += len(result["leaves"])
-                else:
-                    stats["no_leaves_found"] += 1
-                    stats["unmatched_tax_ids"].append(tax_id)
-
-        if return_stats:
-            return results, stats
-        return results
+            result = results[tax_id]
+            if result["self_is_leaf_with_data"]:
+                stats["self_is_leaf_with_data"] += 1
+                stats["distance_distribution"][0] += 1
+                stats["total_leaves_returned"] += 1
+            elif result["leaves"]:
+                stats["leaves_found"] += 1
+                min_distance = min(
+                    leaf["distance"] for leaf in result["leaves"]
+                )
+                stats["distance_distribution"][min_distance] += 1
+                stats["total_leaves_returned"] += len(result["leaves"])
+            else:
+                stats["no_leaves_found"] += 1
+                stats["unmatched_tax_ids"].append(tax_id)
+        return results, stats
 
     def find_nearest_with_data_unified(
         self,
@@ -786,7 +1443,7 @@ class TaxonomyTree:
 
         # Prioritize and return unique nearest leaves
         prioritized_leaves = self._prioritize_candidates(
-            list(set(nearest_leaves)), priority_cols
+            nearest_leaves, priority_cols
         )
         return prioritized_leaves, rank_reached
 
@@ -814,44 +1471,74 @@ class TaxonomyTree:
 
         return leaves
 
-    def get_lineage_path(self, tax_id):
-        """Get full lineage path from root to tax_id"""
-        lineage = []
-        current = tax_id
-        visited = set()
-
-        while current in self.parent_map and current not in visited:
-            visited.add(current)
-            lineage.append(
-                {
-                    "tax_id": current,
-                    "name": self.name_map.get(current),
-                    "rank": self.rank_map.get(current),
-                    "has_data": current in self.data_available,
-                }
-            )
+    def _create_node_info(self, tax_id, distance):
+        """Node description returned by the nearest-with-data searches"""
+        return {
+            "tax_id": tax_id,
+            "name": self.name_map.get(tax_id),
+            "rank": self.rank_map.get(tax_id),
+            "distance": distance,
+            "is_leaf": tax_id in self.leaf_nodes,
+            "metadata": self.metadata_map.get(tax_id, {}),
+        }
 
-            parent = self.parent_map[current]
-            if parent == current:  # Root
-                break
-            current = parent
+    def _prioritize_candidates(self, candidates, priority_cols):
+        """Unique candidates by distance, then priority columns (higher first)"""
+        unique = {}
+        for candidate in candidates:
+            previous = unique.get(candidate["tax_id"])
+            if previous is None or candidate["distance"] < previous["distance"]:
+                unique[candidate["tax_id"]] = candidate
+
+        def _key(candidate):
+            priorities = []
+            for column in priority_cols:
+                value = candidate["metadata"].get(column)
+                numeric = isinstance(value, (int, float)) and value is not None
+                priorities += [not numeric, -value if numeric else 0]
+            return (candidate["distance"], *priorities, candidate["tax_id"])
+
+        return sorted(unique.values(), key=_key)
+
+    def _lineage_node(self, tax_id):
+        return {
+            "tax_id": tax_id,
+            "name": self.name_map.get(tax_id),
+            "rank": self.rank_map.get(tax_id),
+            "has_data": tax_id in self.data_available,
+        }
 
-        return list(reversed(lineage))
+    def get_lineage_path(self, tax_id):
+        """Get full lineage path from root to tax_id"""
+        position = self.arrays.index([tax_id])[0]
+        if position < 0:
+            return []
+        return [
+            self._lineage_node(int(self.arrays.tax_ids[node]))
+            for node in self.arrays.lineage(position)
+        ]
+
+    def get_lineage_frame(self, tax_ids, ranks=None, names=True):
+        """Lineages of many tax_ids as one column per rank (see TaxonomyArrays.lineage_frame)"""
+        return self.arrays.lineage_frame(tax_ids, ranks, names)
 
     def find_common_ancestor(self, tax_id1, tax_id2):
         """Find lowest common ancestor of two tax_ids"""
-        lineage1 = {
-            node["tax_id"]: i
-            for i, node in enumerate(self.get_lineage_path(tax_id1))
-        }
-        lineage2_path = self.get_lineage_path(tax_id2)
+        ancestor = self.arrays.lca_tax_ids([tax_id1], [tax_id2])[0]
+        if ancestor < 0:
+            return None
+        return self._lineage_node(int(ancestor))
 
-        # Find first common node in lineage2 that's also in lineage1
-        for node in lineage2_path:
-            if node["tax_id"] in lineage1:
-                return node
+    def find_common_ancestor_batch(self, tax_ids1, tax_ids2):
+        """Lowest common ancestors of tax_id pairs, null for unknown tax_ids or separate trees.
 
-        return None
+        Returns:
+            pl.Series of ancestor tax_ids, aligned with the pairs
+        """
+        ancestors = self.arrays.lca_tax_ids(tax_ids1, tax_ids2)
+        return pl.Series("lca_tax_id", ancestors).scatter(
+            np.flatnonzero(ancestors < 0), None
+        )
 
     def get_tree_stats(self):
         """Get comprehensive statistics about the tree structure and data availability"""
@@ -0,0 +1,410 @@
+"""
+Persistent on-disk caches shared across rolypoly runs.
+
+Entries are directories named by a content hash (xxhash of the inputs plus
+the parameters that affect the result). Builds happen in a private staging
+directory and are moved into place atomically while holding a per-entry
+file lock, so concurrent jobs on the same node or shared filesystem either
+reuse a finished entry or wait for the job that is building it. Readers
+that go through CacheStore.use hold a shared lock on the entry, which
+garbage collection respects. Files of finished entries are read-only.
+
+Key classes/functions:
+    - get_cache_root: Resolve the cache root (ROLYPOLY_CACHE_DIR or ~/.cache/rolypoly)
+    - file_digest: Streaming xxhash digest of a file
+    - file_fingerprint: Cheap path/size/mtime/edges digest for very large files
+    - hash_key: Stable digest of a parameter mapping
+    - FileLock: fcntl based inter-process lock (exclusive or shared)
+    - CacheStore: Keyed store with get_or_build/use, listing and garbage collection
+"""
+
+import json
+import os
+import shutil
+import stat
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from rolypoly.utils.logging.loggit import get_logger
+
+META_FILE = "meta.json"
+
+
+def get_cache_root(cache_dir: Union[str, Path, None] = None) -> Path:
+    """Resolve the root directory for persistent caches.
+
+    Order of precedence: explicit ``cache_dir``, the ``ROLYPOLY_CACHE_DIR``
+    environment variable, then ``$XDG_CACHE_HOME/rolypoly`` (``~/.cache``).
+    """
+    if cache_dir:
+        return Path(cache_dir).expanduser().absolute()
+    env = os.environ.get("ROLYPOLY_CACHE_DIR")
+    if env:
+        return Path(env).expanduser().absolute()
+    xdg = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(xdg).expanduser().absolute() / "rolypoly"
+
+
+def file_digest(file_path: Union[str, Path], chunk_size: int = 1 << 22) -> str:
+    """Streaming xxh3-128 hex digest of a file's content."""
+    import xxhash
+
+    hasher = xxhash.xxh3_128()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_fingerprint(
+    file_path: Union[str, Path], edge_bytes: int = 1 << 20
+) -> str:
+    """Cheap identity digest of a (possibly huge) file.
+
+    Combines the resolved path, size, mtime and the first/last ``edge_bytes``
+    of content. Meant for caches of derived data where hashing the whole
+    file would cost as much as the work being cached.
+    """
+    import xxhash
+
+    file_path = Path(file_path).resolve()
+    stat = file_path.stat()
+    hasher = xxhash.xxh3_128()
+    hasher.update(f"{file_path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    with open(file_path, "rb") as f:
+        hasher.update(f.read(edge_bytes))
+        if stat.st_size > edge_bytes:
+            f.seek(max(stat.st_size - edge_bytes, edge_bytes))
+            hasher.update(f.read(edge_bytes))
+    return hasher.hexdigest()
+
+
+def hash_key(params: Dict[str, Any]) -> str:
+    """Stable hex digest of a JSON-serializable parameter mapping."""
+    import xxhash
+
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return xxhash.xxh3_128(payload.encode()).hexdigest()
+
+
+def _make_read_only(path: Union[str, Path]) -> None:
+    """Drop the write bits of a file (ignored if we don't own it)."""
+    try:
+        mode = os.stat(path).st_mode
+        os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+    except OSError:
+        pass
+
+
+def link_or_copy(src: Union[str, Path], dst: Union[str, Path]) -> Path:
+    """Hard link ``src`` to ``dst`` when possible, otherwise copy it.
+
+    A hard link shares its content with ``src``, so it is only made when
+    ``src`` is read-only (as the files of finished cache entries are);
+    writing to ``dst`` in place then fails instead of changing ``src``.
+    """
+    dst = Path(dst)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if os.stat(src).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+        shutil.copy2(src, dst)
+        return dst
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+        os.chmod(dst, os.stat(dst).st_mode | stat.S_IWUSR)
+    return dst
+
+
+class FileLock:
+    """Inter-process lock backed by ``fcntl.flock``.
+
+    Args:
+        lock_path: Path of the lock file (created if missing)
+        timeout: Seconds to wait before raising TimeoutError (None waits forever)
+        poll_interval: Seconds between acquisition attempts
+        shared: Take a shared (reader) lock instead of an exclusive one
+    """
+
+    def __init__(
+        self,
+        lock_path: Union[str, Path],
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.5,
+        shared: bool = False,
+    ):
+        self.lock_path = Path(lock_path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.shared = shared
+        self._fh = None
+
+    def acquire(self) -> None:
+        import fcntl
+
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.lock_path, "a")
+        mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        start = time.monotonic()
+        while True:
+            try:
+                fcntl.flock(self._fh.fileno(), mode | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if (
+                    self.timeout is not None
+                    and time.monotonic() - start > self.timeout
+                ):
+                    self._fh.close()
+                    self._fh = None
+                    raise TimeoutError(
+                        f"Timed out waiting for lock {self.lock_path}"
+                    )
+                time.sleep(self.poll_interval)
+
+    def release(self) -> None:
+        import fcntl
+
+        if self._fh is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class CacheStore:
+    """Content-addressed directory store with locking and garbage collection.
+
+    Each entry lives in ``<root>/<key>/`` together with a ``meta.json``
+    describing how it was built and when it was last used.
+
+    Args:
+        name: Store name, used as the sub-directory of the cache root
+        cache_dir: Override for the cache root (see get_cache_root)
+        lock_timeout: Seconds to wait for another job building the same entry
+        logger: Logger instance
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cache_dir: Union[str, Path, None] = None,
+        lock_timeout: Optional[float] = None,
+        logger=None,
+    ):
+        self.name = name
+        self.root = get_cache_root(cache_dir) / name
+        self.lock_timeout = lock_timeout
+        self.logger = get_logger(logger)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def entry_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def lock(self, key: str, shared: bool = False) -> FileLock:
+        return FileLock(
+            self.root / ".locks" / f"{key}.lock",
+            timeout=self.lock_timeout,
+            shared=shared,
+        )
+
+    def has(self, key: str) -> bool:
+        return (self.entry_dir(key) / META_FILE).exists()
+
+    def read_meta(self, key: str) -> Dict[str, Any]:
+        with open(self.entry_dir(key) / META_FILE, "r") as f:
+            return json.load(f)
+
+    def _write_meta(self, entry: Path, meta: Dict[str, Any]) -> None:
+        tmp_meta = entry / f".{META_FILE}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f, indent=2, default=str)
+        os.replace(tmp_meta, entry / META_FILE)
+
+    def touch(self, key: str) -> None:
+        """Record that an entry was used (drives least-recently-used GC)."""
+        try:
+            meta = self.read_meta(key)
+        except (OSError, ValueError):
+            return
+        meta["last_used"] = time.time()
+        self._write_meta(self.entry_dir(key), meta)
+
+    def get_or_build(
+        self,
+        key: str,
+        builder: Callable[[Path], None],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Path:
+        """Return the entry directory for ``key``, building it if needed.
+
+        ``builder`` receives an empty staging directory and must write the
+        entry's files into it. The staging directory is renamed into place
+        only if the builder returns without raising, and its files are made
+        read-only.
+
+        The returned directory is not protected from a concurrent gc; read
+        it inside ``use`` when that matters.
+        """
+        entry = self.entry_dir(key)
+        if self.has(key):
+            self.logger.info(f"[{self.name}] cache hit: {key}")
+            self.touch(key)
+            return entry
+        with self.lock(key):
+            # another job may have finished the entry while we waited
+            if self.has(key):
+                self.logger.info(f"[{self.name}] cache hit: {key}")
+                self.touch(key)
+                return entry
+            self.logger.info(f"[{self.name}] cache miss: {key}, building")
+            staging = self.root / ".staging" / f"{key}.{os.getpid()}"
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+            started = time.time()
+            try:
+                builder(staging)
+                now = time.time()
+                self._write_meta(
+                    staging,
+                    {
+                        "key": key,
+                        "params": params or {},
+                        "created": now,
+                        "last_used": now,
+                        "build_seconds": round(now - started, 3),
+                    },
+                )
+                # (not through symlinks, which point at the user's files)
+                for path in staging.rglob("*"):
+                    if path.is_file() and not path.is_symlink():
+                        _make_read_only(path)
+                shutil.rmtree(entry, ignore_errors=True)
+                os.replace(staging, entry)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        return entry
+
+    @contextmanager
+    def use(
+        self,
+        key: str,
+        builder: Callable[[Path], None],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Path]:
+        """get_or_build, holding a shared lock on the entry inside the block.
+
+        gc skips entries that are locked, so the entry stays in place until
+        the block exits.
+        """
+        while True:
+            entry = self.get_or_build(key, builder, params)
+            with self.lock(key, shared=True):
+                # gc may have removed it between the build and the lock
+                if self.has(key):
+                    yield entry
+                    return
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """List entries with their metadata and on-disk size in bytes."""
+        found = []
+        for entry in sorted(self.root.iterdir()):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                meta = self.read_meta(entry.name)
+            except (OSError, ValueError):
+                meta = {"key": entry.name, "last_used": 0, "created": 0}
+            meta["path"] = str(entry)
+            meta["size"] = sum(
+                p.stat().st_size for p in entry.rglob("*") if p.is_file()
+            )
+            found.append(meta)
+        return found
+
+    def remove(self, key: str) -> None:
+        with self.lock(key):
+            shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def gc(
+        self,
+        max_age_days: Optional[float] = None,
+        max_size: Optional[int] = None,
+        dry_run: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Delete entries unused for ``max_age_days`` and then the least
+        recently used ones until the store fits in ``max_size`` bytes.
+
+        Entries that are being built, or read inside ``use``, are skipped.
+        Paths handed out by get_or_build are not protected.
+
+        Returns:
+            The metadata of the removed (or, with dry_run, removable) entries.
+        """
+        entries = sorted(self.entries(), key=lambda e: e.get("last_used", 0))
+        now = time.time()
+        to_remove = []
+        kept = []
+        for entry in entries:
+            age_days = (now - entry.get("last_used", 0)) / 86400
+            if max_age_days is not None and age_days > max_age_days:
+                to_remove.append(entry)
+            else:
+                kept.append(entry)
+        if max_size is not None:
+            total = sum(e["size"] for e in kept)
+            for entry in list(kept):
+                if total <= max_size:
+                    break
+                to_remove.append(entry)
+                kept.remove(entry)
+                total -= entry["size"]
+
+        removed = []
+        for entry in to_remove:
+            if dry_run:
+                removed.append(entry)
+                continue
+            lock = FileLock(
+                self.root / ".locks" / f"{entry['key']}.lock", timeout=0
+            )
+            try:
+                lock.acquire()
+            except TimeoutError:
+                self.logger.info(
+                    f"[{self.name}] skipping {entry['key']}, in use"
+                )
+                continue
+            try:
+                shutil.rmtree(entry["path"], ignore_errors=True)
+                removed.append(entry)
+            finally:
+                lock.release()
+        # leftovers from killed builds (only those whose build lock is free)
+        staging_root = self.root / ".staging"
+        if not dry_run and staging_root.exists():
+            for staging in staging_root.iterdir():
+                key = staging.name.rsplit(".", 1)[0]
+                lock = FileLock(self.root / ".locks" / f"{key}.lock", timeout=0)
+                try:
+                    lock.acquire()
+                except TimeoutError:
+                    continue
+                try:
+                    shutil.rmtree(staging, ignore_errors=True)
+                finally:
+                    lock.release()
+        return removed
@@ -0,0 +1,259 @@
+"""
+Resumable, checksum-verified downloads into a content-addressed cache.
+
+Files are stored in a CacheStore entry keyed by their MD5 (as published in
+NCBI's md5checksums.txt), or by their URL when no checksum is known, so
+identical files requested by different samples or runs are fetched once.
+Interrupted transfers stay in a per-key partial file and are resumed with
+an HTTP Range request (or a seek, for file:// mirrors). Transfers are
+retried with exponential backoff, and a bounded number run at a time.
+
+Key classes/functions:
+    - DownloadCache: fetch/fetch_many URLs through the cache
+    - file_md5: MD5 hex digest of a file
+    - parse_md5_checksums: {file name: md5} of an md5checksums.txt
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+from urllib.parse import urlparse
+from urllib.request import url2pathname, urlopen
+
+from rolypoly.utils.logging.loggit import get_logger
+
+DOWNLOAD_STORE = "downloads"
+CONTENT_FILE = "content"
+
+
+def file_md5(file_path: Union[str, Path], chunk_size: int = 1 << 22) -> str:
+    """MD5 hex digest of a file's content."""
+    hasher = hashlib.md5()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def parse_md5_checksums(text: str) -> Dict[str, str]:
+    """{file name: md5} from an NCBI md5checksums.txt ("<md5>  ./<name>" lines)."""
+    checksums = {}
+    for line in text.splitlines():
+        fields = line.split(maxsplit=1)
+        if len(fields) == 2:
+            checksums[Path(fields[1].strip()).name] = fields[0].lower()
+    return checksums
+
+
+class DownloadCache:
+    """Content-addressed download cache shared across runs.
+
+    Point ``cache_dir`` (or ROLYPOLY_CACHE_DIR) at a shared directory to
+    share it between users.
+
+    Args:
+        cache_dir: Override for the cache root (see get_cache_root)
+        workers: Maximum concurrent transfers, over all callers
+        retries: Attempts per file after the first one
+        backoff: Seconds before the first retry, doubled for every next one
+        timeout: Connection and read timeout in seconds
+        chunk_size: Bytes per streamed chunk
+        logger: Logger instance
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path, None] = None,
+        workers: int = 4,
+        retries: int = 4,
+        backoff: float = 1.0,
+        timeout: float = 60.0,
+        chunk_size: int = 1 << 20,
+        logger=None,
+    ):
+        from rolypoly.utils.cache import CacheStore
+
+        self.logger = get_logger(logger)
+        self.store = CacheStore(
+            DOWNLOAD_STORE, cache_dir=cache_dir, logger=self.logger
+        )
+        self.workers = max(workers, 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    @staticmethod
+    def key(url: str, md5: Optional[str] = None) -> str:
+        """Cache key: the content MD5 when known, else a digest of the URL."""
+        from rolypoly.utils.cache import hash_key
+
+        return md5.lower() if md5 else hash_key({"url": url})
+
+    def partial_path(self, url: str, md5: Optional[str] = None) -> Path:
+        """Where an interrupted transfer is kept until it is resumed."""
+        return self.store.root / ".partial" / f"{self.key(url, md5)}.part"
+
+    def _open(self, url: str, offset: int):
+        """Stream of url from byte offset.
+
+        Returns:
+            tuple: (binary stream, whether it starts at offset, total size or None)
+        """
+        scheme = urlparse(url).scheme
+        if scheme == "file":
+            path = Path(url2pathname(urlparse(url).path))
+            stream = open(path, "rb")
+            stream.seek(offset)
+            return stream, True, path.stat().st_size
+        if scheme in ("http", "https"):
+            import requests
+
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            response = requests.get(
+                url, headers=headers, stream=True, timeout=self.timeout
+            )
+            if response.status_code == 404:
+                response.close()
+                raise FileNotFoundError(f"Not found: {url}")
+            if response.status_code == 416:
+                # nothing left past offset: the partial file is complete
+                response.close()
+                return _EmptyStream(), True, offset
+            response.raise_for_status()
+            resumed = response.status_code == 206
+            if resumed:
+                total = response.headers.get("Content-Range", "").rsplit("/", 1)
+                size = int(total[1]) if total[-1].isdigit() else None
+            else:
+                length = response.headers.get("Content-Length", "")
+                size = int(length) if length.isdigit() else None
+            # transfer encodings (not .gz payloads) are undone, so the
+            # on-wire length no longer applies
+            response.raw.decode_content = True
+            if response.headers.get("Content-Encoding"):
+                size = None
+            return response.raw, resumed, size
+        # ftp and others: no resume
+        stream = urlopen(url, timeout=self.timeout)
+        length = (stream.headers or {}).get("Content-Length") or ""
+        return stream, False, int(length) if length.isdigit() else None
+
+    def _transfer(self, url: str, partial: Path) -> None:
+        """Download url into partial, resuming what is already there."""
+        partial.parent.mkdir(parents=True, exist_ok=True)
+        offset = partial.stat().st_size if partial.exists() else 0
+        with self._slots:
+            stream, resumed, size = self._open(url, offset)
+            if offset and resumed:
+                self.logger.debug(f"Resuming {url} at byte {offset}")
+            try:
+                with open(partial, "ab" if resumed else "wb") as out:
+                    shutil.copyfileobj(stream, out, self.chunk_size)
+            finally:
+                stream.close()
+        if size is not None and partial.stat().st_size != size:
+            raise IOError(
+                f"Incomplete download of {url}: {partial.stat().st_size} of {size} bytes"
+            )
+
+    def _download(self, url: str, md5: Optional[str], target: Path) -> None:
+        """Transfer with retries and verify against md5, then move into target."""
+        partial = self.partial_path(url, md5)
+        for attempt in range(self.retries + 1):
+            try:
+                self._transfer(url, partial)
+                if md5:
+                    actual = file_md5(partial)
+                    if actual != md5.lower():
+                        partial.unlink(missing_ok=True)
+                        raise ValueError(
+                            f"Checksum mismatch for {url}: expected {md5}, got {actual}"
+                        )
+                os.replace(partial, target)
+                return
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                self.logger.warning(
+                    f"Download of {url} failed ({e}), retrying in {delay:.0f}s"
+                )
+                time.sleep(delay)
+
+    def fetch(
+        self,
+        url: str,
+        md5: Optional[str] = None,
+        output_file: Union[str, Path, None] = None,
+    ) -> Path:
+        """Cached copy of url, downloading it if needed.
+
+        Concurrent requests for the same content wait for a single download.
+
+        Args:
+            url: http(s)://, ftp:// or file:// URL
+            md5: Expected MD5 of the content (verified, and used as the cache key)
+            output_file: Also hard link (or copy) the file here; like the
+                cached file, a link is read-only
+
+        Returns:
+            Path: output_file, or the cached file
+
+        Raises:
+            FileNotFoundError: The URL does not exist
+            ValueError: The content does not match md5 after all retries
+        """
+        from rolypoly.utils.cache import link_or_copy
+
+        with self.store.use(
+            self.key(url, md5),
+            lambda entry_dir: self._download(
+                url, md5, entry_dir / CONTENT_FILE
+            ),
+            params={"url": url, "md5": md5},
+        ) as entry:
+            cached = entry / CONTENT_FILE
+            if output_file is None:
+                return cached
+            # the cached file is read-only, so the link can't corrupt it
+            return link_or_copy(cached, output_file)
+
+    def fetch_many(
+        self, items: Iterable[Tuple[str, Optional[str], Union[str, Path, None]]]
+    ) -> Dict[str, Union[Path, Exception]]:
+        """Fetch (url, md5, output_file) items with up to ``workers`` at a time.
+
+        Returns:
+            dict: url -> Path of the file, or the exception that stopped it
+        """
+        items = list(items)
+
+        def _fetch(item):
+            url, md5, output_file = item
+            try:
+                return url, self.fetch(url, md5, output_file)
+            except Exception as e:
+                return url, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(executor.map(_fetch, items))
+
+
+class _EmptyStream:
+    def read(self, *args):
+        return b""
+
+    def close(self):
+        pass
@@ -1,7 +1,7 @@
 import logging
 import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from typing_extensions import Union
 
@@ -27,6 +27,11 @@ class BaseConfig:
         datadir (str, optional): Data directory path.
         log_level (str, optional): Logging level ("debug", "info", "warning", "error", "critical").
         keep_tmp (bool, optional): Whether to keep temporary files.
+        temp_tiers (str or list, optional): Ordered candidate locations for the temporary directory
+            (e.g. "/dev/shm:/local/scratch"), fastest first. Defaults to $ROLYPOLY_TMP_TIERS; the output
+            directory is always the last tier. Ignored when temp_dir is given.
+        expected_temp_size (str, optional): Expected size of the intermediates (e.g. "50gb") used to pick
+            the tier. Defaults to 3x the size of the input file(s).
     """
 
     def __init__(
@@ -42,6 +47,8 @@ class BaseConfig:
         datadir: Optional[str] = None,
         log_level: str = "INFO",
         keep_tmp: bool = False,
+        temp_tiers: Union[str, List[str], None] = None,
+        expected_temp_size: Union[str, int, None] = None,
     ):
         import shutil
         from datetime import datetime
@@ -78,13 +85,32 @@ class BaseConfig:
             )
 
         # define temporary directory
-        self.temp_dir = (
-            Path(temp_dir).absolute()
-            if temp_dir
-            else (
-                self.output_dir
-                / f"rolypoly_tmp_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            ).absolute()
+        from rolypoly.utils.various import parse_memory
+        from rolypoly.utils.workspace import Workspace, resolve_tiers
+
+        if temp_dir:
+            tiers = [Path(temp_dir).absolute().parent]
+            workspace_name = Path(temp_dir).name
+        else:
+            tiers = resolve_tiers(temp_tiers, self.output_dir)
+            workspace_name = (
+                f"rolypoly_tmp_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            )
+        self.workspace = Workspace(
+            tiers,
+            name=workspace_name,
+            memory_reserved=parse_memory(self.memory["bytes"]),
+            keep=keep_tmp,
+            keep_dir=self.output_dir,
+            logger=self.logger,
+        )
+        expected = (
+            parse_memory(expected_temp_size)
+            if expected_temp_size is not None
+            else 3 * self._input_size()
+        )
+        self.temp_dir = self.workspace.dir_for_tier(
+            self.workspace.choose_tier(expected)
         )
 
         # clean existing temporary directory if overwrite is set to True
@@ -99,9 +125,52 @@ class BaseConfig:
                     f"Temporary directory {self.temp_dir} already exists. Set overwrite to True to clean it."
                 )
 
-        # create temporary directory
+        # create temporary directory (on the first tier with room for the
+        # expected intermediates)
+        self.temp_dir = self.workspace.select(expected)
         self.logger.debug(f"Creating temporary directory: {self.temp_dir}")
-        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.workspace.register_cleanup()
+
+        # thread/memory leases are handed out by the process-wide scheduler,
+        # so stages of nested commands (e.g. end-to-end) share one budget
+        from rolypoly.utils.resources import get_scheduler
+
+        self.scheduler = get_scheduler(
+            self.threads, self.memory["bytes"], logger=self.logger
+        )
+
+    def _input_size(self) -> int:
+        """Total size in bytes of the input file(s), 0 if unknown."""
+        total = 0
+        for part in str(self.input or "").split(","):
+            if not part.strip():
+                continue
+            path = Path(part.strip())
+            try:
+                if path.is_file():
+                    total += path.stat().st_size
+                elif path.is_dir():
+                    total += sum(
+                        p.stat().st_size for p in path.iterdir() if p.is_file()
+                    )
+            except OSError:
+                continue
+        return total
+
+    def ensure_temp_space(self, expected_bytes: int, step: str = "") -> Path:
+        """Make sure the temporary directory can take expected_bytes more.
+
+        Spills to the next temporary tier when the current one is short on
+        space and updates temp_dir accordingly. Files written earlier stay
+        where they are; use find_temp_file to locate them.
+        """
+        self.temp_dir = self.workspace.reserve(expected_bytes, step)
+        return self.temp_dir
+
+    def find_temp_file(self, name: str) -> Path:
+        """Path of a temporary file, searched across all workspace tiers."""
+        found = self.workspace.find(name)
+        return found if found is not None else self.temp_dir / name
 
     def setup_logger(self) -> logging.Logger:
         """Setup logger for the configuration"""
@@ -114,7 +183,7 @@ class BaseConfig:
         return {
             k: str(v) if isinstance(v, Path) else v
             for k, v in self.__dict__.items()
-            if k != "logger"
+            if k not in ("logger", "workspace", "scheduler")
         }
 
     @classmethod
@@ -0,0 +1,466 @@
+"""
+Process-wide thread and memory scheduling for external tools and stages.
+
+Commands take one ``--threads``/``--memory`` budget, but a run may overlap
+several memory-hungry tools (assemblers, bbtools, mmseqs, pyhmmer). The
+ResourceScheduler hands out leases from that budget, queues stages that
+don't fit (first come, first served), translates a lease into the flags
+each tool understands (``-Xmx``, ``--split-memory-limit``, ``cpus`` ...)
+and tracks the real RSS of the leased processes with psutil.
+
+With ``max_oversubscription`` > 1, a running lease whose measured peak RSS
+stays well below its reservation is only charged for what it actually uses
+(never less than ``memory / max_oversubscription``), so the unused part of
+the budget can be lent to queued stages.
+
+Key classes/functions:
+    - Lease: Threads/memory granted to one stage, with tool_params()
+    - tool_params: Tool-specific thread/memory flags for a lease
+    - ResourceScheduler: Lease bookkeeping, queueing, monitoring and run()
+    - get_scheduler: The process-wide scheduler (created on first use)
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from rolypoly.utils.logging.loggit import get_logger
+from rolypoly.utils.various import (
+    convert_bytes_to_units,
+    ensure_memory,
+    parse_memory,
+)
+
+GIB = 1024**3
+MIB = 1024**2
+
+
+def _gib(n_bytes: int) -> float:
+    return n_bytes / GIB
+
+
+# Fractions of a lease handed to the tool's own limit: JVMs and mmseqs
+# allocate outside their nominal limit (metaspace, thread stacks, pipes).
+TOOL_FLAGS: Dict[str, Callable[[int, int], Dict[str, Any]]] = {
+    "bbtools": lambda t, m: {
+        "threads": t,
+        "Xmx": f"{max(int(m * 0.85 / MIB), 256)}m",
+    },
+    "java": lambda t, m: {
+        "threads": t,
+        "Xmx": f"{max(int(m * 0.85 / MIB), 256)}m",
+    },
+    "mmseqs": lambda t, m: {
+        "threads": t,
+        "split-memory-limit": f"{max(int(m * 0.8 / MIB), 512)}M",
+    },
+    "spades": lambda t, m: {"threads": t, "m": max(int(_gib(m)), 1)},
+    "megahit": lambda t, m: {"num-cpu-threads": t, "memory": int(m * 0.9)},
+    # diamond uses roughly 6x the block size (in GB) of memory
+    "diamond": lambda t, m: {
+        "threads": t,
+        "block-size": max(round(_gib(m) / 6, 1), 0.1),
+    },
+    "pyhmmer": lambda t, m: {"cpus": t},
+    "samtools": lambda t, m: {
+        "threads": t,
+        "m": f"{max(int(m * 0.8 / max(t, 1) / MIB), 64)}M",
+    },
+    "seqkit": lambda t, m: {"threads": t},
+    "pigz": lambda t, m: {"p": t},
+    "bowtie": lambda t, m: {"p": t},
+    "minimap2": lambda t, m: {"t": t},
+    "penguin": lambda t, m: {"threads": t},
+    "infernal": lambda t, m: {"cpu": t},
+}
+
+
+def tool_params(tool: str, threads: int, memory: int) -> Dict[str, Any]:
+    """Thread/memory parameters for ``tool`` in run_command_comp/bbmapy style.
+
+    Keys carry no dash prefix (e.g. ``{"threads": 8, "split-memory-limit":
+    "12000M"}`` for mmseqs). Unknown tools get ``{"threads": threads}``.
+    """
+    builder = TOOL_FLAGS.get(tool.lower())
+    if builder is None:
+        return {"threads": threads}
+    return builder(threads, memory)
+
+
+class Lease:
+    """Threads and memory granted to one stage by a ResourceScheduler.
+
+    Args:
+        name: Stage name (used in logs and the usage report)
+        threads: Number of threads granted
+        memory: Bytes of memory granted
+        tool: Default tool for tool_params()
+    """
+
+    def __init__(
+        self, name: str, threads: int, memory: int, tool: Optional[str] = None
+    ):
+        self.name = name
+        self.threads = threads
+        self.memory = memory
+        self.tool = tool
+        self.pids: List[int] = []
+        self.requested_at = time.time()
+        self.granted_at: Optional[float] = None
+        self.released_at: Optional[float] = None
+        self.current_rss = 0
+        self.peak_rss = 0
+        self.warned = False
+
+    @property
+    def memory_units(self) -> Dict[str, str]:
+        """The lease memory in the format returned by ensure_memory."""
+        return convert_bytes_to_units(self.memory)
+
+    def tool_params(self, tool: Optional[str] = None) -> Dict[str, Any]:
+        """Tool-specific flags for this lease (see tool_params)."""
+        tool = tool or self.tool
+        if tool is None:
+            return {"threads": self.threads}
+        return tool_params(tool, self.threads, self.memory)
+
+    @property
+    def wall_time(self) -> float:
+        if self.granted_at is None:
+            return 0.0
+        return (self.released_at or time.time()) - self.granted_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "tool": self.tool or "",
+            "threads": self.threads,
+            "memory": self.memory,
+            "peak_rss": self.peak_rss,
+            "queued_seconds": round(
+                (self.granted_at or self.requested_at) - self.requested_at, 3
+            ),
+            "wall_time": round(self.wall_time, 3),
+        }
+
+    def __repr__(self) -> str:
+        return f"Lease({self.name!r}, threads={self.threads}, memory={self.memory_units['giga']})"
+
+
+class ResourceScheduler:
+    """Hands out thread/memory leases from a fixed budget.
+
+    Requests that don't fit wait in a FIFO queue until enough is released.
+    Requests larger than the whole budget are clamped to it (with a
+    warning) rather than waiting forever.
+
+    Args:
+        threads: Total threads available to the run
+        memory: Total memory budget (e.g. "64gb" or bytes)
+        max_oversubscription: How far the measured usage may let the
+            scheduler lend reserved-but-unused memory (1.0 disables it)
+        monitor_interval: Seconds between psutil samples of leased processes
+        settle_seconds: How long a lease must run before its measured usage
+            is trusted for oversubscription
+        logger: Logger instance
+    """
+
+    def __init__(
+        self,
+        threads: int,
+        memory: Union[str, int, dict],
+        max_oversubscription: float = 1.0,
+        monitor_interval: float = 2.0,
+        settle_seconds: float = 60.0,
+        logger=None,
+    ):
+        self.logger = get_logger(logger)
+        self.total_threads = max(int(threads or 1), 1)
+        self.total_memory = parse_memory(ensure_memory(memory)["bytes"])
+        self.max_oversubscription = max(float(max_oversubscription), 1.0)
+        self.monitor_interval = monitor_interval
+        self.settle_seconds = settle_seconds
+        self.history: List[Lease] = []
+        self._active: List[Lease] = []
+        self._queue: List[Lease] = []
+        self._cond = threading.Condition()
+        self._monitor: Optional[threading.Thread] = None
+
+    # bookkeeping
+    def _charged_memory(self, lease: Lease) -> int:
+        """Memory a running lease counts against the budget."""
+        if (
+            self.max_oversubscription <= 1.0
+            or lease.granted_at is None
+            or time.time() - lease.granted_at < self.settle_seconds
+            or lease.peak_rss == 0
+        ):
+            return lease.memory
+        floor = int(lease.memory / self.max_oversubscription)
+        return min(lease.memory, max(floor, int(lease.peak_rss * 1.2)))
+
+    @property
+    def free_threads(self) -> int:
+        return self.total_threads - sum(lease.threads for lease in self._active)
+
+    @property
+    def free_memory(self) -> int:
+        return self.total_memory - sum(
+            self._charged_memory(lease) for lease in self._active
+        )
+
+    def _fits(self, lease: Lease) -> bool:
+        if not self._active:
+            return True
+        if lease.threads > self.free_threads or lease.memory > self.free_memory:
+            return False
+        if self.max_oversubscription > 1.0:
+            # lending memory relies on it actually being free on the node
+            import psutil
+
+            return psutil.virtual_memory().available >= lease.memory
+        return True
+
+    def acquire(
+        self,
+        name: str,
+        threads: Optional[int] = None,
+        memory: Union[str, int, None] = None,
+        tool: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Lease:
+        """Block until ``threads``/``memory`` are available and lease them.
+
+        Args:
+            name: Stage name
+            threads: Threads wanted (default: the whole budget)
+            memory: Memory wanted (default: the whole budget)
+            tool: Default tool for the lease's tool_params()
+            timeout: Seconds to wait before raising TimeoutError
+
+        Returns:
+            Lease: The granted lease; hand it back with release()
+        """
+        threads = self.total_threads if threads is None else int(threads)
+        memory = self.total_memory if memory is None else parse_memory(memory)
+        if threads > self.total_threads or memory > self.total_memory:
+            self.logger.warning(
+                f"{name} asked for {threads} threads/{convert_bytes_to_units(memory)['giga']} "
+                f"but the budget is {self.total_threads}/{convert_bytes_to_units(self.total_memory)['giga']}, clamping"
+            )
+        lease = Lease(
+            name,
+            max(min(threads, self.total_threads), 1),
+            min(memory, self.total_memory),
+            tool,
+        )
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._queue.append(lease)
+            try:
+                while not (self._queue[0] is lease and self._fits(lease)):
+                    remaining = (
+                        None
+                        if deadline is None
+                        else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(
+                            f"Timed out waiting for resources for {name}"
+                        )
+                    if self._queue[0] is lease:
+                        self.logger.debug(
+                            f"{name} waiting for {lease.threads} threads/{lease.memory_units['giga']}"
+                        )
+                    # wake up periodically: measured usage may free memory
+                    self._cond.wait(
+                        self.monitor_interval
+                        if remaining is None
+                        else min(remaining, self.monitor_interval)
+                    )
+            finally:
+                self._queue.remove(lease)
+                self._cond.notify_all()
+            lease.granted_at = time.time()
+            self._active.append(lease)
+            self.history.append(lease)
+        self.logger.debug(f"Granted {lease}")
+        return lease
+
+    def release(self, lease: Lease) -> None:
+        """Return a lease to the budget."""
+        with self._cond:
+            if lease in self._active:
+                self._active.remove(lease)
+                lease.released_at = time.time()
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(
+        self,
+        name: str,
+        threads: Optional[int] = None,
+        memory: Union[str, int, None] = None,
+        tool: Optional[str] = None,
+    ):
+        """Context manager around acquire()/release()."""
+        granted = self.acquire(name, threads, memory, tool)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+    # monitoring
+    def track(self, lease: Lease, pid: int) -> None:
+        """Measure the RSS of ``pid`` (and its children) against ``lease``."""
+        lease.pids.append(pid)
+        self._ensure_monitor()
+
+    def _ensure_monitor(self) -> None:
+        if self._monitor is not None and self._monitor.is_alive():
+            return
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name="rolypoly-resources", daemon=True
+        )
+        self._monitor.start()
+
+    @staticmethod
+    def _tree_rss(pid: int) -> int:
+        import psutil
+
+        try:
+            proc = psutil.Process(pid)
+            procs = [proc] + proc.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return 0
+        total = 0
+        for p in procs:
+            try:
+                total += p.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total
+
+    def sample(self) -> None:
+        """Take one RSS sample of every tracked, active lease."""
+        with self._cond:
+            active = [lease for lease in self._active if lease.pids]
+        for lease in active:
+            rss = sum(self._tree_rss(pid) for pid in lease.pids)
+            lease.current_rss = rss
+            lease.peak_rss = max(lease.peak_rss, rss)
+            if rss > lease.memory and not lease.warned:
+                lease.warned = True
+                self.logger.warning(
+                    f"{lease.name} uses {convert_bytes_to_units(rss)['giga']}, more than its lease of {lease.memory_units['giga']}"
+                )
+        if active and self.max_oversubscription > 1.0:
+            with self._cond:
+                self._cond.notify_all()
+
+    def _monitor_loop(self) -> None:
+        while True:
+            with self._cond:
+                if not any(lease.pids for lease in self._active):
+                    self._monitor = None
+                    return
+            self.sample()
+            time.sleep(self.monitor_interval)
+
+    def run(
+        self,
+        command: Union[
+            str, List[str], Callable[[Lease], Union[str, List[str]]]
+        ],
+        name: str,
+        threads: Optional[int] = None,
+        memory: Union[str, int, None] = None,
+        tool: Optional[str] = None,
+        check: bool = True,
+        **popen_kwargs,
+    ) -> Dict[str, Any]:
+        """Run a command under a lease and report its usage.
+
+        ``command`` may be a callable receiving the granted Lease, so the
+        command line can use ``lease.tool_params()`` or ``lease.threads``.
+
+        Returns:
+            dict: name, returncode, threads, memory, peak_rss, wall_time
+        """
+        import subprocess
+
+        with self.lease(name, threads, memory, tool) as granted:
+            cmd = command(granted) if callable(command) else command
+            popen_kwargs.setdefault("shell", isinstance(cmd, str))
+            self.logger.info(f"Running {name} with {granted}: {cmd}")
+            process = subprocess.Popen(cmd, **popen_kwargs)
+            self.track(granted, process.pid)
+            returncode = process.wait()
+            self.sample()
+        result = dict(granted.to_dict(), returncode=returncode)
+        self.logger.info(
+            f"{name} finished in {result['wall_time']:.1f}s, peak RSS {convert_bytes_to_units(granted.peak_rss)['giga']}"
+        )
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+        return result
+
+    def usage(self):
+        """Per-lease usage report as a polars DataFrame."""
+        import polars as pl
+
+        return pl.DataFrame(
+            [lease.to_dict() for lease in self.history],
+            schema={
+                "name": pl.Utf8,
+                "tool": pl.Utf8,
+                "threads": pl.Int64,
+                "memory": pl.Int64,
+                "peak_rss": pl.Int64,
+                "queued_seconds": pl.Float64,
+                "wall_time": pl.Float64,
+            },
+        )
+
+
+_scheduler: Optional[ResourceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(
+    threads: Optional[int] = None,
+    memory: Union[str, int, dict, None] = None,
+    logger=None,
+) -> ResourceScheduler:
+    """Return the process-wide scheduler, creating it on first use.
+
+    The first caller sets the budget (e.g. end-to-end's --threads/--memory);
+    commands invoked from it share that budget instead of each assuming
+    they own the whole node. ROLYPOLY_OVERSUBSCRIPTION sets
+    max_oversubscription.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            if memory is None:
+                import psutil
+
+                memory = int(psutil.virtual_memory().total * 0.8)
+            _scheduler = ResourceScheduler(
+                threads or os.cpu_count() or 1,
+                memory,
+                max_oversubscription=float(
+                    os.environ.get("ROLYPOLY_OVERSUBSCRIPTION", "1.0")
+                ),
+                logger=logger,
+            )
+        return _scheduler
+
+
+def reset_scheduler() -> None:
+    """Forget the process-wide scheduler (mainly for tests)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
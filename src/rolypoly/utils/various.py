@@ -1,4 +1,5 @@
 import os
+import re
 import shutil
 from logging import Logger
 from pathlib import Path
@@ -630,106 +631,318 @@ def extract_zip(zip_file):
         return False
 
 
+# Derived columns of alignment tables, usable in filter strings when the
+# table doesn't have a column of that name: {name: (required columns, expr)}
+DERIVED_FILTER_COLUMNS = {
+    "qcov": (
+        ("qstart", "qend", "qlen"),
+        lambda: ((pl.col("qend") - pl.col("qstart")).abs() + 1)
+        / pl.col("qlen"),
+    ),
+    "tcov": (
+        ("tstart", "tend", "tlen"),
+        lambda: ((pl.col("tend") - pl.col("tstart")).abs() + 1)
+        / pl.col("tlen"),
+    ),
+}
+
+_FILTER_TOKEN = re.compile(
+    r"(?:(?P<number>\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_]\w*)"
+    r"|(?P<compare>>=|<=|==|!=|>|<|=)"
+    r"|(?P<logic>&&?|\|\|?)"
+    r"|(?P<arith>[-+*/])"
+    r"|(?P<paren>[()]))"
+)
+
+
+def _tokenize_filter(filter_str):
+    """[(kind, text, position)] of a filter string."""
+    tokens = []
+    position = 0
+    text = filter_str.rstrip()
+    while position < len(text):
+        if text[position].isspace():
+            position += 1
+            continue
+        match = _FILTER_TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(
+                f"Invalid filter {filter_str!r}: unexpected character at position {position}\n"
+                f"  {filter_str}\n  {' ' * position}^"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        start = match.start(kind)
+        if kind == "name" and value.lower() in ("and", "or"):
+            kind, value = "logic", "&" if value.lower() == "and" else "|"
+        elif kind == "logic":
+            value = value[0]
+        elif kind == "compare" and value == "=":
+            value = "=="
+        tokens.append((kind, value, start))
+        position = match.end()
+    return tokens
+
+
 def parse_filter(filter_str):
-    """Convert a filter string into parsed conditions and operators.
+    """Parse a filter string into an expression tree.
 
-    Takes a filter string in the format "[column operator value & column operator value]"
-    and parses it into a list of conditions and logical operators.
+    Grammar (lowest to highest precedence): ``|`` (or ``or``), ``&`` (or
+    ``and``), comparisons (>=, <=, >, <, ==, !=), ``+ -``, ``* /``, then
+    numbers, column names and parenthesised sub-expressions. A surrounding
+    pair of brackets is ignored.
 
     Args:
         filter_str (str): Filter string to parse. Format examples:
             - "[qlen >= 100 & alnlen < 50]"
             - "alnlen >= 120 & pident >= 75"
-            - "length > 1000 | width < 50"
+            - "(qcov >= 0.95 | alnlen > 1000) & pident >= 95"
+            - "alnlen / qlen > 0.5"
 
     Returns:
-        tuple: A tuple containing:
-            - list of tuples: [(column, operator, value),     ] where:
-                - column (str): Column name to filter on
-                - operator (str): Comparison operator (>=, <=, >, <, ==, !=)
-                - value (int/float): Numeric value to compare against
-            - list of str: List of logical operators ('&' or '|') connecting conditions
+        tuple: Nested tuples, one of
+            ("or", left, right), ("and", left, right),
+            ("compare", operator, left, right), ("arith", operator, left, right),
+            ("column", name) or ("number", value)
 
     Raises:
-        ValueError: If any condition in the filter string is invalid
+        ValueError: If the filter string is not valid, pointing at the offending token
 
     Examples:
              parse_filter("[qlen >= 100 & alnlen < 50]")
-        (
-            [('qlen', '>=', 100), ('alnlen', '<', 50)],
-            ['&']
-        )
+        ('and', ('compare', '>=', ('column', 'qlen'), ('number', 100)),
+                ('compare', '<', ('column', 'alnlen'), ('number', 50)))
     """
-    import re
+    stripped = filter_str.strip()
+    if stripped.startswith("[") and stripped.endswith("]"):
+        stripped = stripped[1:-1]
+    tokens = _tokenize_filter(stripped)
+    if not tokens:
+        raise ValueError(f"Empty filter: {filter_str!r}")
+    position = 0
+
+    def _error(message, token=None):
+        where = token[2] if token else len(stripped)
+        return ValueError(
+            f"Invalid filter {filter_str!r}: {message}\n  {stripped}\n  {' ' * where}^"
+        )
 
-    # Remove any surrounding brackets
-    filter_str = filter_str.strip("[]")
-    # Add space around operators and after each variable/condition name
-    # filter_str="alnlen >= 120 & pident>=75"
-    modified_str = re.sub(
-        r"([><=!]=|[><])", r" \1 ", filter_str
-    )  # Space around comparison operators
-    modified_str = re.sub(
-        r"([&|])", r" \1 ", modified_str
-    )  # Space around logical operators
-    modified_str = re.sub(
-        r"  ", r" ", modified_str
-    )  # Remove duplicated spaces - TODO: this but smartly.
-
-    # Split the string into individual conditions
-    conditions = re.split(r"\s+(\&|\|)\s+", modified_str)
-    parsed_conditions = []
-    operators = []
-
-    for i, condition in enumerate(conditions):
-        if condition.lower() in ["&", "|"]:
-            operators.append(condition.lower())
-        else:
-            # Split the condition into column, operator, and value
-            match = re.match(r"(\w+)\s*([<>=!]+)\s*([\d.]+)", condition.strip())
-            if match:
-                col, op, val = match.groups()
-                # Convert value to appropriate type
-                val = float(val) if "." in val else int(val)
-                parsed_conditions.append((col, op, val))
-            else:
-                raise ValueError(f"Invalid condition: {condition}")
+    def _peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def _take(kind=None, values=None):
+        nonlocal position
+        token = _peek()
+        if token is None or (kind and token[0] != kind):
+            return None
+        if values and token[1] not in values:
+            return None
+        position += 1
+        return token
+
+    def _binary(operand, kind, values, node):
+        left = operand()
+        while (token := _take(kind, values)) is not None:
+            right = operand()
+            left = (
+                (node, left, right)
+                if node in ("or", "and")
+                else (node, token[1], left, right)
+            )
+        return left
+
+    def _or():
+        return _binary(_and, "logic", ("|",), "or")
+
+    def _and():
+        return _binary(_comparison, "logic", ("&",), "and")
+
+    def _comparison():
+        # a parenthesised group may hold a whole condition or just arithmetic
+        left = _sum()
+        token = _take("compare")
+        if token is not None and left[0] in ("compare", "and", "or"):
+            raise _error("cannot compare a condition", token)
+        if token is None:
+            if left[0] in ("compare", "and", "or"):
+                return left
+            raise _error("expected a comparison operator", _peek())
+        right = _sum()
+        if right[0] in ("compare", "and", "or"):
+            raise _error("cannot compare against a condition", token)
+        return ("compare", token[1], left, right)
+
+    def _sum():
+        return _binary(_product, "arith", ("+", "-"), "arith")
+
+    def _product():
+        return _binary(_atom, "arith", ("*", "/"), "arith")
+
+    def _atom():
+        token = _peek()
+        if token is None:
+            raise _error("unexpected end of filter")
+        if _take("number"):
+            value = token[1]
+            return (
+                "number",
+                float(value) if any(c in value for c in ".eE") else int(value),
+            )
+        if _take("name"):
+            return ("column", token[1])
+        if _take("arith", ("-",)):
+            operand = _atom()
+            if operand[0] == "number":
+                return ("number", -operand[1])
+            return ("arith", "-", ("number", 0), operand)
+        if _take("paren", ("(",)):
+            inner = _or()
+            if _take("paren", (")",)) is None:
+                raise _error("missing closing parenthesis", _peek())
+            return inner
+        raise _error(f"unexpected {token[1]!r}", token)
+
+    tree = _or()
+    if _peek() is not None:
+        raise _error(f"unexpected {_peek()[1]!r}", _peek())
+    if tree[0] not in ("compare", "and", "or"):
+        raise _error("the filter has no comparison")
+    return tree
+
+
+def filter_columns(tree) -> List[str]:
+    """Column names referenced by a parsed filter, in order of appearance."""
+    if tree[0] == "column":
+        return [tree[1]]
+    if tree[0] == "number":
+        return []
+    columns = []
+    for child in tree[1:]:
+        if isinstance(child, tuple):
+            columns += [c for c in filter_columns(child) if c not in columns]
+    return columns
+
+
+def compile_filter(filter_str, schema=None) -> pl.Expr:
+    """Compile a filter string into a polars expression.
+
+    Column names are checked against the schema (when given); names the
+    table lacks but that are in DERIVED_FILTER_COLUMNS (e.g. qcov from
+    qstart, qend and qlen) are computed from their source columns.
+
+    Args:
+        filter_str (str): Filter string (see parse_filter)
+        schema: Column names (or a polars Schema) of the table to filter
+
+    Returns:
+        pl.Expr: Boolean expression for DataFrame/LazyFrame.filter
 
-    return parsed_conditions, operators
+    Raises:
+        ValueError: If the filter is invalid or references unknown columns
+    """
+    tree = parse_filter(filter_str)
+    available = list(schema) if schema is not None else None
+    if available is not None:
+        for column in filter_columns(tree):
+            if column in available:
+                continue
+            derived = DERIVED_FILTER_COLUMNS.get(column)
+            if derived is None or not all(c in available for c in derived[0]):
+                raise ValueError(
+                    f"Invalid filter {filter_str!r}: unknown column {column!r}. "
+                    f"Available columns: {', '.join(available)}"
+                )
+
+    def _compile(node):
+        kind = node[0]
+        if kind == "number":
+            return pl.lit(node[1])
+        if kind == "column":
+            if (
+                available is not None
+                and node[1] not in available
+                and node[1] in DERIVED_FILTER_COLUMNS
+            ):
+                return DERIVED_FILTER_COLUMNS[node[1]][1]().alias(node[1])
+            return pl.col(node[1])
+        if kind == "or":
+            return _compile(node[1]) | _compile(node[2])
+        if kind == "and":
+            return _compile(node[1]) & _compile(node[2])
+        left, right = _compile(node[2]), _compile(node[3])
+        return {
+            ">=": left.__ge__,
+            "<=": left.__le__,
+            ">": left.__gt__,
+            "<": left.__lt__,
+            "==": left.__eq__,
+            "!=": left.__ne__,
+            "+": left.__add__,
+            "-": left.__sub__,
+            "*": left.__mul__,
+            "/": left.__truediv__,
+        }[node[1]](right)
+
+    return _compile(tree)
 
 
 def apply_filter(df, filter_str):
-    import polars as pl
+    """Filter a table with a filter string (see parse_filter).
+
+    Args:
+        df: DataFrame, LazyFrame or path of a tab separated table with a header.
+            Paths are scanned lazily so only the referenced columns are parsed
+            and rows are filtered during the scan.
+        filter_str (str): Filter string. Empty strings keep every row.
 
-    conditions, operators = parse_filter(filter_str)
-    if not conditions:
+    Returns:
+        Filtered DataFrame (LazyFrame when given one)
+    """
+    if isinstance(df, (str, Path)):
+        return apply_filter(scan_table(df), filter_str).collect()
+    if not filter_str or not filter_str.strip("[] "):
         return df
+    schema = df.collect_schema() if isinstance(df, pl.LazyFrame) else df.schema
+    return df.filter(compile_filter(filter_str, schema))
+
+
+def matching_values(table, filter_strs, column) -> set:
+    """Distinct values of a column over the rows passing any of the filters.
+
+    The filters are OR-ed into one predicate so the table is scanned once.
+
+    Args:
+        table: DataFrame, LazyFrame or path of a tab separated table
+        filter_strs (list): Filter strings (see parse_filter); empty ones are skipped
+        column (str): Column to collect (e.g. qheader)
+
+    Returns:
+        set: Values of column in the matching rows
+    """
+    if isinstance(table, (str, Path)):
+        table = scan_table(table)
+    lazy = table.lazy()
+    schema = lazy.collect_schema()
+    expressions = [
+        compile_filter(filter_str, schema)
+        for filter_str in filter_strs
+        if filter_str and filter_str.strip("[] ")
+    ]
+    if expressions:
+        lazy = lazy.filter(pl.any_horizontal(expressions))
+    return set(lazy.select(pl.col(column).unique()).collect()[column])
+
 
-    expr = None
-    for i, (col, op, val) in enumerate(conditions):
-        condition = None
-        if op == ">=":
-            condition = pl.col(col) >= val
-        elif op == "<=":
-            condition = pl.col(col) <= val
-        elif op == ">":
-            condition = pl.col(col) > val
-        elif op == "<":
-            condition = pl.col(col) < val
-        elif op == "==":
-            condition = pl.col(col) == val
-        elif op == "!=":
-            condition = pl.col(col) != val
-
-        if expr is None:
-            expr = condition
-        elif i - 1 < len(operators):
-            if operators[i - 1] == "&":
-                expr = expr & condition
-            elif operators[i - 1] == "|":
-                expr = expr | condition
-
-    return df.filter(expr)
+def scan_table(path, separator="\t") -> pl.LazyFrame:
+    """LazyFrame over a tab separated alignment table (mmseqs/diamond output with a header)."""
+    return pl.scan_csv(
+        path,
+        separator=separator,
+        has_header=True,
+        infer_schema_length=10000,
+        quote_char=None,
+    )
 
 
 def find_most_recent_folder(path):
@@ -1407,3 +1620,28 @@ def run_command_comp(
         return cmd_str
     else:
         return True
+
+
+def bbtools_launcher(script: str) -> str:
+    """Path of a BBTools launcher script (e.g. "bbmap.sh").
+
+    The copy of BBTools shipped inside the bbmapy package is preferred, so
+    piped calls use the same version as the bbmapy wrappers; a launcher on
+    PATH is used otherwise.
+
+    Raises:
+        FileNotFoundError: if neither bbmapy nor PATH provides the script
+    """
+    from importlib.util import find_spec
+
+    spec = find_spec("bbmapy")
+    for location in (spec.submodule_search_locations or []) if spec else []:
+        for candidate in sorted(Path(location).rglob(script)):
+            if candidate.is_file():
+                return str(candidate)
+    on_path = shutil.which(script)
+    if on_path:
+        return on_path
+    raise FileNotFoundError(
+        f"BBTools launcher {script} was not found in the bbmapy package or on PATH"
+    )
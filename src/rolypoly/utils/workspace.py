@@ -0,0 +1,253 @@
+"""
+Temporary workspace placement across storage tiers.
+
+A workspace is a set of temporary directories spread over an ordered list
+of tiers (e.g. ``/dev/shm`` -> local scratch -> the output directory). The
+first tier with enough free space for the expected intermediates is used,
+and when a later step needs more room than is left the workspace spills
+to the next tier that fits. RAM-backed tiers (tmpfs/ramfs) only count the
+memory that is not reserved for the tools themselves.
+
+Cleanup is registered with atexit and SIGTERM/SIGHUP handlers, so the
+directories are removed on success, on exceptions and when the job is
+killed by the scheduler.
+
+Key classes/functions:
+    - resolve_tiers: Tier list from an argument, ROLYPOLY_TMP_TIERS or a default
+    - tier_free_bytes: Usable free space of a tier
+    - Workspace: Tiered temporary directories with spill-over and cleanup
+"""
+
+import atexit
+import os
+import shutil
+import signal
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from rolypoly.utils.logging.loggit import get_logger
+
+RAM_FILESYSTEMS = ("tmpfs", "ramfs")
+
+
+def resolve_tiers(
+    tiers: Union[str, Sequence[Union[str, Path]], None],
+    fallback: Union[str, Path],
+) -> List[Path]:
+    """Ordered tier list from an explicit value, ROLYPOLY_TMP_TIERS or fallback.
+
+    Tiers may be given as a list or a ``:``/``,`` separated string. The
+    fallback (normally the output directory) is always appended as the last
+    resort. Tiers that don't exist or aren't writable are dropped.
+    """
+    if tiers is None:
+        tiers = os.environ.get("ROLYPOLY_TMP_TIERS", "")
+    if isinstance(tiers, str):
+        tiers = [t for t in tiers.replace(",", ":").split(":") if t]
+    resolved = []
+    for tier in list(tiers) + [fallback]:
+        tier = Path(tier).expanduser().absolute()
+        if tier in resolved:
+            continue
+        if tier != Path(fallback).absolute() and not (
+            tier.is_dir() and os.access(tier, os.W_OK)
+        ):
+            continue
+        resolved.append(tier)
+    return resolved
+
+
+def _mount_fstype(path: Path) -> str:
+    """Filesystem type of the mount holding ``path`` (from /proc/mounts)."""
+    best, fstype = "", ""
+    try:
+        with open("/proc/mounts", "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1]
+                if (
+                    str(path) == mount_point
+                    or str(path).startswith(mount_point.rstrip("/") + "/")
+                ) and len(mount_point) > len(best):
+                    best, fstype = mount_point, fields[2]
+    except OSError:
+        pass
+    return fstype
+
+
+def tier_free_bytes(tier: Union[str, Path], memory_reserved: int = 0) -> int:
+    """Free bytes on a tier; RAM-backed tiers also leave memory_reserved free."""
+    import psutil
+
+    tier = Path(tier)
+    probe = tier
+    while not probe.exists() and probe != probe.parent:
+        probe = probe.parent
+    free = shutil.disk_usage(probe).free
+    if _mount_fstype(probe.resolve()) in RAM_FILESYSTEMS:
+        free = min(free, psutil.virtual_memory().available - memory_reserved)
+    return max(free, 0)
+
+
+class Workspace:
+    """Temporary directories placed on the fastest tier with enough space.
+
+    Args:
+        tiers: Ordered candidate base directories (fastest first)
+        name: Directory name created inside the chosen tier(s)
+        memory_reserved: Bytes of RAM kept free on tmpfs tiers (tool memory)
+        headroom: Fraction added on top of expected sizes as safety margin
+        keep: Keep the directories (RAM-backed ones are moved to keep_dir)
+        keep_dir: Where to move kept directories from RAM-backed tiers
+        logger: Logger instance
+    """
+
+    def __init__(
+        self,
+        tiers: Sequence[Union[str, Path]],
+        name: Optional[str] = None,
+        memory_reserved: int = 0,
+        headroom: float = 0.1,
+        keep: bool = False,
+        keep_dir: Union[str, Path, None] = None,
+        logger=None,
+    ):
+        self.tiers = [Path(t) for t in tiers]
+        self.name = (
+            name or f"rolypoly_tmp_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+        self.memory_reserved = memory_reserved
+        self.headroom = headroom
+        self.keep = keep
+        self.keep_dir = Path(keep_dir) if keep_dir else None
+        self.logger = get_logger(logger)
+        self.dirs: List[Path] = []
+        self._created: List[Path] = []
+        self.active: Optional[Path] = None
+        self._tier_index = 0
+        self._cleaned = False
+        self._previous_handlers: Dict[int, object] = {}
+
+    def _dir_for_tier(self, index: int) -> Path:
+        tier = self.tiers[index]
+        # the last tier is the output directory: keep the historical name;
+        # shared tiers get the pid so concurrent jobs never collide
+        if index == len(self.tiers) - 1:
+            return tier / self.name
+        return tier / f"{self.name}_{os.getpid()}"
+
+    def _fits(self, index: int, expected_bytes: int) -> bool:
+        needed = int(expected_bytes * (1 + self.headroom))
+        return (
+            tier_free_bytes(self.tiers[index], self.memory_reserved) >= needed
+        )
+
+    def choose_tier(self, expected_bytes: int = 0, start: int = 0) -> int:
+        """Index of the first tier from ``start`` that fits expected_bytes."""
+        for i in range(start, len(self.tiers)):
+            if self._fits(i, expected_bytes):
+                return i
+        self.logger.warning(
+            f"No temporary tier has {expected_bytes} bytes free, using {self.tiers[-1]}"
+        )
+        return len(self.tiers) - 1
+
+    def dir_for_tier(self, index: int) -> Path:
+        """Directory this workspace uses (or would use) on tier ``index``."""
+        return self._dir_for_tier(index)
+
+    def select(self, expected_bytes: int = 0, start: int = 0) -> Path:
+        """Activate the first tier from ``start`` that fits expected_bytes.
+
+        Falls back to the last tier (output directory) when none fits.
+        """
+        index = self.choose_tier(expected_bytes, start)
+        path = self._dir_for_tier(index)
+        if not path.exists():
+            self._created.append(path)
+        path.mkdir(parents=True, exist_ok=True)
+        if path not in self.dirs:
+            self.dirs.append(path)
+        self._tier_index = index
+        self.active = path
+        self.logger.debug(f"Temporary workspace: {path}")
+        return path
+
+    def reserve(self, expected_bytes: int, step: str = "") -> Path:
+        """Directory for a step expected to write ``expected_bytes``.
+
+        Returns the active directory if its tier still has room, otherwise
+        spills to the next tier that fits (earlier directories are kept, so
+        previous intermediates stay where they are).
+        """
+        if self.active is None:
+            return self.select(expected_bytes)
+        if self._fits(self._tier_index, expected_bytes):
+            return self.active
+        if self._tier_index == len(self.tiers) - 1:
+            self.logger.warning(
+                f"{step or 'Step'} expects {expected_bytes} bytes of intermediates but only {tier_free_bytes(self.tiers[-1])} are free on {self.tiers[-1]}"
+            )
+            return self.active
+        previous = self.active
+        path = self.select(expected_bytes, start=self._tier_index + 1)
+        self.logger.info(
+            f"Temporary tier {previous.parent} is short on space for {step or 'next step'}, spilling to {path}"
+        )
+        return path
+
+    def find(self, name: str) -> Optional[Path]:
+        """Locate a file written to any of the workspace directories."""
+        for path in reversed(self.dirs):
+            candidate = path / name
+            if candidate.exists():
+                return candidate
+        return None
+
+    def cleanup(self) -> None:
+        """Remove (or, with keep, persist) the workspace directories.
+
+        Directories that existed before the workspace was set up (e.g. an
+        explicit --temp-dir pointing at a shared folder) are never removed.
+        """
+        if self._cleaned:
+            return
+        self._cleaned = True
+        for path in self._created:
+            if not path.exists():
+                continue
+            if self.keep:
+                if (
+                    self.keep_dir is not None
+                    and _mount_fstype(path.resolve()) in RAM_FILESYSTEMS
+                ):
+                    target = self.keep_dir / path.name
+                    self.logger.info(
+                        f"Moving kept temporary files from {path} to {target}"
+                    )
+                    shutil.move(str(path), str(target))
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _signal_cleanup(self, signum, frame) -> None:
+        self.cleanup()
+        previous = self._previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+            return
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    def register_cleanup(self) -> None:
+        """Clean up at interpreter exit and on SIGTERM/SIGHUP."""
+        import threading
+
+        atexit.register(self.cleanup)
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for signum in (signal.SIGTERM, signal.SIGHUP):
+            self._previous_handlers[signum] = signal.getsignal(signum)
+            signal.signal(signum, self._signal_cleanup)
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from rolypoly.utils.bio.annotation_merge import (
+    merge_annotations,
+    protein_features,
+    resolve_conflicts,
+    rna_features,
+)
+
+
+def _protein_table() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "query_full_name": [
+                "c1_1 # 10 # 309 # 1 # ID=1_1;partial=00",
+                "c1_2 # 400 # 699 # -1 # ID=1_2;partial=00",
+            ],
+            "hmm_full_name": ["RdRp_1", "CP"],
+            "env_from": [1, 1],
+            "env_to": [10, 10],
+            "this_dom_score": [50.0, 40.0],
+            "full_hmm_evalue": [1e-10, 1e-5],
+            "source": ["Pfam", "Pfam"],
+        }
+    )
+
+
+def _rna_table() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "sequence_id": ["c1", "c1"],
+            "type": ["ribozyme", "rna_motif"],
+            "start": [15, 1000],
+            "end": [35, 1010],
+            "score": [3.0, None],
+            "source": ["cmscan", "lightmotif"],
+            "strand": ["+", "-"],
+            "phase": [".", "."],
+            "profile_name": ["HHR", None],
+        }
+    )
+
+
+def test_protein_hits_lifted_to_contig_coordinates():
+    features = protein_features(_protein_table())
+    assert features["seqid"].to_list() == ["c1", "c1"]
+    # residues 1-10 of a + ORF at 10..309, and of a - ORF at 400..699
+    assert features.select("start", "end", "strand").rows() == [
+        (10, 39, "+"),
+        (670, 699, "-"),
+    ]
+    assert features["attributes"][0].startswith("Name=RdRp_1;orf_id=c1_1")
+
+
+@pytest.mark.parametrize(
+    ("policy", "types"),
+    [
+        (
+            "keep_all",
+            ["protein_domain", "ribozyme", "protein_domain", "rna_motif"],
+        ),
+        ("prefer_protein", ["protein_domain", "protein_domain", "rna_motif"]),
+        ("prefer_rna", ["ribozyme", "protein_domain", "rna_motif"]),
+    ],
+)
+def test_conflict_policies(policy, types):
+    features = pl.concat(
+        [protein_features(_protein_table()), rna_features(_rna_table())]
+    )
+    resolved = resolve_conflicts(features, policy).sort("start")
+    assert resolved["type"].to_list() == types
+    # only the ribozyme (15-35) and the first domain (10-39) conflict
+    assert resolved.filter("conflict")["start"].to_list() == [
+        s for s in (10, 15) if s in resolved["start"].to_list()
+    ]
+
+
+def test_merge_writes_sorted_gff3_and_parquet(tmp_path: Path):
+    _protein_table().write_csv(tmp_path / "protein.tsv", separator="\t")
+    _rna_table().write_csv(tmp_path / "rna.tsv", separator="\t")
+    merged = merge_annotations(
+        tmp_path / "protein.tsv",
+        tmp_path / "rna.tsv",
+        tmp_path / "combined_annotations",
+    )
+    assert merged["start"].to_list() == [10, 15, 670, 1000]
+
+    table = pl.read_parquet(tmp_path / "combined_annotations.parquet")
+    assert table.equals(merged)
+    lines = (tmp_path / "combined_annotations.gff3").read_text().splitlines()
+    assert lines[0] == "##gff-version 3"
+    fields = [line.split("\t") for line in lines[1:]]
+    assert all(len(f) == 9 for f in fields)
+    assert fields[1][:5] == ["c1", "cmscan", "ribozyme", "15", "35"]
+    assert fields[1][8] == "branch=rna;profile_name=HHR;conflict=true"
+    assert fields[3][8] == "branch=rna"
@@ -0,0 +1,114 @@
+import logging
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from rolypoly.commands.assembly import assemble
+from rolypoly.utils.resources import ResourceScheduler
+
+
+def _config(tmp_path: Path, assemblers):
+    return SimpleNamespace(
+        assembler=assemblers,
+        skip_steps=[],
+        threads=4,
+        memory={"bytes": f"{4 * 1024**3}b"},
+        output_dir=tmp_path,
+        logger=logging.getLogger("test_assemble"),
+        scheduler=ResourceScheduler(4, "4gb", monitor_interval=0.05),
+        step_params={
+            "spades": {"k": "21,33,45,57", "mode": "meta"},
+            "megahit": {"k-min": 21, "k-max": 141, "k-step": 10},
+        },
+    )
+
+
+def test_partition_resources_splits_budget():
+    shares = assemble.partition_resources(
+        ["spades", "megahit"], 8, 8 * 1024**3, "spades:3,megahit:1"
+    )
+    assert shares["spades"] == (6, 6 * 1024**3)
+    assert shares["megahit"] == (2, 2 * 1024**3)
+
+
+def test_run_assemblers_retries_oom_with_fewer_kmers(
+    tmp_path: Path, monkeypatch
+):
+    config = _config(tmp_path, ["spades", "megahit"])
+
+    def _fake_spades(config, libraries, lease=None):
+        out = tmp_path / "spades.fasta"
+        # fail like the OOM killer until the k list has been reduced
+        code = 137 if config.step_params["spades"]["k"].count(",") > 1 else 0
+        assemble._run_tracked(
+            config,
+            f"{sys.executable} -c \"open('{out}', 'w').write('>s1\\nACGT\\n')\"; exit {code}",
+            lease,
+        )
+        return out
+
+    def _fake_megahit(config, libraries, lease=None):
+        out = tmp_path / "megahit.fasta"
+        out.write_text(">m1\nGGCC\n")
+        return out
+
+    monkeypatch.setitem(assemble.ASSEMBLER_RUNNERS, "spades", _fake_spades)
+    monkeypatch.setitem(assemble.ASSEMBLER_RUNNERS, "megahit", _fake_megahit)
+
+    concat = tmp_path / "all_contigs.fasta"
+    contigs, usage = assemble.run_assemblers(config, {}, concat)
+
+    assert len(contigs) == 2
+    assert config.step_params["spades"]["k"] == "21,33"
+    by_name = {u["name"]: u for u in usage}
+    assert by_name["spades"]["attempts"] == 2
+    assert by_name["spades"]["status"] == "ok"
+    assert by_name["spades"]["threads"] + by_name["megahit"]["threads"] == 4
+    # megahit finished first, but contigs are concatenated in selection
+    # order so the renamed IDs do not depend on timing
+    assert concat.read_text().split() == [">s1", "ACGT", ">m1", "GGCC"]
+    assert [Path(c).name for c in contigs] == ["spades.fasta", "megahit.fasta"]
+
+
+def test_partition_weights_must_be_positive():
+    import pytest
+    from click import BadParameter
+
+    for partition in ("spades:0,megahit:1", "spades:x", "megahit:-2"):
+        with pytest.raises(BadParameter):
+            assemble.partition_resources(
+                ["spades", "megahit"], 8, 8 * 1024**3, partition
+            )
+
+
+def test_failed_assembler_stops_the_run_unless_keep_going(
+    tmp_path: Path, monkeypatch
+):
+    import pytest
+
+    def _broken_spades(config, libraries, lease=None):
+        assemble._run_tracked(config, "exit 3", lease)
+
+    def _fake_megahit(config, libraries, lease=None):
+        out = tmp_path / "megahit.fasta"
+        out.write_text(">m1\nGGCC\n")
+        return out
+
+    monkeypatch.setitem(assemble.ASSEMBLER_RUNNERS, "spades", _broken_spades)
+    monkeypatch.setitem(assemble.ASSEMBLER_RUNNERS, "megahit", _fake_megahit)
+    concat = tmp_path / "all_contigs.fasta"
+
+    with pytest.raises(RuntimeError, match="spades"):
+        assemble.run_assemblers(
+            _config(tmp_path, ["spades", "megahit"]), {}, concat
+        )
+    contigs, usage = assemble.run_assemblers(
+        _config(tmp_path, ["spades", "megahit"]), {}, concat, keep_going=True
+    )
+    assert [Path(c).name for c in contigs] == ["megahit.fasta"]
+    assert {u["name"]: u["status"] for u in usage}["spades"] == "failed (3)"
+    # nothing to continue with
+    with pytest.raises(RuntimeError):
+        assemble.run_assemblers(
+            _config(tmp_path, ["spades"]), {}, concat, keep_going=True
+        )
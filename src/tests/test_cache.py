@@ -0,0 +1,102 @@
+from pathlib import Path
+
+from rolypoly.utils.cache import CacheStore, file_digest, hash_key, link_or_copy
+
+
+def test_cache_store_builds_once(tmp_path: Path):
+    store = CacheStore("unit", cache_dir=tmp_path)
+    calls = []
+
+    def _build(entry_dir: Path):
+        calls.append(entry_dir)
+        (entry_dir / "masked.fasta").write_text(">a\nNNNN\n")
+
+    key = hash_key({"input": "a", "aligner": "mmseqs2"})
+    first = store.get_or_build(key, _build, params={"aligner": "mmseqs2"})
+    second = store.get_or_build(key, _build)
+
+    assert first == second
+    assert len(calls) == 1
+    assert (first / "masked.fasta").read_text() == ">a\nNNNN\n"
+    assert store.read_meta(key)["params"] == {"aligner": "mmseqs2"}
+
+
+def test_cache_store_failed_build_leaves_no_entry(tmp_path: Path):
+    store = CacheStore("unit", cache_dir=tmp_path)
+
+    def _fail(entry_dir: Path):
+        (entry_dir / "partial").write_text("x")
+        raise RuntimeError("boom")
+
+    try:
+        store.get_or_build("k", _fail)
+    except RuntimeError:
+        pass
+    assert not store.has("k")
+    assert store.entries() == []
+
+
+def test_cache_store_gc(tmp_path: Path):
+    store = CacheStore("unit", cache_dir=tmp_path)
+    for key in ("old", "new"):
+        store.get_or_build(key, lambda d: (d / "f").write_bytes(b"0" * 1000))
+    meta = store.read_meta("old")
+    meta["last_used"] = 0
+    store._write_meta(store.entry_dir("old"), meta)
+
+    assert [e["key"] for e in store.gc(max_age_days=1, dry_run=True)] == ["old"]
+    assert store.has("old")
+    store.gc(max_age_days=1)
+    assert not store.has("old") and store.has("new")
+    store.gc(max_size=0)
+    assert store.entries() == []
+
+
+def test_file_digest_is_content_based(tmp_path: Path):
+    a, b = tmp_path / "a.fa", tmp_path / "b.fa"
+    a.write_text(">x\nACGT\n")
+    b.write_text(">x\nACGT\n")
+    assert file_digest(a) == file_digest(b)
+
+
+def test_cache_entries_are_read_only_and_links_protected(tmp_path: Path):
+    store = CacheStore("unit", cache_dir=tmp_path)
+    entry = store.get_or_build("k", lambda d: (d / "f").write_text("cached"))
+    assert not (entry / "f").stat().st_mode & 0o222
+
+    linked = link_or_copy(entry / "f", tmp_path / "out" / "f")
+    assert not linked.stat().st_mode & 0o222
+    # writable sources are copied, not linked
+    own = tmp_path / "own"
+    own.write_text("mine")
+    copied = link_or_copy(own, tmp_path / "out" / "own")
+    assert copied.stat().st_ino != own.stat().st_ino
+
+
+def test_gc_skips_entries_being_read(tmp_path: Path):
+    store = CacheStore("unit", cache_dir=tmp_path)
+    with store.use("k", lambda d: (d / "f").write_text("x")) as entry:
+        assert store.gc(max_size=0) == []
+        assert (entry / "f").read_text() == "x"
+        # readers share the entry
+        with store.use("k", lambda d: None) as again:
+            assert again == entry
+    assert [e["key"] for e in store.gc(max_size=0)] == ["k"]
+    assert not store.has("k")
+
+
+def test_cache_command_knows_every_store():
+    from rolypoly.commands.misc.manage_cache import KNOWN_STORES
+    from rolypoly.commands.reads.mask_dna import MASKED_STORE_NAME
+    from rolypoly.utils.bio.genome_fetch import MAPPING_STORE
+    from rolypoly.utils.bio.library_detection import SAMPLE_STORE_NAME
+    from rolypoly.utils.bio.reference_search import REFERENCE_STORE
+    from rolypoly.utils.downloads import DOWNLOAD_STORE
+
+    assert set(KNOWN_STORES) == {
+        MASKED_STORE_NAME,
+        MAPPING_STORE,
+        SAMPLE_STORE_NAME,
+        REFERENCE_STORE,
+        DOWNLOAD_STORE,
+    }
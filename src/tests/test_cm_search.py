@@ -0,0 +1,142 @@
+import os
+from pathlib import Path
+
+from rolypoly.utils.bio.cm_search import merge_tblout, shard_fasta
+
+HEADER = [
+    "#target name         accession query name           accession mdl mdl from   mdl to seq from   seq to strand trunc pass   gc  bias  score   E-value inc description of target",
+    "#------------------- --------- -------------------- --------- --- -------- -------- -------- -------- ------ ----- ---- ---- ----- ------ --------- --- ---------------------",
+]
+
+
+def _row(target, query, score, evalue):
+    return (
+        f"{target:<20} RF00001   {query:<20} -         cm        1      100       10      110      +    no    1 0.50   0.0 "
+        f"{score:>5.1f} {evalue:>9.2g} !   Some RNA"
+    )
+
+
+def _footer(shard):
+    return [
+        "#",
+        "# Program:         cmscan",
+        f"# Query file:      {shard}",
+        "# [ok]",
+    ]
+
+
+def test_shard_fasta_balances_residues(tmp_path: Path):
+    fasta = tmp_path / "input.fasta"
+    lengths = [900, 100, 500, 450, 50, 400]
+    fasta.write_text(
+        "".join(f">seq{i} desc\n{'A' * n}\n" for i, n in enumerate(lengths))
+    )
+    shards, order, residues = shard_fasta(fasta, tmp_path / "shards", 2)
+
+    assert residues == sum(lengths)
+    assert order == {f"seq{i}": i for i in range(len(lengths))}
+    loads = []
+    for shard in shards:
+        records = shard.read_text().split(">")[1:]
+        names = [record.split()[0] for record in records]
+        # input order within a shard
+        assert names == sorted(names, key=lambda name: order[name])
+        loads.append(sum(len(record.split("\n")[1]) for record in records))
+    # longest first onto the lightest shard
+    assert sorted(loads) == [1100, 1300]
+
+
+def test_merge_tblout_restores_single_run_order(tmp_path: Path):
+    order = {"q1": 0, "q2": 1, "q3": 2}
+    shard0 = tmp_path / "shard_0.tblout"
+    shard1 = tmp_path / "shard_1.tblout"
+    shard0.write_text(
+        "\n".join(
+            HEADER
+            + [
+                _row("5S_rRNA", "q3", 50.0, 1e-10),
+                _row("tRNA", "q3", 20.0, 1e-3),
+            ]
+            + _footer(tmp_path / "shard_0.fasta")
+        )
+        + "\n"
+    )
+    shard1.write_text(
+        "\n".join(
+            HEADER
+            + [_row("HDV", "q1", 30.0, 1e-5), _row("tRNA", "q2", 40.0, 1e-8)]
+            + _footer(tmp_path / "shard_1.fasta")
+        )
+        + "\n"
+    )
+
+    merged = tmp_path / "merged.tblout"
+    assert (
+        merge_tblout([shard0, shard1], merged, "cmscan", order, "input.fasta")
+        == 4
+    )
+    lines = merged.read_text().splitlines()
+    assert lines[:2] == HEADER
+    assert [line.split()[2] for line in lines[2:6]] == ["q1", "q2", "q3", "q3"]
+    # hits of one query keep their E-value order
+    assert [line.split()[0] for line in lines[4:6]] == ["5S_rRNA", "tRNA"]
+    assert lines[6:] == _footer("input.fasta")
+
+    merge_tblout([shard0, shard1], merged, "cmsearch", order)
+    evalues = [
+        float(line.split()[15]) for line in merged.read_text().splitlines()[2:6]
+    ]
+    assert evalues == sorted(evalues)
+
+
+def test_shards_run_concurrently(tmp_path: Path, monkeypatch):
+    from rolypoly.utils.bio.cm_search import cm_search_sharded
+    from rolypoly.utils.resources import ResourceScheduler
+
+    # stand-in cmscan: a second of "work", then a tblout without hits
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "cmscan"
+    fake.write_text(
+        "#!/bin/sh\n"
+        "sleep 1\n"
+        'while [ "$1" != "--tblout" ]; do shift; done\n'
+        'printf "# [ok]\\n" > "$2"\n'
+    )
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+
+    fasta = tmp_path / "input.fasta"
+    fasta.write_text(">a\nACGTACGT\n>b\nACGTACGT\n")
+    scheduler = ResourceScheduler(4, "4gb", monitor_interval=0.05)
+    cm_search_sharded(
+        "models.cm",
+        fasta,
+        tmp_path / "hits.tblout",
+        threads=4,
+        shards=2,
+        scheduler=scheduler,
+    )
+
+    leases = scheduler.history
+    assert len(leases) == 2
+    assert all(lease.memory == scheduler.total_memory // 2 for lease in leases)
+    # the second shard starts before the first one finishes
+    starts = sorted(lease.granted_at for lease in leases)
+    ends = sorted(lease.released_at for lease in leases)
+    assert starts[1] < ends[0]
+
+    # a caller sharing the scheduler (e.g. annotate's RNA branch) caps the
+    # shards at its own memory budget
+    cm_search_sharded(
+        "models.cm",
+        fasta,
+        tmp_path / "hits.tblout",
+        threads=2,
+        memory="1gb",
+        shards=2,
+        scheduler=scheduler,
+    )
+    assert [lease.memory for lease in scheduler.history[2:]] == [
+        512 * 1024**2
+    ] * 2
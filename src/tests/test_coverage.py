@@ -0,0 +1,147 @@
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from rolypoly.utils.bio.coverage import (
+    CoverageAggregator,
+    aggregate_sam_stream,
+    map_and_aggregate,
+)
+
+SAM = b"""@HD\tVN:1.6
+@SQ\tSN:c1\tLN:20
+@SQ\tSN:c2\tLN:5
+r1\t0\tc1\t5\t60\t3M1D2M2S\t*\t0\t0\tACGTACG\tIIIIIII\tNM:i:1
+r2\t4\t*\t0\t0\t*\t*\t0\t0\tAC\tII
+r3\t16\tc2\t1\t60\t4M\t*\t0\t0\tACGT\tIIII\tNM:i:0\tAS:i:3
+r4\t256\tc2\t1\t60\t4M\t*\t0\t0\tACGT\tIIII
+r5\t0\tc1\t1\t60\t2S3M10N3M\t*\t0\t0\tACGTACGT\tIIIIIIII
+"""
+
+
+def test_coverage_from_sam_stream():
+    agg = aggregate_sam_stream(
+        io.BytesIO(SAM), CoverageAggregator(), chunk_lines=2
+    )
+
+    expected_c1 = np.zeros(20, dtype=np.int32)
+    expected_c1[[4, 5, 6, 8, 9]] += 1  # r1: 3M1D2M from position 5
+    expected_c1[[0, 1, 2, 13, 14, 15]] += 1  # r5: 3M10N3M from position 1
+    assert np.array_equal(agg.contig_depth("c1"), expected_c1)
+    # the secondary alignment (r4) is not counted
+    assert agg.contig_depth("c2").tolist() == [1, 1, 1, 1, 0]
+
+    summary = agg.summary()
+    assert summary["mapped_reads"].to_list() == [2, 1]
+    assert summary["breadth"].to_list() == [11 / 20, 4 / 5]
+
+    windows = agg.windows(8)
+    assert windows["end"].to_list() == [8, 16, 20, 5]
+    assert windows["mean_depth"][0] == 6 / 8
+
+
+def test_map_and_aggregate_tees_alignments(tmp_path: Path):
+    sam_file = tmp_path / "in.sam"
+    sam_file.write_bytes(SAM)
+    out = tmp_path / "aln.sam.gz"
+    agg = map_and_aggregate(
+        [
+            sys.executable,
+            "-c",
+            f"import sys; sys.stdout.buffer.write(open('{sam_file}', 'rb').read())",
+        ],
+        CoverageAggregator(),
+        alignment_output=out,
+        alignment_format="sam.gz",
+    )
+    import gzip
+
+    assert gzip.open(out).read() == SAM
+    assert agg.records_used == 3
+
+
+def test_bbtools_launcher_prefers_bbmapy_and_fails_loudly(
+    tmp_path: Path, monkeypatch
+):
+    import pytest
+
+    from rolypoly.utils.various import bbtools_launcher
+
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    monkeypatch.setattr(
+        "importlib.util.find_spec", lambda name: None, raising=True
+    )
+    with pytest.raises(FileNotFoundError, match="bbmap.sh"):
+        bbtools_launcher("bbmap.sh")
+    monkeypatch.undo()
+
+    package = tmp_path / "site" / "bbmapy"
+    (package / "vendor" / "bbmap").mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    launcher = package / "vendor" / "bbmap" / "bbmap.sh"
+    launcher.write_text("#!/bin/sh\n")
+    monkeypatch.syspath_prepend(str(tmp_path / "site"))
+    monkeypatch.delitem(sys.modules, "bbmapy", raising=False)
+    assert bbtools_launcher("bbmap.sh") == str(launcher)
+
+    # a mapper that can't start is an error, not an empty coverage table
+    with pytest.raises(FileNotFoundError):
+        map_and_aggregate(
+            [str(tmp_path / "missing" / "bbmap.sh")],
+            CoverageAggregator(),
+            alignment_output=tmp_path / "aln.sam.gz",
+            alignment_format="sam.gz",
+        )
+
+
+def test_allele_counts_from_cigar():
+    agg = aggregate_sam_stream(
+        io.BytesIO(SAM), CoverageAggregator(track_alleles=True)
+    )
+    counts = agg.allele_counts("c1")
+    # r1 (ACGTACG, 3M1D2M2S from 5): A C G at 5-7, deletion at 8, T A at 9-10
+    assert counts[4].tolist() == [1, 0, 0, 0, 0]
+    assert counts[7].tolist() == [0, 0, 0, 0, 1]
+    assert counts[9].tolist() == [1, 0, 0, 0, 0]
+    # r5 soft clips AC, then GTA at 1-3 and (after the N skip) CGT at 14-16
+    assert counts[0].tolist() == [0, 0, 1, 0, 0]
+    assert counts[13].tolist() == [0, 1, 0, 0, 0]
+    # base counts match the coverage depth, which doesn't count deletions
+    assert np.array_equal(counts[:, :4].sum(axis=1), agg.contig_depth("c1"))
+
+
+def test_allele_table_on_synthetic_mixture(tmp_path: Path):
+    import polars as pl
+
+    rng = np.random.default_rng(1)
+    reference = "".join(rng.choice(list("ACGT"), 300))
+    alt = "G" if reference[100] != "G" else "T"
+    variant = reference[:100] + alt + reference[101:]
+    (tmp_path / "ref.fa").write_text(f">c1\n{reference}\n")
+    with open(tmp_path / "reads.fa", "w") as f:
+        for i in range(200):
+            start = (i * 7) % 150
+            source = variant if i % 4 == 0 else reference
+            f.write(f">r{i}\n{source[start : start + 100]}\n")
+
+    from rolypoly.utils.bio.coverage import mappy_sam_lines
+
+    agg = aggregate_sam_stream(
+        mappy_sam_lines(tmp_path / "ref.fa", [tmp_path / "reads.fa"]),
+        CoverageAggregator(track_alleles=True),
+    )
+    table = agg.allele_table(
+        min_depth=10, min_frequency=0.1, references={"c1": reference}
+    )
+    assert table["position"].to_list() == [101]
+    row = table.row(0, named=True)
+    assert row["ref"] == reference[100] == row["major"]
+    assert row["minor"] == alt
+    assert 0.15 < row["minor_freq"] < 0.35
+
+    written = agg.write_parquet(tmp_path / "out", min_frequency=0.1)
+    assert set(written) == {"summary", "windows", "alleles"}
+    assert pl.read_parquet(written["alleles"]).height == 1
+    assert pl.read_parquet(written["summary"])["mapped_reads"][0] == 200
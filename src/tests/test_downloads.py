@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import random
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from rolypoly.utils.bio.genome_fetch import download_from_ftp_path
+from rolypoly.utils.downloads import DownloadCache, parse_md5_checksums
+
+ASSEMBLY = "GCF_000000001.1_test"
+ASSEMBLY_DIR = f"genomes/all/GCF/000/000/001/{ASSEMBLY}"
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Static files with single "bytes=N-" ranges, recording every request."""
+
+    requests = []
+
+    def do_GET(self):
+        RangeHandler.requests.append((self.path, self.headers.get("Range")))
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+        data = path.read_bytes()
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+def _mirror(root: Path, corrupt: bool = False) -> bytes:
+    """Fake NCBI assembly directory, returns the genome file content."""
+    directory = root / ASSEMBLY_DIR
+    directory.mkdir(parents=True)
+    sequence = "".join(random.Random(0).choices("ACGT", k=200_000))
+    genome = gzip.compress(f">chr1\n{sequence}\n".encode(), mtime=0)
+    (directory / f"{ASSEMBLY}_genomic.fna.gz").write_bytes(genome)
+    md5 = hashlib.md5(b"other" if corrupt else genome).hexdigest()
+    (directory / "md5checksums.txt").write_text(
+        f"{md5}  ./{ASSEMBLY}_genomic.fna.gz\n"
+        f"0123456789abcdef0123456789abcdef  ./{ASSEMBLY}_assembly_report.txt\n"
+    )
+    return genome
+
+
+@pytest.fixture
+def server(tmp_path: Path):
+    root = tmp_path / "mirror"
+    root.mkdir()
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(RangeHandler, directory=str(root))
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    RangeHandler.requests = []
+    yield root, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_md5_checksums():
+    assert parse_md5_checksums("ABC  ./a.fna.gz\n\nbad\n") == {
+        "a.fna.gz": "abc"
+    }
+
+
+def test_download_is_verified_cached_and_shared(server, tmp_path: Path):
+    root, base = server
+    genome = _mirror(root)
+    cache = DownloadCache(tmp_path / "cache", backoff=0)
+
+    # no transcripts in the assembly: falls back to the genome, without a 404
+    first, size = download_from_ftp_path(
+        f"{base}/{ASSEMBLY_DIR}", tmp_path / "run1", cache=cache
+    )
+    assert first.name == f"{ASSEMBLY}_genomic.fna.gz"
+    assert first.read_bytes() == genome and size == len(genome)
+    assert [path for path, _ in RangeHandler.requests] == [
+        f"/{ASSEMBLY_DIR}/md5checksums.txt",
+        f"/{ASSEMBLY_DIR}/{ASSEMBLY}_genomic.fna.gz",
+    ]
+
+    # another run (or user of the same cache root) links the cached copy
+    second, _ = download_from_ftp_path(
+        f"{base}/{ASSEMBLY_DIR}",
+        tmp_path / "run2",
+        cache=DownloadCache(tmp_path / "cache"),
+    )
+    assert second.read_bytes() == genome
+    assert len(RangeHandler.requests) == 2
+
+    # the same content from a file:// mirror is deduplicated by its MD5
+    md5 = hashlib.md5(genome).hexdigest()
+    mirrored = cache.fetch(
+        (root / ASSEMBLY_DIR / f"{ASSEMBLY}_genomic.fna.gz").as_uri(),
+        md5,
+        tmp_path / "run3" / "genome.fna.gz",
+    )
+    assert mirrored.read_bytes() == genome
+    assert len([e for e in cache.store.entries() if e["key"] == md5]) == 1
+
+
+def test_interrupted_download_resumes(server, tmp_path: Path):
+    root, base = server
+    genome = _mirror(root)
+    url = f"{base}/{ASSEMBLY_DIR}/{ASSEMBLY}_genomic.fna.gz"
+    md5 = hashlib.md5(genome).hexdigest()
+    cache = DownloadCache(tmp_path / "cache", backoff=0)
+
+    partial_file = cache.partial_path(url, md5)
+    partial_file.parent.mkdir(parents=True)
+    partial_file.write_bytes(genome[:1000])
+
+    assert cache.fetch(url, md5).read_bytes() == genome
+    assert RangeHandler.requests == [
+        (f"/{ASSEMBLY_DIR}/{ASSEMBLY}_genomic.fna.gz", "bytes=1000-")
+    ]
+    assert not partial_file.exists()
+
+
+def test_checksum_mismatch_is_retried_then_rejected(server, tmp_path: Path):
+    root, base = server
+    _mirror(root, corrupt=True)
+    cache = DownloadCache(tmp_path / "cache", retries=2, backoff=0)
+
+    path, size = download_from_ftp_path(
+        f"{base}/{ASSEMBLY_DIR}",
+        tmp_path / "run",
+        prefer_transcript=False,
+        cache=cache,
+    )
+    assert path is None and size is None
+    genome_requests = [
+        path for path, _ in RangeHandler.requests if path.endswith(".fna.gz")
+    ]
+    assert len(genome_requests) == 3
+    assert not list((tmp_path / "run").iterdir())
+    with pytest.raises(FileNotFoundError):
+        cache.fetch(f"{base}/{ASSEMBLY_DIR}/missing.fna.gz")
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from rolypoly.utils.various import (
+    apply_filter,
+    matching_values,
+    parse_filter,
+    scan_table,
+)
+
+
+def _hits() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "qheader": ["a", "b", "c", "d"],
+            "qstart": [1, 10, 1, 200],
+            "qend": [100, 20, 50, 101],
+            "qlen": [100, 100, 100, 200],
+            "alnlen": [100, 11, 1200, 100],
+            "pident": [99.0, 80.0, 96.0, 75.0],
+        }
+    )
+
+
+def test_parse_filter_precedence():
+    assert parse_filter("[qlen >= 100 & alnlen < 50]") == (
+        "and",
+        ("compare", ">=", ("column", "qlen"), ("number", 100)),
+        ("compare", "<", ("column", "alnlen"), ("number", 50)),
+    )
+    # & binds tighter than |
+    tree = parse_filter("pident>=75 | alnlen > 10 and qlen < 5")
+    assert tree[0] == "or" and tree[2][0] == "and"
+
+
+def test_apply_filter_or_parentheses_and_arithmetic():
+    hits = _hits()
+    assert apply_filter(hits, "alnlen >= 120 | pident>=99")[
+        "qheader"
+    ].to_list() == ["a", "c"]
+    assert apply_filter(
+        hits, "(alnlen >= 120 | pident >= 99) & qlen < 100"
+    ).is_empty()
+    assert apply_filter(hits, "alnlen / qlen >= 0.5 and pident < 90")[
+        "qheader"
+    ].to_list() == ["d"]
+    assert apply_filter(hits, "") is hits
+
+
+def test_derived_query_coverage():
+    # qcov is not a column here: computed from qstart/qend/qlen (either strand)
+    assert apply_filter(_hits(), "qcov >= 0.5")["qheader"].to_list() == [
+        "a",
+        "c",
+        "d",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("filter_str", "message"),
+    [
+        ("pident >> 3", "unexpected '>'"),
+        ("(pident > 3", "missing closing parenthesis"),
+        ("pident", "expected a comparison operator"),
+        ("pident > 3 &", "unexpected end of filter"),
+        ("pident $ 3", "unexpected character at position 7"),
+        ("evalue < 1e-5", "unknown column 'evalue'"),
+    ],
+)
+def test_invalid_filters(filter_str, message):
+    with pytest.raises(ValueError, match=message):
+        apply_filter(_hits(), filter_str)
+
+
+def test_scan_with_pushdown(tmp_path: Path):
+    table = tmp_path / "hits.tab"
+    _hits().write_csv(table, separator="\t")
+
+    lazy = apply_filter(scan_table(table), "qcov >= 0.95 & pident >= 95")
+    assert isinstance(lazy, pl.LazyFrame)
+    assert "SELECTION" in lazy.select("qheader").explain()
+    assert apply_filter(table, "qcov >= 0.95 & pident >= 95")[
+        "qheader"
+    ].to_list() == ["a"]
+    assert matching_values(
+        table,
+        ["alnlen >= 120 & pident>=75", "qcov >= 0.95 & pident>=95"],
+        "qheader",
+    ) == {"a", "c"}
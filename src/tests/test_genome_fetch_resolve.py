@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import polars as pl
+
+from rolypoly.utils.bio.genome_fetch import (
+    get_ftp_path_for_taxid,
+    resolve_taxids,
+    taxid_index,
+)
+
+FTP = "https://ftp.ncbi.nlm.nih.gov/genomes/all"
+
+
+def _mapping() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "query_tax_id": [562, 562, 562, 9606, 9606, 623, 1280, 1280],
+            "query_name": [
+                "Escherichia coli",
+                "Escherichia coli",
+                "Escherichia coli",
+                "Homo sapiens",
+                "Homo sapiens",
+                "Shigella flexneri",
+                "Staphylococcus aureus",
+                "Staphylococcus aureus",
+            ],
+            "relationship": [
+                "relative",
+                "self",
+                "self",
+                "self",
+                "self",
+                "ancestor",
+                "self",
+                "self",
+            ],
+            "ftp_path": [
+                f"{FTP}/GCF/000/000/001/GCF_000000001.1_rel",
+                f"{FTP}/GCA/000/000/002/GCA_000000002.1_gb",
+                f"{FTP}/GCF/000/000/003/GCF_000000003.1_rs",
+                f"{FTP}/GCA/000/001/405/GCA_000001405.29_GRCh38",
+                f"{FTP}/GCF/000/001/405/GCF_000001405.40_GRCh38",
+                f"{FTP}/GCF/000/000/623/GCF_000000623.1_anc",
+                f"{FTP}/GCF/000/001/280/GCF_000001280.1_contigs",
+                f"{FTP}/GCF/000/001/281/GCF_000001281.1_complete",
+            ],
+            "reference_name": [
+                "E. relative",
+                "E. coli GenBank",
+                "E. coli RefSeq",
+                "GRCh38 GenBank",
+                "GRCh38 RefSeq",
+                "Shigella",
+                "S. aureus contigs",
+                "S. aureus complete",
+            ],
+            "assembly_level": [
+                "Complete Genome",
+                "Complete Genome",
+                "Scaffold",
+                "Chromosome",
+                "Chromosome",
+                "Contig",
+                "Contig",
+                "Complete Genome",
+            ],
+        }
+    )
+
+
+def test_resolve_preferences():
+    resolved = resolve_taxids([9606, 562, 623, 42, 1280, 562], _mapping())
+    assert resolved.columns == [
+        "query_tax_id",
+        "mapped",
+        "query_name",
+        "ftp_path",
+        "relationship",
+        "reference_name",
+    ]
+    assert resolved.select(
+        "query_tax_id", "mapped", "reference_name"
+    ).rows() == [
+        # RefSeq over GenBank, at the same level
+        (9606, True, "GRCh38 RefSeq"),
+        # self over relative, then RefSeq over a better GenBank level
+        (562, True, "E. coli RefSeq"),
+        # ancestors only with get_relative_for_missing
+        (623, True, None),
+        (42, False, None),
+        # the most contiguous RefSeq assembly
+        (1280, True, "S. aureus complete"),
+    ]
+    relatives = resolve_taxids([623], _mapping(), get_relative_for_missing=True)
+    assert relatives.row(0, named=True)["relationship"] == "ancestor"
+
+    assert get_ftp_path_for_taxid(42, _mapping()) == (None, None, None)
+    assert get_ftp_path_for_taxid(562, _mapping())[1:] == (
+        "self",
+        "E. coli RefSeq",
+    )
+
+
+def test_resolve_through_sorted_index(tmp_path: Path):
+    mapping_path = tmp_path / "mapping.parquet"
+    _mapping().sample(fraction=1.0, shuffle=True, seed=7).write_parquet(
+        mapping_path
+    )
+    cache_dir = tmp_path / "cache"
+
+    index = taxid_index(mapping_path, cache_dir=cache_dir)
+    assert pl.read_parquet(index)["query_tax_id"].is_sorted()
+    assert taxid_index(mapping_path, cache_dir=cache_dir) == index
+
+    taxids = [1280, 562, 9606, 623, 7]
+    assert resolve_taxids(
+        taxids, mapping_path, True, cache_dir=cache_dir
+    ).equals(resolve_taxids(taxids, pl.read_parquet(mapping_path), True))
@@ -0,0 +1,121 @@
+from pathlib import Path
+from urllib.parse import unquote
+
+import polars as pl
+
+from rolypoly.utils.bio.polars_fastx import frame_to_gff3
+
+RESERVED = set("\t\n\r;=&,")
+
+
+def _annotations() -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "sequence_id": ["contig 2", "contig_1", "contig_1"],
+            "type": ["ribozyme", None, "rna_motif"],
+            "start": [5, 300, 12],
+            "end": [40, 420, 20],
+            "score": [12.5, None, 0.0],
+            "source": ["cmscan", "lightmotif", "lightmotif"],
+            "strand": ["+", "-", "+"],
+            "profile_name": ["HHR;type=III", "50%, GC-rich", None],
+            "evalue": [1e-10, None, 0.5],
+            "note": ["tab\there", ".", ""],
+        }
+    )
+
+
+def _validate_gff3(path: Path) -> list:
+    """GFF3 records of a file, checked against the spec."""
+    lines = path.read_text().split("\n")
+    assert lines[0] == "##gff-version 3"
+    assert lines[-1] == ""
+    records = [line.split("\t") for line in lines[1:-1]]
+    for fields in records:
+        assert len(fields) == 9
+        assert int(fields[3]) <= int(fields[4])
+        assert fields[6] in {"+", "-", ".", "?"}
+        assert not set(fields[0]) & (RESERVED | {" "})
+        for pair in fields[8].split(";"):
+            tag, value = pair.split("=")
+            assert tag and value and not set(unquote(tag)) & {"\n"}
+    return records
+
+
+def test_round_trip(tmp_path: Path):
+    output = frame_to_gff3(_annotations(), tmp_path / "annotations.gff3")
+    records = _validate_gff3(output)
+
+    # sorted by seqid, then start
+    assert [(unquote(r[0]), r[3]) for r in records] == [
+        ("contig 2", "5"),
+        ("contig_1", "12"),
+        ("contig_1", "300"),
+    ]
+    assert records[0][:8] == [
+        "contig%202",
+        "cmscan",
+        "ribozyme",
+        "5",
+        "40",
+        "12.5",
+        "+",
+        ".",
+    ]
+    # missing type -> default, null score -> "."
+    assert records[2][2] == "feature" and records[2][5] == "."
+
+    attributes = [
+        {
+            unquote(tag): unquote(value)
+            for tag, value in (pair.split("=") for pair in r[8].split(";"))
+        }
+        for r in records
+    ]
+    assert attributes == [
+        {
+            "profile_name": "HHR;type=III",
+            "evalue": "1e-10",
+            "note": "tab\there",
+        },
+        {"evalue": "0.5"},
+        {"profile_name": "50%, GC-rich"},
+    ]
+
+    # the package's own reader parses the escaped file back
+    parsed = pl.LazyFrame.from_gff(output).collect()
+    assert parsed.height == 3
+    assert parsed["start"].to_list() == [5, 12, 300]
+    assert (
+        parsed["attributes"][0].to_list()[0] == "profile_name=HHR%3Btype%3DIII"
+    )
+
+
+def test_lazy_input_and_preformatted_attributes(tmp_path: Path):
+    frame = pl.LazyFrame(
+        {
+            "seqid": ["c1"],
+            "start": [1],
+            "end": [9],
+            "attributes": ["ID=f1;Name=x"],
+            "branch": ["rna"],
+        }
+    )
+    records = _validate_gff3(
+        frame_to_gff3(
+            frame, tmp_path / "lazy.gff3", default_type="protein_domain"
+        )
+    )
+    assert records == [
+        [
+            "c1",
+            "rp",
+            "protein_domain",
+            "1",
+            "9",
+            ".",
+            "+",
+            ".",
+            "ID=f1;Name=x;branch=rna",
+        ]
+    ]
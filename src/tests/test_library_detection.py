@@ -0,0 +1,114 @@
+import gzip
+from pathlib import Path
+
+from rolypoly.utils.bio.library_detection import (
+    count_reads,
+    create_sample_file,
+    reservoir_sample,
+)
+
+
+def _write_interleaved(path: Path, n_pairs: int):
+    with gzip.open(path, "wt") as f:
+        for i in range(n_pairs):
+            for mate in (1, 2):
+                f.write(f"@read{i}/{mate}\nACGTACGT\n+\nIIIIIIII\n")
+
+
+def _headers(path: Path):
+    with open(path) as f:
+        return [line.strip() for i, line in enumerate(f) if i % 4 == 0]
+
+
+def test_reservoir_sample_is_reproducible_and_ordered():
+    first, seen = reservoir_sample(range(10_000), 50, seed=7)
+    second, _ = reservoir_sample(range(10_000), 50, seed=7)
+    assert seen == 10_000
+    assert first == second
+    assert [i for i, _ in first] == sorted(i for i, _ in first)
+    assert all(i == item for i, item in first)
+
+
+def test_random_sample_keeps_interleaved_mates(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROLYPOLY_CACHE_DIR", str(tmp_path / "cache"))
+    fastq = tmp_path / "reads.fq.gz"
+    _write_interleaved(fastq, 500)
+    out = tmp_path / "sample.fq"
+
+    result = create_sample_file(
+        fastq, "random", 40, str(out), interleaved=True, seed=1
+    )
+
+    headers = _headers(out)
+    assert result["input_reads"] == 1000
+    assert result["sampled_reads"] == len(headers) == 40
+    for r1, r2 in zip(headers[::2], headers[1::2]):
+        assert r1[:-1] == r2[:-1] and r1.endswith("1") and r2.endswith("2")
+    # the full pass recorded the read count for later commands
+    assert count_reads(fastq) == 1000
+
+
+def test_random_sample_paired_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROLYPOLY_CACHE_DIR", str(tmp_path / "cache"))
+    r1, r2 = tmp_path / "s_R1.fq", tmp_path / "s_R2.fq"
+    with open(r1, "w") as f1, open(r2, "w") as f2:
+        for i in range(300):
+            f1.write(f"@p{i}/1\nACGT\n+\nIIII\n")
+            f2.write(f"@p{i}/2\nTTTT\n+\nIIII\n")
+    o1, o2 = tmp_path / "o_R1.fq", tmp_path / "o_R2.fq"
+
+    result = create_sample_file(
+        f"{r1},{r2}", "random", 25, f"{o1},{o2}", seed=3
+    )
+
+    h1, h2 = _headers(o1), _headers(o2)
+    assert len(h1) == len(h2) == 25
+    assert [h[:-1] for h in h1] == [h[:-1] for h in h2]
+    # reads and bases both count the two mates of each pair
+    assert result["input_reads"] == 600 and result["input_bases"] == 2400
+    assert result["sampled_reads"] == 50 and result["sampled_bases"] == 200
+    assert count_reads(r1) == 300
+
+
+def test_fractional_random_sample_streams_mates(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROLYPOLY_CACHE_DIR", str(tmp_path / "cache"))
+    fastq = tmp_path / "reads.fq.gz"
+    _write_interleaved(fastq, 500)
+    out = tmp_path / "sample.fq"
+
+    result = create_sample_file(
+        fastq, "random", 0.3, str(out), interleaved=True, seed=2
+    )
+
+    headers = _headers(out)
+    assert result["input_reads"] == 1000
+    assert result["sampled_reads"] == len(headers)
+    assert result["sampled_bases"] == 8 * len(headers)
+    assert 200 < len(headers) < 400
+    for r1, r2 in zip(headers[::2], headers[1::2]):
+        assert r1[:-1] == r2[:-1]
+
+
+def test_unwritable_cache_falls_back_to_uncached(tmp_path, monkeypatch):
+    from rolypoly.utils.bio.library_detection import determine_fastq_type
+
+    # a cache root below a regular file can never be created
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    monkeypatch.setenv("ROLYPOLY_CACHE_DIR", str(blocker / "cache"))
+    fastq = tmp_path / "reads.fq.gz"
+    _write_interleaved(fastq, 100)
+
+    assert count_reads(fastq) == 200
+    analysis = determine_fastq_type(fastq)
+    assert analysis == determine_fastq_type(fastq, use_cache=False)
+    out = tmp_path / "sample.fq"
+    result = create_sample_file(
+        fastq, "random", 0.5, str(out), interleaved=True, seed=1
+    )
+    assert result["input_reads"] == 200
+
+    # an explicit cache_dir redirects the store
+    cache_dir = tmp_path / "cache"
+    assert count_reads(fastq, cache_dir=cache_dir) == 200
+    assert (cache_dir / "read_samples").is_dir()
@@ -1,7 +1,11 @@
 import shutil
 from pathlib import Path
 
-from rolypoly.utils.bio.interval_ops import mask_nuc_range_from_sam
+from rolypoly.utils.bio.interval_ops import (
+    mask_nuc_range,
+    mask_nuc_range_from_sam,
+    merge_intervals_np,
+)
 
 
 def test_mask_nuc_range_from_sam(tmp_path: Path):
@@ -42,9 +46,57 @@ def test_mask_nuc_range_from_sam(tmp_path: Path):
             seqs.append("".join(cur))
 
     assert any("N" in s for s in seqs), "No masked Ns found in output sequences" #NOT GOOD THIS ASSUMES THE INPUT DIDN'T HAVE Ns TO BEGIN WITH.
+
+
+def test_mask_nuc_range_from_sam_exact(tmp_path: Path):
+    """Synthetic SAM: overlapping, minus-strand, clipped and unmapped records."""
+    fasta = tmp_path / "ref.fasta"
+    sam = tmp_path / "aln.sam"
+    out = tmp_path / "out.fasta"
+    fasta.write_text(
+        ">chr1 some description\nACGTACGTAC\nGTACGTACGT\n"
+        ">chr2\nAAAAAAAAAA\n"
+        ">chr3\nCCCCC\n"
+    )
+    sam.write_text(
+        "@HD\tVN:1.6\n"
+        "r1\t0\tchr1\t3\t60\t2S4M\t*\t0\t0\t*\t*\n"
+        "r2\t16\tchr1\t5\t60\t2M1D1M\t*\t0\t0\t*\t*\n"
+        "r3\t0\tchr1\t18\t60\t10M\t*\t0\t0\t*\t*\n"
+        "r4\t4\tchr2\t1\t0\t5M\t*\t0\t0\t*\t*\n"
+        "r5\t0\tchr3\t1\t0\t*\t*\t0\t0\t*\t*\n"
+    )
+
+    mask_nuc_range_from_sam(str(fasta), str(sam), str(out))
+
+    assert out.read_text() == (
+        ">chr1 some description\nACNNNNNNACGTACGTANNN\n"
+        ">chr2\nAAAAAAAAAA\n"
+        ">chr3\nCCCCC\n"
+    )
+
+
+def test_mask_nuc_range_table(tmp_path: Path):
+    fasta = tmp_path / "ref.fasta"
+    table = tmp_path / "hits.tsv"
+    out = tmp_path / "out.fasta"
+    fasta.write_text(">q1\nACGTACGTAC\n")
+    table.write_text("q1\t2\t3\t+\nq1\t9\t7\t-\n")
+
+    mask_nuc_range(str(fasta), str(table), str(out))
+
+    assert out.read_text() == ">q1\nANNTACNNNC\n"
+
+
+def test_merge_intervals_np():
+    starts, ends = merge_intervals_np([10, 0, 3, 20], [12, 4, 6, 25])
+    assert starts.tolist() == [0, 10, 20]
+    assert ends.tolist() == [6, 12, 25]
+
+
 if __name__ == "__main__":
     from pathlib import Path
     import tempfile
 
     test_mask_nuc_range_from_sam(Path("./tests/"))
-    print("Test completed successfully.")
\ No newline at end of file
+    print("Test completed successfully.")
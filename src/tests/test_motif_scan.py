@@ -0,0 +1,116 @@
+import importlib.util
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    importlib.util.find_spec("lightmotif") is None,
+    reason="lightmotif not installed",
+)
+
+JASPAR = """>MA0001.1 AGL3
+A  [ 0  3 79 40 66 48 65 11 65  0 ]
+C  [94 75  4  3  1  2  5  2  3  3 ]
+G  [ 1  0  3  4  1  0  5  3 28 88 ]
+T  [ 2 19 11 50 29 47 22 81  1  6 ]
+"""
+
+MEME = """MEME version 4
+
+ALPHABET= ACGT
+
+strands: + -
+
+Background letter frequencies
+A 0.25 C 0.25 G 0.25 T 0.25
+
+MOTIF crp CRP
+
+letter-probability matrix: alength= 4 w= 4 nsites= 17 E= 4.1e-009
+ 0.000000  0.176471  0.000000  0.823529
+ 0.000000  0.058824  0.647059  0.294118
+ 0.000000  0.058824  0.000000  0.941176
+ 0.176471  0.000000  0.764706  0.058824
+"""
+
+
+def _reverse_complement(sequence: str) -> str:
+    return sequence[::-1].translate(str.maketrans("ACGU", "UGCA"))
+
+
+def _motif_dir(tmp_path: Path) -> Path:
+    motifs = tmp_path / "motifs"
+    motifs.mkdir()
+    (motifs / "core.jaspar").write_text(JASPAR)
+    (motifs / "crp.meme").write_text(MEME)
+    return motifs
+
+
+def test_scan_matches_naive_pwm_on_both_strands(tmp_path: Path):
+    from rolypoly.utils.bio.motif_scan import (
+        encode_sequence,
+        load_motifs,
+        naive_pwm_scores,
+        scan_sequences,
+    )
+
+    motifs = load_motifs(_motif_dir(tmp_path))
+    assert [(m.name, m.width) for m in motifs] == [("MA0001.1", 10), ("crp", 4)]
+
+    rng = random.Random(3)
+    records = []
+    for i in range(30):
+        sequence = "".join(
+            rng.choice("ACGU") for _ in range(rng.randint(3, 800))
+        )
+        records.append((f"contig_{i}", sequence))
+    # the AGL3 consensus, planted on the minus strand of contig_0
+    planted = _reverse_complement("CCATAAATAG")
+    records[0] = ("contig_0", "ACGU" * 10 + planted + "ACGU" * 10)
+
+    hits = list(
+        scan_sequences(records, motifs, pvalue=1e-3, batch_nucleotides=2000)
+    )
+    assert ("contig_0", "MA0001.1", "AGL3", 41, 50, "-") in [
+        hit[:6] for hit in hits
+    ]
+
+    # same hits as scoring every window of every contig with numpy
+    expected = set()
+    for record_id, sequence in records:
+        encoded = encode_sequence(sequence)
+        for motif in motifs:
+            for strand, pssm in (("+", motif.pssm), ("-", motif.reverse)):
+                scores = naive_pwm_scores(encoded, list(pssm))
+                for position in np.flatnonzero(scores >= motif.threshold(1e-3)):
+                    expected.add(
+                        (record_id, motif.name, int(position) + 1, strand)
+                    )
+    assert {(h[0], h[1], h[3], h[5]) for h in hits} == expected
+    assert all(h[7] <= 1e-3 for h in hits)
+
+
+def test_scan_fasta_feeds_process_rna_motifs_data(tmp_path: Path):
+    from rolypoly.commands.annotation.annotate_RNA import (
+        process_rna_motifs_data,
+    )
+    from rolypoly.utils.bio.motif_scan import load_motifs, scan_fasta
+
+    fasta = tmp_path / "contigs.fasta"
+    fasta.write_text(">c1 desc\nAAAACCATAAATAGAAAA\n>c2\nGGGG\n")
+    motifs = load_motifs(_motif_dir(tmp_path))
+    output = tmp_path / "rna_motifs.out"
+    hits = scan_fasta(
+        fasta,
+        output,
+        motifs,
+        params={"pvalue": 1e-3, "thresholds": {"crp": {"min_score": 100}}},
+    )
+    table = process_rna_motifs_data(None, output)
+    assert table.height == hits >= 1
+    assert "crp" not in table["motif_type"].to_list()
+    # the CArG box is close to palindromic: found on both strands
+    agl3 = table.filter(table["motif_type"] == "MA0001.1")
+    assert sorted(zip(agl3["start"], agl3["strand"])) == [(5, "+"), (5, "-")]
@@ -0,0 +1,104 @@
+import random
+from pathlib import Path
+
+import polars as pl
+
+from rolypoly.commands.misc.quick_taxonomy import (
+    assign_taxonomy,
+    scan_hmm_tblout,
+)
+from rolypoly.utils.bio.polars_fastx import scan_fastx_headers
+
+
+def _per_sequence(sequence_id, markers, hmm_results, min_score):
+    """The former one-sequence-at-a-time assignment."""
+    seq_markers = markers.filter(pl.col("query") == sequence_id)
+    seq_hmms = hmm_results.filter(
+        (pl.col("query") == sequence_id) & (pl.col("score") >= min_score)
+    )
+    tax = {"sequence_id": sequence_id, "taxonomy": "Unknown", "confidence": 0.0}
+    evidence = []
+    is_rdrp = pl.col("target").str.contains("RdRP|RdRp|rdrp")
+    rdrp = seq_markers.filter(is_rdrp)
+    if not rdrp.is_empty():
+        best = rdrp.sort("score", descending=True, maintain_order=True).row(
+            0, named=True
+        )
+        tax["taxonomy"] = best.get("taxonomy") or "RNA virus"
+        tax["confidence"] = min(1.0, best["score"] / 100)
+        evidence.append(f"RdRP marker: {best['target']}")
+    for hit in seq_hmms.sort(
+        "score", descending=True, maintain_order=True
+    ).iter_rows(named=True):
+        evidence.append(f"RNA viral marker: {hit['target']}")
+        if tax["confidence"] < 0.8:
+            tax["confidence"] = min(0.8, hit["score"] / 100)
+    for hit in seq_markers.filter(~is_rdrp).iter_rows(named=True):
+        evidence.append(f"Other marker: {hit['target']}")
+        if tax["confidence"] < 0.6:
+            tax["confidence"] = min(0.6, hit["score"] / 100)
+    tax["evidence"] = evidence
+    return tax
+
+
+def _hits(rng, ids, targets, n):
+    return pl.DataFrame(
+        {
+            "query": [rng.choice(ids + ["unlisted"]) for _ in range(n)],
+            "target": [rng.choice(targets) for _ in range(n)],
+            "score": [float(rng.randint(10, 120)) for _ in range(n)],
+        }
+    )
+
+
+def test_matches_per_sequence_assignment():
+    rng = random.Random(7)
+    ids = [f"contig_{i}" for i in range(60)]
+    markers = _hits(rng, ids, ["RdRp_1", "rdrp_2", "CP", "MP"], 150)
+    markers = markers.with_columns(
+        pl.Series(
+            "taxonomy",
+            [rng.choice(["Picornavirales", None]) for _ in range(150)],
+        )
+    )
+    hmms = _hits(rng, ids, ["g1", "g2", "g3"], 150)
+
+    result = assign_taxonomy(
+        pl.LazyFrame({"sequence_id": ids}), markers.lazy(), hmms.lazy(), 50
+    )
+    expected = [_per_sequence(i, markers, hmms, 50) for i in ids]
+    assert result.select(
+        "sequence_id", "taxonomy", "confidence", "evidence"
+    ).to_dicts() == [
+        {k: e[k] for k in ("sequence_id", "taxonomy", "confidence", "evidence")}
+        for e in expected
+    ]
+
+
+def test_without_markers():
+    hmms = pl.LazyFrame({"query": ["a"], "target": ["g1"], "score": [55.0]})
+    result = assign_taxonomy(
+        pl.LazyFrame({"sequence_id": ["a", "b"]}), None, hmms
+    )
+    assert result.rows() == [
+        ("a", "Unknown", 0.55, ["RNA viral marker: g1"]),
+        ("b", "Unknown", 0.0, []),
+    ]
+
+
+def test_header_and_tblout_scans(tmp_path: Path):
+    fasta = tmp_path / "seqs.fasta"
+    fasta.write_text(">a desc\nACGT\nAC\n\n>b\nGG\n")
+    assert scan_fastx_headers(fasta).collect()["header"].to_list() == [
+        "a desc",
+        "b",
+    ]
+    tblout = tmp_path / "hits.tblout"
+    tblout.write_text(
+        "# target name  accession  query name  accession  E-value  score  bias\n"
+        "#------------\n"
+        "a_1  -  RdRp_1  -  1.2e-30  105.3  0.1  extra columns here\n"
+    )
+    assert scan_hmm_tblout(tblout).collect().rows() == [
+        ("a_1", "RdRp_1", 1.2e-30, 105.3)
+    ]
@@ -0,0 +1,71 @@
+import random
+from collections import defaultdict
+
+import polars as pl
+
+from rolypoly.commands.identify_virus.rdrp_motif_search import (
+    best_motif_combinations,
+    find_best_motif_combination,
+)
+
+
+def _reference(results: pl.DataFrame, max_distance: int) -> pl.DataFrame:
+    """The per-query loop best_motif_combinations replaces."""
+    rows = []
+    for _, group in results.group_by("query_name", maintain_order=True):
+        motif_groups = defaultdict(list)
+        for row in group.sort("ali_from").to_dicts():
+            motif_groups[row.get("motif_type", "unknown")].append(row)
+        rows.extend(find_best_motif_combination(motif_groups, max_distance))
+    return pl.DataFrame(rows, schema=results.schema)
+
+
+def _random_hits(seed: int, n_queries: int = 40) -> pl.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_queries):
+        for _hit in range(rng.randint(1, 12)):
+            start = rng.randint(1, 600)
+            rows.append(
+                {
+                    "query_name": f"q{rng.randint(0, n_queries)}",
+                    "motif_type": rng.choice(["A", "B", "C", "D", None]),
+                    "motif_profile": f"p{rng.randint(0, 5)}",
+                    "ali_from": start,
+                    "ali_to": start + rng.randint(5, 40),
+                    # coarse scores make ties (and tie-breaking) common
+                    "score": float(rng.randint(4, 30)),
+                    "evalue": rng.random(),
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def test_matches_per_query_greedy_search():
+    for seed in range(20):
+        hits = _random_hits(seed)
+        for max_distance in (0, 50, 200):
+            expected = _reference(hits, max_distance)
+            assert best_motif_combinations(hits, max_distance).equals(
+                expected
+            ), (seed, max_distance)
+
+
+def test_combination_respects_distance_and_thresholds():
+    hits = pl.DataFrame(
+        {
+            "query_name": ["q1"] * 4 + ["q2"],
+            "motif_type": ["A", "B", "C", "B", "A"],
+            "motif_profile": ["a1", "b1", "c1", "b2", "a1"],
+            "ali_from": [100, 150, 400, 200, 10],
+            "ali_to": [110, 160, 410, 210, 20],
+            "score": [20.0, 15.0, 30.0, 12.0, 9.0],
+            "evalue": [1e-5] * 5,
+        }
+    )
+    best = best_motif_combinations(hits, max_distance=100)
+    # C is too far from A/B and scores less than A+B; q2's A is below 10
+    assert best.select("query_name", "motif_profile").rows() == [
+        ("q1", "a1"),
+        ("q1", "b1"),
+    ]
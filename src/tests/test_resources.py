@@ -0,0 +1,55 @@
+import sys
+import threading
+import time
+
+from rolypoly.utils.resources import ResourceScheduler, tool_params
+
+
+def test_tool_params_translate_lease():
+    gib = 1024**3
+    assert tool_params("mmseqs", 8, 10 * gib) == {
+        "threads": 8,
+        "split-memory-limit": "8192M",
+    }
+    assert tool_params("bbtools", 4, 10 * gib)["Xmx"] == "8704m"
+    assert tool_params("spades", 4, 10 * gib) == {"threads": 4, "m": 10}
+    assert tool_params("pyhmmer", 3, gib) == {"cpus": 3}
+    assert tool_params("unknown", 2, gib) == {"threads": 2}
+
+
+def test_scheduler_queues_what_does_not_fit():
+    scheduler = ResourceScheduler(4, "4gb", monitor_interval=0.05)
+    first = scheduler.acquire("big", threads=3, memory="3gb")
+    order = []
+
+    def _second():
+        with scheduler.lease("second", threads=2, memory="1gb"):
+            order.append("second")
+
+    worker = threading.Thread(target=_second)
+    worker.start()
+    time.sleep(0.2)
+    # 2 threads don't fit next to the 3 leased ones
+    assert order == []
+    scheduler.release(first)
+    worker.join(timeout=5)
+    assert order == ["second"]
+    usage = scheduler.usage()
+    assert usage["name"].to_list() == ["big", "second"]
+    assert usage["queued_seconds"][1] > 0.1
+
+
+def test_scheduler_run_tracks_usage():
+    scheduler = ResourceScheduler(2, "2gb", monitor_interval=0.05)
+    result = scheduler.run(
+        lambda lease: [
+            sys.executable,
+            "-c",
+            f"import time; x = bytearray(50 * 1024**2); time.sleep(0.5); print({lease.threads})",
+        ],
+        name="python",
+        threads=1,
+    )
+    assert result["returncode"] == 0
+    assert result["threads"] == 1
+    assert result["peak_rss"] > 50 * 1024**2
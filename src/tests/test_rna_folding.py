@@ -0,0 +1,86 @@
+import importlib.util
+import random
+from pathlib import Path
+
+import pytest
+
+from rolypoly.commands.annotation.annotate_RNA import read_multiDBN_to_dataframe
+from rolypoly.utils.bio.rna_folding import fold_fasta, parse_linearfold_output
+
+requires_vienna = pytest.mark.skipif(
+    importlib.util.find_spec("RNA") is None,
+    reason="ViennaRNA python bindings not installed",
+)
+
+
+def _write_fasta(path: Path, lengths):
+    rng = random.Random(7)
+    with open(path, "w") as f:
+        for i, length in enumerate(lengths):
+            sequence = "".join(rng.choice("ACGT") for _ in range(length))
+            f.write(f">seq{i} some description\n{sequence}\n")
+
+
+@requires_vienna
+def test_fold_fasta_global_and_windowed(tmp_path: Path):
+    fasta = tmp_path / "input.fasta"
+    _write_fasta(fasta, [80, 120, 1500])
+    serial = tmp_path / "serial.fold"
+    parallel = tmp_path / "parallel.fold"
+
+    params = {"window_threshold": 1000, "max_bp_span": 100}
+    stats = fold_fasta(fasta, serial, params=params, threads=1)
+    fold_fasta(fasta, parallel, params=params, threads=2)
+    assert stats["records"] == 3 and stats["nucleotides"] == 1700
+    assert serial.read_text() == parallel.read_text()
+
+    structures = read_multiDBN_to_dataframe(serial)
+    global_folds = structures.filter(structures["source"] == "RNAfold")
+    assert global_folds["sequence_id"].to_list() == ["seq0", "seq1"]
+    assert global_folds["end"].to_list() == [80, 120]
+
+    local = structures.filter(structures["sequence_id"] == "seq2")
+    assert set(local["source"]) == {"RNALfold"}
+    # base pair span plus the 3' dangling base RNALfold reports
+    assert (local["end"] - local["start"] + 1).max() <= 101
+    assert (local["end"] <= 1500).all()
+    for row in local.iter_rows(named=True):
+        assert len(row["sequence"]) == len(row["structure"])
+        assert len(row["sequence"]) == row["end"] - row["start"] + 1
+        assert row["score"] <= 0
+
+
+@requires_vienna
+def test_partition_function_is_opt_in(tmp_path: Path):
+    fasta = tmp_path / "input.fasta"
+    _write_fasta(fasta, [60])
+    ensemble = tmp_path / "ensemble.tsv"
+
+    fold_fasta(fasta, tmp_path / "a.fold", ensemble_file=ensemble)
+    assert not ensemble.exists()
+    fold_fasta(
+        fasta,
+        tmp_path / "b.fold",
+        params={"partition_function": True},
+        ensemble_file=ensemble,
+    )
+    assert ensemble.read_text().count("\n") == 2
+
+
+def test_parse_linearfold_output():
+    output = [
+        ">0",
+        "GGGAAACCC",
+        "(((...))) (-1.20)",
+        ">1",
+        "ACGU",
+        "Unrecognized sequence: ACGU",
+        ">2",
+        "AAAA",
+        ".... (0.00)",
+        "",
+    ]
+    assert list(parse_linearfold_output(output)) == [
+        ("0", "GGGAAACCC", "(((...)))", -1.2),
+        ("2", "AAAA", "....", 0.0),
+    ]
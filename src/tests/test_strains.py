@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import numpy as np
+
+from rolypoly.utils.bio.coverage import (
+    CoverageAggregator,
+    aggregate_sam_stream,
+    mappy_sam_lines,
+)
+from rolypoly.utils.bio.strains import (
+    apply_alleles,
+    cluster_haplotypes,
+    collect_observations,
+    resolve_strains,
+    variant_positions,
+)
+
+
+def _mutate(sequence: str, changes: dict) -> str:
+    sequence = list(sequence)
+    for position, base in changes.items():
+        sequence[position] = base
+    return "".join(sequence)
+
+
+def _write_mixture(tmp_path: Path, strains, n_reads=600, read_length=100):
+    """Reference (first strain) and reads drawn from weighted strains."""
+    rng = np.random.default_rng(7)
+    (tmp_path / "ref.fa").write_text(f">c1\n{strains[0][0]}\n")
+    weights = np.array([w for _, w in strains], dtype=float)
+    choice = rng.choice(len(strains), n_reads, p=weights / weights.sum())
+    length = len(strains[0][0])
+    with open(tmp_path / "reads.fa", "w") as f:
+        for i, strain in enumerate(choice):
+            start = rng.integers(0, length - read_length)
+            seq = strains[strain][0][start : start + read_length]
+            f.write(f">r{i}\n{seq}\n")
+
+
+def test_cluster_haplotypes_links_variants():
+    # two haplotypes over 3 variants; reads cover 1-2 variants each
+    hap_a, hap_b = [0, 1, 2], [3, 2, 1]
+    rows = []
+    for hap, count in ((hap_a, 30), (hap_b, 10)):
+        for i in range(count):
+            row = [-1, -1, -1]
+            for j in (i % 3, (i + 1) % 3):
+                row[j] = hap[j]
+            rows.append(row)
+    haplotypes, labels, abundance = cluster_haplotypes(
+        np.array(rows), min_reads=3
+    )
+    assert sorted(map(list, haplotypes)) == sorted([hap_a, hap_b])
+    assert sorted(np.round(abundance, 2)) == [0.25, 0.75]
+    assert len(set(labels[:30])) == 1 and len(set(labels[30:])) == 1
+
+
+def test_cluster_haplotypes_ignores_noise():
+    rng = np.random.default_rng(0)
+    matrix = np.zeros((200, 4), dtype=np.int8)
+    noise = rng.random(matrix.shape) < 0.02
+    matrix[noise] = 2
+    haplotypes, _, abundance = cluster_haplotypes(matrix)
+    assert haplotypes.tolist() == [[0, 0, 0, 0]]
+    assert abundance.tolist() == [1.0]
+
+
+def test_apply_alleles():
+    assert apply_alleles("ACGTA", np.array([-1, 3, 4, -1, 1])) == "ATTC"
+
+
+def test_resolve_strains_on_synthetic_mixture(tmp_path: Path):
+    rng = np.random.default_rng(3)
+    reference = "".join(rng.choice(list("ACGT"), 800))
+    swap = {"A": "C", "C": "G", "G": "T", "T": "A"}
+    # private variants every 45 bp, so 100 bp reads link neighbouring ones
+    strain_b = _mutate(
+        reference, {p: swap[reference[p]] for p in range(150, 651, 45)}
+    )
+    strain_c = _mutate(
+        reference, {p: swap[reference[p]] for p in range(170, 651, 45)}
+    )
+    _write_mixture(
+        tmp_path, [(reference, 0.5), (strain_b, 0.3), (strain_c, 0.2)], 3000
+    )
+
+    aggregator = aggregate_sam_stream(
+        mappy_sam_lines(tmp_path / "ref.fa", [tmp_path / "reads.fa"]),
+        CoverageAggregator(track_alleles=True),
+    )
+    variants = variant_positions(aggregator, min_depth=10, min_frequency=0.1)
+    assert variants.tolist() == sorted(
+        [*range(150, 651, 45), *range(170, 651, 45)]
+    )
+
+    observations = collect_observations(
+        mappy_sam_lines(tmp_path / "ref.fa", [tmp_path / "reads.fa"]),
+        aggregator,
+        variants,
+    )
+    strains = resolve_strains(
+        aggregator, observations, variants, {"c1": reference}, threads=2
+    )
+    assert strains["strain"].to_list() == [
+        "c1_strain1",
+        "c1_strain2",
+        "c1_strain3",
+    ]
+    # the ends are barely covered, so compare the middle of the consensus
+    for sequence, expected in zip(
+        strains["sequence"], (reference, strain_b, strain_c)
+    ):
+        assert sequence[100:700] == expected[100:700]
+    assert np.allclose(strains["abundance"], [0.5, 0.3, 0.2], atol=0.05)
+    assert strains["variants"][1].startswith("151:")
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import polars as pl
+
+from rolypoly.utils.bio.sequences import (
+    count_fasta_records,
+    process_sequences,
+    read_fasta_df,
+    rename_sequences,
+    stream_rename_fasta,
+)
+
+
+def _write_inputs(tmp_path: Path):
+    first = tmp_path / "spades.fasta"
+    second = tmp_path / "megahit.fasta"
+    first.write_text(">NODE_1 len=12\nACGTACGTGGCC\n>NODE_2\nAC\nGT\n")
+    second.write_text(
+        ">k141_1\nGGGGCCCCAAAA\n>k141_2\nNNNNACGT\n>k141_3\nTTTTTTTTTTTT\n"
+    )
+    return [first, second]
+
+
+def test_stream_rename_matches_in_memory_rename(tmp_path: Path):
+    inputs = _write_inputs(tmp_path)
+    assert sum(count_fasta_records(f) for f in inputs) == 5
+
+    merged = tmp_path / "merged.fasta"
+    merged.write_text("".join(f.read_text() for f in inputs))
+    df, id_map = rename_sequences(read_fasta_df(str(merged)), use_hash=True)
+    df = process_sequences(df)
+
+    out = tmp_path / "renamed.fasta"
+    mapping = tmp_path / "map.tsv"
+    stats = stream_rename_fasta(
+        inputs, out, mapping, use_hash=True, batch_size=2
+    )
+    assert stats == {"input": 5, "written": 5}
+    expected = "".join(
+        f">{h}\n{s}\n" for h, s in zip(df["header"], df["sequence"])
+    )
+    assert out.read_text() == expected
+
+    table = pl.read_csv(mapping, separator="\t")
+    assert table["old_id"].to_list() == list(id_map.keys())
+    assert table["new_id"].to_list() == list(id_map.values())
+    assert table["length"].to_list() == df["length"].to_list()
+
+
+def test_stream_rename_numbers_and_filters(tmp_path: Path):
+    inputs = _write_inputs(tmp_path)
+    out = tmp_path / "renamed.fasta"
+    mapping = tmp_path / "map.tsv"
+    stats = stream_rename_fasta(
+        inputs, out, mapping, min_length=8, batch_size=2
+    )
+    assert stats == {"input": 5, "written": 4}
+    headers = [line for line in out.read_text().splitlines() if line[0] == ">"]
+    assert headers == [">CID_1", ">CID_2", ">CID_3", ">CID_4"]
+    table = pl.read_csv(mapping, separator="\t")
+    assert "NODE_2" not in table["old_id"].to_list()
+
+
+def test_stream_rename_hash_ids_unique_for_repeated_contigs(tmp_path: Path):
+    first = tmp_path / "spades.fasta"
+    second = tmp_path / "megahit.fasta"
+    first.write_text(">NODE_1\nACGTACGT\n>NODE_2\nACGTACGT\n")
+    second.write_text(">k141_1\nGGGGCCCC\n>k141_2\nACGTACGT\n")
+    out = tmp_path / "renamed.fasta"
+    mapping = tmp_path / "map.tsv"
+    stream_rename_fasta(
+        [first, second], out, mapping, use_hash=True, batch_size=1
+    )
+
+    table = pl.read_csv(mapping, separator="\t")
+    assert table["new_id"].n_unique() == 4
+    digest = table["new_id"][0]
+    assert table.filter(pl.col("new_id").str.starts_with(digest))[
+        "old_id"
+    ].to_list() == ["NODE_1", "NODE_2", "k141_2"]
+    assert table["new_id"].to_list()[1] == f"{digest}_2"
+    assert table["new_id"].to_list()[3] == f"{digest}_3"
+    headers = [
+        line[1:] for line in out.read_text().splitlines() if line[0] == ">"
+    ]
+    assert headers == table["new_id"].to_list()
@@ -0,0 +1,230 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pytest
+
+from rolypoly.utils.bio.trees import TaxonomyArrays, TaxonomyTree
+
+
+def _nodes() -> pl.DataFrame:
+    # 1 root, 2 Bacteria / 2759 Eukaryota, genera and species below
+    rows = [
+        (1, 1, "no rank", "root"),
+        (2, 1, "superkingdom", "Bacteria"),
+        (2759, 1, "superkingdom", "Eukaryota"),
+        (561, 2, "genus", "Escherichia"),
+        (562, 561, "species", "Escherichia coli"),
+        (83333, 562, "strain", "E. coli K-12"),
+        (620, 2, "genus", "Shigella"),
+        (623, 620, "species", "Shigella flexneri"),
+        (9605, 2759, "genus", "Homo"),
+        (9606, 9605, "species", "Homo sapiens"),
+    ]
+    return pl.DataFrame(
+        rows,
+        schema=["tax_id", "parent_tax_id", "rank", "scientific_name"],
+        orient="row",
+    )
+
+
+def _random_nodes(n: int, seed: int = 0) -> pl.DataFrame:
+    rng = np.random.default_rng(seed)
+    # every node hangs below an earlier one; two roots make a forest
+    parents = [0, 1] + [int(rng.integers(0, i)) for i in range(2, n)]
+    tax_ids = rng.permutation(np.arange(10, 10 + 10 * n, 10))
+    return pl.DataFrame(
+        {
+            "tax_id": tax_ids,
+            "parent_tax_id": [
+                tax_ids[p] if i > 1 else tax_ids[i]
+                for i, p in enumerate(parents)
+            ],
+        }
+    )
+
+
+def _walk_lca(parent_of, a, b):
+    lineage = []
+    while a is not None:
+        lineage.append(a)
+        a = parent_of.get(a)
+    while b is not None and b not in lineage:
+        b = parent_of.get(b)
+    return b
+
+
+def test_lca_matches_parent_walk():
+    nodes = _random_nodes(2000)
+    parent_of = {
+        t: (p if p != t else None)
+        for t, p in zip(
+            nodes["tax_id"].to_list(), nodes["parent_tax_id"].to_list()
+        )
+    }
+    arrays = TaxonomyArrays.from_nodes(nodes)
+    rng = np.random.default_rng(1)
+    first = rng.choice(nodes["tax_id"].to_numpy(), 3000)
+    second = rng.choice(nodes["tax_id"].to_numpy(), 3000)
+    second[:50] = first[:50]
+
+    expected = [
+        _walk_lca(parent_of, int(a), int(b)) for a, b in zip(first, second)
+    ]
+    assert arrays.lca_tax_ids(first, second).tolist() == [
+        -1 if e is None else e for e in expected
+    ]
+    assert arrays.lca_tax_ids([first[0]], [123456789]).tolist() == [-1]
+
+
+def test_tree_lineage_and_common_ancestor():
+    tree = TaxonomyTree(_nodes())
+    assert tree.find_common_ancestor(83333, 623)["name"] == "Bacteria"
+    assert tree.find_common_ancestor(562, 83333)["tax_id"] == 562
+    assert tree.find_common_ancestor(9606, 623)["tax_id"] == 1
+    assert tree.find_common_ancestor(9606, 42) is None
+    assert tree.find_common_ancestor_batch(
+        [83333, 9606], [623, 42]
+    ).to_list() == [2, None]
+    assert [node["tax_id"] for node in tree.get_lineage_path(83333)] == [
+        1,
+        2,
+        561,
+        562,
+        83333,
+    ]
+
+    lineages = tree.get_lineage_frame([83333, 9606, 2, 42])
+    assert lineages.columns == ["tax_id", "superkingdom", "genus", "species"]
+    assert lineages.rows() == [
+        (83333, "Bacteria", "Escherichia", "Escherichia coli"),
+        (9606, "Eukaryota", "Homo", "Homo sapiens"),
+        (2, "Bacteria", None, None),
+        (42, None, None, None),
+    ]
+    assert tree.get_lineage_frame([623], ["genus"], names=False).row(0) == (
+        623,
+        620,
+    )
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".parquet"])
+def test_save_load_round_trip(tmp_path: Path, suffix):
+    tree = TaxonomyTree(_nodes())
+    path = tree.save(tmp_path / f"taxonomy{suffix}")
+    loaded = TaxonomyTree.load(path)
+
+    for attribute in ("tax_ids", "parent", "depth", "preorder", "rank"):
+        assert np.array_equal(
+            getattr(loaded.arrays, attribute), getattr(tree.arrays, attribute)
+        )
+    assert loaded.arrays.names.to_list() == tree.arrays.names.to_list()
+    assert loaded.parent_map[83333] == 562
+    assert loaded.name_map[9606] == "Homo sapiens"
+    assert loaded.get_lineage_frame([623]).equals(tree.get_lineage_frame([623]))
+
+
+def _data_tree(nodes: pl.DataFrame, with_data) -> TaxonomyTree:
+    return TaxonomyTree(
+        nodes, pl.DataFrame({"tax_id": list(with_data), "has_genome": "yes"})
+    )
+
+
+def test_nearest_with_data_matches_walks():
+    nodes = _random_nodes(400, seed=3)
+    rng = np.random.default_rng(4)
+    tax_ids = nodes["tax_id"].to_list()
+    parent_of = {
+        t: (p if p != t else None)
+        for t, p in zip(tax_ids, nodes["parent_tax_id"].to_list())
+    }
+    children = {t: [] for t in tax_ids}
+    for t, p in parent_of.items():
+        if p is not None:
+            children[p].append(t)
+    with_data = set(rng.choice(tax_ids, 40, replace=False).tolist())
+    tree = _data_tree(nodes, with_data)
+
+    def ancestor(t):
+        distance, t = 1, parent_of[t]
+        while t is not None and t not in with_data:
+            distance, t = distance + 1, parent_of[t]
+        return (t, distance) if t is not None else (None, None)
+
+    def descendant(t, leaves_only=False):
+        frontier, distance = sorted(children[t]), 1
+        while frontier:
+            hits = [
+                c
+                for c in frontier
+                if c in with_data and (not leaves_only or not children[c])
+            ]
+            if hits:
+                return min(hits), distance
+            frontier = sorted(c for f in frontier for c in children[f])
+            distance += 1
+        return None, None
+
+    frame = tree.find_nearest_with_data_frame(tax_ids, max_distance=1000)
+    for row in frame.iter_rows(named=True):
+        t = row["tax_id"]
+        assert row["self_has_data"] == (t in with_data)
+        assert (row["ancestor_tax_id"], row["ancestor_distance"]) == ancestor(t)
+        assert (
+            row["descendant_tax_id"],
+            row["descendant_distance"],
+        ) == descendant(t)
+
+    def leaf_relative(t, max_distance):
+        candidates = []
+        up, a = 0, t
+        while a is not None:
+            if a in with_data and not children[a]:
+                candidates.append((up, a))
+            hit, down = descendant(a, leaves_only=True)
+            if hit is not None:
+                candidates.append((up + down, hit))
+            up, a = up + 1, parent_of[a]
+        candidates = [c for c in candidates if c[0] <= max_distance]
+        return min(candidates)[::-1] if candidates else (None, None)
+
+    leaves = tree.find_nearest_leaf_with_data_frame(tax_ids, max_distance=4)
+    for row in leaves.iter_rows(named=True):
+        assert (row["leaf_tax_id"], row["leaf_distance"]) == leaf_relative(
+            row["tax_id"], 4
+        )
+
+
+def test_nearest_batch_priority_and_propagation():
+    data = pl.DataFrame(
+        {"tax_id": [83333, 623, 9606], "gene_count": [4000, 4500, 20000]}
+    )
+    tree = TaxonomyTree(_nodes(), data, priority_columns=["gene_count"])
+
+    results = tree.find_nearest_with_data_batch([1, 2, 562, 9605, 42])
+    # Shigella flexneri and Homo sapiens are both 3 steps below the root
+    assert results[1]["descendants"][0]["tax_id"] == 9606
+    assert results[2]["descendants"][0]["tax_id"] == 623
+    assert results[562]["descendants"][0]["distance"] == 1
+    assert results[9605]["descendants"][0]["name"] == "Homo sapiens"
+    assert results[42]["ancestor"] is None and not results[42]["descendants"]
+    assert tree.find_nearest_with_data(83333)["self_has_data"]
+    assert tree.find_nearest_leaf_with_data(561)["leaves"][0]["tax_id"] == 83333
+
+    assert tree.propagate_data_to_ancestors("majority") == 7
+    assert tree.metadata_map[2]["descendant_count_total"] == 2
+    assert tree.find_nearest_with_data_batch([562])[562]["self_has_data"]
+
+
+def test_nearest_labels_saved_next_to_snapshot(tmp_path: Path):
+    tree = _data_tree(_nodes(), [83333, 9606])
+    path = tree.save(tmp_path / "taxonomy.npz")
+    labels_path = tmp_path / "taxonomy.nearest.parquet"
+    assert labels_path.exists()
+
+    data = pl.DataFrame({"tax_id": [83333, 9606], "has_genome": "yes"})
+    loaded = TaxonomyTree.load(path, data)
+    assert loaded._nearest_labels[()].equals(tree.nearest_data_labels())
+    # labels of other data are not reused
+    stale = TaxonomyTree(_nodes(), data.head(1))
+    assert not stale.load_nearest_labels(labels_path)
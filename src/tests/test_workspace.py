@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from rolypoly.utils.workspace import Workspace, resolve_tiers
+
+
+def test_resolve_tiers_drops_missing_and_appends_fallback(tmp_path: Path):
+    fast = tmp_path / "fast"
+    fast.mkdir()
+    out = tmp_path / "out"
+    tiers = resolve_tiers(f"{fast}:{tmp_path / 'missing'}", out)
+    assert tiers == [fast, out]
+
+
+def test_workspace_spills_and_cleans_up(tmp_path: Path):
+    fast = tmp_path / "fast"
+    fast.mkdir()
+    out = tmp_path / "out"
+    shared = out / "shared_tmp"
+    shared.mkdir(parents=True)
+    ws = Workspace([fast, out], name="shared_tmp")
+
+    first = ws.select(expected_bytes=0)
+    assert first.parent == fast
+    (first / "step1.fq").write_text("@r\nA\n+\nI\n")
+
+    # nothing fits 1 EB, so the workspace spills to the last tier
+    second = ws.reserve(1 << 60, step="huge")
+    assert second == shared
+    assert ws.find("step1.fq") == first / "step1.fq"
+
+    ws.cleanup()
+    assert not first.exists()
+    # pre-existing directories are left alone
+    assert shared.exists()